@@ -5,7 +5,7 @@ import pandas as pd
 from datetime import datetime
 import io # Para manipulação de arquivos em memória
 import sqlite3 # Importar sqlite3 para verificar tipo de dado
-import base64 # Para codificar a imagem de fundo em base64
+from app_logic.utils import set_background_image
 
 # Importar funções do novo módulo de utilitários de banco de dados
 from db_utils import (
@@ -20,40 +20,6 @@ from db_utils import (
     get_db_path
 )
 
-# --- Função para definir imagem de fundo com opacidade (copiada de app_main.py) ---
-def set_background_image(image_path):
-    try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background-color: transparent !important; /* Garante que o fundo do app seja transparente */
-            }}
-            .stApp::before {{
-                content: "";
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/png;base64,{encoded_string}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-                opacity: 0.20; /* Opacidade ajustada para 20% */
-                z-index: -1; /* Garante que o pseudo-elemento fique atrás do conteúdo */
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except FileNotFoundError:
-        st.warning(f"A imagem de fundo não foi encontrada no caminho: {image_path}")
-    except Exception as e:
-        st.error(f"Erro ao carregar a imagem de fundo: {e}")
 
 
 
@@ -368,7 +334,7 @@ def show_page():
     st.subheader("Importar e Analisar XML DI")
 
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
-    set_background_image(background_image_path)
+    set_background_image(background_image_path, opacity=0.20)
     
     _display_edit_popup_before_save()
     _display_items_popup()
@@ -0,0 +1,119 @@
+"""
+Arquivos estáticos (imagens de fundo e CSS) preparados uma vez por processo.
+
+Cada arquivo é lido, opcionalmente reduzido e convertido para WebP, e codificado em Base64 apenas
+na primeira vez; o resultado fica em memória pela data de modificação e tamanho do arquivo, de modo
+que substituir a imagem em 'assets/' invalida o cache sem reiniciar o servidor. As páginas recebem o
+data URI pronto em vez de reler e recodificar o PNG a cada rerun.
+"""
+import base64
+import io
+import logging
+import os
+import re
+import threading
+from typing import Optional, Dict, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow é opcional: sem ele as imagens são enviadas no formato original
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Imagens de fundo ficam atrás do conteúdo com opacidade baixa: 1920px de largura e WebP bastam
+LARGURA_MAXIMA_FUNDO = 1920
+QUALIDADE_WEBP = 80
+
+_MIME_POR_EXTENSAO = {
+    '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.gif': 'image/gif',
+    '.webp': 'image/webp', '.svg': 'image/svg+xml',
+}
+
+_lock = threading.Lock()
+_cache: Dict[Tuple, Tuple[Tuple[int, int], str]] = {}
+
+
+def _assinatura_arquivo(caminho: str) -> Tuple[int, int]:
+    info = os.stat(caminho)  # Levanta FileNotFoundError se o arquivo não existir
+    return (info.st_mtime_ns, info.st_size)
+
+
+def _obter_em_cache(chave: Tuple, caminho: str, gerar) -> str:
+    assinatura = _assinatura_arquivo(caminho)
+    with _lock:
+        em_cache = _cache.get(chave)
+    if em_cache is not None and em_cache[0] == assinatura:
+        return em_cache[1]
+    valor = gerar()
+    with _lock:
+        _cache[chave] = (assinatura, valor)
+    return valor
+
+
+def _converter_imagem(conteudo: bytes, largura_maxima: Optional[int], webp: bool) -> Tuple[bytes, Optional[str]]:
+    """Reduz a imagem à largura máxima e/ou converte para WebP. Retorna (bytes, mime) ou (conteudo, None) sem Pillow."""
+    if Image is None:
+        return conteudo, None
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        if largura_maxima and imagem.width > largura_maxima:
+            altura = round(imagem.height * largura_maxima / imagem.width)
+            imagem = imagem.resize((largura_maxima, altura), Image.LANCZOS)
+        if not webp:
+            saida = io.BytesIO()
+            imagem.save(saida, format="PNG", optimize=True)
+            return saida.getvalue(), 'image/png'
+        if imagem.mode not in ("RGB", "RGBA"):
+            imagem = imagem.convert("RGBA")
+        saida = io.BytesIO()
+        imagem.save(saida, format="WEBP", quality=QUALIDADE_WEBP, method=4)
+        return saida.getvalue(), 'image/webp'
+
+
+def get_data_uri(caminho: str, largura_maxima: Optional[int] = None, webp: bool = False) -> str:
+    """
+    Data URI ('data:<mime>;base64,...') do arquivo, gerado uma vez por versão do arquivo.
+    Levanta FileNotFoundError se o arquivo não existir.
+    """
+    caminho = os.path.abspath(caminho)
+
+    def gerar():
+        with open(caminho, "rb") as arquivo:
+            conteudo = arquivo.read()
+        mime = _MIME_POR_EXTENSAO.get(os.path.splitext(caminho)[1].lower(), 'application/octet-stream')
+        if (largura_maxima or webp) and mime.startswith('image/') and mime != 'image/svg+xml':
+            try:
+                convertido, mime_convertido = _converter_imagem(conteudo, largura_maxima, webp)
+                # Só usa a versão convertida se ela for menor que o original
+                if mime_convertido and len(convertido) < len(conteudo):
+                    conteudo, mime = convertido, mime_convertido
+            except Exception as e:
+                logger.warning(f"Não foi possível otimizar a imagem '{caminho}', usando o original: {e}")
+        logger.debug(f"Asset '{caminho}' codificado ({len(conteudo)} bytes, {mime}).")
+        return f"data:{mime};base64,{base64.b64encode(conteudo).decode()}"
+
+    return _obter_em_cache(('uri', caminho, largura_maxima, webp), caminho, gerar)
+
+
+def get_background_data_uri(caminho: str) -> str:
+    """Data URI de uma imagem de fundo: no máximo LARGURA_MAXIMA_FUNDO de largura, em WebP."""
+    return get_data_uri(caminho, largura_maxima=LARGURA_MAXIMA_FUNDO, webp=True)
+
+
+def _minificar_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    # Antes de ':' o espaço pode fazer parte do seletor (ex.: 'div :first-child')
+    return re.sub(r":\s+", ":", css).strip()
+
+
+def get_css(caminho: str) -> str:
+    """Conteúdo do arquivo CSS sem comentários e espaços desnecessários, gerado uma vez por versão do arquivo."""
+    caminho = os.path.abspath(caminho)
+
+    def gerar():
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            return _minificar_css(arquivo.read())
+
+    return _obter_em_cache(('css', caminho), caminho, gerar)
@@ -6,13 +6,17 @@ from datetime import datetime
 
 # Importa as funções reais do db_utils
 try:
-    from db_utils import get_declaracao_by_id
+    from db_utils import get_declaracao_cached
 except ImportError:
     st.error("Erro: db_utils não encontrado. Certifique-se de que o arquivo está acessível.")
-    get_declaracao_by_id = None
+    get_declaracao_cached = None
+
+from app_logic import assets, tariff_engine
 
 logger = logging.getLogger(__name__)
 
+TARIFA_FECHAMENTO = tariff_engine.TABELAS_TARIFAS[tariff_engine.FECHAMENTO]
+
 # --- Funções Auxiliares de Formatação ---
 def _format_currency(value):
     """Formata um valor numérico para o formato de moeda R$ X.XXX,XX."""
@@ -54,13 +58,17 @@ def perform_fechamento_calculations():
 
     di_data = st.session_state.fechamento_di_data
 
-    # Desempacota os dados da DI (29 campos)
-    (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-     arquivo_origem, data_importacao, informacao_complementar,
-     vmle, frete_di, seguro_di, vmld, ipi, pis_pasep, cofins, icms_sc,
-     taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-     cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-     imposto_importacao, armazenagem_db, frete_nacional_db) = di_data
+    # Campos da DI usados abaixo
+    vmle = di_data.vmle
+    frete_di = di_data.frete
+    seguro_di = di_data.seguro
+    ipi = di_data.ipi
+    pis_pasep = di_data.pis_pasep
+    cofins = di_data.cofins
+    taxa_siscomex = di_data.taxa_siscomex
+    imposto_importacao = di_data.imposto_importacao
+    armazenagem_db = di_data.armazenagem
+    frete_nacional_db = di_data.frete_nacional
 
     # --- Obter valores dos campos editáveis e labels ---
     # Lendo diretamente da chave do widget no session_state
@@ -87,26 +95,26 @@ def perform_fechamento_calculations():
         frete_internacional_pago_float = 0.0
         logger.warning("Frete Internacional Pago inválido, usando 0.0 para cálculo.")
 
-    # --- Cálculos dos Impostos ---
-    total_impostos = imposto_importacao + ipi + pis_pasep + cofins
+    # Impostos, taxas de destino (frete pago - frete da DI), despesas e totais das NFs
+    resultado = tariff_engine.calcular_fechamento(
+        vmle, frete_di, seguro_di, imposto_importacao, ipi, pis_pasep, cofins, taxa_siscomex,
+        armazenagem_float, frete_nacional_float, afrmm_float, frete_internacional_pago_float, valor_nfs_float
+    )
+    total_impostos = float(resultado['total_impostos'])
     st.session_state.fechamento_total_impostos_display = _format_currency(total_impostos)
 
-    # --- Cálculo de TAXAS DESTINO ---
-    taxas_destino_calculado = frete_internacional_pago_float - frete_di
+    taxas_destino_calculado = float(resultado['taxas_destino'])
     st.session_state.fechamento_taxas_destino_display = _format_currency(taxas_destino_calculado)
 
-    # --- Cálculo do TOTAL DESPESAS ---
-    despachante_fixo = 1000.00
+    # --- TOTAL DESPESAS (valores fixos da template em tariff_engine.TABELAS_TARIFAS) ---
+    despachante_fixo = TARIFA_FECHAMENTO["despachante"]
     siscomex_fixo = taxa_siscomex
-    connecta_fixo = 0.00
-    descarregamento_fixo = 0.00 # Assumindo 0 se não tiver valor
-    icms_4_percent_fixo = 0.00
-    envio_docs_fixo = 0.00 # Valor fixo da template
-
-    total_despesas = (afrmm_float + armazenagem_float + envio_docs_fixo + frete_nacional_float +
-                      despachante_fixo + siscomex_fixo + connecta_fixo +
-                      descarregamento_fixo + taxas_destino_calculado + icms_4_percent_fixo)
-    
+    connecta_fixo = TARIFA_FECHAMENTO["connecta"]
+    descarregamento_fixo = TARIFA_FECHAMENTO["descarregamento"]
+    icms_4_percent_fixo = TARIFA_FECHAMENTO["icms_4_percent"]
+    envio_docs_fixo = TARIFA_FECHAMENTO["envio_docs"]
+
+    total_despesas = float(resultado['total_despesas'])
     st.session_state.fechamento_total_despesas_display = _format_currency(total_despesas)
 
     # Atualiza os valores de exibição das despesas
@@ -124,14 +132,14 @@ def perform_fechamento_calculations():
     # --- Cálculos dos Totais Finais ---
     st.session_state.fechamento_total_mercadoria_display = _format_currency(vmle)
 
-    total_adicionais_final = total_impostos + total_despesas + seguro_di + frete_di
+    total_adicionais_final = float(resultado['total_adicionais'])
     st.session_state.fechamento_total_adicionais_display = _format_currency(total_adicionais_final)
 
-    total_nfs_calculado = vmle + total_adicionais_final
+    total_nfs_calculado = float(resultado['total_nfs'])
     st.session_state.fechamento_total_nfs_calculado_display = _format_currency(total_nfs_calculado)
 
     # MODIFICADO: A conta da diferença agora é (Valor NFs - TOTAL NFS)
-    diferenca_calculada = valor_nfs_float - total_nfs_calculado
+    diferenca_calculada = float(resultado['diferenca'])
     st.session_state.fechamento_diferenca_final_value = _format_currency(diferenca_calculada)
 
     # Força a re-execução da página para atualizar os valores exibidos
@@ -148,19 +156,26 @@ def load_fechamento_di_data(declaracao_id):
         return
 
     logger.info(f"Carregando dados para DI ID (Fechamento): {declaracao_id}")
-    di_data_row = get_declaracao_by_id(declaracao_id)
+    di_data_row = get_declaracao_cached(declaracao_id)
 
     if di_data_row:
-        di_data = tuple(di_data_row)
+        di_data = di_data_row
         st.session_state.fechamento_di_data = di_data
         
-        # Desempacota os dados (29 campos)
-        (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-         arquivo_origem, data_importacao, informacao_complementar,
-         vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-         taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-         cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-         imposto_importacao, armazenagem_db, frete_nacional_db) = di_data
+        # Campos da DI usados abaixo
+        valor_total_reais_xml = di_data.valor_total_reais_xml
+        informacao_complementar = di_data.informacao_complementar
+        vmle = di_data.vmle
+        frete = di_data.frete
+        seguro = di_data.seguro
+        vmld = di_data.vmld
+        ipi = di_data.ipi
+        pis_pasep = di_data.pis_pasep
+        cofins = di_data.cofins
+        acrescimo = di_data.acrescimo
+        imposto_importacao = di_data.imposto_importacao
+        armazenagem_db = di_data.armazenagem
+        frete_nacional_db = di_data.frete_nacional
 
         st.session_state.fechamento_processo_ref = f"Processo : {informacao_complementar if informacao_complementar else 'N/A'}"
         
@@ -248,7 +263,7 @@ def set_background_image_local(image_path, opacity=None):
         f"""
         <style>
         .stApp {{
-            background-image: url("data:image/png;base64,{_get_base64_image(image_path)}");
+            background-image: url("{assets.get_background_data_uri(image_path)}");
             background-size: cover;
             background-repeat: no-repeat;
             background-attachment: fixed;
@@ -260,12 +275,6 @@ def set_background_image_local(image_path, opacity=None):
         unsafe_allow_html=True
     )
 
-import base64
-def _get_base64_image(image_path):
-    """Converte uma imagem para base64."""
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
-
 # Tenta importar as funções de utils, caso contrário, usa os fallbacks locais
 try:
     from app_logic.utils import set_background_image, get_default_background_opacity
@@ -298,10 +307,13 @@ def show_calculo_fechamento_page():
     if 'fechamento_di_data' not in st.session_state:
         clear_fechamento_di_data()
 
-    # Carrega os dados da DI se um ID foi passado da página anterior
-    if 'selected_di_id_fechamento' in st.session_state and st.session_state.selected_di_id_fechamento and st.session_state.fechamento_di_data is None:
-        load_fechamento_di_data(st.session_state.selected_di_id_fechamento)
+    # Carrega os dados da DI se um ID foi passado da página anterior (ou se a DI exibida foi alterada em outra tela)
+    if 'selected_di_id_fechamento' in st.session_state and st.session_state.selected_di_id_fechamento:
+        if st.session_state.fechamento_di_data is None or get_declaracao_cached(st.session_state.selected_di_id_fechamento) != st.session_state.fechamento_di_data:
+            load_fechamento_di_data(st.session_state.selected_di_id_fechamento)
         st.session_state.selected_di_id_fechamento = None # Limpa o ID após carregar
+    elif st.session_state.fechamento_di_data is not None and get_declaracao_cached(st.session_state.fechamento_di_data.id) != st.session_state.fechamento_di_data:
+        load_fechamento_di_data(st.session_state.fechamento_di_data.id)
 
     st.markdown(f"#### {st.session_state.fechamento_processo_ref}")
     st.markdown("---")
@@ -6,7 +6,9 @@ from datetime import datetime
 import urllib.parse # Importa para codificar URLs para o mailto
 
 # Importa as funções reais do db_utils
-from db_utils import get_declaracao_by_id, update_declaracao_field
+from db_utils import get_declaracao_cached, update_declaracao_fields
+
+from app_logic import tariff_engine
 
 # Importa as funções de utilidade para o fundo
 try:
@@ -112,7 +114,8 @@ def _save_frete_nacional_to_db():
         st.error("Valor do Total a Depositar calculado inválido para salvar no banco de dados.")
         return
 
-    if update_declaracao_field(di_id, 'frete_nacional', frete_nacional_float):
+    user_info = st.session_state.get('user_info') or {'username': 'Desconhecido'}
+    if update_declaracao_fields([(di_id, 'frete_nacional', frete_nacional_float)], origem="FN Transportes", usuario=user_info.get('username')):
         st.success(f"Frete Nacional ({_format_currency(frete_nacional_float)}) salvo com sucesso")
     else:
         st.error(f"Falha ao salvar o valor do Frete Nacional para a DI ID {di_id}.")
@@ -129,20 +132,19 @@ def load_fn_transportes_di_data(declaracao_id):
         return
 
     logger.info(f"Carregando dados para DI ID (FN Transportes): {declaracao_id}")
-    di_data_row = get_declaracao_by_id(declaracao_id)
+    di_data_row = get_declaracao_cached(declaracao_id)
 
     if di_data_row:
-        # Converte sqlite3.Row para uma tupla ou lista para desempacotar
-        di_data = tuple(di_data_row)
+        # get_declaracao_cached já devolve um registro Declaracao (acesso por atributo)
+        di_data = di_data_row
         st.session_state.fn_transportes_di_data = di_data
         
-        # Desempacota os dados para acessar informacao_complementar e outros campos
-        (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-         arquivo_origem, data_importacao, informacao_complementar,
-         vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-         taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-         cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-         imposto_importacao, armazenagem_db_value, frete_nacional_db_value) = di_data
+        # Campos da DI usados abaixo
+        informacao_complementar = di_data.informacao_complementar
+        vmld = di_data.vmld
+        peso_bruto = di_data.peso_bruto
+        peso_liquido = di_data.peso_liquido
+        frete_nacional_db_value = di_data.frete_nacional
 
         st.session_state.fn_transportes_processo_ref = informacao_complementar if informacao_complementar else "N/A"
         
@@ -243,43 +245,13 @@ def perform_fn_transportes_calculations():
         st.session_state.fn_transportes_total_a_depositar_display = _format_currency(0.00)
         return
 
-    # Constantes de cálculo (extraídas de view_calculo_fn_transportes.py)
-    BASE_FIXA_CALCULO = 1650.00
-    VALOR_BAIXA_VAZIO_UNITARIO = 380.00
-    DIVISOR_FINAL = 0.83
-
-    # Cálculo da Base - Ajustado para corresponder à imagem e lógica de 1650 fixo por processo
-    # A lógica original do view_calculo_fn_transportes.py é:
-    # base_calculo = self.BASE_FIXA_CALCULO
-    # if qtde_container > 0: base_calculo *= qtde_container
-    # if qtde_processos > 0: base_calculo /= qtde_processos
-    # Para corresponder à imagem, onde a base de cálculo é R$ 1.650,00 mesmo com 2 contêineres e 1 processo:
-    base_calculo_for_display = BASE_FIXA_CALCULO # Mantém 1650 fixo para exibição
-
-    # Porcentagem do VMLD da DI
-    percentual_vmld = 0.00055 * vmld
-
-    # Total Parcial
-    # A lógica do view_calculo_fn_transportes.py para total_parcial_bruto é (base_calculo + percentual_vmld)
-    # ONDE base_calculo já considera qtde_container e qtde_processos.
-    calculated_base_for_total = BASE_FIXA_CALCULO
-    if qtde_container > 0:
-        calculated_base_for_total *= qtde_container
-    if qtde_processos > 0:
-        calculated_base_for_total /= qtde_processos
-
-    total_parcial_bruto = (calculated_base_for_total + percentual_vmld)
-    total_parcial = total_parcial_bruto / DIVISOR_FINAL
-
-    # Valor da Baixa de Vazio
-    valor_baixa_vazio_calculado = 0.0
-    if baixa_vazio_sim:
-        valor_baixa_vazio_calculado = VALOR_BAIXA_VAZIO_UNITARIO * qtde_baixa_vazio
-        if qtde_processos > 0: # Divide pela quantidade de processos, se houver mais de um
-            valor_baixa_vazio_calculado /= qtde_processos
-
-    # Total a Depositar
-    total_a_depositar = total_parcial + diferenca_float + valor_baixa_vazio_calculado
+    # (base por contêiner rateada entre os processos + 0,055% do VMLD) / 0,83, mais a baixa de vazio rateada
+    resultado = tariff_engine.calcular_fn_transportes(vmld, qtde_container, qtde_processos, qtde_baixa_vazio, diferenca_float)
+    # Para corresponder à imagem, a Base Cálculo exibida é sempre a base fixa de R$ 1.650,00
+    base_calculo_for_display = tariff_engine.TABELAS_TARIFAS[tariff_engine.FN_TRANSPORTES]["base_por_container"]
+    percentual_vmld = float(resultado['percentual_vmld'])
+    total_parcial = float(resultado['total_parcial'])
+    total_a_depositar = float(resultado['total_a_depositar'])
 
     # Atualiza os valores no session_state para exibição
     st.session_state.fn_transportes_vmld_di_display = _format_currency(vmld)
@@ -384,6 +356,9 @@ def show_calculo_fn_transportes_page():
     if 'selected_di_id_fn_transportes' in st.session_state and st.session_state.selected_di_id_fn_transportes:
         load_fn_transportes_di_data(st.session_state.selected_di_id_fn_transportes)
         st.session_state.selected_di_id_fn_transportes = None # Limpa o ID após carregar
+    elif st.session_state.fn_transportes_di_data is not None and get_declaracao_cached(st.session_state.fn_transportes_di_data.id) != st.session_state.fn_transportes_di_data:
+        # A DI exibida foi alterada em outra tela: recarrega a partir do cache compartilhado
+        load_fn_transportes_di_data(st.session_state.fn_transportes_di_data.id)
 
     st.markdown(f"#### Processo: **{st.session_state.fn_transportes_processo_ref}**")
     st.markdown("---")
@@ -7,10 +7,12 @@ import urllib.parse # Importa para codificar URLs para o mailto
 
 # Importa as funções reais do db_utils
 try:
-    from db_utils import get_declaracao_by_id
+    from db_utils import get_declaracao_cached
 except ImportError:
     st.error("Erro: db_utils não encontrado. Certifique-se de que o arquivo está acessível.")
-    get_declaracao_by_id = None
+    get_declaracao_cached = None
+
+from app_logic import tariff_engine
 
 logger = logging.getLogger(__name__)
 
@@ -48,9 +50,8 @@ def _format_int(value):
         return "N/A"
 
 # --- Constantes de Cálculo ---
-ASSESSORIA_LOGISTICA = 1000.00
-TAXA_MERCANTE_FIXA = 20.00
-AFRMM_PERCENTUAL_CALC = 0.08
+# Assessoria logística, taxa do Mercante e percentual do AFRMM ficam em tariff_engine.TABELAS_TARIFAS
+TARIFA_FUTURA = tariff_engine.TABELAS_TARIFAS[tariff_engine.FUTURA]
 
 def perform_futura_calculations():
     """
@@ -62,13 +63,16 @@ def perform_futura_calculations():
 
     di_data = st.session_state.futura_di_data
 
-    # Desempacota os dados (agora com 29 campos conforme db_utils.py)
-    (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-     arquivo_origem, data_importacao, informacao_complementar,
-     vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-     taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-     cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo_xml,
-     imposto_importacao_xml, armazenagem_db, frete_nacional_db) = di_data
+    # Campos da DI usados abaixo
+    frete = di_data.frete
+    ipi = di_data.ipi
+    pis_pasep = di_data.pis_pasep
+    cofins = di_data.cofins
+    icms_sc = di_data.icms_sc
+    taxa_cambial_usd = di_data.taxa_cambial_usd
+    taxa_siscomex = di_data.taxa_siscomex
+    acrescimo_xml = di_data.acrescimo
+    imposto_importacao_xml = di_data.imposto_importacao
 
     # Obter valores editáveis
     try:
@@ -103,13 +107,14 @@ def perform_futura_calculations():
     # --- Cálculos para VALORES ESTIMADOS PARA PAGAMENTO E/OU DÉBITO PELO IMPORTADOR ---
     imposto_importacao_calc = imposto_importacao_xml
 
-    total_importador = imposto_importacao_calc + ipi + pis_pasep + cofins + taxa_siscomex
-    # Verifica se icms_sc é um valor numérico antes de tentar somar
-    if icms_sc and icms_sc.replace(',', '.').replace('R$', '').strip().replace('.', '', 1).isdigit():
-        try:
-            total_importador += float(icms_sc.replace('R$', '').replace('.', '').replace(',', '.').strip())
-        except ValueError:
-            pass # Não adiciona se não for um número válido
+    # AFRMM: (Frete(BRL) + Acrescimo(BRL) + capatazia(BRL) ) x 0,08 + Tarifa + Taxa do Mercante, só no marítimo
+    maritimo = st.session_state.futura_tipo_transporte == "Marítimo"
+    resultado = tariff_engine.calcular_futura(
+        imposto_importacao_calc, ipi, pis_pasep, cofins, taxa_siscomex, tariff_engine.icms_para_float(icms_sc),
+        frete_di_reais_float, acrescimo_afrmm_float, capatazias_afrmm_float, tarifa_afrmm_float,
+        maritimo, diferenca_atual_float
+    )
+    total_importador = float(resultado['total_importador'])
 
     st.session_state.futura_imposto_importacao_display = _format_currency(imposto_importacao_calc)
     st.session_state.futura_ipi_display = _format_currency(ipi)
@@ -120,25 +125,22 @@ def perform_futura_calculations():
     st.session_state.futura_total_debito_importador = _format_currency(total_importador)
 
     # --- Cálculos para VALORES ESTIMADOS PARA DEPÓSITOS E PAGAMENTOS PELA COMISSÁRIA DE DESPACHOS ---
-    total_afrmm_calc = 0.0
-    if st.session_state.futura_tipo_transporte == "Marítimo":
-        # Fórmula AFRMM: (Frete(BRL) + Acrescimo(BRL) + capatazia(BRL) ) x 0,08 + Tarifa + Taxa do Mercante
-        total_afrmm_calc = (frete_di_reais_float + acrescimo_afrmm_float + capatazias_afrmm_float) * AFRMM_PERCENTUAL_CALC + tarifa_afrmm_float + TAXA_MERCANTE_FIXA
+    total_afrmm_calc = float(resultado['afrmm'])
+    if maritimo:
         st.session_state.futura_afrmm_comissaria_display = _format_currency(total_afrmm_calc)
         st.session_state.futura_total_afrmm_calc_display = _format_currency(total_afrmm_calc)
         st.session_state.futura_taxa_ptax_display = _format_float(taxa_cambial_usd, decimals=4) # Taxa PTAX é a Taxa Cambial (USD)
-        st.session_state.futura_taxa_mercante_afrmm_display = _format_currency(TAXA_MERCANTE_FIXA)
+        st.session_state.futura_taxa_mercante_afrmm_display = _format_currency(TARIFA_FUTURA["taxa_mercante"])
     else:
         st.session_state.futura_afrmm_comissaria_display = _format_currency(0.00)
         st.session_state.futura_total_afrmm_calc_display = _format_currency(0.00)
         st.session_state.futura_taxa_ptax_display = "R$ 0,00"
         st.session_state.futura_taxa_mercante_afrmm_display = "R$ 0,00"
 
-    st.session_state.futura_assessoria_logistica_display = _format_currency(ASSESSORIA_LOGISTICA)
-    st.session_state.futura_remessa_documentos_display = _format_currency(0.00)
+    st.session_state.futura_assessoria_logistica_display = _format_currency(TARIFA_FUTURA["assessoria_logistica"])
+    st.session_state.futura_remessa_documentos_display = _format_currency(TARIFA_FUTURA["remessa_documentos"])
 
-    total_comissaria = ASSESSORIA_LOGISTICA + total_afrmm_calc + 0.00 # Remessa de documentos (assumindo 0.00)
-    st.session_state.futura_total_debito_comissaria = _format_currency(total_comissaria + diferenca_atual_float)
+    st.session_state.futura_total_debito_comissaria = _format_currency(float(resultado['total_a_depositar']))
 
 def load_futura_di_data(declaracao_id):
     """
@@ -150,20 +152,19 @@ def load_futura_di_data(declaracao_id):
         return
 
     logger.info(f"Carregando dados para DI ID (Futura): {declaracao_id}")
-    di_data_row = get_declaracao_by_id(declaracao_id)
+    di_data_row = get_declaracao_cached(declaracao_id)
 
     if di_data_row:
-        # Converte sqlite3.Row para uma tupla ou lista para desempacotar
-        di_data = tuple(di_data_row)
+        # get_declaracao_cached já devolve um registro Declaracao (acesso por atributo)
+        di_data = di_data_row
         st.session_state.futura_di_data = di_data
         
-        # Desempacota os dados (agora com 29 campos)
-        (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-         arquivo_origem, data_importacao, informacao_complementar,
-         vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-         taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-         cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-         imposto_importacao, armazenagem_db, frete_nacional_db) = di_data
+        # Campos da DI usados abaixo
+        numero_di = di_data.numero_di
+        informacao_complementar = di_data.informacao_complementar
+        frete = di_data.frete
+        taxa_cambial_usd = di_data.taxa_cambial_usd
+        acrescimo = di_data.acrescimo
 
         logger.info(f"DEBUG: Taxa Cambial (USD) carregada para DI {numero_di}: {taxa_cambial_usd}")
 
@@ -297,13 +298,16 @@ def show_calculo_futura_page():
         st.session_state.email_type_to_show = None
 
 
-    # Carrega os dados da DI se um ID foi passado da página anterior
-    # A condição 'st.session_state.futura_di_data is None' garante que a DI só é carregada
-    # se ainda não estiver na sessão (ou se foi explicitamente limpa por navigate_to_calc_page)
-    if 'selected_di_id_futura' in st.session_state and st.session_state.selected_di_id_futura and st.session_state.futura_di_data is None:
-        load_futura_di_data(st.session_state.selected_di_id_futura)
+    # Carrega os dados da DI se um ID foi passado da página anterior.
+    # A DI só é recarregada se ainda não estiver na sessão, se for outra DI ou se foi alterada
+    # desde o carregamento (comparação com o cache compartilhado de DIs, sem consultar o banco)
+    if 'selected_di_id_futura' in st.session_state and st.session_state.selected_di_id_futura:
+        if st.session_state.futura_di_data is None or get_declaracao_cached(st.session_state.selected_di_id_futura) != st.session_state.futura_di_data:
+            load_futura_di_data(st.session_state.selected_di_id_futura)
         # Limpa o ID após carregar para evitar recarregar na próxima atualização
         st.session_state.selected_di_id_futura = None
+    elif st.session_state.futura_di_data is not None and get_declaracao_cached(st.session_state.futura_di_data.id) != st.session_state.futura_di_data:
+        load_futura_di_data(st.session_state.futura_di_data.id)
 
     st.markdown(f"#### Processo: **{st.session_state.futura_processo_ref}**")
     st.markdown("---")
@@ -7,9 +7,11 @@ import urllib.parse # Importa para codificar URLs para o mailto
 
 # Importa as funções reais do db_utils
 # ATENÇÃO: Certifique-se de que 'db_utils.py' existe no mesmo diretório raiz do 'app_main.py'
-# e que as funções 'get_declaracao_by_id' e 'update_declaracao_field'
+# e que as funções 'get_declaracao_cached' e 'update_declaracao_fields'
 # estão corretamente implementadas nele para interagir com seu banco de dados real.
-from db_utils import get_declaracao_by_id, update_declaracao_field
+from db_utils import get_declaracao_cached, update_declaracao_fields
+
+from app_logic import tariff_engine
 
 logger = logging.getLogger(__name__)
 
@@ -104,7 +106,8 @@ def _save_armazenagem_to_db():
         st.error("Valor de Armazenagem calculado inválido para salvar no banco de dados.")
         return
 
-    if update_declaracao_field(di_id, 'armazenagem', armazenagem_float):
+    user_info = st.session_state.get('user_info') or {'username': 'Desconhecido'}
+    if update_declaracao_fields([(di_id, 'armazenagem', armazenagem_float)], origem="Armazenagem Elo", usuario=user_info.get('username')):
         st.success(f"Valor de armazenagem ({_format_currency(armazenagem_float)}) salvo com sucesso para a DI ID {di_id}!")
     else:
         st.error(f"Falha ao salvar o valor de armazenagem para a DI ID {di_id}.")
@@ -119,20 +122,19 @@ def load_elo_di_data(declaracao_id):
         return
 
     logger.info(f"Carregando dados para DI ID (Armazenagem Elo): {declaracao_id}")
-    di_data_row = get_declaracao_by_id(declaracao_id)
+    di_data_row = get_declaracao_cached(declaracao_id)
 
     if di_data_row:
-        # Converte sqlite3.Row para uma tupla ou lista para desempacotar
-        di_data = tuple(di_data_row)
+        # get_declaracao_cached já devolve um registro Declaracao (acesso por atributo)
+        di_data = di_data_row
         st.session_state.elo_di_data = di_data
         
-        # Desempacota os dados para acessar informacao_complementar e outros campos
-        (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-         arquivo_origem, data_importacao, informacao_complementar,
-         vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-         taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-         cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-         imposto_importacao, armazenagem_db_value, frete_nacional_db) = di_data
+        # Campos da DI usados abaixo
+        informacao_complementar = di_data.informacao_complementar
+        vmld = di_data.vmld
+        peso_bruto = di_data.peso_bruto
+        peso_liquido = di_data.peso_liquido
+        armazenagem_db_value = di_data.armazenagem
 
         st.session_state.elo_processo_ref = informacao_complementar if informacao_complementar else "N/A"
         
@@ -206,36 +208,17 @@ def perform_elo_calculations():
         diferenca_atual_float = 0.00
         logger.warning("Valor de Diferença (Elo) inválido, usando 0.00 para cálculo.")
 
-    # --- Cálculo de Armazenagem ---
-    # O total de armazenagem é VMLD x período (0,40%)
-    periodo_percent = 0.0040 # 0,40%
-    total_armazenagem = vmld * periodo_percent
-        
-    # --- Cálculo de Capatazia ---
-    capatazia_por_kg = 0.08
-    capatazia_calculada = peso_bruto * capatazia_por_kg
-    capatazia_minima = 17.95 # Valor fixo da tabela
-    
-    # Aplica a regra da capatazia mínima (se a calculada for menor que a mínima, usa a mínima)
-    capatazia_final = max(capatazia_calculada, capatazia_minima)
-    
-    tabela_valor = capatazia_final 
-
-    # --- Cálculo de Impostos (PIS/COFINS/ISS) - NOVA FÓRMULA ---
-    # Impostos = (Armazenagem + Capatazia + Carregamento) / 0.8775 - (Armazenagem + Capatazia + Carregamento)
-    CARREGAMENTO_FIXO = 350.00 # Definido como constante na classe CalculoPacLogEloView
-    base_impostos_nova = total_armazenagem + capatazia_final + CARREGAMENTO_FIXO
-    if base_impostos_nova != 0: # Evita divisão por zero
-        impostos_calculados = (base_impostos_nova / 0.8775) - base_impostos_nova
-    else:
-        impostos_calculados = 0.0
-    
-    # --- Total a Depositar ---
-    # Inclui o CARREGAMENTO_FIXO, Taxas Extras e o valor da DIFERENÇA
-    total_a_depositar = total_armazenagem + capatazia_final + impostos_calculados + CARREGAMENTO_FIXO + diferenca_atual_float + taxas_extras_atual_float
+    # Armazenagem (VMLD x 0,40%), capatazia com mínimo, carregamento e PIS/COFINS/ISS por dentro (/0,8775)
+    resultado = tariff_engine.calcular_paclog_elo(vmld, peso_bruto, diferenca_atual_float, taxas_extras_atual_float)
+    total_armazenagem = float(resultado['armazenagem'])
+    capatazia_final = float(resultado['capatazia'])
+    tabela_valor = capatazia_final
+    impostos_calculados = float(resultado['impostos'])
+    carregamento = float(resultado['carregamento'])
+    total_a_depositar = float(resultado['total_a_depositar'])
 
     # DEBUG: Log dos valores intermediários e final do cálculo
-    logger.info(f"DEBUG ELO Cálculos: Total Armazenagem (VMLD*0.40%): {total_armazenagem}, Capatazia Final: {capatazia_final}, Impostos Calculados: {impostos_calculados}, Carregamento Fixo: {CARREGAMENTO_FIXO}, Diferença: {diferenca_atual_float}, Taxas Extras: {taxas_extras_atual_float}")
+    logger.info(f"DEBUG ELO Cálculos: Total Armazenagem (VMLD*0.40%): {total_armazenagem}, Capatazia Final: {capatazia_final}, Impostos Calculados: {impostos_calculados}, Carregamento Fixo: {carregamento}, Diferença: {diferenca_atual_float}, Taxas Extras: {taxas_extras_atual_float}")
     logger.info(f"DEBUG ELO Cálculos: TOTAL A DEPOSITAR FINAL: {total_a_depositar}")
 
 
@@ -248,7 +231,7 @@ def perform_elo_calculations():
     st.session_state.elo_tabela_valor_display = _format_currency(tabela_valor)
     st.session_state.elo_total_a_depositar_display = _format_currency(total_a_depositar)
     st.session_state.elo_pis_cofins_iss_display = _format_currency(impostos_calculados)
-    st.session_state.elo_carregamento_display = _format_currency(CARREGAMENTO_FIXO)
+    st.session_state.elo_carregamento_display = _format_currency(carregamento)
 
 
 def show_calculo_paclog_elo_page():
@@ -322,6 +305,9 @@ def show_calculo_paclog_elo_page():
     if 'selected_di_id_paclog' in st.session_state and st.session_state.selected_di_id_paclog:
         load_elo_di_data(st.session_state.selected_di_id_paclog)
         st.session_state.selected_di_id_paclog = None # Limpa o ID após carregar
+    elif st.session_state.elo_di_data is not None and get_declaracao_cached(st.session_state.elo_di_data.id) != st.session_state.elo_di_data:
+        # A DI exibida foi alterada em outra tela: recarrega a partir do cache compartilhado
+        load_elo_di_data(st.session_state.elo_di_data.id)
 
     st.markdown(f"#### Processo: **{st.session_state.elo_processo_ref}**")
     st.markdown("---")
@@ -1,6 +1,7 @@
 import os
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import logging
 import urllib.parse # Para codificar URLs de e-mail
@@ -10,21 +11,18 @@ from app_logic.utils import set_background_image, set_sidebar_background_image
 from db_utils import (
     get_db_path,
     connect_db,
-    get_declaracao_by_id,
-    update_declaracao # Para salvar a armazenagem no DB
+    get_declaracao_cached,
+    update_declaracao_fields # Para salvar a armazenagem no DB
 )
 
 logger = logging.getLogger(__name__)
 
-# Constantes da Tabela Portonave (baseado na imagem fornecida para a lógica de armazenagem)
-TABELA_PORTONAVE = {
-    "1": {"percent": 0.0047, "dias_min_total": 1, "dias_max_total": 6, "minimo": 909.00}, # 0,47% sobre CIF, min 909.00 (até 6 dias)
-    "2": {"percent": 0.0033, "dias_min_total": 7, "dias_max_total": 14, "minimo": 263.00}, # 0,33% ao dia, min 263.00 (para dias 7-14)
-    "3": {"percent": 0.0040, "dias_min_total": 15, "dias_max_total": 29, "minimo": 386.00}, # 0,40% ao dia, min 386.00 (para dias 15-29)
-    "4": {"percent": 0.0044, "dias_min_total": 30, "dias_max_total": float('inf'), "minimo": 487.00} # 0,44% ao dia, min 487.00 (para dias 30 em diante)
-}
-LEVANTE_FIXO = 419.00
-PESAGEM_FIXA = 141.00
+# Tabela e motor de cálculo da Portonave ficam no motor de tarifas (app_logic/tariff_engine.py)
+from app_logic.tariff_engine import (
+    dia_total_portonave,
+    calcular_portonave,
+    simular_portonave
+)
 
 # --- Funções Auxiliares de Formatação ---
 def _format_currency(value):
@@ -83,96 +81,12 @@ def perform_calculations():
     # Desempacota os dados da DI
     vmld_di_original = di_data['vmld'] if 'vmld' in di_data and di_data['vmld'] is not None else 0.0
 
-    # --- Cálculo do Dia Total para a Armazenagem ---
-    dia_total_para_calculo = 0
-    if periodo_selecionado == 1:
-        dia_total_para_calculo = dias_no_periodo
-    elif periodo_selecionado == 2:
-        dia_total_para_calculo = TABELA_PORTONAVE["1"]["dias_max_total"] + dias_no_periodo
-    elif periodo_selecionado == 3:
-        dia_total_para_calculo = TABELA_PORTONAVE["2"]["dias_max_total"] + dias_no_periodo
-    elif periodo_selecionado == 4:
-        dia_total_para_calculo = TABELA_PORTONAVE["3"]["dias_max_total"] + dias_no_periodo
-    
-    if str(periodo_selecionado) in TABELA_PORTONAVE and TABELA_PORTONAVE[str(periodo_selecionado)]["dias_max_total"] != float('inf'):
-        dia_total_para_calculo = min(dia_total_para_calculo, TABELA_PORTONAVE[str(periodo_selecionado)]["dias_max_total"])
-
-    # --- Cálculo de Armazenagem por Contêiner (Lógica Ajustada) ---
-    total_armazenagem_todos_containers = 0.0
-    
-    vmld_por_container = vmld_di_original / qtde_container if qtde_container > 0 else 0.0
-
-    for _ in range(qtde_container):
-        armazenagem_container = 0.0
-        
-        if dia_total_para_calculo <= 0:
-            armazenagem_container = 0.0
-        else:
-            current_total_days_processed = 0
-            
-            # Período 1 (dias 1 a 6)
-            if dia_total_para_calculo >= TABELA_PORTONAVE["1"]["dias_min_total"]:
-                val_periodo1_base_raw = vmld_por_container * TABELA_PORTONAVE["1"]["percent"]
-                val_periodo1_base = val_periodo1_base_raw
-                if qtde_processos <= 1 and val_periodo1_base < TABELA_PORTONAVE["1"]["minimo"]:
-                    val_periodo1_base = TABELA_PORTONAVE["1"]["minimo"]
-                
-                if dia_total_para_calculo <= TABELA_PORTONAVE["1"]["dias_max_total"]:
-                    armazenagem_container = val_periodo1_base
-                else:
-                    armazenagem_container = val_periodo1_base
-                    current_total_days_processed = TABELA_PORTONAVE["1"]["dias_max_total"]
-
-                    # Acumula para Período 2 (dias 7 a 14)
-                    if dia_total_para_calculo > current_total_days_processed and dia_total_para_calculo >= TABELA_PORTONAVE["2"]["dias_min_total"]:
-                        days_in_p2_segment = min(dia_total_para_calculo, TABELA_PORTONAVE["2"]["dias_max_total"]) - current_total_days_processed
-                        if days_in_p2_segment > 0:
-                            val_diario_p2_raw = vmld_por_container * TABELA_PORTONAVE["2"]["percent"]
-                            val_diario_p2 = val_diario_p2_raw
-                            if qtde_processos <= 1 and val_diario_p2 < TABELA_PORTONAVE["2"]["minimo"]:
-                                val_diario_p2 = TABELA_PORTONAVE["2"]["minimo"]
-                            armazenagem_container += val_diario_p2 * days_in_p2_segment
-                        current_total_days_processed = TABELA_PORTONAVE["2"]["dias_max_total"]
-
-                    # Acumula para Período 3 (dias 15 a 29)
-                    if dia_total_para_calculo > current_total_days_processed and dia_total_para_calculo >= TABELA_PORTONAVE["3"]["dias_min_total"]:
-                        days_in_p3_segment = min(dia_total_para_calculo, TABELA_PORTONAVE["3"]["dias_max_total"]) - current_total_days_processed
-                        if days_in_p3_segment > 0:
-                            val_diario_p3_raw = vmld_por_container * TABELA_PORTONAVE["3"]["percent"]
-                            val_diario_p3 = val_diario_p3_raw
-                            if qtde_processos <= 1 and val_diario_p3 < TABELA_PORTONAVE["3"]["minimo"]:
-                                val_diario_p3 = TABELA_PORTONAVE["3"]["minimo"]
-                            armazenagem_container += val_diario_p3 * days_in_p3_segment
-                        current_total_days_processed = TABELA_PORTONAVE["3"]["dias_max_total"]
-
-                    # Acumula para Período 4 (dias 30 em diante)
-                    if dia_total_para_calculo > current_total_days_processed and dia_total_para_calculo >= TABELA_PORTONAVE["4"]["dias_min_total"]:
-                        days_in_p4_segment = dia_total_para_calculo - current_total_days_processed
-                        if days_in_p4_segment > 0:
-                            val_diario_p4_raw = vmld_por_container * TABELA_PORTONAVE["4"]["percent"]
-                            val_diario_p4 = val_diario_p4_raw
-                            if qtde_processos <= 1 and val_diario_p4 < TABELA_PORTONAVE["4"]["minimo"]:
-                                val_diario_p4 = TABELA_PORTONAVE["4"]["minimo"]
-                            armazenagem_container += val_diario_p4 * days_in_p4_segment
-        
-        total_armazenagem_todos_containers += armazenagem_container
-
-    # --- Cálculo de Levante e Pesagem ---
-    base_levante = LEVANTE_FIXO
-    base_pesagem = PESAGEM_FIXA
-
-    levante_final = base_levante * qtde_container
-    pesagem_final = base_pesagem * qtde_container
-
-    if qtde_processos > 1:
-        levante_final = levante_final / qtde_processos
-        pesagem_final = pesagem_final / qtde_processos
-    else:
-        levante_final = max(levante_final, LEVANTE_FIXO)
-        pesagem_final = max(pesagem_final, PESAGEM_FIXA)
-
-    # --- Total a Depositar ---
-    total_a_depositar = total_armazenagem_todos_containers + levante_final + pesagem_final + diferenca + taxas_extras
+    dia_total_para_calculo = dia_total_portonave(periodo_selecionado, dias_no_periodo)
+    resultado = calcular_portonave(vmld_di_original, qtde_container, qtde_processos, dia_total_para_calculo, diferenca, taxas_extras)
+    total_armazenagem_todos_containers = float(resultado['armazenagem'])
+    levante_final = float(resultado['levante'])
+    pesagem_final = float(resultado['pesagem'])
+    total_a_depositar = float(resultado['total_a_depositar'])
 
     # Armazena os resultados no session_state
     st.session_state.portonave_calculated_data = {
@@ -189,9 +103,9 @@ def load_di_data_for_portonave(declaracao_id):
     Carrega os dados da DI selecionada do banco de dados e inicializa
     os campos de entrada e dados calculados no session_state.
     """
-    di_data_raw = get_declaracao_by_id(declaracao_id)
+    di_data_raw = get_declaracao_cached(declaracao_id)
     if di_data_raw:
-        # Converte sqlite3.Row para dicionário para facilitar o acesso por chave
+        # Converte a Declaracao para dicionário para facilitar o acesso por chave
         di_data = dict(di_data_raw)
         st.session_state.portonave_di_data = di_data
         st.session_state.portonave_declaracao_id = declaracao_id
@@ -314,15 +228,13 @@ def save_armazenagem_to_db():
     try:
         total_a_depositar_float = st.session_state.portonave_calculated_data['total_a_depositar']
 
-        di_data = st.session_state.portonave_di_data
         declaracao_id = st.session_state.portonave_declaracao_id
 
-        # Cria um dicionário com os dados da DI, atualizando apenas 'armazenagem'
-        updated_di_data = dict(di_data) # Cria uma cópia mutável
-        updated_di_data['armazenagem'] = total_a_depositar_float
-
-        # Chamar a função de atualização do db_utils
-        success = update_declaracao(declaracao_id, updated_di_data)
+        # Grava apenas o campo 'armazenagem' (com registro na auditoria da DI)
+        user_info = st.session_state.get('user_info') or {'username': 'Desconhecido'}
+        success = update_declaracao_fields(
+            [(declaracao_id, 'armazenagem', total_a_depositar_float)], origem="Portonave", usuario=user_info.get('username')
+        )
 
         if success:
             st.success("Valor do Total a Depositar salvo no banco de dados!")
@@ -336,6 +248,51 @@ def save_armazenagem_to_db():
         logging.exception("Erro inesperado ao salvar Total a Depositar no DB (Portonave).")
 
 
+def show_what_if_section():
+    """Grade de simulação: total a depositar por dia de retirada, quantidade de contêineres e de processos."""
+    vmld_di = 0.0
+    if st.session_state.get('portonave_di_data'):
+        vmld_di = st.session_state.portonave_di_data.get('vmld') or 0.0
+    if not vmld_di:
+        st.info("Carregue uma DI para simular a armazenagem.")
+        return
+
+    col_dias, col_cont, col_proc = st.columns(3)
+    with col_dias:
+        max_dias = st.number_input("Dias (até)", min_value=1, max_value=365, value=60, step=1, key="portonave_whatif_max_dias")
+    with col_cont:
+        max_containers = st.number_input("Contêineres (até)", min_value=1, max_value=100, value=max(5, int(st.session_state.portonave_qtde_container)), step=1, key="portonave_whatif_max_containers")
+    with col_proc:
+        max_processos = st.number_input("Processos (até)", min_value=1, max_value=50, value=max(3, int(st.session_state.portonave_qtde_processos)), step=1, key="portonave_whatif_max_processos")
+
+    df_grade = simular_portonave(
+        vmld_di,
+        np.arange(1, max_dias + 1),
+        np.arange(1, max_containers + 1),
+        np.arange(1, max_processos + 1),
+        float(st.session_state.portonave_diferenca),
+        float(st.session_state.portonave_taxas_extras)
+    )
+
+    # Melhor dia de retirada = menor custo médio por dia de armazenagem em cada combinação
+    idx_melhor = df_grade.groupby(['Contêineres', 'Processos'])['Custo Médio por Dia'].idxmin()
+    df_melhor = df_grade.loc[idx_melhor, ['Contêineres', 'Processos', 'Dias', 'Total a Depositar', 'Custo Médio por Dia']]
+    df_melhor = df_melhor.rename(columns={'Dias': 'Melhor Dia'})
+    st.markdown("##### Melhor dia de retirada (menor custo médio por dia)")
+    st.dataframe(
+        df_melhor.style.format({'Total a Depositar': _format_currency, 'Custo Médio por Dia': _format_currency}),
+        hide_index=True, use_container_width=True
+    )
+
+    processos_grafico = st.selectbox("Processos (gráfico)", options=list(range(1, max_processos + 1)),
+                                     index=min(int(st.session_state.portonave_qtde_processos), max_processos) - 1,
+                                     key="portonave_whatif_processos_grafico")
+    df_grafico = df_grade[df_grade['Processos'] == processos_grafico].pivot(index='Dias', columns='Contêineres', values='Total a Depositar')
+    df_grafico.columns = [f"{c} contêiner(es)" for c in df_grafico.columns]
+    st.markdown("##### Total a depositar por dia de retirada")
+    st.line_chart(df_grafico)
+
+
 # --- Tela Principal do Streamlit para Portonave ---
 def show_page():
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
@@ -348,11 +305,19 @@ def show_page():
         clear_portonave_data()
     
     # Verifica se há um ID de DI vindo da tela de Detalhes
-    if 'portonave_selected_di_id' in st.session_state and st.session_state.portonave_selected_di_id is not None:
-        if st.session_state.portonave_di_data is None or st.session_state.portonave_di_data.get('id') != st.session_state.portonave_selected_di_id:
-            load_di_data_for_portonave(st.session_state.portonave_selected_di_id)
-            # Limpa o ID após o carregamento para evitar recarregar em cada rerun
-            st.session_state.portonave_selected_di_id = None
+    if st.session_state.get('portonave_selected_di_id') is not None:
+        di_selecionada = st.session_state.portonave_selected_di_id
+        # Limpa o ID mesmo quando a DI já está carregada, para não reprocessar a seleção em cada rerun
+        st.session_state.portonave_selected_di_id = None
+        if st.session_state.portonave_di_data is None or st.session_state.portonave_di_data.get('id') != di_selecionada:
+            load_di_data_for_portonave(di_selecionada)
+    if st.session_state.portonave_declaracao_id is not None:
+        # A DI foi alterada (nesta ou em outra tela): atualiza os dados sem perder os campos editados.
+        # Roda em todo rerun; logo após um carregamento os dados coincidem e nada é recalculado.
+        di_atual = get_declaracao_cached(st.session_state.portonave_declaracao_id)
+        if di_atual is not None and dict(di_atual) != st.session_state.portonave_di_data:
+            st.session_state.portonave_di_data = dict(di_atual)
+            perform_calculations()
 
 
     # Seção para carregar DI
@@ -431,6 +396,10 @@ def show_page():
     else:
         st.info("Aguardando dados para cálculo...")
 
+    st.markdown("---")
+    with st.expander("Simulação de Retirada (what-if)"):
+        show_what_if_section()
+
     st.markdown("---")
     st.markdown("#### Tabela de Referência Portonave")
     # Exibir a tabela de referência (pode ser um DataFrame ou Markdown)
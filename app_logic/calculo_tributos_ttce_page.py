@@ -1,13 +1,15 @@
 import streamlit as st
 import requests
-import json
 import os
+from datetime import date
+import pandas as pd
 from app_logic.utils import set_background_image
+from app_logic import ttce_client
+import db_utils
+import followup_db_manager
 
-# Configuração da API TTCE
-# Use o ambiente de Produção ou Validação conforme sua necessidade
-TTCE_BASE_URL = "https://portalunico.siscomex.gov.br/ttce" # Ambiente de Produção
-# TTCE_BASE_URL = "https://val.portalunico.siscomex.gov.br/ttce" # Ambiente de Validação
+# Configuração da API TTCE (ambiente e cache das respostas em app_logic/ttce_client.py)
+TTCE_BASE_URL = ttce_client.TTCE_BASE_URL
 
 # --- Configuração do Certificado Digital (Lendo de Variáveis de Ambiente) ---
 # IMPORTANTE: NÃO FAÇA COMMIT DESTAS VARIÁVEIS DE AMBIENTE PARA O GITHUB!
@@ -21,11 +23,6 @@ TTCE_BASE_URL = "https://portalunico.siscomex.gov.br/ttce" # Ambiente de Produç
 # Ou, se os arquivos estiverem em 'app_logic/certs/' no deploy, você pode usar um caminho relativo.
 # No entanto, para segurança, é melhor ter caminhos absolutos ou garantir que 'certs' não seja público.
 
-# Tenta obter os caminhos e senha das variáveis de ambiente
-CERT_PATH = os.getenv("TTCE_CERT_PATH")
-KEY_PATH = os.getenv("TTCE_KEY_PATH")
-CERT_PASSWORD = os.getenv("TTCE_CERT_PASSWORD", "") # Assume string vazia se a variável não for definida
-
 # Listas de apoio (baseadas na documentação)
 REGIMES_TRIBUTARIOS = {
     "1": "RECOLHIMENTO INTEGRAL",
@@ -51,45 +48,19 @@ TRIBUTOS = {
     "11": "IMPOSTO DE EXPORTAÇÃO"
 }
 
-# Função para chamar a API TTCE
-def get_tratamentos_tributarios(ncm, codigo_pais, data_fato_gerador, tipo_operacao, fundamentos_opcionais=None):
-    url = f"{TTCE_BASE_URL}/api/ext/tratamentos-tributarios/importacao/"
-    
-    payload = {
-        "ncm": str(ncm),
-        "codigoPais": int(codigo_pais),
-        "dataFato_gerador": str(data_fato_gerador), # Corrigido para 'dataFato_gerador' conforme padrão de nomenclatura
-        "tipoOperacao": str(tipo_operacao)
-    }
-    
-    if fundamentos_opcionais:
-        payload["fundamentosOpcionais"] = fundamentos_opcionais
-
-    headers = {
-        "Content-Type": "application/json"
-    }
-
-    # Configuração do certificado para a requisição
-    cert_config = None
-    if CERT_PATH and KEY_PATH and os.path.exists(CERT_PATH) and os.path.exists(KEY_PATH):
-        if CERT_PASSWORD:
-            cert_config = (CERT_PATH, KEY_PATH, CERT_PASSWORD)
-        else:
-            cert_config = (CERT_PATH, KEY_PATH)
-        st.info(f"DEBUG (TTCE API): Usando certificado digital de: {CERT_PATH}")
-    else:
-        st.warning("DEBUG (TTCE API): Certificado digital não encontrado ou configurado via variáveis de ambiente. A requisição pode falhar por falta de autenticação.")
-        st.warning("DEBUG (TTCE API): Verifique se TTCE_CERT_PATH e TTCE_KEY_PATH estão definidos e os arquivos existem.")
-
-
-    st.info(f"DEBUG (TTCE API): URL: {url}")
-    st.info(f"DEBUG (TTCE API): Payload: {payload}")
+# Função para chamar a API TTCE (respostas em cache por NCM, país, data e tipo de operação)
+def get_tratamentos_tributarios(ncm, codigo_pais, data_fato_gerador, tipo_operacao, fundamentos_opcionais=None, usar_cache=True):
+    if ttce_client.get_cert_config() is None:
+        st.warning("Certificado digital não encontrado ou configurado via variáveis de ambiente. A requisição pode falhar por falta de autenticação.")
+        st.warning("Verifique se TTCE_CERT_PATH e TTCE_KEY_PATH estão definidos e os arquivos existem.")
 
     try:
-        # Inclui o parâmetro 'cert' na requisição POST
-        response = requests.post(url, headers=headers, data=json.dumps(payload), timeout=30, cert=cert_config)
-        response.raise_for_status()
-        return response.json()
+        result, origem = ttce_client.consultar_tratamentos(
+            ncm, codigo_pais, data_fato_gerador, tipo_operacao, fundamentos_opcionais, usar_cache=usar_cache, base_url=TTCE_BASE_URL
+        )
+        if origem == 'cache':
+            st.caption("Resposta obtida do cache local de consultas TTCE.")
+        return result
     except requests.exceptions.RequestException as e:
         st.error(f"Erro de rede ao consultar a API TTCE: {e}. Verifique o certificado e as permissões.")
         return None
@@ -100,6 +71,86 @@ def get_tratamentos_tributarios(ncm, codigo_pais, data_fato_gerador, tipo_operac
         st.error(f"Erro inesperado ao consultar a API TTCE: {e}")
         return None
 
+
+def _ncms_da_di(referencia):
+    """NCMs distintos dos itens da DI e a data de registro (fato gerador)."""
+    declaracao = db_utils.get_declaracao_by_referencia(referencia)
+    if not declaracao:
+        return [], None
+    ncms = [item.ncm_item for item in db_utils.get_itens_by_declaracao_id(declaracao.id) if item.ncm_item]
+    return list(dict.fromkeys(ncms)), declaracao.data_registro
+
+
+def _ncms_do_processo(processo_novo):
+    """NCMs distintos dos itens do processo do Follow-up."""
+    processo = followup_db_manager.obter_processo_by_processo_novo(processo_novo)
+    if not processo:
+        return None
+    ncms = [item['ncm'] for item in followup_db_manager.obter_itens_processo(processo['id']) if item.get('ncm')]
+    return list(dict.fromkeys(ncms))
+
+
+def _show_consulta_em_lote():
+    """Consulta de todos os NCMs distintos de uma DI ou de um processo do Follow-up, em paralelo e com cache."""
+    st.subheader("Consulta em Lote (DI ou Processo)")
+    origem = st.radio("Origem dos NCMs", ["DI", "Processo (Follow-up)"], horizontal=True, key="ttce_lote_origem")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        referencia = st.text_input("Referência da DI" if origem == "DI" else "Processo", key="ttce_lote_referencia")
+    with col2:
+        codigo_pais = st.number_input("Código do País", min_value=1, value=160, key="ttce_lote_pais", help="Ex.: 160 para China")
+    with col3:
+        tipo_operacao = st.selectbox("Tipo de Operação", ["I", "E", "F"], key="ttce_lote_tipo_operacao")
+    col4, col5 = st.columns(2)
+    with col4:
+        data_fato_gerador = st.date_input(
+            "Data do Fato Gerador", value=date.today(), key="ttce_lote_data",
+            help="Para DIs, a data de registro da DI é usada quando existir."
+        )
+    with col5:
+        usar_cache = st.checkbox("Usar respostas em cache", value=True, key="ttce_lote_usar_cache")
+
+    if st.button("Consultar NCMs", key="ttce_lote_consultar"):
+        if not referencia:
+            st.warning("Informe a referência da DI ou o processo.")
+            return
+        data_consulta = data_fato_gerador.strftime("%Y-%m-%d")
+        if origem == "DI":
+            ncms, data_registro = _ncms_da_di(referencia.strip().upper())
+            if data_registro:
+                data_consulta = data_registro[:10]
+        else:
+            ncms = _ncms_do_processo(referencia.strip())
+            if ncms is None:
+                st.error(f"Processo '{referencia}' não encontrado.")
+                return
+        if not ncms:
+            st.warning("Nenhum NCM encontrado nos itens informados.")
+            return
+        with st.spinner(f"Consultando {len(ncms)} NCM(s) na API TTCE..."):
+            st.session_state.ttce_lote_resultados = ttce_client.consultar_em_lote(
+                ncms, codigo_pais, data_consulta, tipo_operacao, usar_cache=usar_cache, base_url=TTCE_BASE_URL
+            )
+        st.session_state.ttce_lote_data_consulta = data_consulta
+
+    resultados = st.session_state.get('ttce_lote_resultados')
+    if resultados:
+        st.caption(f"Data do fato gerador consultada: {st.session_state.get('ttce_lote_data_consulta')}")
+        st.dataframe(pd.DataFrame([
+            {
+                "NCM": ncm,
+                "Tratamentos": len((r['resposta'] or {}).get('tratamentosTributarios') or []),
+                "Origem": {'cache': "Cache", 'api': "API"}.get(r['origem'], "-"),
+                "Erro": r['erro'] or "",
+            }
+            for ncm, r in resultados.items()
+        ]), use_container_width=True, hide_index=True)
+        for ncm, r in resultados.items():
+            if r['resposta']:
+                with st.expander(f"NCM {ncm}"):
+                    st.json(r['resposta'])
+
+
 def show_page():
     """
     Exibe a página de Cálculo de Tributos TTCE, permitindo consultar a API.
@@ -124,6 +175,7 @@ def show_page():
             data_fato_gerador_input = st.date_input("Data do Fato Gerador", help="Data no formato aaaa-mm-dd")
         with col4:
             tipo_operacao_input = st.selectbox("Tipo de Operação", ["I", "E", "F"], help="I: Importação, E: Exportação, F: Frete. Para DUIMP, fixar 'I'.")
+        usar_cache_input = st.checkbox("Usar resposta em cache (consultas dos últimos 7 dias)", value=True)
 
         st.markdown("---")
         st.write("Fundamentos Opcionais (Opcional)")
@@ -160,7 +212,8 @@ def show_page():
                         codigo_pais_input,
                         data_fato_gerador_input.strftime("%Y-%m-%d"),
                         tipo_operacao_input,
-                        fundamentos_opcionais=fundamentos_opcionais_list if fundamentos_opcionais_list else None
+                        fundamentos_opcionais=fundamentos_opcionais_list if fundamentos_opcionais_list else None,
+                        usar_cache=usar_cache_input
                     )
 
                 if result:
@@ -194,3 +247,6 @@ def show_page():
 
                 else:
                     st.error("Não foi possível obter resultados da API TTCE. Verifique os parâmetros e sua conexão.")
+
+    st.markdown("---")
+    _show_consulta_em_lote()
@@ -0,0 +1,158 @@
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, Tuple
+
+import pandas as pd
+import streamlit as st
+
+from app_logic.utils import set_background_image
+from app_logic import tariff_engine
+import db_utils
+
+logger = logging.getLogger(__name__)
+
+# Tempo que a página espera pelo cálculo em segundo plano antes de exibir o aviso de "calculando"
+_ESPERA_RESULTADO_S = 5.0
+_MAX_RESULTADOS_CACHE = 8
+
+# RLock: o callback de conclusão pode rodar na própria thread que agenda o cálculo
+_lock = threading.RLock()
+_executor: Optional[ThreadPoolExecutor] = None
+_resultados: Dict[Tuple, pd.DataFrame] = {}
+_em_andamento: Dict[Tuple, Future] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Worker único compartilhado entre as sessões (criado sob demanda)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="comparativo_terminais")
+    return _executor
+
+
+def _assinatura_base() -> Tuple:
+    """Identifica o estado do banco de DIs: qualquer gravação altera a data de modificação ou o tamanho do arquivo."""
+    caminho = db_utils.get_db_path("xml_di")
+    try:
+        info = os.stat(caminho)
+        return (caminho, info.st_mtime_ns, info.st_size)
+    except OSError:
+        return (caminho, None, None)
+
+
+def calcular_comparativo(terminais: Tuple[str, ...], parametros: Dict[str, Any]) -> pd.DataFrame:
+    """Carrega todas as DIs com uma consulta e avalia os terminais em forma vetorizada."""
+    dis = db_utils.get_declaracoes_para_calculo()
+    relatorio = tariff_engine.comparar_terminais(dis, terminais, **parametros)
+    logger.info(f"Comparativo de terminais calculado para {len(relatorio)} DI(s).")
+    return relatorio
+
+
+def obter_comparativo(terminais: Tuple[str, ...], parametros: Dict[str, Any]) -> Tuple[Optional[pd.DataFrame], Optional[Future]]:
+    """
+    Retorna (relatório, None) se o resultado para o estado atual do banco já estiver em cache;
+    caso contrário agenda (ou reaproveita) o cálculo no worker e retorna (None, future).
+    """
+    chave = (_assinatura_base(), tuple(terminais), tuple(sorted(parametros.items())))
+    with _lock:
+        if chave in _resultados:
+            return _resultados[chave], None
+        future = _em_andamento.get(chave)
+        if future is None:
+            future = _get_executor().submit(calcular_comparativo, tuple(terminais), dict(parametros))
+            _em_andamento[chave] = future
+            future.add_done_callback(lambda f, chave=chave: _guardar_resultado(chave, f))
+        return None, future
+
+
+def _guardar_resultado(chave: Tuple, future: Future):
+    with _lock:
+        _em_andamento.pop(chave, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        # Resultados de estados anteriores do banco não serão mais pedidos
+        for antiga in [c for c in _resultados if c[0] != chave[0]]:
+            del _resultados[antiga]
+        while len(_resultados) >= _MAX_RESULTADOS_CACHE:
+            del _resultados[next(iter(_resultados))]
+        _resultados[chave] = future.result()
+
+
+def limpar_cache_comparativo():
+    with _lock:
+        _resultados.clear()
+
+
+def _format_currency(value):
+    """Formata um valor numérico para o formato de moeda R$ X.XXX,XX."""
+    try:
+        val = float(value)
+        return f"R$ {val:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
+    except (ValueError, TypeError):
+        return "R$ 0,00"
+
+
+def show_page():
+    background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
+    set_background_image(background_image_path)
+
+    st.subheader("Comparativo de Custos por Terminal")
+    st.info("Calcula o total a depositar de cada terminal para todas as DIs registradas e indica o mais barato. "
+            "Os contêineres vêm da quantidade de volumes quando a embalagem da DI é contêiner.")
+
+    nomes_terminais = {t: tariff_engine.TABELAS_TARIFAS[t]["nome"] for t in tariff_engine.TABELAS_TARIFAS if t != tariff_engine.FECHAMENTO}
+    terminais = st.multiselect(
+        "Terminais", options=list(nomes_terminais), default=tariff_engine.TERMINAIS_COMPARACAO,
+        format_func=nomes_terminais.get, key="comparativo_terminais_selecionados"
+    )
+
+    col_dias, col_proc, col_cont = st.columns(3)
+    with col_dias:
+        dia_total = st.number_input("Dias de armazenagem", min_value=1, max_value=365, value=7, step=1, key="comparativo_dia_total")
+    with col_proc:
+        qtde_processos = st.number_input("Processos por contêiner", min_value=1, max_value=50, value=1, step=1, key="comparativo_qtde_processos")
+    with col_cont:
+        qtde_container = st.number_input("Contêineres (DIs sem contêiner declarado)", min_value=1, max_value=100, value=1, step=1, key="comparativo_qtde_container")
+
+    if not terminais:
+        st.warning("Selecione ao menos um terminal.")
+        return
+
+    if st.button("Recalcular", key="comparativo_recalcular"):
+        limpar_cache_comparativo()
+
+    parametros = {'dia_total': int(dia_total), 'qtde_processos': int(qtde_processos), 'qtde_container': int(qtde_container)}
+    relatorio, future = obter_comparativo(tuple(terminais), parametros)
+    if relatorio is None:
+        try:
+            with st.spinner("Calculando o comparativo em segundo plano..."):
+                relatorio = future.result(timeout=_ESPERA_RESULTADO_S)
+        except FutureTimeoutError:
+            st.info("O comparativo ainda está sendo calculado. Atualize a página em alguns instantes.")
+            return
+        except Exception as e:
+            logger.exception("Erro ao calcular o comparativo de terminais.")
+            st.error(f"Erro ao calcular o comparativo: {e}")
+            return
+
+    if relatorio.empty:
+        st.info("Nenhuma DI registrada para comparar.")
+        return
+
+    colunas_metricas = st.columns(len(terminais) + 1)
+    colunas_metricas[0].metric("DIs", len(relatorio))
+    for coluna, terminal in zip(colunas_metricas[1:], terminais):
+        nome = nomes_terminais[terminal]
+        coluna.metric(f"Mais barato: {nome}", int((relatorio['Mais Barato'] == nome).sum()))
+
+    colunas_moeda = ['VMLD', 'Economia'] + [nomes_terminais[t] for t in terminais]
+    st.dataframe(
+        relatorio.style.format({c: _format_currency for c in colunas_moeda}),
+        hide_index=True, use_container_width=True
+    )
+    st.download_button(
+        "Baixar CSV", relatorio.to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'),
+        file_name="comparativo_terminais.csv", mime="text/csv", key="comparativo_download"
+    )
@@ -0,0 +1,83 @@
+import streamlit as st
+import pandas as pd
+import logging
+import os
+
+import query_trace
+from app_logic.utils import set_background_image
+
+logger = logging.getLogger(__name__)
+
+MAX_LINHAS_EXIBIDAS = 200
+ARQUIVO_LENTAS_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'consultas_lentas.log')
+
+
+def _show_configuracao():
+    config = query_trace.get_configuracao()
+    with st.expander("Configuração do rastreamento"):
+        with st.form("form_config_rastreamento_consultas"):
+            ativo = st.checkbox("Rastrear consultas (vale para as novas conexões)", value=config['ativo'])
+            limite = st.number_input("Limite de consulta lenta (ms)", min_value=1.0, value=float(config['limite_lenta_ms']), step=50.0)
+            gravar_arquivo = st.checkbox("Gravar consultas lentas em arquivo", value=bool(config['arquivo_lentas']))
+            arquivo = st.text_input("Arquivo de consultas lentas", value=config['arquivo_lentas'] or os.path.normpath(ARQUIVO_LENTAS_PADRAO))
+            if st.form_submit_button("Aplicar"):
+                try:
+                    query_trace.configurar(ativo=ativo, limite_lenta_ms=limite, arquivo_lentas=arquivo if gravar_arquivo else None)
+                    st.success("Configuração aplicada.")
+                except OSError as e:
+                    logger.error(f"Erro ao configurar o arquivo de consultas lentas: {e}")
+                    st.error(f"Não foi possível abrir o arquivo de consultas lentas: {e}")
+
+
+def show_page():
+    background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
+    set_background_image(background_image_path)
+
+    st.title("Consultas ao Banco de Dados")
+    st.caption("Consultas SQL feitas desde o início do servidor (ou da última limpeza), com a página que as executou.")
+
+    _show_configuracao()
+
+    resumo = pd.DataFrame(query_trace.get_resumo_consultas())
+    recentes = pd.DataFrame(query_trace.get_consultas_recentes())
+    if resumo.empty:
+        st.info("Nenhuma consulta registrada ainda.")
+        return
+
+    paginas = ["Todas"] + sorted(resumo['pagina'].unique().tolist())
+    pagina = st.selectbox("Página", paginas, key="consultas_banco_pagina")
+    if pagina != "Todas":
+        resumo = resumo[resumo['pagina'] == pagina]
+        recentes = recentes[recentes['pagina'] == pagina] if not recentes.empty else recentes
+
+    limite_ms = query_trace.get_configuracao()['limite_lenta_ms']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Execuções", f"{int(resumo['execucoes'].sum()):,}".replace(',', '.'))
+    col2.metric("Tempo total", f"{resumo['tempo_total_ms'].sum() / 1000:.2f} s")
+    col3.metric("Consultas distintas", len(resumo))
+    col4.metric(f"Lentas recentes (≥ {limite_ms:.0f} ms)", int((recentes['duracao_ms'] >= limite_ms).sum()) if not recentes.empty else 0)
+
+    tab_top, tab_paginas, tab_recentes = st.tabs(["Mais custosas", "Por página", "Recentes"])
+    with tab_top:
+        st.dataframe(
+            resumo.head(MAX_LINHAS_EXIBIDAS)[['tempo_total_ms', 'execucoes', 'tempo_medio_ms', 'tempo_max_ms', 'linhas',
+                                              'parametros_distintos', 'erros', 'pagina', 'origem', 'sql']],
+            use_container_width=True, hide_index=True
+        )
+        st.caption("Muitas execuções com poucos parâmetros distintos indicam a mesma consulta repetida na página.")
+    with tab_paginas:
+        por_pagina = (
+            resumo.groupby('pagina', as_index=False)
+            .agg(tempo_total_ms=('tempo_total_ms', 'sum'), execucoes=('execucoes', 'sum'), consultas_distintas=('sql', 'count'))
+            .sort_values('tempo_total_ms', ascending=False)
+        )
+        st.dataframe(por_pagina, use_container_width=True, hide_index=True)
+    with tab_recentes:
+        if recentes.empty:
+            st.info("Nenhuma consulta recente para a página selecionada.")
+        else:
+            st.dataframe(recentes.head(MAX_LINHAS_EXIBIDAS), use_container_width=True, hide_index=True)
+
+    if st.button("Limpar registros", key="consultas_banco_limpar"):
+        query_trace.limpar()
+        st.rerun()
@@ -0,0 +1,255 @@
+"""
+Cotações do dólar (boletins PTAX do Banco Central) servidas a partir do armazenamento local.
+
+Os boletins baixados da API Olinda (abertura, intermediários e fechamento) ficam gravados por data
+na tabela 'cotacoes' (db_utils). As telas leem sempre do armazenamento: quando os dados de hoje estão
+mais velhos que INTERVALO_ATUALIZACAO_S, uma atualização é agendada em segundo plano e a leitura
+devolve o que já está gravado (stale-while-revalidate). Cotações históricas, como a PTAX da data de
+registro de uma DI, são lidas sem acesso à rede.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+import requests
+
+import db_utils
+
+logger = logging.getLogger(__name__)
+
+MOEDA_PADRAO = "USD"
+API_URL = (
+    "https://olinda.bcb.gov.br/olinda/servico/PTAX/versao/v1/odata/"
+    "CotacaoMoedaPeriodo(moeda=@moeda,dataInicial=@dataInicial,dataFinalCotacao=@dataFinalCotacao)"
+    "?@moeda='{moeda}'&@dataInicial='{inicio}'&@dataFinalCotacao='{fim}'&$top=10000&$format=json"
+    "&$select=cotacaoCompra,cotacaoVenda,dataHoraCotacao,tipoBoletim"
+)
+TIMEOUT_S = (3.05, 10)  # (conexão, leitura)
+TENTATIVAS = 3
+ESPERA_ENTRE_TENTATIVAS_S = 1.0  # dobra a cada nova tentativa
+INTERVALO_ATUALIZACAO_S = 15 * 60
+# Intervalo mínimo entre tentativas quando a API está fora do ar
+INTERVALO_NOVA_TENTATIVA_S = 60
+MAX_DIAS_POR_CONSULTA = 180
+HISTORICO_MINIMO_DIAS = 30
+# Espera pela primeira carga quando ainda não há nenhuma cotação gravada
+ESPERA_PRIMEIRA_CARGA_S = 5.0
+
+TIPO_ABERTURA = "Abertura"
+TIPO_FECHAMENTO = "Fechamento"
+TIPO_FECHAMENTO_INTERBANCARIO = "Fechamento Interbancário"
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+_em_andamento: Optional[Future] = None
+_ultima_atualizacao: Dict[str, float] = {}
+_ultima_tentativa: Dict[str, float] = {}
+_atualizador: Optional[threading.Thread] = None
+_parar_atualizador = threading.Event()
+
+
+def _data_iso(valor) -> str:
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)[:10]
+
+
+def buscar_boletins(data_inicial: date, data_final: date, moeda: str = MOEDA_PADRAO) -> List[Dict[str, Any]]:
+    """
+    Busca na API do Banco Central os boletins da moeda no período, com timeout e novas tentativas.
+    Levanta a última exceção se todas as tentativas falharem.
+    """
+    url = API_URL.format(moeda=moeda, inicio=data_inicial.strftime('%m-%d-%Y'), fim=data_final.strftime('%m-%d-%Y'))
+    espera = ESPERA_ENTRE_TENTATIVAS_S
+    for tentativa in range(1, TENTATIVAS + 1):
+        try:
+            response = requests.get(url, timeout=TIMEOUT_S)
+            response.raise_for_status()
+            return [
+                {
+                    'data_hora': item['dataHoraCotacao'],
+                    'tipo_boletim': item.get('tipoBoletim'),
+                    'cotacao_compra': item.get('cotacaoCompra'),
+                    'cotacao_venda': item.get('cotacaoVenda'),
+                }
+                for item in response.json().get('value', [])
+                if item.get('dataHoraCotacao')
+            ]
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Falha ao buscar cotações {moeda} ({tentativa}/{TENTATIVAS}): {e}")
+            if tentativa == TENTATIVAS:
+                raise
+            time.sleep(espera)
+            espera *= 2
+    return []
+
+
+def atualizar_cotacoes(data_inicial: Optional[date] = None, data_final: Optional[date] = None, moeda: str = MOEDA_PADRAO) -> int:
+    """Baixa e grava os boletins do período (padrão: hoje), em consultas de até MAX_DIAS_POR_CONSULTA dias."""
+    data_final = data_final or date.today()
+    data_inicial = data_inicial or data_final
+    total = 0
+    inicio = data_inicial
+    while inicio <= data_final:
+        fim = min(data_final, inicio + timedelta(days=MAX_DIAS_POR_CONSULTA - 1))
+        boletins = buscar_boletins(inicio, fim, moeda)
+        if not db_utils.salvar_boletins_cotacao(boletins, moeda):
+            raise RuntimeError(f"Não foi possível gravar as cotações {moeda} de {inicio} a {fim}.")
+        total += len(boletins)
+        inicio = fim + timedelta(days=1)
+    if data_final >= date.today():
+        with _lock:
+            _ultima_atualizacao[moeda] = time.monotonic()
+    logger.info(f"{total} boletim(ns) de cotação {moeda} atualizado(s) de {data_inicial} a {data_final}.")
+    return total
+
+
+def sincronizar_historico(moeda: str = MOEDA_PADRAO) -> int:
+    """
+    Completa o armazenamento desde a DI registrada mais antiga (ou HISTORICO_MINIMO_DIAS atrás) até hoje.
+    Só baixa os períodos ainda não gravados.
+    """
+    hoje = date.today()
+    inicio_desejado = hoje - timedelta(days=HISTORICO_MINIMO_DIAS)
+    data_registro = db_utils.get_data_registro_mais_antiga()
+    if data_registro:
+        try:
+            inicio_desejado = min(inicio_desejado, datetime.strptime(data_registro[:10], '%Y-%m-%d').date())
+        except ValueError:
+            logger.warning(f"Data de registro inválida ao sincronizar cotações: {data_registro}")
+
+    primeira, ultima = db_utils.get_intervalo_cotacoes(moeda)
+    if not primeira:
+        return atualizar_cotacoes(inicio_desejado, hoje, moeda)
+    total = 0
+    primeira = datetime.strptime(primeira, '%Y-%m-%d').date()
+    if inicio_desejado < primeira:
+        total += atualizar_cotacoes(inicio_desejado, primeira - timedelta(days=1), moeda)
+    total += atualizar_cotacoes(datetime.strptime(ultima, '%Y-%m-%d').date(), hoje, moeda)
+    return total
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cotacoes")
+    return _executor
+
+
+def _agendar_atualizacao(moeda: str) -> Future:
+    """Agenda a atualização de hoje em segundo plano (no máximo uma por vez)."""
+    global _em_andamento
+    with _lock:
+        if _em_andamento is None or _em_andamento.done():
+            _ultima_tentativa[moeda] = time.monotonic()
+            _em_andamento = _get_executor().submit(atualizar_cotacoes, None, None, moeda)
+        return _em_andamento
+
+
+def _desatualizada(moeda: str) -> bool:
+    agora = time.monotonic()
+    with _lock:
+        ultima = _ultima_atualizacao.get(moeda)
+        tentativa = _ultima_tentativa.get(moeda)
+    if ultima is not None and agora - ultima <= INTERVALO_ATUALIZACAO_S:
+        return False
+    return tentativa is None or agora - tentativa > INTERVALO_NOVA_TENTATIVA_S
+
+
+def resumir_boletins(boletins: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Abertura (compra/venda) e PTAX (compra/venda) de um dia. A PTAX é o boletim 'Fechamento Interbancário'
+    quando existir; senão, o 'Fechamento'. Cotações ausentes ficam como None.
+    """
+    resumo = {"abertura_compra": None, "abertura_venda": None, "ptax_compra": None, "ptax_venda": None}
+    fechamento = None
+    for boletim in boletins:
+        tipo = boletim.get('tipo_boletim')
+        if tipo == TIPO_ABERTURA:
+            resumo['abertura_compra'] = boletim.get('cotacao_compra')
+            resumo['abertura_venda'] = boletim.get('cotacao_venda')
+        elif tipo == TIPO_FECHAMENTO_INTERBANCARIO:
+            fechamento = boletim
+        elif tipo == TIPO_FECHAMENTO and fechamento is None:
+            fechamento = boletim
+    if fechamento is not None:
+        resumo['ptax_compra'] = fechamento.get('cotacao_compra')
+        resumo['ptax_venda'] = fechamento.get('cotacao_venda')
+    return resumo
+
+
+def get_cotacao(data_referencia=None, moeda: str = MOEDA_PADRAO) -> Optional[Dict[str, Any]]:
+    """
+    Cotações da data (padrão: hoje) ou do último dia anterior com boletins, lidas do armazenamento local.
+    Retorna o resumo de resumir_boletins() com 'data' (dia das cotações) e 'boletins', ou None se não houver
+    nenhuma cotação até a data. Não acessa a rede.
+    """
+    data_iso = _data_iso(data_referencia or date.today())
+    boletins = db_utils.get_boletins_cotacao(data_iso, moeda)
+    if not boletins:
+        data_anterior = db_utils.get_data_cotacao_anterior(data_iso, moeda)
+        if not data_anterior:
+            return None
+        data_iso = data_anterior
+        boletins = db_utils.get_boletins_cotacao(data_iso, moeda)
+    return {**resumir_boletins(boletins), 'data': data_iso, 'boletins': boletins}
+
+
+def get_ptax_venda(data_referencia, moeda: str = MOEDA_PADRAO) -> Optional[float]:
+    """PTAX de venda na data (ex.: data_registro de uma DI) ou no último dia útil anterior, sem acesso à rede."""
+    cotacao = get_cotacao(data_referencia, moeda)
+    return cotacao['ptax_venda'] if cotacao else None
+
+
+def get_cotacao_hoje(moeda: str = MOEDA_PADRAO) -> Optional[Dict[str, Any]]:
+    """
+    Cotações de hoje com stale-while-revalidate: devolve o que está gravado e, se a última atualização
+    for mais antiga que INTERVALO_ATUALIZACAO_S, agenda uma nova em segundo plano. Só espera pela rede
+    (até ESPERA_PRIMEIRA_CARGA_S) quando ainda não existe nenhuma cotação gravada.
+    """
+    future = _agendar_atualizacao(moeda) if _desatualizada(moeda) else None
+    cotacao = get_cotacao(date.today(), moeda)
+    if cotacao is None and future is not None:
+        try:
+            future.result(timeout=ESPERA_PRIMEIRA_CARGA_S)
+        except FutureTimeoutError:
+            logger.warning("Primeira carga de cotações ainda em andamento.")
+        except Exception as e:
+            logger.error(f"Erro ao carregar cotações do Banco Central: {e}")
+        cotacao = get_cotacao(date.today(), moeda)
+    return cotacao
+
+
+def _executar_atualizador(intervalo_s: float, moeda: str):
+    try:
+        sincronizar_historico(moeda)
+    except Exception as e:
+        logger.error(f"Erro ao sincronizar o histórico de cotações: {e}")
+    while not _parar_atualizador.wait(intervalo_s):
+        try:
+            atualizar_cotacoes(moeda=moeda)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar cotações em segundo plano: {e}")
+
+
+def iniciar_atualizador(intervalo_s: float = INTERVALO_ATUALIZACAO_S, moeda: str = MOEDA_PADRAO):
+    """Inicia (uma vez por processo) a thread que completa o histórico e atualiza as cotações de hoje periodicamente."""
+    global _atualizador
+    with _lock:
+        if _atualizador is not None and _atualizador.is_alive():
+            return
+        _parar_atualizador.clear()
+        _atualizador = threading.Thread(
+            target=_executar_atualizador, args=(intervalo_s, moeda), name="atualizador_cotacoes", daemon=True
+        )
+        _atualizador.start()
+    logger.info("Atualizador de cotações iniciado.")
+
+
+def parar_atualizador():
+    _parar_atualizador.set()
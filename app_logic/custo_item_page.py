@@ -14,11 +14,14 @@ from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
 import logging
-import sqlite3 # Importar sqlite3 para verificar tipo de dado
+import numpy as np
 from app_logic.utils import set_background_image, set_sidebar_background_image
 
 # Importar funções do novo módulo de utilitários de banco de dados
-from db_utils import get_declaracao_by_referencia, get_itens_by_declaracao_id, update_xml_item_erp_code, get_process_cost_data, save_process_cost_data
+from db_utils import (
+    get_declaracao_by_referencia, get_itens_colunares_by_declaracao_id, update_xml_item_erp_code,
+    get_process_cost_data, save_process_cost_data, Declaracao, ItensDeclaracao
+)
 
 logger = logging.getLogger(__name__)
 
@@ -115,21 +118,37 @@ def _clean_quantity(x):
     except (ValueError, AttributeError):
         return 0.0
 
+def _extract_sku(desc_mercadoria, sku_item):
+    """Extrai o SKU da descrição: tudo até o primeiro " - " (espaço, traço, espaço); senão usa o SKU do item."""
+    if desc_mercadoria:
+        match = re.match(r'^(.*?)\s-\s', desc_mercadoria)
+        if match:
+            return match.group(1).strip()
+    return sku_item if sku_item else "N/A"
+
 # --- Função de Cálculo Principal (Adaptada do seu código) ---
 def perform_calculations(di_data, itens_data, expense_inputs, contracts_df):
     """Realiza todos os cálculos de custo do processo e itens."""
     if not di_data:
         return {}, {}, {}, pd.DataFrame(), 0.0, 0.0
 
-    # Desempacota os dados da DI
-    (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-     arquivo_origem, data_importacao, informacao_complementar,
-     vmle_declaracao, frete_declaracao, seguro_declaracao, vmld_declaracao,
-     ipi_total_declaracao, pis_pasep_total_declaracao, cofins_total_declaracao, icms_sc,
-     taxa_cambial_usd_declaracao, taxa_siscomex_total_declaracao, numero_invoice,
-     peso_bruto_total, peso_liquido_total, cnpj_importador, importador_nome,
-     recinto, embalagem, quantidade_volumes_total, acrescimo_total_declaracao,
-     imposto_importacao_total_declaracao, armazenagem_db, frete_nacional_db) = di_data
+    # Campos da DI usados nos cálculos
+    if not isinstance(di_data, Declaracao):
+        di_data = Declaracao._make(di_data)
+    vmle_declaracao = di_data.vmle
+    frete_declaracao = di_data.frete
+    seguro_declaracao = di_data.seguro
+    vmld_declaracao = di_data.vmld
+    ipi_total_declaracao = di_data.ipi
+    pis_pasep_total_declaracao = di_data.pis_pasep
+    cofins_total_declaracao = di_data.cofins
+    taxa_cambial_usd_declaracao = di_data.taxa_cambial_usd
+    taxa_siscomex_total_declaracao = di_data.taxa_siscomex
+    peso_liquido_total = di_data.peso_liquido
+    acrescimo_total_declaracao = di_data.acrescimo
+    imposto_importacao_total_declaracao = di_data.imposto_importacao
+    armazenagem_db = di_data.armazenagem
+    frete_nacional_db = di_data.frete_nacional
 
     # Obter valores dos campos editáveis de despesas
     afrmm_input = expense_inputs['afrmm']
@@ -230,20 +249,16 @@ def perform_calculations(di_data, itens_data, expense_inputs, contracts_df):
     diferenca_contratos_usd = soma_contratos_usd - vmle_declaracao_usd
 
     # Cálculos e População da Tabela de Itens
-    itens_df_data = []
-    total_peso_liquido_itens_di = sum(item[9] for item in itens_data if item[9] is not None)
-    total_valor_fob_brl_itens_di = sum(item[8] for item in itens_data if item[8] is not None)
-    total_quantidade_itens_di = 0
-    for item in itens_data:
-        if item[5] is not None:
-            try:
-                # Use _clean_quantity para obter o valor numérico correto
-                qty = _clean_quantity(item[5])
-                # Correção: dividir a quantidade por 10 conforme solicitado
-                qty = qty / 10.0
-                total_quantidade_itens_di += qty
-            except (ValueError, AttributeError):
-                continue
+    # Os itens são tratados em colunas (um array por campo), sem converter linha a linha
+    itens = ItensDeclaracao.from_rows(itens_data)
+    peso_liquido_itens = itens.numerico('peso_liquido_item')
+    valor_fob_brl_itens = itens.numerico('valor_item_calculado')
+    # Correção: dividir a quantidade por 10 para todos os cálculos
+    qtd_itens = np.array([_clean_quantity(q) / 10.0 if q is not None else 0.0 for q in itens.coluna('quantidade')], dtype=float)
+
+    total_peso_liquido_itens_di = peso_liquido_itens.sum()
+    total_valor_fob_brl_itens_di = valor_fob_brl_itens.sum()
+    total_quantidade_itens_di = qtd_itens.sum()
 
     total_peso_liquido_itens_di = total_peso_liquido_itens_di if total_peso_liquido_itens_di > 0 else 1.0
     total_valor_fob_brl_itens_di = total_valor_fob_brl_itens_di if total_valor_fob_brl_itens_di > 0 else 1.0
@@ -251,137 +266,75 @@ def perform_calculations(di_data, itens_data, expense_inputs, contracts_df):
 
     vmld_declaracao_para_rateio = vmld_declaracao if vmld_declaracao is not None and vmld_declaracao > 0 else 1.0
 
-    # Calculate total VLME for all items (needed for "Seguro do item" calculation)
-    total_vlme_brl_itens_di_calc = 0.0
-    for item_data in itens_data:
-        # Garante que item_data seja uma tupla/lista e não sqlite3.Row
-        if isinstance(item_data, sqlite3.Row):
-            item_data = tuple(item_data)
-        
-        qty_original = item_data[5] if item_data[5] is not None else 0
-        qty = _clean_quantity(qty_original) / 10.0 # Aplicar a divisão por 10 aqui também para cálculos
-        
-        val_item_fob_brl = item_data[8] if item_data[8] is not None else 0.0
-        peso_liquido_item_from_db = item_data[9] if item_data[9] is not None else 0.0
-        acrescimo_rateado_item_brl_calc = (acrescimo_total_declaracao if acrescimo_total_declaracao is not None else 0.0) / total_peso_liquido_itens_di * peso_liquido_item_from_db if total_peso_liquido_itens_di > 0 else 0.0
-        vlme_brl_item_calc = val_item_fob_brl + acrescimo_rateado_item_brl_calc
-        total_vlme_brl_itens_di_calc += vlme_brl_item_calc
+    # Rateios por peso líquido (frete e acréscimo) e por VLME (seguro)
+    acrescimo_rateado_itens = (acrescimo_total_declaracao if acrescimo_total_declaracao is not None else 0.0) / total_peso_liquido_itens_di * peso_liquido_itens
+    vlme_brl_itens = valor_fob_brl_itens + acrescimo_rateado_itens
+    total_vlme_brl_itens_di_calc = vlme_brl_itens.sum()
     total_vlme_brl_itens_di_calc = total_vlme_brl_itens_di_calc if total_vlme_brl_itens_di_calc > 0 else 1.0
 
-    fatores_por_adicao = {}
-
-    for item_data in itens_data:
-        # Ensure item_data is a tuple/list, not sqlite3.Row
-        if isinstance(item_data, sqlite3.Row):
-            item_data = tuple(item_data)
-
-        (item_id, decl_id, num_adicao, num_item_seq, desc_mercadoria, qty_original, unit_medida, # Renomeado qty para qty_original
-         val_unit_fob_usd, val_item_fob_brl, peso_liquido_item_from_db, ncm_item, sku_item,
-         custo_unit_di_usd, ii_perc_item, ipi_perc_item, pis_perc_item, cofins_perc_item, icms_perc_item,
-         codigo_erp_do_db) = item_data
-
-        # Use _clean_quantity para garantir que a quantidade seja um número correto
-        qty = _clean_quantity(qty_original) if qty_original is not None else 0
-        # Correção: dividir a quantidade por 10 para todos os cálculos
-        qty = qty / 10.0
-
-        val_item_fob_brl = val_item_fob_brl if val_item_fob_brl is not None else 0.0
-        peso_liquido_item_from_db = peso_liquido_item_from_db if peso_liquido_item_from_db is not None else 0.0
-        custo_unit_di_usd = custo_unit_di_usd if custo_unit_di_usd is not None else 0.0
-        taxa_cambial_usd_proc = taxa_cambial_usd_declaracao if taxa_cambial_usd_declaracao is not None else 0.0
-
-        peso_liquido_item_rateado = peso_liquido_item_from_db
-        frete_rateado_item = (frete_declaracao / total_peso_liquido_itens_di) * peso_liquido_item_rateado if total_peso_liquido_itens_di > 0 else 0.0
-        acrescimo_rateado_item_brl = (acrescimo_total_declaracao if acrescimo_total_declaracao is not None else 0.0) / total_peso_liquido_itens_di * peso_liquido_item_rateado if total_peso_liquido_itens_di > 0 else 0.0
-        vlme_brl_item = val_item_fob_brl + acrescimo_rateado_item_brl
-        seguro_rateado_item = (seguro_declaracao / total_vlme_brl_itens_di_calc) * vlme_brl_item if total_vlme_brl_itens_di_calc > 0 else 0.0
-        vlmd_brl_item = vlme_brl_item + frete_rateado_item + seguro_rateado_item
-        cif_item_total = vlmd_brl_item
-        cif_unitario_item = cif_item_total / qty if qty > 0 else 0.0
-
-        ii_perc_item_safe = ii_perc_item if ii_perc_item is not None else 0.0
-        ipi_perc_item_safe = ipi_perc_item if ipi_perc_item is not None else 0.0
-        pis_perc_item_safe = pis_perc_item if pis_perc_item is not None else 0.0
-        cofins_perc_item_safe = cofins_perc_item if cofins_perc_item is not None else 0.0
-        icms_perc_item_safe = icms_perc_item if icms_perc_item is not None else 0.0
-
-
-        ii_item_val_brl = vlmd_brl_item * ii_perc_item_safe
-        ipi_item_val_brl = (vlmd_brl_item + ii_item_val_brl) * ipi_perc_item_safe
-        pis_item_val_brl = vlmd_brl_item * pis_perc_item_safe
-        cofins_item_val_brl = vlmd_brl_item * cofins_perc_item_safe
-        icms_item_val = cif_unitario_item * icms_perc_item_safe
-
-        despesas_rateada_item = (total_despesas_operacionais / vmld_declaracao_para_rateio) * vlmd_brl_item if vmld_declaracao_para_rateio > 0 else 0.0
-        total_de_despesas_item = vlmd_brl_item + ii_item_val_brl + ipi_item_val_brl + pis_item_val_brl + cofins_item_val_brl + despesas_rateada_item
-        total_unitario_item = total_de_despesas_item / qty if qty > 0 else 0.0
-        item_variacao_cambial = variacao_cambial_total / total_quantidade_itens_di if total_quantidade_itens_di > 0 else 0.0
-        total_unitario_com_variacao = total_unitario_item + item_variacao_cambial
-        fator_internacao = total_unitario_com_variacao / (custo_unit_di_usd * taxa_cambial_usd_proc) if (custo_unit_di_usd * taxa_cambial_usd_proc) > 0 else 0.0
-
-        if num_adicao not in fatores_por_adicao:
-            fatores_por_adicao[num_adicao] = []
-        fatores_por_adicao[num_adicao].append(fator_internacao)
-
-        # Ajuste para extrair o SKU da descrição: Captura tudo até o primeiro " - " (espaço, traço, espaço)
-        extracted_sku = sku_item # Valor padrão
-        if desc_mercadoria:
-            match = re.match(r'^(.*?)\s-\s', desc_mercadoria) # Expressão regular ajustada para " - " com espaços
-            if match:
-                extracted_sku = match.group(1).strip()
-            else:
-                extracted_sku = sku_item if sku_item else "N/A"
-        else:
-            extracted_sku = sku_item if sku_item else "N/A"
-
-
-        itens_df_data.append({
-            "ID": item_id,
-            "Código ERP": st.session_state.item_erp_codes.get(item_id, codigo_erp_do_db if codigo_erp_do_db else ""), # Recebe o código ERP do banco
-            "NCM": _format_ncm(ncm_item),
-            "SKU": extracted_sku, # Usando o SKU extraído
-            "Descrição": desc_mercadoria if desc_mercadoria else "N/A", # Mantém a descrição original
-            "Quantidade": _format_int(qty), # Usando _format_int para exibir corretamente
-            "Peso Unitário": _format_weight_no_kg(peso_liquido_item_rateado),
-            "CIF Unitário": _format_float(cif_unitario_item, 4, prefix="R$ "),
-            "VLME (BRL)": _format_currency(vlme_brl_item),
-            "VLMD (BRL)": _format_currency(vlmd_brl_item),
-            "II (BRL)": _format_currency(ii_item_val_brl),
-            "IPI (BRL)": _format_currency(ipi_item_val_brl),
-            "PIS (BRL)": _format_currency(pis_item_val_brl),
-            "COFINS (BRL)": _format_currency(cofins_item_val_brl),
-            "II %": _format_percent(ii_perc_item),
-            "IPI %": _format_percent(ipi_perc_item),
-            "PIS %": _format_percent(pis_perc_item),
-            "COFINS %": _format_percent(cofins_perc_item),
-            "ICMS %": _format_percent(icms_perc_item),
-            "Frete R$": _format_currency(frete_rateado_item),
-            "Seguro R$": _format_currency(seguro_rateado_item),
-            "Unitário US$ DI": _format_float(custo_unit_di_usd, 2),
-            "Despesas Rateada": _format_currency(despesas_rateada_item),
-            "Total de Despesas": _format_currency(total_de_despesas_item),
-            "Total Unitário": _format_currency(total_unitario_item),
-            "Variação Cambial": _format_currency(item_variacao_cambial),
-            "Total Unitário com Variação": _format_currency(total_unitario_com_variacao),
-            "Fator de Internação": _format_float(fator_internacao, 4),
-            "Fator por Adição": "Calculando..." # Será preenchido no final
-        })
-
-    itens_df = pd.DataFrame(itens_df_data)
-
-    # Calcular Fator por Adição e Fator Geral
-    adicao_fator_medio = {}
-    for adicao, fatores in fatores_por_adicao.items():
-        if fatores:
-            adicao_fator_medio[adicao] = sum(fatores) / len(fatores)
-        else:
-            adicao_fator_medio[adicao] = 0.0
-
-    # Atualizar a coluna "Fator por Adição" no DataFrame
-    for index, row in itens_df.iterrows():
-        # Para o mock, vamos simplesmente aplicar o fator médio geral:
-        if adicao_fator_medio:
-            itens_df.loc[index, "Fator por Adição"] = _format_float(sum(adicao_fator_medio.values()) / len(adicao_fator_medio), 4)
+    frete_rateado_itens = (frete_declaracao / total_peso_liquido_itens_di) * peso_liquido_itens
+    seguro_rateado_itens = (seguro_declaracao / total_vlme_brl_itens_di_calc) * vlme_brl_itens
+    vlmd_brl_itens = vlme_brl_itens + frete_rateado_itens + seguro_rateado_itens
+    com_quantidade = qtd_itens > 0
+    cif_unitario_itens = np.divide(vlmd_brl_itens, qtd_itens, out=np.zeros(len(itens)), where=com_quantidade)
+
+    ii_itens = vlmd_brl_itens * itens.numerico('ii_percent_item')
+    ipi_itens = (vlmd_brl_itens + ii_itens) * itens.numerico('ipi_percent_item')
+    pis_itens = vlmd_brl_itens * itens.numerico('pis_percent_item')
+    cofins_itens = vlmd_brl_itens * itens.numerico('cofins_percent_item')
+
+    despesas_rateada_itens = (total_despesas_operacionais / vmld_declaracao_para_rateio) * vlmd_brl_itens
+    total_de_despesas_itens = vlmd_brl_itens + ii_itens + ipi_itens + pis_itens + cofins_itens + despesas_rateada_itens
+    total_unitario_itens = np.divide(total_de_despesas_itens, qtd_itens, out=np.zeros(len(itens)), where=com_quantidade)
+    item_variacao_cambial = variacao_cambial_total / total_quantidade_itens_di
+    total_unitario_com_variacao_itens = total_unitario_itens + item_variacao_cambial
+
+    custo_unit_di_usd_itens = itens.numerico('custo_unit_di_usd')
+    taxa_cambial_usd_proc = taxa_cambial_usd_declaracao if taxa_cambial_usd_declaracao is not None else 0.0
+    custo_unit_di_brl_itens = custo_unit_di_usd_itens * taxa_cambial_usd_proc
+    fator_internacao_itens = np.divide(total_unitario_com_variacao_itens, custo_unit_di_brl_itens,
+                                       out=np.zeros(len(itens)), where=custo_unit_di_brl_itens > 0)
+
+    # Fator por Adição: média dos fatores de cada adição; a coluna recebe a média geral das adições
+    fator_medio_por_adicao = pd.Series(fator_internacao_itens).groupby(list(itens.coluna('numero_adicao')), dropna=False, sort=False).mean()
+    if len(fator_medio_por_adicao):
+        fator_por_adicao = _format_float(sum(fator_medio_por_adicao.tolist()) / len(fator_medio_por_adicao), 4)
+    else:
+        fator_por_adicao = "Calculando..."
+
+    item_ids = itens.coluna('id')
+    itens_df = pd.DataFrame({
+        "ID": item_ids,
+        "Código ERP": [st.session_state.item_erp_codes.get(item_id, codigo_erp if codigo_erp else "") # Recebe o código ERP do banco
+                       for item_id, codigo_erp in zip(item_ids, itens.coluna('codigo_erp_item'))],
+        "NCM": [_format_ncm(ncm) for ncm in itens.coluna('ncm_item')],
+        "SKU": [_extract_sku(desc, sku) for desc, sku in zip(itens.coluna('descricao_mercadoria'), itens.coluna('sku_item'))],
+        "Descrição": [desc if desc else "N/A" for desc in itens.coluna('descricao_mercadoria')], # Mantém a descrição original
+        "Quantidade": [_format_int(qty) for qty in qtd_itens],
+        "Peso Unitário": [_format_weight_no_kg(peso) for peso in peso_liquido_itens],
+        "CIF Unitário": [_format_float(v, 4, prefix="R$ ") for v in cif_unitario_itens],
+        "VLME (BRL)": [_format_currency(v) for v in vlme_brl_itens],
+        "VLMD (BRL)": [_format_currency(v) for v in vlmd_brl_itens],
+        "II (BRL)": [_format_currency(v) for v in ii_itens],
+        "IPI (BRL)": [_format_currency(v) for v in ipi_itens],
+        "PIS (BRL)": [_format_currency(v) for v in pis_itens],
+        "COFINS (BRL)": [_format_currency(v) for v in cofins_itens],
+        "II %": [_format_percent(v) for v in itens.coluna('ii_percent_item')],
+        "IPI %": [_format_percent(v) for v in itens.coluna('ipi_percent_item')],
+        "PIS %": [_format_percent(v) for v in itens.coluna('pis_percent_item')],
+        "COFINS %": [_format_percent(v) for v in itens.coluna('cofins_percent_item')],
+        "ICMS %": [_format_percent(v) for v in itens.coluna('icms_percent_item')],
+        "Frete R$": [_format_currency(v) for v in frete_rateado_itens],
+        "Seguro R$": [_format_currency(v) for v in seguro_rateado_itens],
+        "Unitário US$ DI": [_format_float(v, 2) for v in custo_unit_di_usd_itens],
+        "Despesas Rateada": [_format_currency(v) for v in despesas_rateada_itens],
+        "Total de Despesas": [_format_currency(v) for v in total_de_despesas_itens],
+        "Total Unitário": [_format_currency(v) for v in total_unitario_itens],
+        "Variação Cambial": [_format_currency(item_variacao_cambial)] * len(itens),
+        "Total Unitário com Variação": [_format_currency(v) for v in total_unitario_com_variacao_itens],
+        "Fator de Internação": [_format_float(v, 4) for v in fator_internacao_itens],
+        "Fator por Adição": [fator_por_adicao] * len(itens),
+    })
 
 
     total_impostos_processo = (imposto_importacao_total_declaracao if imposto_importacao_total_declaracao is not None else 0.0) + \
@@ -454,11 +407,6 @@ def _generate_excel_for_cadastro(di_data, itens_data, item_erp_codes):
 
 
     for item_data in itens_data:
-        # Ensure item_data is a tuple or list, and access by index
-        # If it's a sqlite3.Row object, convert to tuple/list first
-        if isinstance(item_data, sqlite3.Row):
-            item_data = tuple(item_data)
-
         (item_id, decl_id, num_adicao, num_item_seq, desc_mercadoria, qty, unit_medida,
          val_unit_fob_usd, val_item_calculado_fob_brl, peso_liquido_item, ncm_item, sku_item,
          custo_unit_di_usd, ii_perc_item, ipi_perc_item, pis_perc_item, cofins_perc_item, icms_perc_item,
@@ -466,15 +414,7 @@ def _generate_excel_for_cadastro(di_data, itens_data, item_erp_codes):
 
         display_desc_mercadoria = desc_mercadoria
         # Usando a mesma lógica de extração de SKU para o Excel
-        extracted_sku = sku_item
-        if desc_mercadoria:
-            match = re.match(r'^(.*?)\s-\s', desc_mercadoria) # Expressão regular ajustada para " - " com espaços
-            if match:
-                extracted_sku = match.group(1).strip()
-            else:
-                extracted_sku = sku_item if sku_item else "N/A"
-        else:
-            extracted_sku = sku_item if sku_item else "N/A"
+        extracted_sku = _extract_sku(desc_mercadoria, sku_item)
         
         formatted_ncm = _format_ncm(ncm_item)
 
@@ -889,15 +829,16 @@ def _generate_cover_pdf(di_data, total_para_nf, process_totals, contracts_df):
         story.append(Paragraph(f"REFERÊNCIA DO PROCESSO: {di_data[6] if di_data[6] else ''}", style_center_bold))
         story.append(Spacer(1, 0.1*inch))
 
-        # Data from DI (index based on db_utils.get_declaracao_by_id)
-        (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-         arquivo_origem, data_importacao, informacao_complementar,
-         vmle_declaracao, frete_declaracao, seguro_declaracao, vmld_declaracao,
-         ipi_total_declaracao, pis_pasep_total_declaracao, cofins_total_declaracao, icms_sc,
-         taxa_cambial_usd_declaracao, taxa_siscomex_total_declaracao, numero_invoice,
-         peso_bruto_total, peso_liquido_total, cnpj_importador, importador_nome,
-         recinto, embalagem, quantidade_volumes_total, acrescimo_total_declaracao,
-         imposto_importacao_total_declaracao, armazenagem_db, frete_nacional_db) = di_data
+        # Data from DI (campos de db_utils.Declaracao)
+        numero_di = di_data.numero_di
+        data_registro_db = di_data.data_registro
+        vmle_declaracao = di_data.vmle
+        frete_declaracao = di_data.frete
+        seguro_declaracao = di_data.seguro
+        vmld_declaracao = di_data.vmld
+        taxa_cambial_usd_declaracao = di_data.taxa_cambial_usd
+        peso_bruto_total = di_data.peso_bruto
+        quantidade_volumes_total = di_data.quantidade_volumes
 
         vmle_usd_capa = vmle_declaracao / taxa_cambial_usd_declaracao if taxa_cambial_usd_declaracao > 0 else 0.0
         frete_usd_capa = frete_declaracao / taxa_cambial_usd_declaracao if taxa_cambial_usd_declaracao > 0 else 0.0
@@ -1111,22 +1052,18 @@ def show_page():
             declaracao = get_declaracao_by_referencia(search_ref)
             if declaracao:
                 st.session_state.di_data = declaracao
-                st.session_state.itens_data = get_itens_by_declaracao_id(declaracao[0])
+                st.session_state.itens_data = get_itens_colunares_by_declaracao_id(declaracao.id)
                 
                 # Load existing ERP codes from DB for items
-                st.session_state.item_erp_codes = {}
-                if st.session_state.itens_data:
-                    for item_tuple in st.session_state.itens_data:
-                        # Ensure item_tuple is a tuple/list, not sqlite3.Row
-                        if isinstance(item_tuple, sqlite3.Row):
-                            item_tuple = tuple(item_tuple)
-                        item_id_db = item_tuple[0]
-                        codigo_erp_from_db = item_tuple[17] # 18th element is codigo_erp_item
-                        if codigo_erp_from_db:
-                            st.session_state.item_erp_codes[item_id_db] = codigo_erp_from_db
+                itens = st.session_state.itens_data
+                st.session_state.item_erp_codes = {
+                    item_id_db: codigo_erp_from_db
+                    for item_id_db, codigo_erp_from_db in zip(itens.coluna('id'), itens.coluna('codigo_erp_item'))
+                    if codigo_erp_from_db
+                }
 
                 # Load existing expenses and contracts from DB
-                expenses_db, contracts_db = get_process_cost_data(declaracao[0])
+                expenses_db, contracts_db = get_process_cost_data(declaracao.id)
                 if expenses_db:
                     st.session_state.expense_inputs = {
                         'afrmm': expenses_db[0],
@@ -1144,9 +1081,6 @@ def show_page():
                 contracts_df_data = []
                 if contracts_db:
                     for contract in contracts_db:
-                        # Ensure contract is a tuple/list, not sqlite3.Row
-                        if isinstance(contract, sqlite3.Row):
-                            contract = tuple(contract)
                         contracts_df_data.append({
                             'Nº Contrato': contract[0],
                             'Dólar': contract[1],
@@ -1369,15 +1303,16 @@ def show_page():
     with tab5:
         st.subheader("COMPARATIVOS")
         if st.session_state.di_data:
-            # Desempacota os dados da DI novamente para fácil acesso aos valores do banco
-            (id_db, numero_di, data_registro_db, valor_total_reais_xml,
-             arquivo_origem, data_importacao, informacao_complementar,
-             vmle_declaracao, frete_declaracao_db, seguro_declaracao_db, vmld_declaracao,
-             ipi_total_declaracao_db, pis_pasep_total_declaracao_db, cofins_total_declaracao_db, icms_sc,
-             taxa_cambial_usd_declaracao, taxa_siscomex_total_declaracao, numero_invoice,
-             peso_bruto_total, peso_liquido_total, cnpj_importador, importador_importador_nome,
-             recinto, embalagem, quantidade_volumes_total, acrescimo_total_declaracao,
-             imposto_importacao_total_declaracao_db, armazenagem_db, frete_nacional_db) = st.session_state.di_data
+            # Campos da DI usados abaixo
+            frete_declaracao_db = st.session_state.di_data.frete
+            seguro_declaracao_db = st.session_state.di_data.seguro
+            ipi_total_declaracao_db = st.session_state.di_data.ipi
+            pis_pasep_total_declaracao_db = st.session_state.di_data.pis_pasep
+            cofins_total_declaracao_db = st.session_state.di_data.cofins
+            taxa_siscomex_total_declaracao = st.session_state.di_data.taxa_siscomex
+            imposto_importacao_total_declaracao_db = st.session_state.di_data.imposto_importacao
+            armazenagem_db = st.session_state.di_data.armazenagem
+            frete_nacional_db = st.session_state.di_data.frete_nacional
 
             st.markdown("##### Comparativo de Valores (Calculado vs. Declaração de Importação)")
             
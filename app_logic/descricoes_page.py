@@ -5,7 +5,7 @@ import openpyxl # Para gerar e ler arquivos Excel
 import logging
 from datetime import datetime # Importar datetime para uso em datas
 import os # Importar os para manipulação de caminhos
-import base64 # Importar base64 para codificar imagens
+from app_logic.utils import set_background_image
 
 # Importar funções do novo módulo de utilitários de banco de dados
 # Assumimos que db_utils.py existe e está no PYTHONPATH ou no mesmo diretório/subdiretório 'app_logic'
@@ -14,6 +14,7 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import db_utils
+from app_logic import produtos_index
 
 
 logger = logging.getLogger(__name__)
@@ -26,40 +27,6 @@ _COLS_MAP_PRODUTOS = {
     "ncm": {"text": "NCM", "width": 100, "col_id": "ncm"}
 }
 
-# --- Função para definir imagem de fundo com opacidade (copiada de app_main.py) ---
-def set_background_image(image_path):
-    try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background-color: transparent !important; /* Garante que o fundo do app seja transparente */
-            }}
-            .stApp::before {{
-                content: "";
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/png;base64,{encoded_string}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-                opacity: 0.20; /* Opacidade ajustada para 20% */
-                z-index: -1; /* Garante que o pseudo-elemento fique atrás do conteúdo */
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except FileNotFoundError:
-        st.warning(f"A imagem de fundo não foi encontrada no caminho: {image_path}")
-    except Exception as e:
-        st.error(f"Erro ao carregar a imagem de fundo: {e}")
 
 
 # --- Funções Auxiliares de Formatação ---
@@ -70,64 +37,27 @@ def _format_ncm(ncm_value):
     return ncm_value
 
 # --- Funções para interagir com o DB (adaptadas para Streamlit) ---
-def load_produtos():
-    """Carrega todos os produtos do DB e atualiza o estado da sessão."""
+@st.cache_resource(show_spinner=False)
+def _get_produtos_index(db_path: str) -> produtos_index.ProdutosIndex:
+    """Índice do catálogo compartilhado por todas as sessões; reconstruído apenas após escritas."""
+    return produtos_index.ProdutosIndex.from_db(db_path)
+
+def get_produtos_index():
+    """Retorna o índice em memória do catálogo de produtos, ou None em caso de falha."""
     db_path = db_utils.get_db_path("produtos") # Assume que 'produtos' é um tipo de DB no db_utils
     if not db_path:
         st.error("Caminho do banco de dados de produtos não configurado. Por favor, verifique a configuração de 'db_utils'.")
-        st.session_state.produtos_data = []
-        # Garante que o DataFrame de sessão tenha as colunas esperadas, mesmo que vazio
-        st.session_state.produtos_data_df = pd.DataFrame(columns=[col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()])
-        return
-
-    conn = db_utils.connect_db(db_path)
-    if conn is None: # connect_db retorna None em caso de falha
-        st.error("Não foi possível conectar ao banco de dados de produtos. Verifique os logs para detalhes da conexão.")
-        st.session_state.produtos_data = []
-        # Garante que o DataFrame de sessão tenha as colunas esperadas, mesmo que vazio
-        st.session_state.produtos_data_df = pd.DataFrame(columns=[col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()])
-        return
-
+        return None
     try:
-        produtos = db_utils.selecionar_todos_produtos(db_path)
-        conn.close() # Fechar a conexão após a operação
-
-        # Converte para lista de dicionários para facilitar o uso no Streamlit
-        # Garante que as chaves do dicionário correspondem aos col_id do _COLS_MAP_PRODUTOS
-        produtos_dicts = []
-        for p_tuple in produtos:
-            p_dict = {}
-            for i, col_info in enumerate(_COLS_MAP_PRODUTOS.values()):
-                p_dict[col_info['col_id']] = p_tuple[i]
-            produtos_dicts.append(p_dict)
-
-        st.session_state.produtos_data = produtos_dicts
-        
-        # --- NOVO: Inicialização robusta do DataFrame de sessão ---
-        expected_cols = [col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()]
-        if produtos_dicts:
-            st.session_state.produtos_data_df = pd.DataFrame(st.session_state.produtos_data)
-        else:
-            # Cria um DataFrame vazio, mas com as colunas definidas
-            st.session_state.produtos_data_df = pd.DataFrame(columns=expected_cols)
-        # --- Fim da Inicialização robusta ---
-        
-        # Formatar NCM para exibição (apenas se o DataFrame não estiver vazio após a criação)
-        if not st.session_state.produtos_data_df.empty:
-            st.session_state.produtos_data_df['ncm'] = st.session_state.produtos_data_df['ncm'].apply(_format_ncm)
-
-        logger.info(f"Carregados {len(produtos)} produtos do DB.")
-        if not produtos:
-            st.info("Nenhum produto encontrado no banco de dados. Adicione um novo ou importe via Excel.")
+        return _get_produtos_index(db_path)
     except Exception as e:
         st.error(f"Erro ao carregar produtos do banco de dados: {e}. Verifique a estrutura da tabela e os dados.")
         logger.exception("Erro durante o carregamento de produtos.")
-        st.session_state.produtos_data = []
-        # Garante o DataFrame com colunas definidas MESMO em caso de erro
-        st.session_state.produtos_data_df = pd.DataFrame(columns=[col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()])
-    finally:
-        if conn:
-            conn.close()
+        return None
+
+def refresh_produtos_index():
+    """Descarta o índice do catálogo após uma escrita; o próximo acesso o reconstrói a partir do DB."""
+    _get_produtos_index.clear()
 
 
 def add_or_update_produto(produto_id, nome, desc, ncm):
@@ -148,7 +78,7 @@ def add_or_update_produto(produto_id, nome, desc, ncm):
     produto_tuple = (str(produto_id), nome, desc, ncm)
     if db_utils.inserir_ou_atualizar_produto(db_path, produto_tuple):
         st.success(f"Produto '{nome}' (ID: {produto_id}) salvo com sucesso!")
-        load_produtos() # Recarrega a tabela
+        refresh_produtos_index() # Recarrega a tabela
         return True
     else:
         # A função db_utils.inserir_ou_atualizar_produto já loga o erro,
@@ -170,7 +100,7 @@ def delete_produto_from_db(produto_id):
         if produto_id in st.session_state.get('produtos_selecionados_ids_list', []):
             st.session_state.produtos_selecionados_ids_list.remove(produto_id)
         st.session_state.selected_produto_id = None # Limpa a seleção
-        load_produtos() # Recarrega a tabela
+        refresh_produtos_index() # Recarrega a tabela
         return True
     else:
         st.error(f"Falha ao excluir o produto ID '{produto_id}'. Verifique os logs.")
@@ -187,9 +117,9 @@ def export_selected_products():
         st.warning("Nenhum produto selecionado para exportar.")
         return
 
-    # Prepare a dictionary for quick lookup of existing products from the session state
-    # Garante que st.session_state.produtos_data exista e seja uma lista de dicionários
-    all_products_dict_by_id = {p.get('id_key_erp'): p for p in st.session_state.get('produtos_data', []) if p.get('id_key_erp')}
+    # Busca exata no índice do catálogo (sem varrer a lista de produtos)
+    index = get_produtos_index()
+    all_products_dict_by_id = index.get_many(st.session_state.produtos_selecionados_ids_list) if index else {}
 
     products_to_export = []
     not_found_count = 0
@@ -235,11 +165,14 @@ def export_selected_products():
 
 
 def import_excel_products(uploaded_file):
-    """Importa produtos de arquivo Excel."""
+    """
+    Importa produtos de arquivo Excel em lote (uma única transação).
+    Retorna a lista de erros por linha ({'linha', 'id_key_erp', 'erro'}).
+    """
     db_path = db_utils.get_db_path("produtos") # Assume que 'produtos' é um tipo de DB no db_utils
     if not db_path:
         st.error("Caminho do banco de dados de produtos não configurado.")
-        return
+        return []
 
     try:
         df = pd.read_excel(uploaded_file, dtype=str)
@@ -247,7 +180,7 @@ def import_excel_products(uploaded_file):
     except Exception as e:
         st.error(f"Erro ao ler arquivo Excel: {e}")
         logger.exception("Erro leitura Excel de produtos.")
-        return
+        return []
 
     # Pré-processamento: Remover espaços dos nomes das colunas para facilitar a busca.
     df.columns = df.columns.str.replace(' ', '', regex=False)
@@ -267,71 +200,59 @@ def import_excel_products(uploaded_file):
             excel_to_db_col_map[db_col_id] = db_col_text
         else:
             st.error(f"Coluna obrigatória '{db_col_text}' (ou '{db_col_id}') não encontrada no arquivo Excel.")
-            return
+            return []
+
+    # Monta o DataFrame na ordem das colunas do DB, com valores já normalizados
+    df_produtos = pd.DataFrame({
+        db_col_info['col_id']: df[excel_to_db_col_map[db_col_info['col_id']]].astype(str).str.strip()
+        for db_col_info in _COLS_MAP_PRODUTOS.values()
+    })
+
+    # Validação vetorizada (ID não vazio, sem espaços no ID)
+    ids = df_produtos[_COLS_MAP_PRODUTOS['id']['col_id']]
+    mask_id_vazio = ids == ''
+    mask_id_com_espaco = ~mask_id_vazio & ids.str.contains(' ', regex=False)
+
+    # Linha do Excel = índice do DataFrame + 2 (cabeçalho e base 1)
+    errors = []
+    for mask, mensagem in ((mask_id_vazio, "ID de produto vazio"), (mask_id_com_espaco, "ID de produto contém espaços")):
+        errors.extend(
+            {'linha': int(idx) + 2, 'id_key_erp': id_p, 'erro': mensagem}
+            for idx, id_p in ids[mask].items()
+        )
+    errors.sort(key=lambda err: err['linha'])
 
-    imported_count = 0
-    error_count = 0
-    
-    for index, row in df.iterrows():
-        try:
-            # Mapeia os dados da linha do Excel para o formato do produto esperado pelo DB
-            # Garante que a ordem e o tipo sejam consistentes
-            prod_data_from_excel = {
-                db_col_info['col_id']: str(row[excel_to_db_col_map[db_col_info['col_id']]]).strip()
-                for db_col_info in _COLS_MAP_PRODUTOS.values()
-            }
-            
-            # Converte para tupla na ordem correta para inserir_ou_atualizar_produto
-            produto_tuple = (
-                prod_data_from_excel[_COLS_MAP_PRODUTOS['id']['col_id']],
-                prod_data_from_excel[_COLS_MAP_PRODUTOS['nome']['col_id']],
-                prod_data_from_excel[_COLS_MAP_PRODUTOS['desc']['col_id']],
-                prod_data_from_excel[_COLS_MAP_PRODUTOS['ncm']['col_id']]
-            )
-            
-            # Basic validation (ID not empty, no spaces in ID)
-            id_p = produto_tuple[0]
-            if not id_p:
-                logger.warning(f"Linha {index+2}: ID de produto vazio, ignorado.")
-                error_count += 1
-                continue
-            if ' ' in id_p:
-                st.warning(f"Linha {index+2}: ID de produto '{id_p}' contém espaços, ignorado.")
-                error_count += 1
-                continue
-            
-            if db_utils.inserir_ou_atualizar_produto(db_path, produto_tuple):
-                imported_count += 1
-            else:
-                error_count += 1 # inserir_ou_atualizar_produto already logs/shows error
-        except KeyError as e:
-            st.warning(f"Linha {index+2} ignorada: Coluna '{e}' não encontrada ou problema no mapeamento. Erro: {e}")
-            error_count += 1
-        except Exception as e:
-            st.error(f"Erro ao processar linha {index+2} do Excel para produtos: {e}")
-            error_count += 1
-
-    st.success(f"{imported_count} produtos importados/atualizados.")
-    if error_count > 0:
-        st.warning(f"{error_count} linhas com erro/ignoradas. Verifique os logs.")
-    
-    load_produtos() # Recarrega a tabela
+    df_validos = df_produtos[~(mask_id_vazio | mask_id_com_espaco)]
+    produtos_tuples = list(df_validos.itertuples(index=False, name=None))
+
+    if db_utils.inserir_ou_atualizar_produtos_em_lote(db_path, produtos_tuples):
+        st.success(f"{len(produtos_tuples)} produtos importados/atualizados.")
+    else:
+        st.error("Falha ao gravar os produtos do Excel no banco de dados. Nenhuma linha foi importada. Verifique os logs.")
+        errors.extend(
+            {'linha': int(idx) + 2, 'id_key_erp': id_p, 'erro': "Falha ao gravar no banco de dados"}
+            for idx, id_p in df_validos[_COLS_MAP_PRODUTOS['id']['col_id']].items()
+        )
+
+    if errors:
+        st.warning(f"{len(errors)} linhas com erro/ignoradas.")
+        for err in errors:
+            logger.warning(f"Linha {err['linha']}: {err['erro']} ('{err['id_key_erp']}'), ignorada.")
+        st.dataframe(pd.DataFrame(errors), hide_index=True, use_container_width=True)
+
+    refresh_produtos_index() # Recarrega a tabela
+    return errors
 
 def show_page():
     # --- Configuração da Imagem de Fundo para a página Descrições ---
     # Certifique-se de que o caminho para a imagem esteja correto
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
-    set_background_image(background_image_path)
+    set_background_image(background_image_path, opacity=0.20)
     # --- Fim da Configuração da Imagem de Fundo ---
 
     st.subheader("Gerenciamento de Produtos / Descrições")
 
     # --- Estado da Sessão para esta página ---
-    if 'produtos_data' not in st.session_state:
-        st.session_state.produtos_data = []
-    # NOVO: Garante que produtos_data_df seja um DataFrame vazio com colunas
-    if 'produtos_data_df' not in st.session_state:
-        st.session_state.produtos_data_df = pd.DataFrame(columns=[col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()])
     if 'selected_produto_id' not in st.session_state:
         st.session_state.selected_produto_id = None
     if 'produtos_selecionados_ids_list' not in st.session_state: # Para a lista de seleção múltipla
@@ -362,14 +283,8 @@ def show_page():
         st.session_state.multi_id_search_input_value = ""
 
 
-    # Garante que os dados sejam carregados na primeira execução ou se o estado mudar
-    # Apenas carrega se os dados ainda não estiverem presentes ou se o DB não foi inicializado
-    # (mas a inicialização do DB é mais robusta agora em app_main)
-    if not st.session_state.produtos_data_df.empty: # Se o DataFrame já foi populado com dados
-        pass # Não recarrega, mantém o estado atual
-    else: # Se o DataFrame está vazio (primeira carga ou erro anterior)
-        load_produtos() # Chamar load_produtos para carregar os dados
-        # Após a carga, ainda pode estar vazio se não houver produtos no DB
+    # O índice do catálogo é compartilhado pelo processo e só é reconstruído após escritas
+    index = get_produtos_index()
 
     # --- UI Layout ---
 
@@ -397,29 +312,11 @@ def show_page():
                 st.session_state.produtos_table_editor_key_counter += 1 # Força a re-renderização do dataframe principal
                 st.rerun()
 
-    # Aplicar filtros à exibição do DataFrame
-    filtered_df_display = st.session_state.produtos_data_df.copy()
-
-    # --- NOVO: Bloco de proteção extra: Garante que as colunas de pesquisa existam no DataFrame ---
-    expected_search_cols = [col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()]
-    for col in expected_search_cols:
-        if col not in filtered_df_display.columns:
-            # Adiciona a coluna com valores nulos (NaN/NaT) se não existir para evitar KeyError
-            filtered_df_display[col] = pd.NA 
-    # --- Fim do bloco de proteção extra ---
-
-    for col_id, search_term in st.session_state.descricoes_search_terms.items():
-        if search_term:
-            # Verifica se a coluna existe ANTES de tentar filtrá-la
-            if col_id in filtered_df_display.columns:
-                # Converte para string e aplica o filtro de contém (case-insensitive)
-                # O parâmetro 'na=False' garante que valores NaN/None não causem erro no .str.contains
-                filtered_df_display = filtered_df_display[
-                    filtered_df_display[col_id].astype(str).str.contains(search_term, case=False, na=False)
-                ]
-            else:
-                # Loga um aviso se uma coluna de pesquisa não for encontrada (útil para depuração)
-                logger.warning(f"Coluna de pesquisa '{col_id}' não encontrada em filtered_df_display para filtragem. Ignorando este filtro.")
+    # Aplicar filtros à exibição do DataFrame (busca no índice, sem copiar o DataFrame completo)
+    if index is not None:
+        filtered_df_display = index.search(st.session_state.descricoes_search_terms)
+    else:
+        filtered_df_display = pd.DataFrame(columns=[col_info['col_id'] for col_info in _COLS_MAP_PRODUTOS.values()])
 
 
     # Botões de Ação Principal
@@ -561,12 +458,8 @@ def show_page():
             if st.button("Buscar Produtos", key="search_multi_ids_button_expander"):
                 search_ids = [id.strip() for id in st.session_state.multi_id_search_input_value.split('\n') if id.strip()]
                 if search_ids:
-                    db_path = db_utils.get_db_path("produtos")
-                    
-                    # Get all products to check against
-                    all_products_in_db_raw = db_utils.selecionar_todos_produtos(db_path)
-                    # Converte para dicionários para facilitar a busca
-                    all_products_dict = {p[0]: {col_info['col_id']: p[i] for i, col_info in enumerate(_COLS_MAP_PRODUTOS.values())} for p in all_products_in_db_raw}
+                    # Busca exata no índice do catálogo
+                    all_products_dict = index.get_many(search_ids) if index else {}
 
                     results_for_display = []
                     found_count = 0
@@ -639,7 +532,7 @@ def show_page():
         selected_products_details = []
         # Para cada ID na lista de selecionados, busca os detalhes (do cache ou do DB)
         for prod_id in st.session_state.produtos_selecionados_ids_list:
-            found_product = next((p for p in st.session_state.produtos_data if p.get('id_key_erp') == prod_id), None)
+            found_product = index.get(prod_id) if index else None
             if found_product:
                 selected_products_details.append(found_product)
             else:
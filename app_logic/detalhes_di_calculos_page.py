@@ -3,16 +3,18 @@ import pandas as pd
 from datetime import datetime
 import logging
 import os
-import base64
+from app_logic.utils import set_background_image
 
 # Importar funções do módulo de utilitários de banco de dados
 from db_utils import (
-    get_declaracao_by_id,
+    get_declaracao_cached,
     get_declaracao_by_referencia,
     get_db_path,
     get_all_declaracoes # NOVO: Importa a função para buscar todas as declarações
 )
 
+from app_logic import cotacoes
+
 # Importar as páginas de cálculo Streamlit
 from app_logic import calculo_portonave_page
 from app_logic import calculo_futura_page
@@ -24,40 +26,6 @@ from app_logic import calculo_frete_internacional_page
 
 logger = logging.getLogger(__name__)
 
-# --- Função para definir imagem de fundo com opacidade (copiada de app_main.py) ---
-def set_background_image(image_path):
-    try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background-color: transparent !important; /* Garante que o fundo do app seja transparente */
-            }}
-            .stApp::before {{
-                content: "";
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/png;base64,{encoded_string}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-                opacity: 0.20; /* Opacidade ajustada para 20% */
-                z-index: -1; /* Garante que o pseudo-elemento fique atrás do conteúdo */
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except FileNotFoundError:
-        st.warning(f"A imagem de fundo não foi encontrada no caminho: {image_path}")
-    except Exception as e:
-        st.error(f"Erro ao carregar a imagem de fundo: {e}")
 
 
 # --- Funções Auxiliares de Formatação ---
@@ -75,6 +43,12 @@ def _format_currency(value):
     except (ValueError, TypeError):
         return "R$ 0,00"
 
+def _format_ptax(value):
+    """Formata uma cotação com 4 casas decimais (ex.: 5,1234) ou 'N/A'."""
+    if value is None:
+        return "N/A"
+    return f"{float(value):.4f}".replace('.', ',')
+
 def _format_date(date_str):
     """Formata uma string de data AAAA-MM-DD para DD/MM/AAAA."""
     if date_str:
@@ -150,7 +124,7 @@ def load_di_details(input_value):
         st.warning("Por favor, selecione ou insira um valor para carregar a DI.")
         return
     
-    if get_declaracao_by_id is None or get_declaracao_by_referencia is None:
+    if get_declaracao_cached is None or get_declaracao_by_referencia is None:
         st.error("Serviço de banco de dados não disponível.")
         return
 
@@ -160,7 +134,7 @@ def load_di_details(input_value):
     try:
         declaracao_id = int(input_value)
         logger.info(f"Tentando carregar DI por ID: {declaracao_id}")
-        di_data_row = get_declaracao_by_id(declaracao_id)
+        di_data_row = get_declaracao_cached(declaracao_id)
         if di_data_row:
             st.session_state.detalhes_di_data = dict(di_data_row)
             st.success(f"DI {_format_di_number(st.session_state.detalhes_di_data.get('numero_di', ''))} carregada por ID com sucesso!")
@@ -189,19 +163,8 @@ def navigate_to_calc_page(page_name, di_id_session_key):
     Navega para a tela de cálculo especificada, passando o ID da DI carregada.
     """
     if 'detalhes_di_data' in st.session_state and st.session_state.detalhes_di_data:
-        # Limpa os dados da DI da página de cálculo específica para forçar um refresh
-        if page_name == "Cálculo Futura":
-            st.session_state.futura_di_data = None
-        elif page_name == "Cálculo Pac Log - Elo":
-            st.session_state.elo_di_data = None # Corrigido para 'elo_di_data'
-        elif page_name == "Cálculo Fechamento":
-            st.session_state.fechamento_di_data = None
-        elif page_name == "Cálculo FN Transportes": # NOVO: Limpeza para FN Transportes
-            st.session_state.fn_transportes_di_data = None
-        elif page_name == "Cálculo Frete Internacional": # NOVO: Limpeza para Frete Internacional
-            st.session_state.frete_internacional_di_data = None
-
-
+        # Os dados da DI na página de destino não são limpos: ela compara a DI da sessão com o cache
+        # compartilhado de DIs (db_utils.get_declaracao_cached) e só recarrega se for outra DI ou se mudou
         st.session_state.current_page = page_name
         # Armazena o ID da DI selecionada para que a tela de cálculo possa carregá-la
         st.session_state[di_id_session_key] = st.session_state.detalhes_di_data['id']
@@ -213,7 +176,7 @@ def navigate_to_calc_page(page_name, di_id_session_key):
 def show_page():
     # --- Configuração da Imagem de Fundo para a página Detalhes DI e Cálculos ---
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
-    set_background_image(background_image_path)
+    set_background_image(background_image_path, opacity=0.20)
     # --- Fim da Configuração da Imagem de Fundo ---
 
     
@@ -289,6 +252,8 @@ def show_page():
                     "Cofins": _format_currency(di_data.get('cofins')),
                     "ICMS-SC": di_data.get('icms_sc'),
                     "Taxa Cambial (USD)": di_data.get('taxa_cambial_usd'),
+                    # Lida do armazenamento local de cotações (sem acesso à rede)
+                    "PTAX Venda na Data do Registro": _format_ptax(cotacoes.get_ptax_venda(di_data.get('data_registro'))) if di_data.get('data_registro') else "N/A",
                     "Taxa SISCOMEX": _format_currency(di_data.get('taxa_siscomex')),
                     "Nº Invoice": di_data.get('numero_invoice'),
                     "Peso Bruto (KG)": di_data.get('peso_bruto'),
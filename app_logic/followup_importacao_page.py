@@ -11,7 +11,7 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from typing import Optional, Any, Dict, List, Union
 import numpy as np # Importar numpy explicitamente
-import base64 # Importar base64 explicitamente
+from app_logic.utils import set_background_image
 
 import followup_db_manager as db_manager # Importa o módulo db_manager
 # NOVO: Importa a nova página de formulário de processo
@@ -57,41 +57,6 @@ except Exception as e:
     db_utils = MockDbUtils()
 
 
-# --- Função para definir imagem de fundo com opacidade (copiada de app_main.py) ---
-def set_background_image(image_path: str):
-    """Define uma imagem de fundo para o aplicativo Streamlit com opacidade."""
-    try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background-color: transparent !important; /* Garante que o fundo do app seja transparente */
-            }}
-            .stApp::before {{
-                content: "";
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/png;base64,{encoded_string}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-                opacity: 0.20; /* Opacidade ajustada para 20% */
-                z-index: -1; /* Garante que o pseudo-elemento fique atrás do conteúdo */
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except FileNotFoundError:
-        st.warning(f"A imagem de fundo não foi encontrada no caminho: {image_path}")
-    except Exception as e:
-        st.error(f"Erro ao carregar a imagem de fundo: {e}")
 
 def _format_date_display(date_str: Optional[str]) -> str:
     """Formata uma string de data (YYYY-MM-DD) para exibição (DD/MM/YYYY)."""
@@ -962,7 +927,7 @@ def _display_mass_edit_popup():
 def show_page():
     """Função principal para exibir a página de Follow-up de Importação."""
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
-    set_background_image(background_image_path)
+    set_background_image(background_image_path, opacity=0.20)
 
     st.subheader("Follow-up Importação")
 
@@ -4,7 +4,7 @@ import sys
 import os
 import logging
 import re
-import base64
+from app_logic.utils import set_background_image
 # Adiciona o diretório raiz do projeto ao sys.path para importações
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -16,40 +16,6 @@ except ImportError:
     st.stop()
 
 logger = logging.getLogger(__name__)
-# --- Função para definir imagem de fundo com opacidade (copiada de app_main.py) ---
-def set_background_image(image_path):
-    try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background-color: transparent !important; /* Garante que o fundo do app seja transparente */
-            }}
-            .stApp::before {{
-                content: "";
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/png;base64,{encoded_string}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-                opacity: 0.20; /* Opacidade ajustada para 20% */
-                z-index: -1; /* Garante que o pseudo-elemento fique atrás do conteúdo */
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except FileNotFoundError:
-        st.warning(f"A imagem de fundo não foi encontrada no caminho: {image_path}")
-    except Exception as e:
-        st.error(f"Erro ao carregar a imagem de fundo: {e}")
         
 def format_ncm_code(ncm_raw: str) -> str:
     """
@@ -73,9 +39,48 @@ def format_ncm_code(ncm_raw: str) -> str:
     
     return formatted_ncm
 
+def _parse_aliquota_column(serie: pd.Series) -> pd.Series:
+    """
+    Converte uma coluna de alíquotas ('16%', '1,65', vazio...) para float de forma vetorizada.
+    Células vazias viram 0.0; valores não numéricos viram NaN.
+    """
+    texto = serie.astype(str).str.replace('%', '', regex=False).str.replace(',', '.', regex=False).str.strip()
+    vazio = serie.isna() | texto.eq('')
+    return pd.to_numeric(texto.mask(vazio, '0'), errors='coerce')
+
+def _prepare_ncm_import_rows(df: pd.DataFrame, column_mapping: dict):
+    """
+    Valida e converte o DataFrame importado de uma só vez.
+    Retorna (itens, erros): itens prontos para db_utils.adicionar_ou_atualizar_ncm_itens_em_lote
+    e a lista de erros por linha ({'linha', 'ncm', 'erro'}).
+    """
+    ncm_raw = df[column_mapping['NCM']].astype(str).str.strip()
+    # Formata o NCM antes de salvar (remove pontos e garante 8 dígitos)
+    ncm_clean = ncm_raw.str.replace(r'\D', '', regex=True).str[:8]
+    descricao = df[column_mapping['DESCRIÇÃO']].fillna('').astype(str).str.strip()
+    aliquotas = {
+        col: _parse_aliquota_column(df[column_mapping[col]])
+        for col in ('II (%)', 'IPI (%)', 'PIS (%)', 'COFINS (%)', 'ICMS (%)')
+    }
+
+    mask_ncm_vazio = ncm_clean.eq('')
+    mask_aliquota_invalida = pd.concat(aliquotas.values(), axis=1).isna().any(axis=1)
+
+    errors = []
+    for mask, mensagem in ((mask_ncm_vazio, "NCM vazio ou sem dígitos"), (mask_aliquota_invalida & ~mask_ncm_vazio, "Alíquota não numérica")):
+        errors.extend({'linha': int(idx) + 1, 'ncm': ncm_raw[idx], 'erro': mensagem} for idx in df.index[mask.to_numpy()])
+    errors.sort(key=lambda err: err['linha'])
+
+    validos = ~(mask_ncm_vazio | mask_aliquota_invalida)
+    itens = list(zip(
+        ncm_clean[validos], descricao[validos],
+        *(aliquotas[col][validos].astype(float) for col in ('II (%)', 'IPI (%)', 'PIS (%)', 'COFINS (%)', 'ICMS (%)'))
+    ))
+    return itens, errors
+
 def show_ncm_list_page():
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
-    set_background_image(background_image_path)
+    set_background_image(background_image_path, opacity=0.20)
     
     """
     Exibe a página de Listagem NCM para adicionar, visualizar e gerenciar itens NCM.
@@ -145,10 +150,6 @@ def show_ncm_list_page():
                 st.dataframe(df.head())
 
                 if st.button("Processar e Inserir/Atualizar NCMs do Arquivo"):
-                    total_rows = len(df)
-                    success_count = 0
-                    fail_count = 0
-                    
                     # ATUALIZADO: Mapeamento de colunas corrigido para corresponder ao seu Excel
                     column_mapping = {
                         'NCM': 'NCM', # Nome da coluna no seu arquivo Excel
@@ -165,49 +166,15 @@ def show_ncm_list_page():
                     if missing_columns:
                         st.error(f"Colunas ausentes no arquivo: {', '.join(missing_columns)}. Por favor, verifique o cabeçalho do arquivo.")
                     else:
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
+                        itens, errors = _prepare_ncm_import_rows(df, column_mapping)
+                        for err in errors:
+                            logger.error(f"Falha ao processar a linha {err['linha']} (NCM: {err['ncm']}): {err['erro']}")
 
-                        for index, row in df.iterrows():
-                            status_text.text(f"Processando linha {index + 1}/{total_rows}...")
-                            progress_bar.progress((index + 1) / total_rows)
-
-                            try:
-                                # Tenta extrair os dados, convertendo para os tipos corretos
-                                # Agora, acessamos diretamente os nomes das colunas como estão no DataFrame
-                                ncm_code = str(row[column_mapping['NCM']]).strip()
-                                # Formata o NCM antes de salvar (remove pontos e garante 8 dígitos)
-                                ncm_code_clean = re.sub(r'\D', '', ncm_code)[:8]
-
-                                descricao_item = str(row[column_mapping['DESCRIÇÃO']]).strip()
-                                
-                                # Converte para float, tratando valores vazios ou não numéricos
-                                ii = float(str(row.get(column_mapping['II (%)'], 0.0)).replace('%', '').replace(',', '.') or 0.0) # Adicionado .replace(',', '.') para vírgulas em números
-                                ipi = float(str(row.get(column_mapping['IPI (%)'], 0.0)).replace('%', '').replace(',', '.') or 0.0)
-                                pis = float(str(row.get(column_mapping['PIS (%)'], 0.0)).replace('%', '').replace(',', '.') or 0.0)
-                                cofins = float(str(row.get(column_mapping['COFINS (%)'], 0.0)).replace('%', '').replace(',', '.') or 0.0)
-                                icms = float(str(row.get(column_mapping['ICMS (%)'], 0.0)).replace('%', '').replace(',', '.') or 0.0)
-
-
-                                if db_utils.adicionar_ou_atualizar_ncm_item(
-                                    ncm_code_clean, descricao_item, ii, ipi, pis, cofins, icms
-                                ):
-                                    success_count += 1
-                                else:
-                                    fail_count += 1
-                                    logger.error(f"Falha ao processar a linha {index + 1} (NCM: {ncm_code}).")
-                            except KeyError as ke:
-                                st.error(f"Erro: Coluna '{ke}' não encontrada na linha {index + 1}. Verifique o mapeamento das colunas.")
-                                fail_count += 1
-                            except Exception as e:
-                                fail_count += 1
-                                st.error(f"Erro ao processar a linha {index + 1} (NCM: {ncm_code}): {e}")
-                                logger.error(f"Erro ao processar linha {index + 1} do Excel: {e}")
-
-                        status_text.empty()
-                        progress_bar.empty()
-                        st.success(f"Processamento concluído: {success_count} itens inseridos/atualizados, {fail_count} falhas.")
-                        st.rerun() # Recarrega a página para exibir os dados atualizados
+                        if db_utils.adicionar_ou_atualizar_ncm_itens_em_lote(itens):
+                            st.success(f"Processamento concluído: {len(itens)} itens inseridos/atualizados, {len(errors)} falhas.")
+                            st.rerun() # Recarrega a página para exibir os dados atualizados
+                        else:
+                            st.error("Erro ao gravar os itens NCM no banco de dados. Nenhum item foi importado. Verifique os logs.")
             except Exception as e:
                 st.error(f"Erro ao ler o arquivo: {e}. Certifique-se de que é um arquivo Excel ou CSV válido e que as colunas estão corretas.")
                 logger.error(f"Erro ao carregar/processar arquivo Excel/CSV: {e}")
@@ -258,44 +225,40 @@ def show_ncm_list_page():
         )
 
         if st.button("Atualizar Itens Selecionados da Tabela"):
-            # Para cada linha editada, encontre a linha original e atualize
+            # Compara com os dados já carregados e grava apenas as linhas alteradas, em lote
+            original_por_ncm = {item['ncm_code']: item for item in itens_ncm}
+            itens_alterados = []
             for edited_row_dict in edited_df.to_dict('records'):
                 ncm_code_clean = re.sub(r'\D', '', edited_row_dict['Código NCM'])
-                
-                # Para evitar acessar o DataFrame original novamente, use o NCM limpo
-                # e recupere o item NCM original para comparação (se necessário)
-                original_ncm_item_data = db_utils.get_ncm_item_by_ncm_code(ncm_code_clean)
+                original_ncm_item_data = original_por_ncm.get(ncm_code_clean)
                 
                 if original_ncm_item_data:
-                    # Get the values from the edited row
-                    new_descricao_item = edited_row_dict['Descrição']
-                    new_ii_aliquota = edited_row_dict['II (%)']
-                    new_ipi_aliquota = edited_row_dict['IPI (%)']
-                    new_pis_aliquota = edited_row_dict['PIS (%)']
-                    new_cofins_aliquota = edited_row_dict['COFINS (%)']
-                    new_icms_aliquota = edited_row_dict['ICMS (%)']
+                    novo_item = (
+                        ncm_code_clean,
+                        edited_row_dict['Descrição'],
+                        edited_row_dict['II (%)'],
+                        edited_row_dict['IPI (%)'],
+                        edited_row_dict['PIS (%)'],
+                        edited_row_dict['COFINS (%)'],
+                        edited_row_dict['ICMS (%)'],
+                    )
+                    item_original = (
+                        ncm_code_clean,
+                        original_ncm_item_data['descricao_item'],
+                        original_ncm_item_data['ii_aliquota'],
+                        original_ncm_item_data['ipi_aliquota'],
+                        original_ncm_item_data['pis_aliquota'],
+                        original_ncm_item_data['cofins_aliquota'],
+                        original_ncm_item_data['icms_aliquota'],
+                    )
+                    if novo_item != item_original:
+                        itens_alterados.append(novo_item)
 
-                    # Compare with original values from the database (assuming 'original_ncm_item_data' is a dict or similar)
-                    desc_changed = original_ncm_item_data['descricao_item'] != new_descricao_item
-                    ii_changed = original_ncm_item_data['ii_aliquota'] != new_ii_aliquota
-                    ipi_changed = original_ncm_item_data['ipi_aliquota'] != new_ipi_aliquota
-                    pis_changed = original_ncm_item_data['pis_aliquota'] != new_pis_aliquota
-                    cofins_changed = original_ncm_item_data['cofins_aliquota'] != new_cofins_aliquota
-                    icms_changed = original_ncm_item_data['icms_aliquota'] != new_icms_aliquota
-                    
-                    if desc_changed or ii_changed or ipi_changed or pis_changed or cofins_changed or icms_changed:
-                        if db_utils.adicionar_ou_atualizar_ncm_item(
-                            ncm_code_clean,
-                            new_descricao_item,
-                            new_ii_aliquota,
-                            new_ipi_aliquota,
-                            new_pis_aliquota,
-                            new_cofins_aliquota,
-                            new_icms_aliquota
-                        ):
-                            st.success(f"Item NCM '{edited_row_dict['Código NCM']}' atualizado com sucesso!")
-                        else:
-                            st.error(f"Erro ao atualizar o item NCM '{edited_row_dict['Código NCM']}'.")
+            if itens_alterados:
+                if db_utils.adicionar_ou_atualizar_ncm_itens_em_lote(itens_alterados):
+                    st.success(f"{len(itens_alterados)} itens NCM atualizados com sucesso!")
+                else:
+                    st.error("Erro ao atualizar os itens NCM alterados.")
             st.rerun() # Recarrega a página para refletir as atualizações
 
         # Opção para deletar itens
@@ -0,0 +1,210 @@
+"""
+Perfilador por amostragem das páginas do app, para uso dos administradores.
+
+Enquanto a função de uma página roda, uma thread auxiliar lê a pilha da thread do script a cada
+INTERVALO_AMOSTRAGEM_S (sys._current_frames) e conta as pilhas observadas a partir da função da
+página. Os últimos PERFIS_POR_PAGINA perfis de cada página ficam em memória no processo; deles saem a
+tabela de funções mais custosas, o flame graph em HTML e as pilhas no formato "colapsado"
+(uma linha 'a;b;c N'), aceito pelo speedscope e pelo flamegraph.pl. Nada aqui usa Streamlit.
+"""
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_AMOSTRAGEM_S = 0.005
+PERFIS_POR_PAGINA = 10
+ALTURA_LINHA_FLAME_PX = 18
+# Quadros mais estreitos que isso (fração das amostras) não são desenhados no flame graph
+LARGURA_MINIMA_FLAME = 0.002
+
+_app_root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_lock = threading.Lock()
+_perfis: Dict[str, deque] = {}
+
+
+class _Amostrador(threading.Thread):
+    """Conta as pilhas da thread alvo, cortadas na função raiz (amostras fora dela são descartadas)."""
+
+    def __init__(self, thread_id: int, codigo_raiz, intervalo_s: float):
+        super().__init__(name="perfilador_paginas", daemon=True)
+        self.thread_id = thread_id
+        self.codigo_raiz = codigo_raiz
+        self.intervalo_s = intervalo_s
+        self.pilhas: Counter = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo_s):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                pilha.append(frame.f_code)
+                if frame.f_code is self.codigo_raiz:
+                    break
+                frame = frame.f_back
+            if frame is not None or self.codigo_raiz is None:
+                pilha.reverse()
+                self.pilhas[tuple(pilha)] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+@lru_cache(maxsize=8192)
+def _nome_funcao(codigo) -> str:
+    """'app_logic/custo_item_page.py:show_page' para código do app; 'pacote/arquivo.py:funcao' para bibliotecas."""
+    caminho = os.path.abspath(codigo.co_filename)
+    if caminho.startswith(_app_root_path + os.sep):
+        caminho = os.path.relpath(caminho, _app_root_path)
+    elif "site-packages" in caminho:
+        caminho = caminho.split("site-packages" + os.sep, 1)[1]
+    else:
+        caminho = os.path.basename(caminho)
+    return f"{caminho.replace(os.sep, '/')}:{codigo.co_qualname}"
+
+
+@contextmanager
+def perfilar(pagina: str, funcao: Optional[Callable] = None, ativo: bool = True, intervalo_s: float = INTERVALO_AMOSTRAGEM_S):
+    """
+    Perfila o bloco (a chamada da função da página) e guarda o resultado entre os perfis da página.
+    Com ativo=False não faz nada. O perfil é guardado mesmo se a página interromper o script (st.rerun, st.stop).
+    """
+    if not ativo:
+        yield
+        return
+    codigo_raiz = getattr(funcao, '__code__', None)
+    amostrador = _Amostrador(threading.get_ident(), codigo_raiz, intervalo_s)
+    inicio = time.perf_counter()
+    amostrador.start()
+    try:
+        yield
+    finally:
+        duracao_s = time.perf_counter() - inicio
+        amostrador.parar()
+        pilhas = Counter()
+        for pilha, amostras in amostrador.pilhas.items():
+            pilhas[tuple(_nome_funcao(codigo) for codigo in pilha)] += amostras
+        perfil = {
+            'pagina': pagina, 'momento': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'duracao_s': duracao_s,
+            'intervalo_s': intervalo_s, 'amostras': sum(pilhas.values()), 'pilhas': dict(pilhas),
+        }
+        with _lock:
+            _perfis.setdefault(pagina, deque(maxlen=PERFIS_POR_PAGINA)).append(perfil)
+        logger.info(f"Perfil da página '{pagina}': {duracao_s * 1000:.0f} ms, {perfil['amostras']} amostra(s).")
+
+
+def get_paginas_perfiladas() -> List[str]:
+    with _lock:
+        return sorted(_perfis)
+
+
+def get_perfis(pagina: str) -> List[Dict[str, Any]]:
+    """Perfis guardados da página, do mais antigo para o mais recente."""
+    with _lock:
+        return list(_perfis.get(pagina, ()))
+
+
+def limpar():
+    with _lock:
+        _perfis.clear()
+
+
+def _ms_por_amostra(perfil: Dict[str, Any]) -> float:
+    # As amostras cobrem só o tempo dentro da função da página; a duração medida distribui o tempo real entre elas
+    return perfil['duracao_s'] * 1000 / perfil['amostras'] if perfil['amostras'] else 0.0
+
+
+def top_funcoes(perfil: Dict[str, Any], limite: int = 50) -> List[Dict[str, Any]]:
+    """Funções por tempo total (inclusive chamadas internas) e tempo próprio (no topo da pilha), estimados pelas amostras."""
+    proprias: Counter = Counter()
+    totais: Counter = Counter()
+    for pilha, amostras in perfil['pilhas'].items():
+        if not pilha:
+            continue
+        proprias[pilha[-1]] += amostras
+        for funcao in set(pilha):  # recursão conta uma vez por amostra
+            totais[funcao] += amostras
+    total = perfil['amostras'] or 1
+    ms = _ms_por_amostra(perfil)
+    linhas = [
+        {
+            'funcao': funcao, 'tempo_total_ms': round(amostras * ms, 1), 'tempo_proprio_ms': round(proprias[funcao] * ms, 1),
+            'total_%': round(100 * amostras / total, 1), 'proprio_%': round(100 * proprias[funcao] / total, 1),
+            'amostras': amostras,
+        }
+        for funcao, amostras in totais.items()
+    ]
+    linhas.sort(key=lambda linha: (linha['tempo_total_ms'], linha['tempo_proprio_ms']), reverse=True)
+    return linhas[:limite]
+
+
+def pilhas_colapsadas(perfil: Dict[str, Any]) -> str:
+    """Pilhas no formato colapsado ('raiz;...;folha amostras'), uma por linha."""
+    return "\n".join(f"{';'.join(pilha)} {amostras}" for pilha, amostras in sorted(perfil['pilhas'].items()) if pilha)
+
+
+def _arvore(perfil: Dict[str, Any]) -> Dict[str, Any]:
+    raiz = {'nome': perfil['pagina'], 'valor': 0, 'filhos': {}}
+    for pilha, amostras in perfil['pilhas'].items():
+        raiz['valor'] += amostras
+        no = raiz
+        for funcao in pilha:
+            no = no['filhos'].setdefault(funcao, {'nome': funcao, 'valor': 0, 'filhos': {}})
+            no['valor'] += amostras
+    return raiz
+
+
+def _cor(nome: str) -> str:
+    # Cor estável por arquivo: tons quentes para o código do app, frios para bibliotecas
+    arquivo = nome.split(':', 1)[0]
+    matiz = zlib.crc32(arquivo.encode('utf-8')) % 40
+    if arquivo.startswith(('app_logic/', 'db_utils', 'followup_db_manager', 'app_main')):
+        return f"hsl({10 + matiz}, 85%, 62%)"
+    return f"hsl({190 + matiz}, 45%, 68%)"
+
+
+def flame_graph_html(perfil: Dict[str, Any]) -> Tuple[str, int]:
+    """HTML autocontido do flame graph (raiz no topo) e a altura em pixels necessária para exibi-lo."""
+    raiz = _arvore(perfil)
+    total = raiz['valor']
+    if not total:
+        return "<p>Nenhuma amostra coletada.</p>", 40
+    ms = _ms_por_amostra(perfil)
+    blocos = []
+    profundidade_maxima = 0
+    pendentes = [(raiz, 0, 0)]  # (nó, profundidade, amostras à esquerda)
+    while pendentes:
+        no, profundidade, esquerda = pendentes.pop()
+        if no['valor'] / total < LARGURA_MINIMA_FLAME:
+            continue
+        profundidade_maxima = max(profundidade_maxima, profundidade)
+        nome = html.escape(no['nome'])
+        dica = f"{nome} — {no['valor'] * ms:.1f} ms ({100 * no['valor'] / total:.1f}%)"
+        blocos.append(
+            f'<div class="f" title="{dica}" style="left:{100 * esquerda / total:.4f}%;width:{100 * no["valor"] / total:.4f}%;'
+            f'top:{profundidade * ALTURA_LINHA_FLAME_PX}px;background:{_cor(no["nome"])}">{nome}</div>'
+        )
+        for filho in sorted(no['filhos'].values(), key=lambda filho: filho['nome']):
+            pendentes.append((filho, profundidade + 1, esquerda))
+            esquerda += filho['valor']
+    altura = (profundidade_maxima + 1) * ALTURA_LINHA_FLAME_PX
+    estilo = (
+        "<style>body{margin:0}.fg{position:relative;width:100%;font:11px monospace}"
+        f".f{{position:absolute;height:{ALTURA_LINHA_FLAME_PX - 1}px;line-height:{ALTURA_LINHA_FLAME_PX - 1}px;"
+        "overflow:hidden;white-space:nowrap;text-overflow:ellipsis;box-sizing:border-box;padding:0 3px;"
+        "border-right:1px solid #fff;color:#222;cursor:default}.f:hover{filter:brightness(0.85)}</style>"
+    )
+    return f'{estilo}<div class="fg" style="height:{altura}px">{"".join(blocos)}</div>', altura + 10
@@ -0,0 +1,56 @@
+"""
+Registro das páginas do app com importação sob demanda.
+
+Cada página é registrada pelo nome do módulo e da função de exibição; o módulo só é importado na
+primeira navegação para a página (ou no primeiro uso de uma função dele), de modo que a tela de login
+não carrega as bibliotecas de PDF, Excel, Google Sheets ou mapas. O tempo da primeira importação de
+cada módulo fica registrado em get_tempos_importacao().
+"""
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Optional, Dict, Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class Pagina(NamedTuple):
+    modulo: str
+    funcao: str
+
+
+_lock = threading.Lock()
+_tempos_importacao: Dict[str, float] = {}
+
+
+def carregar_modulo(nome_modulo: str):
+    """Importa o módulo (uma vez por processo) e registra o tempo da primeira importação."""
+    # Sempre passa por import_module: se outra sessão ainda estiver importando o módulo, ele já está em
+    # sys.modules, mas incompleto, e import_module espera o fim da importação (lock do próprio módulo).
+    ja_importado = nome_modulo in sys.modules
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nome_modulo)
+    if not ja_importado:
+        duracao = time.perf_counter() - inicio
+        with _lock:
+            registrado = nome_modulo not in _tempos_importacao
+            if registrado:
+                _tempos_importacao[nome_modulo] = duracao
+        if registrado:
+            logger.info(f"Módulo '{nome_modulo}' importado em {duracao:.3f}s.")
+    return modulo
+
+
+def obter_funcao(pagina: Optional[Pagina]) -> Optional[Callable]:
+    """Função de exibição da página (importando o módulo se necessário), ou None para páginas sem tela."""
+    if pagina is None:
+        return None
+    return getattr(carregar_modulo(pagina.modulo), pagina.funcao)
+
+
+def get_tempos_importacao() -> Dict[str, float]:
+    """Tempo (s) da primeira importação de cada módulo carregado pelo registro."""
+    with _lock:
+        return dict(_tempos_importacao)
@@ -1,176 +1,33 @@
 import streamlit as st
-import pdfplumber
 import re
 import pandas as pd
 from io import BytesIO
 import tempfile
 import os
-import base64
+from app_logic.utils import set_background_image
 # Importar o db_utils para buscar descrições de produtos (assumindo que este arquivo existe e funciona)
 import db_utils
+from app_logic import pdf_extraction
 
 
-# --- Função para definir imagem de fundo com opacidade (copiada de app_main.py) ---
-def set_background_image(image_path):
-    try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode()
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background-color: transparent !important; /* Garante que o fundo do app seja transparente */
-            }}
-            .stApp::before {{
-                content: "";
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background-image: url("data:image/png;base64,{encoded_string}");
-                background-size: cover;
-                background-position: center;
-                background-repeat: no-repeat;
-                background-attachment: fixed;
-                opacity: 0.20; /* Opacidade ajustada para 20% */
-                z-index: -1; /* Garante que o pseudo-elemento fique atrás do conteúdo */
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except FileNotFoundError:
-        st.warning(f"A imagem de fundo não foi encontrada no caminho: {image_path}")
-    except Exception as e:
-        st.error(f"Erro ao carregar a imagem de fundo: {e}")
-        
-def find_table_bbox_by_markers(pdf_page, area_start_marker_pattern, area_end_marker_pattern, table_header_pattern, table_footer_pattern):
+def find_table_bbox_by_markers(pdf_page, area_start_marker_pattern, area_end_marker_pattern, table_header_pattern, table_footer_pattern, line_index=None):
     """
     Tenta encontrar a bounding box (bbox) para uma seção de tabela usando marcadores de início e fim da área,
     e padrões para o cabeçalho e rodapé da tabela dentro dessa área.
+    Aceita um índice de linhas já construído (pdf_extraction.PageTextIndex) para não reextrair as palavras.
     Retorna uma tupla (x0, y0, x1, y1) ou None.
     """
-    all_words = pdf_page.extract_words()
-    
-    # 1. Encontrar a área geral de busca usando area_start_marker_pattern e area_end_marker_pattern
-    broad_search_start_y = 0
-    start_section_pattern = re.compile(area_start_marker_pattern, re.IGNORECASE)
-    # Reconstruct lines for better marker detection
-    lines_by_y_group = {}
-    for word_obj in all_words:
-        line_y_group_key = int(word_obj['top'] // 3) * 3 
-        if line_y_group_key not in lines_by_y_group:
-            lines_by_y_group[line_y_group_key] = []
-        lines_by_y_group[line_y_group_key].append(word_obj)
-
-    sorted_line_keys = sorted(lines_by_y_group.keys())
-
-    for line_key in sorted_line_keys:
-        words_in_current_line = sorted(lines_by_y_group[line_key], key=lambda w: w['x0'])
-        full_line_text = " ".join([w['text'] for w in words_in_current_line])
-        
-        if start_section_pattern.search(full_line_text):
-            broad_search_start_y = max(broad_search_start_y, min(w['bottom'] for w in words_in_current_line)) # Get the bottom of the marker line
-            break
-    
-    broad_search_end_y = pdf_page.height
-    end_section_pattern = re.compile(area_end_marker_pattern, re.IGNORECASE)
-    # Search for end marker after start marker has been found
-    for line_key in sorted_line_keys:
-        words_in_current_line = sorted(lines_by_y_group[line_key], key=lambda w: w['x0'])
-        full_line_text = " ".join([w['text'] for w in words_in_current_line])
-        current_line_top = min(w['top'] for w in words_in_current_line) # Top of current line
-        
-        if current_line_top > broad_search_start_y and end_section_pattern.search(full_line_text):
-            broad_search_end_y = min(broad_search_end_y, max(w['top'] for w in words_in_current_line)) # Get the top of the marker line
-            break
-
-    # If section markers were not found, or area is invalid
-    if broad_search_start_y == 0 and start_section_pattern.pattern != r"": 
-         st.warning(f"Marcador de início de seção '{area_start_marker_pattern}' não encontrado.")
-         return None
-    if broad_search_end_y == pdf_page.height and end_section_pattern.pattern != r"": 
-        st.warning(f"Marcador de fim de seção '{area_end_marker_pattern}' não encontrado.")
-        # Attempt to proceed without end marker if it's the end of the page
-        broad_search_end_y = pdf_page.height # Set to end of page as fallback
-    
-    # Ensure broad search area is valid and has minimum height
-    if broad_search_end_y <= broad_search_start_y + 10: 
-        st.warning(f"Área de busca ampla inválida para marcadores de seção: start_y={broad_search_start_y}, end_y={broad_search_end_y}. Marcadores muito próximos ou invertidos.")
-        return None
-
-    # Filter words to the broad search area
-    words_in_broad_area = [w for w in all_words if w['top'] >= broad_search_start_y and w['bottom'] <= broad_search_end_y]
-    if not words_in_broad_area: 
-        st.warning(f"Nenhuma palavra encontrada na área de busca ampla após filtrar por seção.")
-        return None
-
-    # 2. Reconstruct lines and find the table header and footer within the broad area
-    table_header_y = None 
-    table_footer_y = None 
-
-    header_pattern = re.compile(table_header_pattern, re.IGNORECASE)
-    footer_pattern = re.compile(table_footer_pattern, re.IGNORECASE)
-
-    lines_by_y_group_filtered = {}
-    for word_obj in words_in_broad_area:
-        line_y_group_key = int(word_obj['top'] // 3) * 3 
-        if line_y_group_key not in lines_by_y_group_filtered:
-            lines_by_y_group_filtered[line_y_group_key] = []
-        lines_by_y_group_filtered[line_y_group_key].append(word_obj)
-
-    sorted_line_keys_filtered = sorted(lines_by_y_group_filtered.keys())
-
-    for line_key in sorted_line_keys_filtered:
-        words_in_current_line = sorted(lines_by_y_group_filtered[line_key], key=lambda w: w['x0'])
-        full_line_text = " ".join([w['text'] for w in words_in_current_line])
-        
-        current_line_top = min(w['top'] for w in words_in_current_line)
-        current_line_bottom = max(w['bottom'] for w in words_in_current_line)
-
-        # Search for table header
-        if header_pattern.search(full_line_text):
-            table_header_y = current_line_top
-        
-        # Search for table footer *after* header found
-        if table_header_y is not None and current_line_top > table_header_y:
-            if footer_pattern.search(full_line_text):
-                table_footer_y = current_line_bottom
-                break 
-
-    # 3. Define the final bbox
-    if table_header_y is None:
-        st.warning(f"Cabeçalho da tabela '{table_header_pattern}' não encontrado dentro da área de busca ampla. Não é possível determinar a bbox da tabela.")
-        return None
-    
-    # Fallback if footer is not found, use the end of the broad search area
-    if table_footer_y is None:
-        st.warning(f"Rodapé da tabela '{table_footer_pattern}' não encontrado. Usando o limite inferior da área de busca ampla como rodapé da tabela.")
-        table_footer_y = broad_search_end_y 
-
-    x0 = pdf_page.bbox[0] 
-    x1 = pdf_page.bbox[2]
-    
-    # Add buffers to capture content accurately.
-    # We want to start slightly above the header and end slightly below the footer.
-    buffer_top = 15  # Increased buffer for header
-    buffer_bottom = 15 # Increased buffer for footer
-
-    y0_final = max(0, table_header_y - buffer_top)
-    y1_final = min(pdf_page.height, table_footer_y + buffer_bottom)
-
-    # Ensure final calculated area is valid and has a minimum height
-    if y1_final <= y0_final + 5: 
-        st.warning(f"Área da tabela calculada muito pequena ou inválida para padrões '{table_header_pattern}' e '{table_footer_pattern}': y0={y0_final}, y1={y1_final}. Tentando usar uma área mais geral para a tabela.")
-        # Fallback to a more general area if precise area is invalid, but still within broad search
-        y0_final = broad_search_start_y + 10 # Start slightly after broad section marker
-        y1_final = broad_search_end_y - 10   # End slightly before broad section end marker
-        if y1_final <= y0_final + 5: 
-            st.error("Falha ao determinar uma área de tabela válida mesmo com fallback geral.")
-            return None 
-
-    return (x0, y0_final, x1, y1_final)
+    if line_index is None:
+        line_index = pdf_extraction.PageTextIndex(pdf_page.extract_words())
+    avisos = []
+    bbox = pdf_extraction.find_table_bbox_in_lines(
+        line_index, pdf_page.bbox, pdf_page.height,
+        area_start_marker_pattern, area_end_marker_pattern,
+        table_header_pattern, table_footer_pattern, avisos=avisos
+    )
+    for aviso in avisos:
+        st.warning(aviso)
+    return bbox
 
 
 def extract_invoice_data(pdf_page):
@@ -178,32 +35,66 @@ def extract_invoice_data(pdf_page):
     Extrai informações gerais da fatura da página PDF.
     Assume que essas informações estão em posições relativamente fixas ou seguem padrões de texto.
     """
-    text = pdf_page.extract_text()
-    data = {}
+    return pdf_extraction.extract_invoice_data_from_text(pdf_page.extract_text() or "")
+
+
+def extract_products_from_pages(paginas, section_keyword, invoice_fornecedor="N/A"):
+    """
+    Junta as tabelas de uma seção (PAID PRODUCTS / FREE OF CHARGE PRODUCTS) encontradas em todas as páginas
+    extraídas por pdf_extraction.extract_pdf_pages e as converte em itens.
+    Os avisos de marcadores só são exibidos quando a seção não foi localizada em nenhuma página.
+    """
+    tabelas = []
+    paginas_com_secao = []
+    for pagina in paginas:
+        secao = pagina['sections'].get(section_keyword, {})
+        if secao.get('bbox'):
+            paginas_com_secao.append(pagina['page_number'] + 1)
+            tabelas.extend(secao.get('tables') or [])
+
+    if not paginas_com_secao:
+        primeira = paginas[0]['sections'].get(section_keyword, {}) if paginas else {}
+        for aviso in primeira.get('avisos', []):
+            st.warning(aviso)
+        st.warning(f"Área de {section_keyword} não pôde ser determinada por marcadores de texto em nenhuma página.")
+        return []
+
+    if not tabelas:
+        st.warning(f"pdfplumber não encontrou tabelas na área especificada para {section_keyword} (páginas {paginas_com_secao}).")
+        return []
+
+    st.info(f"pdfplumber encontrou {len(tabelas)} tabela(s) para {section_keyword} nas páginas {paginas_com_secao}.")
+    return extract_products_table_from_pdfplumber_tables(tabelas, section_keyword=section_keyword, invoice_fornecedor=invoice_fornecedor)
+
+
+# Define as colunas esperadas na saída final e seus mapeamentos de sinônimos/variantes
+# Isso ajuda a flexibilizar a detecção de cabeçalhos
+EXPECTED_HEADERS_MAPPING = {
+    "EXP ou Fabricante": ["EXP ou Fabricante", "EXP", "Fabricante", "Exporter", "Manufacturer"], 
+    "Código Interno": ["Código Interno", "COD ERP", "ERP Code", "Internal Code"],
+    "Fornecedor": ["Fornecedor", "Supplier"],
+    "Invoice N#": ["Invoice N#", "Invoice No.", "Invoice Number"],
+    "NCM": ["NCM", "HS Code"],
+    "Cobertura": ["Cobertura", "Coverage"],
+    "Denominação do produto": ["Denominação do produto", "DESCRIPTION", "Product Name"],
+    "SKU": ["SKU", "Part No."],
+    "Detalhamento complementar do produto": ["Detalhamento complementar do produto", "MODEL", "Description Model", "Detailed Description"],
+    "Qtde": ["Qtde", "QTY", "Quantity", "QTY. (PCS)"],
+    "Peso Unitário": ["Peso Unitário", "Unit Weight", "GW/NW (KGS)", "Net Weight (KGS)"], 
+    "Valor Unitário": ["Valor Unitário", "UNIT PRICE (USD)", "Unit Price"],
+    "Valor total do item": ["Valor total do item", "AMOUNT (USD)", "Amount"] 
+}
+
+# Inverte o mapeamento para encontrar a chave interna a partir de um cabeçalho extraído do PDF (construído uma vez)
+_REVERSE_HEADER_MAPPING = {
+    variant.lower(): internal_header
+    for internal_header, pdf_variants in EXPECTED_HEADERS_MAPPING.items()
+    for variant in pdf_variants
+}
+
+# Linhas de total das tabelas de produtos (ignoradas na extração)
+_RE_LINHA_TOTAL = re.compile(r"TOTAL QUANTITY|TOTAL AMOUNT|SAY TOTAL|SUBTOTAL")
 
-    # Extrair Invoice No.
-    invoice_no_match = re.search(r"Invoice No\.:\s*([A-Za-z0-9-]+)", text)
-    if invoice_no_match: 
-        data['Invoice N#'] = invoice_no_match.group(1).strip()
-    else:
-        invoice_no_match = re.search(r"Invoice No\.:\s*\"\s*([A-Za-z0-9-]+)\s*\"", text)
-        if invoice_no_match:
-            data['Invoice N#'] = invoice_no_match.group(1).strip()
-        else:
-            data['Invoice N#'] = "N/A"
-
-    # Extrair Fornecedor (da primeira linha, assumindo que é o nome da empresa)
-    lines = text.split('\n')
-    if lines:
-        data['Fornecedor'] = lines[0].strip()
-        # Adjusted logic to capture manufacturer from "Manufacturer: "
-        manufacturer_match = re.search(r"Manufacturer:\s*(.*)", text, re.IGNORECASE)
-        if manufacturer_match:
-            data['Fornecedor'] = manufacturer_match.group(1).strip()
-        elif "LTD" not in data['Fornecedor'].upper() and len(lines) > 1:
-            if "LTD" in lines[1].upper():
-                data['Fornecedor'] = lines[1].strip()
-    return data
 
 def extract_products_table_from_pdfplumber_tables(pdfplumber_tables, section_keyword="PAID PRODUCTS", invoice_fornecedor="N/A"):
     """
@@ -211,30 +102,6 @@ def extract_products_table_from_pdfplumber_tables(pdfplumber_tables, section_key
     """
     product_data = []
     
-    # Define as colunas esperadas na saída final e seus mapeamentos de sinônimos/variantes
-    # Isso ajuda a flexibilizar a detecção de cabeçalhos
-    expected_headers_mapping = {
-        "EXP ou Fabricante": ["EXP ou Fabricante", "EXP", "Fabricante", "Exporter", "Manufacturer"], 
-        "Código Interno": ["Código Interno", "COD ERP", "ERP Code", "Internal Code"],
-        "Fornecedor": ["Fornecedor", "Supplier"],
-        "Invoice N#": ["Invoice N#", "Invoice No.", "Invoice Number"],
-        "NCM": ["NCM", "HS Code"],
-        "Cobertura": ["Cobertura", "Coverage"],
-        "Denominação do produto": ["Denominação do produto", "DESCRIPTION", "Product Name"],
-        "SKU": ["SKU", "Part No."],
-        "Detalhamento complementar do produto": ["Detalhamento complementar do produto", "MODEL", "Description Model", "Detailed Description"],
-        "Qtde": ["Qtde", "QTY", "Quantity", "QTY. (PCS)"],
-        "Peso Unitário": ["Peso Unitário", "Unit Weight", "GW/NW (KGS)", "Net Weight (KGS)"], 
-        "Valor Unitário": ["Valor Unitário", "UNIT PRICE (USD)", "Unit Price"],
-        "Valor total do item": ["Valor total do item", "AMOUNT (USD)", "Amount"] 
-    }
-
-    # Inverte o mapeamento para encontrar a chave interna a partir de um cabeçalho extraído do PDF
-    reverse_header_mapping = {}
-    for internal_header, pdf_variants in expected_headers_mapping.items():
-        for variant in pdf_variants:
-            reverse_header_mapping[variant.lower()] = internal_header 
-
     for table in pdfplumber_tables:
         if not table or len(table) < 2:
             continue
@@ -255,15 +122,10 @@ def extract_products_table_from_pdfplumber_tables(pdfplumber_tables, section_key
             current_matched_headers = []
             temp_headers = []
             for cell_value in row_elements:
-                found_match = False
-                for expected_internal_header, variants in expected_headers_mapping.items():
-                    if cell_value.lower() in [v.lower() for v in variants]:
-                        current_matched_headers.append(expected_internal_header) 
-                        temp_headers.append(cell_value) 
-                        found_match = True
-                        break
-                if not found_match and cell_value:
-                    temp_headers.append(cell_value)
+                expected_internal_header = _REVERSE_HEADER_MAPPING.get(cell_value.lower())
+                if expected_internal_header:
+                    current_matched_headers.append(expected_internal_header)
+                temp_headers.append(cell_value)
 
             if len(current_matched_headers) > max_matched_headers:
                 max_matched_headers = len(current_matched_headers)
@@ -285,7 +147,7 @@ def extract_products_table_from_pdfplumber_tables(pdfplumber_tables, section_key
                 continue
             
             row_text_upper = " ".join([str(c).strip() for c in row if c is not None]).upper()
-            if "TOTAL QUANTITY" in row_text_upper or "TOTAL AMOUNT" in row_text_upper or "SAY TOTAL" in row_text_upper or "SUBTOTAL" in row_text_upper:
+            if _RE_LINHA_TOTAL.search(row_text_upper):
                 st.info(f"Linha de total detectada e ignorada: {row_text_upper}")
                 continue
 
@@ -294,8 +156,7 @@ def extract_products_table_from_pdfplumber_tables(pdfplumber_tables, section_key
                 if col_idx >= len(row) or row[col_idx] is None:
                     continue 
 
-                header_pdf_lower = header_pdf_raw.lower()
-                mapped_header = reverse_header_mapping.get(header_pdf_lower)
+                mapped_header = _REVERSE_HEADER_MAPPING.get(header_pdf_raw.lower())
                 
                 # Only include columns that are explicitly mapped
                 if mapped_header:
@@ -363,7 +224,7 @@ def process_product_item(item, section_keyword, invoice_fornecedor):
 
 def show_pdf_analyzer_page():
     background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
-    set_background_image(background_image_path)
+    set_background_image(background_image_path, opacity=0.20)
     
     st.subheader("Análise de Faturas/Packing List PDF")
     st.info("Faça o upload de um arquivo PDF (Fatura Comercial ou Packing List) para extrair e analisar as informações.")
@@ -372,75 +233,23 @@ def show_pdf_analyzer_page():
 
     if uploaded_file is not None:
         try:
-            with pdfplumber.open(uploaded_file) as pdf:
-                first_page = pdf.pages[0]
-                second_page = pdf.pages[1] if len(pdf.pages) > 1 else None
-
-                invoice_info = extract_invoice_data(first_page)
+            # Análise em cache pelo hash do arquivo: reruns e novos uploads do mesmo PDF não refazem o layout
+            with st.spinner("Extraindo páginas do PDF..."):
+                analise_pdf = pdf_extraction.analyze_pdf(uploaded_file.getvalue())
+            paginas = analise_pdf['pages']
+            if not paginas:
+                st.warning("O PDF não possui páginas.")
+            else:
+                invoice_info = analise_pdf['invoice']
                 invoice_fornecedor = invoice_info.get('Fornecedor', 'N/A')
                 invoice_n_fat = invoice_info.get('Invoice N#', 'N/A')
 
-                # --- Extração de Produtos Pagos usando pdfplumber com bboxes refinadas ---
-                paid_bbox = find_table_bbox_by_markers(
-                    first_page,
-                    area_start_marker_pattern=r"PAID\s+PRODUCTS|PRODUTOS\s+PAGOS", 
-                    area_end_marker_pattern=r"PRODUTOS\s+NÃO\s+PAGOS|FREE\s+OF\s+CHARGE\s+PRODUCTS|TOTAIS\s+GERAIS|VALOR\s+TOTAL|Say\s+Total\s+Amount|TOTAL\s+QUANTITY|TOTAL\s+AMOUNT|\n\s*\d+\s*$", 
-                    table_header_pattern=r"EXP\s+ou\s+Fabricante|COD\s+ERP|DESCRIPTION|MODEL|SKU|QTY|UNIT\s+PRICE|AMOUNT|Código\s+Interno|Denominação\s+do\s+produto", 
-                    table_footer_pattern=r".*(total\s+quantity|TOTAL\s+AMOUNT|Say\s+Total\s+Amount|SUBTOTAL|VALOR\s+TOTAL|\n\s*\d+\s*$).*" 
-                )
-                
-                paid_products_raw = []
-                if paid_bbox:
-                    st.write(f"Tentando extrair PRODUTOS PAGOS com pdfplumber na área: {paid_bbox}")
-                    paid_page_region = first_page.crop(paid_bbox)
-                    table_settings_paid = {
-                        "vertical_strategy": "lines", 
-                        "horizontal_strategy": "lines", 
-                        "snap_tolerance": 3,
-                        "text_tolerance": 1,
-                        "intersection_tolerance": 3
-                    }
-                    pdfplumber_paid_tables = paid_page_region.extract_tables(table_settings_paid)
-                    if pdfplumber_paid_tables:
-                        st.info(f"pdfplumber encontrou {len(pdfplumber_paid_tables)} tabela(s) para PRODUTOS PAGOS.")
-                        paid_products_raw = extract_products_table_from_pdfplumber_tables(pdfplumber_paid_tables, section_keyword="PAID PRODUCTS", invoice_fornecedor=invoice_fornecedor)
-                    else:
-                        st.warning("pdfplumber não encontrou tabelas na área especificada para PRODUTOS PAGOS.")
-                else:
-                    st.warning("Área de PRODUTOS PAGOS não pôde ser determinada por marcadores de texto para pdfplumber.")
-
-                # --- Extração de Produtos Não Pagos (GRATUITOS / PEÇAS DE REPOSIÇÃO) ---
-                free_bbox = find_table_bbox_by_markers(
-                    first_page,
-                    area_start_marker_pattern=r"FREE\s+OF\s+CHARGE\s+PRODUCTS|PRODUTOS\s+NÃO\s+PAGOS", 
-                    area_end_marker_pattern=r"TOTAIS\s+GERAIS|VALOR\s+TOTAL|Say\s+Total\s+Amount.*SIXTY\s+ONLY|Say\s+Total\s+Amount|TOTAL\s+QUANTITY|TOTAL\s+AMOUNT|\n\s*\d+\s*$", 
-                    table_header_pattern=r"EXP\s+ou\s+Fabricante|Código\s+Interno|Fornecedor|Invoice\s+N#|NCM|Cobertura|Denominação\s+do\s+produto|SKU|Detalhamento\s+complementar\s+do\s+produto", 
-                    table_footer_pattern=r".*(total\s+quantity|TOTAL\s+AMOUNT|Say\s+Total\s+Amount|SUBTOTAL|VALOR\s+TOTAL|\n\s*\d+\s*$).*" 
-                )
-
-                free_products_raw = []
-                if free_bbox:
-                    st.write(f"Tentando extrair PRODUTOS NÃO PAGOS com pdfplumber na área: {free_bbox}")
-                    free_page_region = first_page.crop(free_bbox)
-                    table_settings_free = { 
-                        "vertical_strategy": "lines",
-                        "horizontal_strategy": "lines",
-                        "snap_tolerance": 3,
-                        "text_tolerance": 1,
-                        "intersection_tolerance": 3
-                    }
-                    pdfplumber_free_tables = free_page_region.extract_tables(table_settings_free)
-                    if pdfplumber_free_tables:
-                        st.info(f"pdfplumber encontrou {len(pdfplumber_free_tables)} tabela(s) para PRODUTOS NÃO PAGOS.")
-                        free_products_raw = extract_products_table_from_pdfplumber_tables(pdfplumber_free_tables, section_keyword="FREE OF CHARGE PRODUCTS", invoice_fornecedor=invoice_fornecedor)
-                    else:
-                        st.warning("pdfplumber não encontrou tabelas na área especificada para PRODUTOS NÃO PAGOS.")
-                else:
-                    st.warning("Área de PRODUTOS NÃO PAGOS não pôde ser determinada por marcadores de texto para pdfplumber.")
+                # --- Extração de Produtos Pagos e Não Pagos em todas as páginas ---
+                paid_products_raw = extract_products_from_pages(paginas, "PAID PRODUCTS", invoice_fornecedor=invoice_fornecedor)
+                free_products_raw = extract_products_from_pages(paginas, "FREE OF CHARGE PRODUCTS", invoice_fornecedor=invoice_fornecedor)
 
                 # Tenta extrair NCM da invoice info (se não encontrado na tabela de produtos)
-                ncm_invoice_match = re.search(r"NCM/HS Code Principal:\s*(\d+)", first_page.extract_text())
-                ncm_from_invoice = ncm_invoice_match.group(1) if ncm_invoice_match else "N/A"
+                ncm_from_invoice = analise_pdf['ncm_principal']
 
                 # Preencher NCM, Fornecedor e Invoice N# para itens se não foi extraído da tabela ou se é "N/A"
                 for item_list in [paid_products_raw, free_products_raw]:
@@ -563,62 +372,23 @@ def show_pdf_analyzer_page():
                     total_invoice_amount = calculated_total_paid + calculated_total_free
 
 
-                # Extrair totais de Qtde e Peso da segunda página, se disponível, ou somar do DataFrame
+                # Extrair totais de Qtde e Peso da packing list (última página com linha de totais), ou somar do DataFrame
                 total_qty_text = "N/A"
                 total_peso_liquido_text = "N/A"
 
-                if second_page:
-                    second_page_text = second_page.extract_text()
-
-                    # Extrair tabelas da segunda página
-                    pdfplumber_second_page_tables = second_page.extract_tables({
-                        "vertical_strategy": "lines",
-                        "horizontal_strategy": "lines"
-                    })
-
-                    # Inicializar variável para armazenar candidatos
-                    total_row_candidate_list = []
-
-                    # Verificar se existem tabelas
-                    if pdfplumber_second_page_tables and len(pdfplumber_second_page_tables) > 0:
-                        # Pegar a última tabela
-                        last_table = pdfplumber_second_page_tables[-1]
-
-                        # Verificar se a tabela tem conteúdo
-                        if last_table and len(last_table) > 1:
-                            # Iterar pelas linhas da tabela de baixo para cima
-                            for row in reversed(last_table):
-                                if not row:  # Pula linhas vazias
-                                    continue
-                                
-                                # Limpa e verifica células numéricas
-                                numeric_cells = []
-                                for cell in row:
-                                    if cell is not None:
-                                        cell_str = str(cell).strip()
-                                        cell_clean = cell_str.replace(',', '.').replace(' ', '')
-                                        try:
-                                            float(cell_clean)
-                                            numeric_cells.append(cell_clean)
-                                        except ValueError:
-                                            continue
-                                
-                                if len(numeric_cells) >= 3:  # Se encontrou pelo menos 3 números na linha
-                                    total_row_candidate_list = numeric_cells
-                                    break
-
-                        if total_row_candidate_list:
-                            try:
-                                # Tenta converter os valores encontrados
-                                total_qty = float(total_row_candidate_list[0])
-                                total_peso = float(total_row_candidate_list[2])
-                                
-                                total_qty_text = str(int(total_qty))
-                                total_peso_liquido_text = f"{total_peso:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
-                            except (IndexError, ValueError) as e:
-                                st.warning(f"Erro ao processar valores totais: {str(e)}")
-                                total_qty_text = "N/A"
-                                total_peso_liquido_text = "N/A"
+                total_row_candidate_list = next((p['total_row'] for p in reversed(paginas) if p['total_row']), [])
+                if total_row_candidate_list:
+                    try:
+                        # Tenta converter os valores encontrados
+                        total_qty = float(total_row_candidate_list[0])
+                        total_peso = float(total_row_candidate_list[2])
+
+                        total_qty_text = str(int(total_qty))
+                        total_peso_liquido_text = f"{total_peso:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
+                    except (IndexError, ValueError) as e:
+                        st.warning(f"Erro ao processar valores totais: {str(e)}")
+                        total_qty_text = "N/A"
+                        total_peso_liquido_text = "N/A"
 
                 # Fallback se a extração da Packing List falhar ou se não houver segunda página
                 if total_qty_text == "N/A" or total_qty_text == "0":
@@ -691,3 +461,9 @@ def show_pdf_analyzer_page():
             file_name=f"analise_fatura_{st.session_state['invoice_n_fat_for_export']}.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
+
+    st.markdown("---")
+    with st.expander("Ingestão em lote (pasta ou ZIP)"):
+        # Import tardio: pdf_batch_ingestion depende de process_form_page, que importa esta página
+        from app_logic import pdf_batch_ingestion
+        pdf_batch_ingestion.show_batch_ingestion_section()
@@ -0,0 +1,279 @@
+import io
+import os
+import zipfile
+import logging
+from typing import Dict, Any, List, Tuple
+
+import pandas as pd
+import streamlit as st
+
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import followup_db_manager as db_manager
+import db_utils
+
+from app_logic import pdf_extraction
+from app_logic import process_form_page
+
+
+logger = logging.getLogger(__name__)
+
+STATUS_IMPORTADO = "Importado"
+STATUS_SEM_PROCESSO = "Sem processo para a invoice"
+STATUS_AMBIGUO = "Invoice em mais de um processo"
+STATUS_SEM_INVOICE = "Invoice não identificada"
+STATUS_SEM_ITENS = "Nenhum item extraído"
+STATUS_ERRO_EXTRACAO = "Erro na extração"
+STATUS_ERRO_GRAVACAO = "Erro ao gravar itens"
+
+# Pasta do servidor sob a qual a ingestão por pasta é permitida (só administradores; sem ela, a opção não aparece)
+PDF_BATCH_ROOT = os.getenv("PDF_BATCH_ROOT")
+# Limites de um lote, para ZIP e pasta: quantidade de PDFs e soma dos tamanhos lidos para a memória
+MAX_ARQUIVOS_LOTE = 500
+MAX_BYTES_LOTE = 200 * 1024 * 1024
+
+
+def _verificar_limites_lote(quantidade: int, total_bytes: int):
+    """Levanta ValueError se o lote passar de MAX_ARQUIVOS_LOTE arquivos ou MAX_BYTES_LOTE bytes."""
+    if quantidade > MAX_ARQUIVOS_LOTE:
+        raise ValueError(f"o lote tem mais de {MAX_ARQUIVOS_LOTE} PDFs")
+    if total_bytes > MAX_BYTES_LOTE:
+        raise ValueError(f"o lote passa de {MAX_BYTES_LOTE // (1024 * 1024)} MB de PDFs")
+
+
+def read_pdfs_from_zip(zip_bytes: bytes) -> List[Tuple[str, bytes]]:
+    """Lê todos os PDFs de um arquivo ZIP (incluindo subpastas). Retorna [(nome, conteúdo)]."""
+    arquivos = []
+    total_bytes = 0
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                continue
+            # Ignora metadados do macOS incluídos em ZIPs gerados pelo Finder
+            if info.filename.startswith("__MACOSX/"):
+                continue
+            # Confere pelo tamanho declarado antes de descompactar
+            total_bytes += info.file_size
+            _verificar_limites_lote(len(arquivos) + 1, total_bytes)
+            arquivos.append((info.filename, zf.read(info)))
+    return arquivos
+
+
+def resolve_batch_folder(folder: str) -> str:
+    """
+    Resolve o caminho informado (absoluto ou relativo a PDF_BATCH_ROOT) e garante que fique dentro de
+    PDF_BATCH_ROOT, já seguindo links simbólicos. Levanta ValueError se a raiz não estiver configurada
+    ou se o caminho sair dela.
+    """
+    if not PDF_BATCH_ROOT:
+        raise ValueError("a ingestão por pasta não está habilitada (PDF_BATCH_ROOT não configurado)")
+    raiz = os.path.realpath(PDF_BATCH_ROOT)
+    caminho = os.path.realpath(os.path.join(raiz, folder))
+    if os.path.commonpath([raiz, caminho]) != raiz:
+        raise ValueError(f"a pasta deve ficar dentro de {raiz}")
+    return caminho
+
+
+def read_pdfs_from_folder(folder: str) -> List[Tuple[str, bytes]]:
+    """
+    Lê todos os PDFs de uma pasta do servidor (incluindo subpastas). Retorna [(nome relativo, conteúdo)].
+    O chamador valida a pasta com resolve_batch_folder; os limites do lote valem durante a leitura.
+    """
+    arquivos = []
+    total_bytes = 0
+    for raiz, _, nomes in os.walk(folder):
+        for nome in sorted(nomes):
+            if not nome.lower().endswith(".pdf"):
+                continue
+            caminho = os.path.join(raiz, nome)
+            total_bytes += os.path.getsize(caminho)
+            _verificar_limites_lote(len(arquivos) + 1, total_bytes)
+            with open(caminho, "rb") as f:
+                arquivos.append((os.path.relpath(caminho, folder), f.read()))
+    return arquivos
+
+
+# Colunas de process_items (na ordem de db_manager.inserir_itens_processo_em_lote) e as chaves de DEFAULT_ITEM_SCHEMA
+_COLUNAS_ITEM_DB = [
+    ('codigo_interno', 'Código Interno'),
+    ('ncm', 'NCM'),
+    ('cobertura', 'Cobertura'),
+    ('sku', 'SKU'),
+    ('quantidade', 'Quantidade'),
+    ('peso_unitario', 'Peso Unitário'),
+    ('valor_unitario', 'Valor Unitário'),
+    ('valor_total_item', 'Valor total do item'),
+    ('estimativa_ii_br', 'Estimativa_II_BR'),
+    ('estimativa_ipi_br', 'Estimativa_IPI_BR'),
+    ('estimativa_pis_br', 'Estimativa_PIS_BR'),
+    ('estimativa_cofins_br', 'Estimativa_COFINS_BR'),
+    ('estimativa_icms_br', 'Estimativa_ICMS_BR'),
+    ('frete_rateado_usd', 'Frete_Rateado_USD'),
+    ('seguro_rateado_brl', 'Seguro_Rateado_BRL'),
+    ('vlmd_item', 'VLMD_Item'),
+    ('denominacao_produto', 'Denominação do produto'),
+    ('detalhamento_complementar_produto', 'Detalhamento complementar do produto'),
+]
+
+
+def _item_to_db_tuple(item: Dict[str, Any]) -> tuple:
+    """Converte um item no esquema de DEFAULT_ITEM_SCHEMA na tupla de db_manager.inserir_itens_processo_em_lote."""
+    return tuple(item.get(chave) for _, chave in _COLUNAS_ITEM_DB)
+
+
+def _item_from_db_row(row: Dict[str, Any], fornecedor: Any = None, invoice_n: Any = None) -> Dict[str, Any]:
+    """Converte uma linha de process_items (db_manager.obter_itens_processo) em um item no esquema de DEFAULT_ITEM_SCHEMA."""
+    return process_form_page._standardize_item_data(
+        {chave: row.get(coluna) for coluna, chave in _COLUNAS_ITEM_DB}, fornecedor, invoice_n
+    )
+
+
+def _calcular_impostos_itens(itens: List[Dict[str, Any]], processo: Dict[str, Any], ncm_rates_df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Aplica a estimativa de impostos do processo (mesmo cálculo da aba Itens) aos itens importados."""
+    df_item_taxes, _ = process_form_page.calculate_items_taxes_batch(
+        pd.DataFrame(itens),
+        ncm_rates_df,
+        processo.get("Estimativa_Dolar_BRL") or 0.0,
+        processo.get("Estimativa_Frete_USD") or 0.0,
+        processo.get("Estimativa_Seguro_BRL") or 0.0
+    )
+    return [{**item, **calculado} for item, calculado in zip(itens, df_item_taxes.to_dict('records'))]
+
+
+def ingest_pdfs(arquivos: List[Tuple[str, bytes]], substituir: bool = False) -> List[Dict[str, Any]]:
+    """
+    Extrai os PDFs em paralelo, associa cada um a um processo pelo número da invoice (N_Invoice)
+    e grava os itens de cada processo em uma única transação.
+
+    Arquivos com a mesma invoice têm seus itens somados no mesmo processo. Com substituir=True
+    os itens existentes do processo são trocados pelos importados; caso contrário, são acrescentados,
+    e o frete, o seguro e o VLMD do processo são rateados de novo entre os itens existentes e os novos
+    (todos os itens do processo são regravados na mesma transação).
+    Retorna o relatório com uma linha por arquivo.
+    """
+    analises = pdf_extraction.analyze_pdfs([conteudo for _, conteudo in arquivos])
+    processos_por_invoice = db_manager.obter_processos_por_invoice()
+
+    relatorio = []
+    itens_por_processo: Dict[int, List[Dict[str, Any]]] = {}
+    linhas_por_processo: Dict[int, List[Dict[str, Any]]] = {}
+    processos: Dict[int, Dict[str, Any]] = {}
+
+    for (nome, _), analise in zip(arquivos, analises):
+        linha = {"Arquivo": nome, "Invoice N#": "N/A", "Processo": "", "Itens": 0, "Status": ""}
+        relatorio.append(linha)
+
+        if isinstance(analise, Exception) or analise is None:
+            linha["Status"] = f"{STATUS_ERRO_EXTRACAO}: {analise}"
+            continue
+
+        invoice_n = analise.get('invoice', {}).get('Invoice N#', 'N/A')
+        linha["Invoice N#"] = invoice_n
+        if invoice_n in (None, "", "N/A"):
+            linha["Status"] = STATUS_SEM_INVOICE
+            continue
+
+        candidatos = processos_por_invoice.get(db_manager.normalizar_invoice(invoice_n), [])
+        if not candidatos:
+            linha["Status"] = STATUS_SEM_PROCESSO
+            continue
+        if len(candidatos) > 1:
+            linha["Processo"] = ", ".join(str(p.get("Processo_Novo")) for p in candidatos)
+            linha["Status"] = STATUS_AMBIGUO
+            continue
+
+        processo = candidatos[0]
+        linha["Processo"] = processo.get("Processo_Novo")
+        itens = process_form_page.pdf_analysis_to_items(analise, processo.get("Fornecedor"), processo.get("N_Invoice"))
+        linha["Itens"] = len(itens)
+        if not itens:
+            linha["Status"] = STATUS_SEM_ITENS
+            continue
+
+        processos[processo["id"]] = processo
+        itens_por_processo.setdefault(processo["id"], []).extend(itens)
+        linhas_por_processo.setdefault(processo["id"], []).append(linha)
+
+    if itens_por_processo:
+        ncm_rates_df = process_form_page.ncm_rates_to_frame(db_utils.get_ncm_rates_map())
+    for processo_id, itens in itens_por_processo.items():
+        processo = processos[processo_id]
+        if not substituir:
+            # O rateio depende do total do processo: os itens já gravados entram no cálculo com os novos
+            existentes = [
+                _item_from_db_row(row, processo.get("Fornecedor"), processo.get("N_Invoice"))
+                for row in db_manager.obter_itens_processo(processo_id)
+            ]
+            itens = existentes + itens
+        itens = _calcular_impostos_itens(itens, processo, ncm_rates_df)
+        sucesso = db_manager.inserir_itens_processo_em_lote(
+            processo_id, [_item_to_db_tuple(item) for item in itens], substituir=True
+        )
+        for linha in linhas_por_processo[processo_id]:
+            linha["Status"] = STATUS_IMPORTADO if sucesso else STATUS_ERRO_GRAVACAO
+
+    logger.info(
+        f"Ingestão em lote: {len(arquivos)} arquivo(s), "
+        f"{sum(1 for l in relatorio if l['Status'] == STATUS_IMPORTADO)} importado(s) em {len(itens_por_processo)} processo(s)."
+    )
+    return relatorio
+
+
+def show_batch_ingestion_section():
+    """
+    Seção da página de análise de PDF para ingestão em lote (arquivo ZIP ou, para administradores com
+    PDF_BATCH_ROOT configurado, uma pasta do servidor dentro dessa raiz).
+    """
+    st.subheader("Ingestão em Lote de Invoices/Packing Lists")
+    st.info(f"Envie um ZIP com PDFs (até {MAX_ARQUIVOS_LOTE} arquivos). Cada arquivo é associado ao processo com o mesmo Nº Invoice e seus itens são gravados no processo.")
+
+    user_info = st.session_state.get('user_info') or {}
+    permite_pasta = bool(user_info.get('is_admin')) and bool(PDF_BATCH_ROOT)
+    origem = "Arquivo ZIP"
+    if permite_pasta:
+        origem = st.radio("Origem dos arquivos", ["Arquivo ZIP", "Pasta do servidor"], horizontal=True, key="pdf_batch_origem")
+    uploaded_zip = None
+    folder = ""
+    if origem == "Arquivo ZIP":
+        uploaded_zip = st.file_uploader("Escolha um arquivo ZIP", type=["zip"], key="pdf_batch_zip_uploader")
+    else:
+        folder = st.text_input(f"Caminho da pasta (dentro de {PDF_BATCH_ROOT})", key="pdf_batch_folder")
+
+    substituir = st.checkbox("Substituir os itens já cadastrados nos processos encontrados", value=False, key="pdf_batch_substituir")
+
+    if st.button("Processar Lote", key="pdf_batch_process_button"):
+        try:
+            if uploaded_zip is not None:
+                arquivos = read_pdfs_from_zip(uploaded_zip.getvalue())
+            elif folder and permite_pasta:
+                pasta = resolve_batch_folder(folder)
+                if not os.path.isdir(pasta):
+                    st.error(f"Pasta não encontrada: {folder}")
+                    return
+                arquivos = read_pdfs_from_folder(pasta)
+            else:
+                st.warning("Selecione um arquivo ZIP ou informe uma pasta.")
+                return
+        except (zipfile.BadZipFile, OSError, ValueError) as e:
+            st.error(f"Não foi possível ler os arquivos: {e}")
+            return
+
+        if not arquivos:
+            st.warning("Nenhum PDF encontrado.")
+            return
+
+        with st.spinner(f"Processando {len(arquivos)} PDF(s)..."):
+            # As mensagens de extração de cada tabela ficam recolhidas para não poluir o relatório
+            with st.expander("Detalhes da extração"):
+                relatorio = ingest_pdfs(arquivos, substituir=substituir)
+        st.session_state.pdf_batch_report = relatorio
+
+    relatorio = st.session_state.get('pdf_batch_report')
+    if relatorio:
+        df_relatorio = pd.DataFrame(relatorio)
+        importados = df_relatorio[df_relatorio["Status"] == STATUS_IMPORTADO]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Arquivos", len(df_relatorio))
+        col2.metric("Importados", len(importados))
+        col3.metric("Não associados", len(df_relatorio) - len(importados))
+        st.dataframe(df_relatorio, use_container_width=True, hide_index=True)
@@ -0,0 +1,677 @@
+"""
+Pipeline de extração de faturas/packing lists em PDF.
+
+Este módulo não depende do Streamlit: as funções de página são executadas em
+processos separados (ProcessPoolExecutor) e devolvem apenas estruturas simples
+(texto, tabelas brutas e avisos), que a página de análise converte em itens.
+"""
+import re
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+import multiprocessing
+from io import BytesIO
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, Tuple
+
+import pdfplumber
+
+
+logger = logging.getLogger(__name__)
+
+# Altura (em pontos) usada para agrupar palavras na mesma linha
+_ALTURA_GRUPO_LINHA = 3
+
+# Abaixo deste número de páginas não compensa iniciar processos
+_MIN_PAGINAS_PARALELO = 4
+
+# Cache de extrações (chave: SHA-256 do conteúdo do PDF)
+_CACHE_MAX_ENTRADAS_MEMORIA = 32
+# Limites do cache em disco: entradas sem uso há mais de _CACHE_MAX_IDADE_DISCO_S são descartadas e, acima de
+# _CACHE_MAX_BYTES_DISCO, saem as usadas há mais tempo. A limpeza roda no máximo a cada _CACHE_INTERVALO_LIMPEZA_S.
+_CACHE_MAX_BYTES_DISCO = 256 * 1024 * 1024
+_CACHE_MAX_IDADE_DISCO_S = 60 * 24 * 3600
+_CACHE_INTERVALO_LIMPEZA_S = 60
+# Arquivos temporários mais antigos que isso são sobras de gravações interrompidas
+_CACHE_IDADE_TEMPORARIO_S = 3600
+# Incrementar quando o formato do resultado (ou as regras de extração) mudar, invalidando o cache em disco
+_CACHE_VERSAO_FORMATO = 1
+_base_path = os.path.dirname(os.path.abspath(__file__))
+_app_root_path = os.path.dirname(_base_path) if os.path.basename(_base_path) == 'app_logic' else _base_path
+_CACHE_DIR = os.path.join(_app_root_path, "data", "pdf_cache")
+
+TABLE_SETTINGS_PRODUTOS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+    "snap_tolerance": 3,
+    "text_tolerance": 1,
+    "intersection_tolerance": 3
+}
+
+TABLE_SETTINGS_TOTAIS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines"
+}
+
+# Marcadores das seções de produtos (mesmos padrões usados originalmente em pdf_analyzer_page)
+SECOES_PRODUTOS = {
+    "PAID PRODUCTS": {
+        "area_start_marker_pattern": r"PAID\s+PRODUCTS|PRODUTOS\s+PAGOS",
+        "area_end_marker_pattern": r"PRODUTOS\s+NÃO\s+PAGOS|FREE\s+OF\s+CHARGE\s+PRODUCTS|TOTAIS\s+GERAIS|VALOR\s+TOTAL|Say\s+Total\s+Amount|TOTAL\s+QUANTITY|TOTAL\s+AMOUNT|\n\s*\d+\s*$",
+        "table_header_pattern": r"EXP\s+ou\s+Fabricante|COD\s+ERP|DESCRIPTION|MODEL|SKU|QTY|UNIT\s+PRICE|AMOUNT|Código\s+Interno|Denominação\s+do\s+produto",
+        "table_footer_pattern": r".*(total\s+quantity|TOTAL\s+AMOUNT|Say\s+Total\s+Amount|SUBTOTAL|VALOR\s+TOTAL|\n\s*\d+\s*$).*",
+    },
+    "FREE OF CHARGE PRODUCTS": {
+        "area_start_marker_pattern": r"FREE\s+OF\s+CHARGE\s+PRODUCTS|PRODUTOS\s+NÃO\s+PAGOS",
+        "area_end_marker_pattern": r"TOTAIS\s+GERAIS|VALOR\s+TOTAL|Say\s+Total\s+Amount.*SIXTY\s+ONLY|Say\s+Total\s+Amount|TOTAL\s+QUANTITY|TOTAL\s+AMOUNT|\n\s*\d+\s*$",
+        "table_header_pattern": r"EXP\s+ou\s+Fabricante|Código\s+Interno|Fornecedor|Invoice\s+N#|NCM|Cobertura|Denominação\s+do\s+produto|SKU|Detalhamento\s+complementar\s+do\s+produto",
+        "table_footer_pattern": r".*(total\s+quantity|TOTAL\s+AMOUNT|Say\s+Total\s+Amount|SUBTOTAL|VALOR\s+TOTAL|\n\s*\d+\s*$).*",
+    },
+}
+
+
+def _padrao_para_busca(padrao: str) -> str:
+    """
+    Remove o '.*' das pontas de um padrão usado só com search() (ex.: rodapés '.*(total|...).*').
+    Nas linhas (que não têm quebra) o resultado do search é o mesmo, sem o backtracking do '.*'.
+    """
+    if len(padrao) > 4 and padrao.startswith(".*") and padrao.endswith(".*"):
+        return padrao[2:-2]
+    return padrao
+
+
+def _compilar_padroes(padroes: Dict[str, str]) -> Dict[str, "re.Pattern"]:
+    return {nome: re.compile(_padrao_para_busca(padrao), re.IGNORECASE) for nome, padrao in padroes.items()}
+
+
+# Padrões de marcadores compilados uma única vez, na importação do módulo
+SECOES_PRODUTOS_COMPILADAS = {secao: _compilar_padroes(padroes) for secao, padroes in SECOES_PRODUTOS.items()}
+
+_RE_INVOICE_NO = re.compile(r"Invoice No\.:\s*([A-Za-z0-9-]+)")
+_RE_INVOICE_NO_ASPAS = re.compile(r"Invoice No\.:\s*\"\s*([A-Za-z0-9-]+)\s*\"")
+_RE_MANUFACTURER = re.compile(r"Manufacturer:\s*(.*)", re.IGNORECASE)
+_RE_NCM_PRINCIPAL = re.compile(r"NCM/HS Code Principal:\s*(\d+)")
+
+
+@lru_cache(maxsize=64)
+def _compilar_padrao(padrao: str) -> "re.Pattern":
+    return re.compile(_padrao_para_busca(padrao), re.IGNORECASE)
+
+
+def _como_padrao(padrao) -> "re.Pattern":
+    """Aceita um padrão já compilado ou uma string (compilada uma vez e reaproveitada)."""
+    return padrao if isinstance(padrao, re.Pattern) else _compilar_padrao(padrao)
+
+
+_chave_x0 = itemgetter('x0')
+
+
+class PageTextIndex:
+    """
+    Índice das linhas de texto de uma página.
+
+    As palavras são agrupadas em faixas de 3 pontos de altura e ordenadas da esquerda
+    para a direita. Para cada linha ficam guardados o texto já unido e as posições
+    verticais; como os topos são crescentes, as buscas por faixa de y usam bisect.
+    """
+
+    __slots__ = ('words', 'texts', 'tops', 'bottoms', 'max_tops', 'min_bottoms')
+
+    def __init__(self, words: List[Dict[str, Any]]):
+        grupos: Dict[int, List[Dict[str, Any]]] = {}
+        for word_obj in words:
+            chave = int(word_obj['top'] // _ALTURA_GRUPO_LINHA)
+            grupo = grupos.get(chave)
+            if grupo is None:
+                grupos[chave] = [word_obj]
+            else:
+                grupo.append(word_obj)
+
+        self.words: List[List[Dict[str, Any]]] = []
+        self.texts: List[str] = []
+        self.tops: List[float] = []
+        self.bottoms: List[float] = []
+        self.max_tops: List[float] = []
+        self.min_bottoms: List[float] = []
+        for chave in sorted(grupos):
+            palavras = grupos[chave]
+            if len(palavras) > 1:
+                palavras.sort(key=_chave_x0)
+            # Uma única passada por linha para as quatro posições verticais
+            primeira = palavras[0]
+            top_min = top_max = primeira['top']
+            bottom_min = bottom_max = primeira['bottom']
+            for w in palavras:
+                top, bottom = w['top'], w['bottom']
+                if top < top_min:
+                    top_min = top
+                elif top > top_max:
+                    top_max = top
+                if bottom < bottom_min:
+                    bottom_min = bottom
+                elif bottom > bottom_max:
+                    bottom_max = bottom
+            self.words.append(palavras)
+            self.texts.append(" ".join([w['text'] for w in palavras]))
+            self.tops.append(top_min)
+            self.bottoms.append(bottom_max)
+            self.max_tops.append(top_max)
+            self.min_bottoms.append(bottom_min)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def first_line_below(self, y: float) -> int:
+        """Posição da primeira linha cujo topo é estritamente maior que y."""
+        return bisect_right(self.tops, y)
+
+    def lines_between(self, y0: float, y1: float) -> range:
+        """Posições das linhas com topo em [y0, y1] (o filtro pela base fica a cargo de quem chama)."""
+        return range(bisect_left(self.tops, y0), bisect_right(self.tops, y1))
+
+    def search(self, pattern, start: int = 0, stop: Optional[int] = None) -> Optional[int]:
+        """Posição da primeira linha em [start, stop) cujo texto casa com o padrão, ou None."""
+        pattern = _como_padrao(pattern)
+        stop = len(self.texts) if stop is None else stop
+        texts = self.texts
+        for i in range(start, stop):
+            if pattern.search(texts[i]):
+                return i
+        return None
+
+
+def find_table_bbox_in_lines(line_index: PageTextIndex, page_bbox, page_height, area_start_marker_pattern, area_end_marker_pattern,
+                             table_header_pattern, table_footer_pattern, avisos: Optional[List[str]] = None):
+    """
+    Localiza a bbox de uma tabela usando o índice de linhas já construído para a página.
+    Mesma regra de find_table_bbox_by_markers, mas sem reextrair nem reagrupar as palavras.
+    Os padrões podem ser strings ou expressões já compiladas. Os avisos são acumulados em
+    'avisos' (quando informado). Retorna (x0, y0, x1, y1) ou None.
+    """
+    if avisos is None:
+        avisos = []
+
+    start_section_pattern = _como_padrao(area_start_marker_pattern)
+    end_section_pattern = _como_padrao(area_end_marker_pattern)
+    header_pattern = _como_padrao(table_header_pattern)
+    footer_pattern = _como_padrao(table_footer_pattern)
+
+    # 1. Área geral de busca delimitada pelos marcadores de seção
+    broad_search_start_y = 0
+    pos_inicio = line_index.search(start_section_pattern)
+    if pos_inicio is not None:
+        broad_search_start_y = max(broad_search_start_y, line_index.min_bottoms[pos_inicio])
+
+    broad_search_end_y = page_height
+    pos_fim = line_index.search(end_section_pattern, start=line_index.first_line_below(broad_search_start_y))
+    if pos_fim is not None:
+        broad_search_end_y = min(broad_search_end_y, line_index.max_tops[pos_fim])
+
+    if broad_search_start_y == 0 and start_section_pattern.pattern != r"":
+        avisos.append(f"Marcador de início de seção '{start_section_pattern.pattern}' não encontrado.")
+        return None
+    if broad_search_end_y == page_height and end_section_pattern.pattern != r"":
+        avisos.append(f"Marcador de fim de seção '{end_section_pattern.pattern}' não encontrado.")
+        broad_search_end_y = page_height
+
+    if broad_search_end_y <= broad_search_start_y + 10:
+        avisos.append(f"Área de busca ampla inválida para marcadores de seção: start_y={broad_search_start_y}, end_y={broad_search_end_y}. Marcadores muito próximos ou invertidos.")
+        return None
+
+    # 2. Cabeçalho e rodapé da tabela dentro da área ampla (faixa de linhas localizada por bisect)
+    bottoms = line_index.bottoms
+    linhas_area = [i for i in line_index.lines_between(broad_search_start_y, broad_search_end_y) if bottoms[i] <= broad_search_end_y]
+    if not linhas_area:
+        avisos.append("Nenhuma palavra encontrada na área de busca ampla após filtrar por seção.")
+        return None
+
+    table_header_y = None
+    table_footer_y = None
+    texts = line_index.texts
+    tops = line_index.tops
+    for i in linhas_area:
+        if header_pattern.search(texts[i]):
+            table_header_y = tops[i]
+        if table_header_y is not None and tops[i] > table_header_y:
+            if footer_pattern.search(texts[i]):
+                table_footer_y = bottoms[i]
+                break
+
+    # 3. Bbox final
+    if table_header_y is None:
+        avisos.append(f"Cabeçalho da tabela '{header_pattern.pattern}' não encontrado dentro da área de busca ampla. Não é possível determinar a bbox da tabela.")
+        return None
+
+    if table_footer_y is None:
+        avisos.append(f"Rodapé da tabela '{footer_pattern.pattern}' não encontrado. Usando o limite inferior da área de busca ampla como rodapé da tabela.")
+        table_footer_y = broad_search_end_y
+
+    x0 = page_bbox[0]
+    x1 = page_bbox[2]
+
+    buffer_top = 15
+    buffer_bottom = 15
+
+    y0_final = max(0, table_header_y - buffer_top)
+    y1_final = min(page_height, table_footer_y + buffer_bottom)
+
+    if y1_final <= y0_final + 5:
+        avisos.append(f"Área da tabela calculada muito pequena ou inválida para padrões '{header_pattern.pattern}' e '{footer_pattern.pattern}': y0={y0_final}, y1={y1_final}. Tentando usar uma área mais geral para a tabela.")
+        y0_final = broad_search_start_y + 10
+        y1_final = broad_search_end_y - 10
+        if y1_final <= y0_final + 5:
+            avisos.append("Falha ao determinar uma área de tabela válida mesmo com fallback geral.")
+            return None
+
+    return (x0, y0_final, x1, y1_final)
+
+
+def _find_total_row(tables) -> List[str]:
+    """Procura, de baixo para cima na última tabela, uma linha com pelo menos 3 valores numéricos."""
+    if not tables:
+        return []
+    last_table = tables[-1]
+    if not last_table or len(last_table) <= 1:
+        return []
+    for row in reversed(last_table):
+        if not row:
+            continue
+        numeric_cells = []
+        for cell in row:
+            if cell is None:
+                continue
+            cell_clean = str(cell).strip().replace(',', '.').replace(' ', '')
+            try:
+                float(cell_clean)
+                numeric_cells.append(cell_clean)
+            except ValueError:
+                continue
+        if len(numeric_cells) >= 3:
+            return numeric_cells
+    return []
+
+
+def extract_page(page, page_number: int) -> Dict[str, Any]:
+    """
+    Extrai de uma página tudo o que a análise de faturas precisa.
+    As palavras são extraídas uma única vez e o índice de linhas é reutilizado
+    para todas as buscas de marcadores (produtos pagos e não pagos).
+    """
+    resultado = {
+        'page_number': page_number,
+        'text': page.extract_text() or "",
+        'sections': {},
+        'total_row': [],
+    }
+
+    line_index = PageTextIndex(page.extract_words())
+    for section_keyword, padroes in SECOES_PRODUTOS_COMPILADAS.items():
+        avisos = []
+        bbox = find_table_bbox_in_lines(line_index, page.bbox, page.height, avisos=avisos, **padroes)
+        tabelas = []
+        if bbox:
+            tabelas = page.crop(bbox).extract_tables(TABLE_SETTINGS_PRODUTOS) or []
+        resultado['sections'][section_keyword] = {'bbox': bbox, 'tables': tabelas, 'avisos': avisos}
+
+    # A linha de totais (packing list) só é procurada a partir da segunda página
+    if page_number > 0:
+        resultado['total_row'] = _find_total_row(page.extract_tables(TABLE_SETTINGS_TOTAIS))
+    return resultado
+
+
+def _extract_page_range(pdf_bytes: bytes, inicio: int, fim: int) -> List[Dict[str, Any]]:
+    """Tarefa do pool: abre o PDF uma vez e extrai as páginas [inicio, fim)."""
+    resultados = []
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        for page_number in range(inicio, fim):
+            page = pdf.pages[page_number]
+            resultados.append(extract_page(page, page_number))
+            # Libera o cache de layout da página antes de seguir para a próxima
+            page.close()
+    return resultados
+
+
+def _split_pages(total_paginas: int, partes: int) -> List[Tuple[int, int]]:
+    """Divide o intervalo de páginas em blocos contíguos de tamanho parecido."""
+    partes = max(1, min(partes, total_paginas))
+    tamanho, resto = divmod(total_paginas, partes)
+    intervalos = []
+    inicio = 0
+    for i in range(partes):
+        fim = inicio + tamanho + (1 if i < resto else 0)
+        intervalos.append((inicio, fim))
+        inicio = fim
+    return intervalos
+
+
+_executor_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Pool de processos compartilhado (criado sob demanda)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 'spawn' evita fork de um processo com várias threads (servidor do Streamlit)
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """Retorna o número de páginas do PDF."""
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_pages(pdf_bytes: bytes, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Extrai todas as páginas do PDF, em paralelo quando o documento é grande o bastante.
+    Retorna a lista de resultados de extract_page, na ordem das páginas.
+    """
+    total_paginas = count_pages(pdf_bytes)
+    if total_paginas == 0:
+        return []
+
+    workers = max_workers or os.cpu_count() or 1
+    if total_paginas < _MIN_PAGINAS_PARALELO or workers <= 1:
+        return _extract_page_range(pdf_bytes, 0, total_paginas)
+
+    intervalos = _split_pages(total_paginas, workers)
+    try:
+        executor = _get_executor()
+        futures = [executor.submit(_extract_page_range, pdf_bytes, inicio, fim) for inicio, fim in intervalos]
+        resultados = []
+        for future in futures:
+            resultados.extend(future.result())
+        return resultados
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Pool de processos indisponível para extração de PDF, extraindo sequencialmente: {e}")
+        _reset_executor()
+        return _extract_page_range(pdf_bytes, 0, total_paginas)
+
+
+def extract_invoice_data_from_text(text: str) -> Dict[str, str]:
+    """
+    Extrai informações gerais da fatura (Invoice N# e Fornecedor) a partir do texto da primeira página.
+    """
+    data = {}
+
+    invoice_no_match = _RE_INVOICE_NO.search(text)
+    if invoice_no_match:
+        data['Invoice N#'] = invoice_no_match.group(1).strip()
+    else:
+        invoice_no_match = _RE_INVOICE_NO_ASPAS.search(text)
+        if invoice_no_match:
+            data['Invoice N#'] = invoice_no_match.group(1).strip()
+        else:
+            data['Invoice N#'] = "N/A"
+
+    lines = text.split('\n')
+    if lines:
+        data['Fornecedor'] = lines[0].strip()
+        manufacturer_match = _RE_MANUFACTURER.search(text)
+        if manufacturer_match:
+            data['Fornecedor'] = manufacturer_match.group(1).strip()
+        elif "LTD" not in data['Fornecedor'].upper() and len(lines) > 1:
+            if "LTD" in lines[1].upper():
+                data['Fornecedor'] = lines[1].strip()
+    return data
+
+
+def extract_ncm_principal(text: str) -> str:
+    """Extrai o 'NCM/HS Code Principal' informado no cabeçalho da fatura."""
+    ncm_invoice_match = _RE_NCM_PRINCIPAL.search(text)
+    return ncm_invoice_match.group(1) if ncm_invoice_match else "N/A"
+
+
+def _build_analysis(paginas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Monta o resultado completo da análise: cabeçalho da invoice, NCM principal e páginas extraídas."""
+    first_page_text = paginas[0]['text'] if paginas else ""
+    return {
+        'invoice': extract_invoice_data_from_text(first_page_text) if paginas else {},
+        'ncm_principal': extract_ncm_principal(first_page_text),
+        'pages': paginas,
+    }
+
+
+class PdfExtractionCache:
+    """
+    Cache das análises de PDF indexado pelo hash do conteúdo do arquivo.
+
+    Mantém as entradas mais recentes em memória (LRU) e grava cada análise em JSON
+    no diretório informado, para que reruns do Streamlit e novos uploads do mesmo
+    arquivo não refaçam a análise de layout do pdfplumber. No disco, a data de
+    modificação de cada arquivo marca o último uso: entradas antigas expiram e, acima
+    do limite de tamanho, as menos usadas são removidas (ver limpar_disco).
+    """
+
+    def __init__(self, cache_dir: Optional[str] = _CACHE_DIR, max_entradas: int = _CACHE_MAX_ENTRADAS_MEMORIA,
+                 max_bytes_disco: Optional[int] = _CACHE_MAX_BYTES_DISCO, max_idade_disco_s: Optional[float] = _CACHE_MAX_IDADE_DISCO_S):
+        self._cache_dir = cache_dir
+        self._max_entradas = max_entradas
+        self._max_bytes_disco = max_bytes_disco
+        self._max_idade_disco_s = max_idade_disco_s
+        self._memoria: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ultima_limpeza = 0.0
+
+    @staticmethod
+    def hash_pdf(pdf_bytes: bytes) -> str:
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    def _arquivo(self, chave: str) -> Optional[str]:
+        if not self._cache_dir:
+            return None
+        return os.path.join(self._cache_dir, f"{chave}.v{_CACHE_VERSAO_FORMATO}.json")
+
+    def _guardar_memoria(self, chave: str, analise: Dict[str, Any]):
+        with self._lock:
+            self._memoria[chave] = analise
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self._max_entradas:
+                self._memoria.popitem(last=False)
+
+    def get(self, chave: str) -> Optional[Dict[str, Any]]:
+        """Retorna a análise em cache (memória, depois disco) ou None."""
+        with self._lock:
+            analise = self._memoria.get(chave)
+            if analise is not None:
+                self._memoria.move_to_end(chave)
+                return analise
+
+        arquivo = self._arquivo(chave)
+        if arquivo and os.path.exists(arquivo):
+            try:
+                if self._max_idade_disco_s and time.time() - os.path.getmtime(arquivo) > self._max_idade_disco_s:
+                    os.remove(arquivo)
+                    return None
+                with open(arquivo, "r", encoding="utf-8") as f:
+                    analise = json.load(f)
+                os.utime(arquivo)  # Marca o uso para a expiração e o descarte por tamanho
+                self._guardar_memoria(chave, analise)
+                return analise
+            except FileNotFoundError:
+                return None  # Removido por outro processo durante a leitura
+            except (OSError, ValueError) as e:
+                logger.warning(f"Entrada de cache de PDF inválida em {arquivo}, ignorando: {e}")
+        return None
+
+    def put(self, chave: str, analise: Dict[str, Any]):
+        """Guarda a análise em memória e em disco (gravação atômica)."""
+        self._guardar_memoria(chave, analise)
+        arquivo = self._arquivo(chave)
+        if not arquivo:
+            return
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            temporario = f"{arquivo}.{os.getpid()}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(analise, f, ensure_ascii=False)
+            os.replace(temporario, arquivo)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o cache de PDF em {arquivo}: {e}")
+            return
+        with self._lock:
+            limpar = time.monotonic() - self._ultima_limpeza >= _CACHE_INTERVALO_LIMPEZA_S
+            if limpar:
+                self._ultima_limpeza = time.monotonic()
+        if limpar:
+            self.limpar_disco()
+
+    def limpar_disco(self) -> int:
+        """
+        Remove do disco as entradas expiradas, as de versões anteriores do formato e as sobras de gravações
+        interrompidas; depois, se o cache passar de max_bytes_disco, as entradas usadas há mais tempo.
+        Retorna o número de arquivos removidos.
+        """
+        if not self._cache_dir or not os.path.isdir(self._cache_dir):
+            return 0
+        agora = time.time()
+        sufixo = f".v{_CACHE_VERSAO_FORMATO}.json"
+        entradas = []  # (último uso, tamanho, caminho) das entradas válidas
+        removidos = 0
+        for nome in os.listdir(self._cache_dir):
+            caminho = os.path.join(self._cache_dir, nome)
+            try:
+                info = os.stat(caminho)
+                if nome.endswith(".tmp"):
+                    descartar = agora - info.st_mtime > _CACHE_IDADE_TEMPORARIO_S
+                elif nome.endswith(sufixo):
+                    descartar = bool(self._max_idade_disco_s) and agora - info.st_mtime > self._max_idade_disco_s
+                else:
+                    descartar = nome.endswith(".json")  # Versão anterior do formato
+                if descartar:
+                    os.remove(caminho)
+                    removidos += 1
+                elif nome.endswith(sufixo):
+                    entradas.append((info.st_mtime, info.st_size, caminho))
+            except OSError:
+                continue  # Removido por outro processo
+        if self._max_bytes_disco is not None:
+            total = sum(tamanho for _, tamanho, _ in entradas)
+            for _, tamanho, caminho in sorted(entradas):
+                if total <= self._max_bytes_disco:
+                    break
+                try:
+                    os.remove(caminho)
+                    removidos += 1
+                except OSError:
+                    pass
+                total -= tamanho
+        if removidos:
+            logger.info(f"Cache de PDF em disco: {removidos} arquivo(s) removido(s).")
+        return removidos
+
+    def clear(self):
+        """Esvazia o cache em memória (os arquivos em disco são mantidos)."""
+        with self._lock:
+            self._memoria.clear()
+
+
+_pdf_cache = PdfExtractionCache()
+
+
+def analyze_pdf(pdf_bytes: bytes, max_workers: Optional[int] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Analisa o PDF (cabeçalho da invoice + tabelas de todas as páginas), reaproveitando
+    o resultado em cache quando o mesmo conteúdo já foi analisado.
+    O dicionário retornado é compartilhado pelo cache e não deve ser alterado.
+    """
+    if not use_cache:
+        return _build_analysis(extract_pdf_pages(pdf_bytes, max_workers=max_workers))
+
+    chave = PdfExtractionCache.hash_pdf(pdf_bytes)
+    analise = _pdf_cache.get(chave)
+    if analise is not None:
+        logger.debug(f"Análise de PDF {chave[:12]} obtida do cache.")
+        return analise
+
+    analise = _build_analysis(extract_pdf_pages(pdf_bytes, max_workers=max_workers))
+    # Normaliza tuplas (bbox) para listas, para que memória e disco devolvam a mesma estrutura
+    analise = json.loads(json.dumps(analise, ensure_ascii=False))
+    _pdf_cache.put(chave, analise)
+    return analise
+
+
+def _analyze_pdf_sequencial(pdf_bytes: bytes) -> Dict[str, Any]:
+    """Tarefa do pool para análise em lote: um arquivo inteiro por processo."""
+    analise = _build_analysis(_extract_page_range(pdf_bytes, 0, count_pages(pdf_bytes)))
+    return json.loads(json.dumps(analise, ensure_ascii=False))
+
+
+def analyze_pdfs(pdfs: List[bytes], max_workers: Optional[int] = None) -> List[Any]:
+    """
+    Analisa vários PDFs, distribuindo um arquivo por processo do pool.
+    Arquivos já analisados vêm do cache. Retorna, na mesma ordem da entrada, a análise
+    de cada arquivo ou a exceção que impediu sua extração.
+    """
+    resultados: List[Any] = [None] * len(pdfs)
+    pendentes: Dict[str, List[int]] = {}
+    for i, pdf_bytes in enumerate(pdfs):
+        chave = PdfExtractionCache.hash_pdf(pdf_bytes)
+        analise = _pdf_cache.get(chave)
+        if analise is not None:
+            resultados[i] = analise
+        else:
+            # Arquivos repetidos no lote são analisados uma única vez
+            pendentes.setdefault(chave, []).append(i)
+
+    if not pendentes:
+        return resultados
+
+    def _registrar(chave, analise):
+        if not isinstance(analise, Exception):
+            _pdf_cache.put(chave, analise)
+        for i in pendentes[chave]:
+            resultados[i] = analise
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers <= 1 or len(pendentes) == 1:
+        for chave, posicoes in pendentes.items():
+            try:
+                _registrar(chave, _analyze_pdf_sequencial(pdfs[posicoes[0]]))
+            except Exception as e:
+                logger.exception(f"Erro ao analisar PDF {chave[:12]}")
+                _registrar(chave, e)
+        return resultados
+
+    try:
+        executor = _get_executor()
+        futures = {chave: executor.submit(_analyze_pdf_sequencial, pdfs[posicoes[0]]) for chave, posicoes in pendentes.items()}
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Pool de processos indisponível para análise em lote, analisando sequencialmente: {e}")
+        _reset_executor()
+        return analyze_pdfs(pdfs, max_workers=1)
+
+    for chave, future in futures.items():
+        try:
+            _registrar(chave, future.result())
+        except BrokenProcessPool as e:
+            logger.warning(f"Pool de processos interrompido durante a análise em lote: {e}")
+            _reset_executor()
+            try:
+                _registrar(chave, _analyze_pdf_sequencial(pdfs[pendentes[chave][0]]))
+            except Exception as e_seq:
+                _registrar(chave, e_seq)
+        except Exception as e:
+            logger.exception(f"Erro ao analisar PDF {chave[:12]}")
+            _registrar(chave, e)
+    return resultados
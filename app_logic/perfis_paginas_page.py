@@ -0,0 +1,70 @@
+import streamlit as st
+import streamlit.components.v1 as components
+import pandas as pd
+import logging
+import os
+
+from app_logic import page_profiler
+from app_logic.utils import set_background_image
+
+logger = logging.getLogger(__name__)
+
+MAX_FUNCOES_EXIBIDAS = 100
+
+
+def show_page():
+    background_image_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets', 'logo_navio_atracado.png')
+    set_background_image(background_image_path)
+
+    st.title("Perfis das Páginas")
+    st.caption(
+        "Amostras da pilha coletadas a cada "
+        f"{page_profiler.INTERVALO_AMOSTRAGEM_S * 1000:.0f} ms enquanto a página é exibida "
+        f"(últimos {page_profiler.PERFIS_POR_PAGINA} perfis de cada página)."
+    )
+
+    paginas = page_profiler.get_paginas_perfiladas()
+    if not paginas:
+        st.info("Nenhum perfil registrado. Marque 'Perfilar páginas' no menu Administrador "
+                "(ou abra o app com ?perfilar=1) e navegue pelas páginas.")
+        return
+
+    col_pagina, col_perfil = st.columns(2)
+    pagina = col_pagina.selectbox("Página", paginas, key="perfis_paginas_pagina")
+    perfis = list(reversed(page_profiler.get_perfis(pagina)))
+    if not perfis:
+        st.info("Nenhum perfil para esta página.")
+        return
+    indice = col_perfil.selectbox(
+        "Perfil", range(len(perfis)), key="perfis_paginas_indice",
+        format_func=lambda i: f"{perfis[i]['momento']} — {perfis[i]['duracao_s'] * 1000:.0f} ms"
+    )
+    perfil = perfis[indice]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Duração", f"{perfil['duracao_s'] * 1000:.0f} ms")
+    col2.metric("Amostras", perfil['amostras'])
+    col3.metric("Média da página (perfis guardados)", f"{sum(p['duracao_s'] for p in perfis) * 1000 / len(perfis):.0f} ms")
+
+    tab_funcoes, tab_flame = st.tabs(["Funções mais custosas", "Flame graph"])
+    with tab_funcoes:
+        funcoes = pd.DataFrame(page_profiler.top_funcoes(perfil, MAX_FUNCOES_EXIBIDAS))
+        if funcoes.empty:
+            st.info("Nenhuma amostra coletada (a página executou mais rápido que o intervalo de amostragem).")
+        else:
+            st.dataframe(funcoes, use_container_width=True, hide_index=True)
+            st.caption("Tempo próprio: amostras em que a função estava no topo da pilha. Tempos estimados pela proporção de amostras.")
+    with tab_flame:
+        conteudo, altura = page_profiler.flame_graph_html(perfil)
+        components.html(conteudo, height=min(altura, 800), scrolling=True)
+
+    col_download, col_limpar = st.columns(2)
+    col_download.download_button(
+        "Baixar pilhas (formato colapsado)", page_profiler.pilhas_colapsadas(perfil),
+        file_name=f"perfil_{pagina}_{perfil['momento']}.txt".replace(' ', '_').replace(':', '-').replace('/', '-'),
+        mime="text/plain", key="perfis_paginas_download",
+        help="Formato aceito pelo speedscope.app e pelo flamegraph.pl."
+    )
+    if col_limpar.button("Limpar perfis", key="perfis_paginas_limpar"):
+        page_profiler.limpar()
+        st.rerun()
@@ -6,7 +6,7 @@ import os
 import sys
 import re
 import tempfile
-from typing import Optional, Any, Dict, List, Union
+from typing import Optional, Any, Dict, List, Tuple, Union
 
 import followup_db_manager as db_manager
 
@@ -19,6 +19,7 @@ try:
     if not hasattr(db_utils, 'get_declaracao_by_id') or \
        not hasattr(db_utils, 'get_declaracao_by_referencia') or \
        not hasattr(db_utils, 'get_ncm_item_by_ncm_code') or \
+       not hasattr(db_utils, 'get_ncm_rates_map') or \
        not hasattr(db_utils, 'selecionar_todos_ncm_itens'):
         raise ImportError("db_utils real não contém todas as funções esperadas.")
 except ImportError:
@@ -47,6 +48,12 @@ except ImportError:
                 }
             return None
 
+        def get_ncm_rates_map(self) -> Dict[str, Dict[str, float]]:
+            return {
+                item['ncm_code']: {k: item[k] for k in ('ii_aliquota', 'ipi_aliquota', 'pis_aliquota', 'cofins_aliquota', 'icms_aliquota')}
+                for item in self.selecionar_todos_ncm_itens()
+            }
+
         def selecionar_todos_ncm_itens(self) -> List[Dict[str, Any]]:
             return [
                 {'ID': 1, 'ncm_code': '85171231', 'descricao_item': 'Telefones celulares', 'ii_aliquota': 16.0, 'ipi_aliquota': 5.0, 'pis_aliquota': 1.65, 'cofins_aliquota': 7.6, 'icms_aliquota': 18.0},
@@ -64,10 +71,12 @@ except Exception as e:
 # Importar pdf_analyzer_page.py e ncm_list_page para reuso de funções
 try:
     from app_logic import pdf_analyzer_page
+    from app_logic import pdf_extraction
     import pdfplumber # Import pdfplumber here as it's used in this module directly
 except ImportError:
     logging.warning("Módulo 'pdf_analyzer_page' ou 'pdfplumber' não encontrado. Funções de análise de PDF não estarão disponíveis.")
     pdf_analyzer_page = None # Define como None se não puder ser importado
+    pdf_extraction = None
 
 try:
     from app_logic import ncm_list_page
@@ -110,11 +119,14 @@ def _display_message_box(message: str, type: str = "info"):
         st.error(message)
 
 # --- Funções de Cálculo ---
-def get_ncm_taxes(ncm_code: str) -> Dict[str, float]:
-    """Busca as alíquotas de impostos para um dado NCM."""
-    ncm_data_raw = db_utils.get_ncm_item_by_ncm_code(ncm_code)
-    # Convert sqlite3.Row object to dictionary if it's not None
-    ncm_data = dict(ncm_data_raw) if ncm_data_raw else None
+def get_ncm_taxes(ncm_code: str, ncm_rates: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, float]:
+    """
+    Busca as alíquotas de impostos para um dado NCM.
+    Usa o dicionário 'ncm_rates' (de db_utils.get_ncm_rates_map) quando informado, sem acessar o DB.
+    """
+    if ncm_rates is None:
+        ncm_rates = db_utils.get_ncm_rates_map()
+    ncm_data = ncm_rates.get(ncm_code)
 
     if ncm_data:
         return {
@@ -126,10 +138,11 @@ def get_ncm_taxes(ncm_code: str) -> Dict[str, float]:
         }
     return {'ii_aliquota': 0.0, 'ipi_aliquota': 0.0, 'pis_aliquota': 0.0, 'cofins_aliquota': 0.0, 'icms_aliquota': 0.0}
 
-def calculate_item_taxes_and_values(item: Dict[str, Any], dolar_brl: float, total_invoice_value_usd: float, total_invoice_weight_kg: float, estimativa_frete_usd: float, estimativa_seguro_brl: float) -> Dict[str, Any]:
+def calculate_item_taxes_and_values(item: Dict[str, Any], dolar_brl: float, total_invoice_value_usd: float, total_invoice_weight_kg: float, estimativa_frete_usd: float, estimativa_seguro_brl: float, ncm_rates: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Any]:
     """
     Calcula o VLMD, impostos e rateios para um item individual.
     Retorna o item com os campos de impostos atualizados e valores rateados.
+    Em laços, passe 'ncm_rates' obtido uma única vez para evitar consultas por item.
     """
     item_qty = float(item.get('Quantidade', 0))
     item_unit_value_usd = float(item.get('Valor Unitário', 0))
@@ -148,7 +161,7 @@ def calculate_item_taxes_and_values(item: Dict[str, Any], dolar_brl: float, tota
 
     # NCM e impostos
     ncm_code = str(item.get('NCM', ''))
-    ncm_taxes = get_ncm_taxes(ncm_code)
+    ncm_taxes = get_ncm_taxes(ncm_code, ncm_rates)
 
     # VLMD_Item (Valor da Mercadoria no Local de Desembaraço)
     # Considera o valor em USD, frete e seguro rateados convertidos para BRL
@@ -172,6 +185,135 @@ def calculate_item_taxes_and_values(item: Dict[str, Any], dolar_brl: float, tota
 
     return item
 
+_NCM_RATE_COLUMNS = ['ii_aliquota', 'ipi_aliquota', 'pis_aliquota', 'cofins_aliquota', 'icms_aliquota']
+# Colunas produzidas por calculate_items_taxes_batch (as mesmas de calculate_item_taxes_and_values)
+ITEM_TAX_COLUMNS = ['Estimativa_II_BR', 'Estimativa_IPI_BR', 'Estimativa_PIS_BR', 'Estimativa_COFINS_BR', 'Estimativa_ICMS_BR', 'VLMD_Item', 'Frete_Rateado_USD', 'Seguro_Rateado_BRL']
+
+# Abaixo desta quantidade de itens o laço item a item com o mapa de alíquotas é mais rápido que a versão
+# vetorizada, que tem um custo fixo de montagem de DataFrames (ver benchmarks/bench_item_taxes.py)
+ITENS_MINIMO_CALCULO_VETORIZADO = 3000
+
+def ncm_rates_to_frame(ncm_rates: Dict[str, Dict[str, float]]) -> pd.DataFrame:
+    """Converte o dicionário de db_utils.get_ncm_rates_map em uma tabela indexada por NCM."""
+    if not ncm_rates:
+        return pd.DataFrame(columns=_NCM_RATE_COLUMNS, dtype=float)
+    return pd.DataFrame.from_dict(ncm_rates, orient='index')[_NCM_RATE_COLUMNS].astype(float)
+
+# (dicionário de alíquotas, tabela montada a partir dele)
+_ncm_rates_frame_cache: Tuple[Optional[Dict[str, Dict[str, float]]], Optional[pd.DataFrame]] = (None, None)
+
+def get_ncm_rates_frame(ncm_rates: Dict[str, Dict[str, float]]) -> pd.DataFrame:
+    """
+    ncm_rates_to_frame com cache. db_utils.get_ncm_rates_map devolve o mesmo dicionário enquanto a versão
+    das alíquotas não muda, então a tabela só é remontada quando o mapa é recarregado.
+    """
+    global _ncm_rates_frame_cache
+    rates_em_cache, frame = _ncm_rates_frame_cache
+    if rates_em_cache is not ncm_rates or frame is None:
+        frame = ncm_rates_to_frame(ncm_rates)
+        _ncm_rates_frame_cache = (ncm_rates, frame)
+    return frame
+
+def _to_float(value: Any) -> float:
+    """Converte para float como a versão vetorizada (valores inválidos ou vazios viram 0)."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if number != number else number  # NaN
+
+def calculate_items_taxes(items: List[Dict[str, Any]], ncm_rates: Dict[str, Dict[str, float]], dolar_brl: float, estimativa_frete_usd: float, estimativa_seguro_brl: float) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """
+    Calcula impostos e rateios de todos os itens. Retorna (itens com as colunas de ITEM_TAX_COLUMNS
+    atualizadas, dicionário de totais como em calculate_items_taxes_batch).
+    Listas pequenas (as invoices típicas) usam o laço item a item com o mapa de alíquotas; a partir de
+    ITENS_MINIMO_CALCULO_VETORIZADO itens, usa calculate_items_taxes_batch.
+    """
+    if len(items) >= ITENS_MINIMO_CALCULO_VETORIZADO:
+        df_item_taxes, totals = calculate_items_taxes_batch(
+            pd.DataFrame(items), get_ncm_rates_frame(ncm_rates), dolar_brl, estimativa_frete_usd, estimativa_seguro_brl
+        )
+        tax_rows = zip(*(df_item_taxes[col].tolist() for col in ITEM_TAX_COLUMNS))
+        return [{**item, **dict(zip(ITEM_TAX_COLUMNS, row))} for item, row in zip(items, tax_rows)], totals
+
+    # Mesmos totais e conversões da versão vetorizada
+    numeric_items = [
+        {
+            'NCM': item.get('NCM'),
+            'Quantidade': _to_float(item.get('Quantidade')),
+            'Valor Unitário': _to_float(item.get('Valor Unitário')),
+            'Peso Unitário': _to_float(item.get('Peso Unitário')),
+        }
+        for item in items
+    ]
+    total_invoice_value_usd = sum(_to_float(item.get('Valor total do item')) for item in items)
+    total_invoice_weight_kg = sum(item['Quantidade'] * item['Peso Unitário'] for item in numeric_items)
+
+    updated_items = []
+    totals = dict.fromkeys(['Estimativa_II_BR', 'Estimativa_IPI_BR', 'Estimativa_PIS_BR', 'Estimativa_COFINS_BR', 'Estimativa_ICMS_BR'], 0.0)
+    for item, numeric_item in zip(items, numeric_items):
+        calculated = calculate_item_taxes_and_values(
+            numeric_item, float(dolar_brl or 0.0), total_invoice_value_usd, total_invoice_weight_kg,
+            float(estimativa_frete_usd or 0.0), float(estimativa_seguro_brl or 0.0), ncm_rates
+        )
+        for col in totals:
+            totals[col] += calculated[col]
+        updated_items.append({**item, **{col: calculated[col] for col in ITEM_TAX_COLUMNS}})
+    totals['Estimativa_Impostos_Total'] = sum(totals.values())
+    return updated_items, totals
+
+def calculate_items_taxes_batch(df_items: pd.DataFrame, ncm_rates_df: pd.DataFrame, dolar_brl: float, estimativa_frete_usd: float, estimativa_seguro_brl: float):
+    """
+    Versão vetorizada de calculate_item_taxes_and_values para todos os itens de uma vez.
+    'ncm_rates_df' é a tabela de alíquotas indexada por NCM (ver ncm_rates_to_frame).
+    Retorna (DataFrame com as colunas de ITEM_TAX_COLUMNS, dicionário de totais).
+    """
+    def _num(col: str) -> pd.Series:
+        if col not in df_items.columns:
+            return pd.Series(0.0, index=df_items.index)
+        return pd.to_numeric(df_items[col], errors='coerce').fillna(0.0)
+
+    item_qty = _num('Quantidade')
+    item_unit_value_usd = _num('Valor Unitário')
+    item_value_usd = item_qty * item_unit_value_usd
+    item_weight_kg = item_qty * _num('Peso Unitário')
+
+    # Mesmos totais usados pela tela: soma de 'Valor total do item' e de peso unitário x quantidade
+    total_invoice_value_usd = _num('Valor total do item').sum()
+    total_invoice_weight_kg = item_weight_kg.sum()
+
+    value_ratio = item_value_usd / max(1, total_invoice_value_usd)
+    weight_ratio = item_weight_kg / max(1, total_invoice_weight_kg)
+
+    frete_rateado_usd = float(estimativa_frete_usd or 0.0) * value_ratio
+    seguro_rateado_brl = float(estimativa_seguro_brl or 0.0) * weight_ratio
+    dolar_brl = float(dolar_brl or 0.0)
+    vlmd_item = (item_value_usd * dolar_brl) + (frete_rateado_usd * dolar_brl) + seguro_rateado_brl
+
+    # Alíquotas alinhadas aos itens (NCM sem cadastro => 0%)
+    ncm_keys = df_items['NCM'].astype(str) if 'NCM' in df_items.columns else pd.Series('', index=df_items.index)
+    rates = ncm_rates_df.reindex(ncm_keys.to_numpy())[_NCM_RATE_COLUMNS].fillna(0.0).set_axis(df_items.index) / 100
+
+    result = pd.DataFrame(index=df_items.index)
+    result['Estimativa_II_BR'] = vlmd_item * rates['ii_aliquota']
+    result['Estimativa_IPI_BR'] = (vlmd_item + result['Estimativa_II_BR']) * rates['ipi_aliquota']
+    result['Estimativa_PIS_BR'] = vlmd_item * rates['pis_aliquota']
+    result['Estimativa_COFINS_BR'] = vlmd_item * rates['cofins_aliquota']
+    result['Estimativa_ICMS_BR'] = vlmd_item * rates['icms_aliquota']
+    result['VLMD_Item'] = vlmd_item
+    result['Frete_Rateado_USD'] = frete_rateado_usd
+    result['Seguro_Rateado_BRL'] = seguro_rateado_brl
+
+    totals = {
+        'Estimativa_II_BR': float(result['Estimativa_II_BR'].sum()),
+        'Estimativa_IPI_BR': float(result['Estimativa_IPI_BR'].sum()),
+        'Estimativa_PIS_BR': float(result['Estimativa_PIS_BR'].sum()),
+        'Estimativa_COFINS_BR': float(result['Estimativa_COFINS_BR'].sum()),
+        'Estimativa_ICMS_BR': float(result['Estimativa_ICMS_BR'].sum()),
+    }
+    totals['Estimativa_Impostos_Total'] = sum(totals.values())
+    return result, totals
+
 # --- Lógica para Salvar Processo ---
 def _save_process_action(process_id: Optional[int], edited_data: dict, is_new_process: bool):
     """Lógica para salvar ou atualizar um processo."""
@@ -338,6 +480,40 @@ def _standardize_item_data(item_dict: Dict[str, Any], fornecedor: Optional[str]
             standardized_item[key] = default_value
     return standardized_item
 
+def pdf_analysis_to_items(analise_pdf: Dict[str, Any], fornecedor: Optional[str] = None, invoice_n: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Converte uma análise de PDF (pdf_extraction.analyze_pdf) em itens no esquema de DEFAULT_ITEM_SCHEMA,
+    reutilizando a extração de tabelas da página de análise de faturas.
+    """
+    invoice_info = analise_pdf.get('invoice', {})
+    invoice_fornecedor = invoice_info.get('Fornecedor', 'N/A')
+    ncm_principal = analise_pdf.get('ncm_principal', 'N/A')
+    itens = []
+    for section_keyword in ("PAID PRODUCTS", "FREE OF CHARGE PRODUCTS"):
+        for item_pdf in pdf_analyzer_page.extract_products_from_pages(analise_pdf.get('pages', []), section_keyword, invoice_fornecedor=invoice_fornecedor):
+            try:
+                quantidade = int(item_pdf.get("Qtde", 0))
+            except (TypeError, ValueError):
+                quantidade = 0
+            ncm = item_pdf.get("NCM", "N/A")
+            if ncm in (None, "", "N/A"):
+                ncm = ncm_principal
+            raw_item = {
+                "Código Interno": item_pdf.get("Código Interno"),
+                "NCM": re.sub(r'\D', '', str(ncm)) if ncm != "N/A" else None,
+                "Cobertura": item_pdf.get("Cobertura", "NÃO"),
+                "SKU": item_pdf.get("SKU"),
+                "Quantidade": quantidade,
+                "Peso Unitário": item_pdf.get("Peso Unitário", 0.0),
+                "Valor Unitário": item_pdf.get("Valor Unitário", 0.0),
+                "Denominação do produto": item_pdf.get("Denominação do produto"),
+                "Detalhamento complementar do produto": item_pdf.get("Detalhamento complementar do produto"),
+            }
+            item = _standardize_item_data(raw_item, fornecedor, invoice_n)
+            item["Valor total do item"] = item_pdf.get("Valor total do item") or item["Quantidade"] * item["Valor Unitário"]
+            itens.append(item)
+    return itens
+
 def show_process_form_page(process_identifier: Optional[Any] = None, reload_processes_callback: Optional[callable] = None):
     """
     Exibe o formulário de edição/criação de processo em uma página dedicada.
@@ -614,8 +790,7 @@ def show_process_form_page(process_identifier: Optional[Any] = None, reload_proc
                         with st.form("add_item_form_fixed", clear_on_submit=True):
                             new_item_codigo_interno = st.text_input("Código Interno", key="new_item_codigo_interno_popup")
                             
-                            all_ncm_items = db_utils.selecionar_todos_ncm_itens()
-                            ncm_options = [""] + sorted([ncm_list_page.format_ncm_code(item['ncm_code']) for item in all_ncm_items]) if ncm_list_page else [""]
+                            ncm_options = [""] + sorted([ncm_list_page.format_ncm_code(ncm_code) for ncm_code in db_utils.get_ncm_rates_map()]) if ncm_list_page else [""]
                             new_item_ncm_display = st.selectbox("NCM", options=ncm_options, key="new_item_ncm_popup")
                             
                             new_item_cobertura = st.selectbox("Cobertura", options=["SIM", "NÃO"], key="new_item_cobertura_popup")
@@ -650,38 +825,35 @@ def show_process_form_page(process_identifier: Optional[Any] = None, reload_proc
                                 st.session_state.show_add_item_popup = False
                                 st.rerun()
 
+                if pdf_analyzer_page:
+                    with st.expander("Importar Itens de PDF (Invoice/Packing List)"):
+                        # Mensagem da importação anterior, guardada para aparecer depois do st.rerun()
+                        mensagem_pdf = st.session_state.pop('process_items_pdf_message', None)
+                        if mensagem_pdf:
+                            _display_message_box(*mensagem_pdf)
+                        uploaded_pdf = st.file_uploader("Escolha um arquivo PDF", type=["pdf"], key="process_items_pdf_uploader")
+                        if uploaded_pdf is not None:
+                            # A análise fica em cache pelo hash do arquivo: os reruns não refazem a extração
+                            with st.spinner("Analisando PDF..."):
+                                analise_pdf = pdf_extraction.analyze_pdf(uploaded_pdf.getvalue())
+                            pdf_items = pdf_analysis_to_items(analise_pdf, current_fornecedor_context, current_invoice_n_context)
+                            st.write(f"{len(pdf_items)} item(ns) encontrado(s) no PDF (Invoice N#: {analise_pdf.get('invoice', {}).get('Invoice N#', 'N/A')}).")
+                            if pdf_items and st.button("Adicionar itens do PDF", key="add_pdf_items_button"):
+                                st.session_state.process_items_data.extend(pdf_items)
+                                st.session_state.process_items_pdf_message = (f"{len(pdf_items)} item(ns) importado(s) do PDF.", "success")
+                                st.rerun()
+
                 st.markdown("---") 
 
-                # Ensure df_items is created with all expected columns from the schema
-                df_items = pd.DataFrame(st.session_state.process_items_data)
-                
-                # Garanta que todas as colunas de DEFAULT_ITEM_SCHEMA estão presentes no DataFrame
-                for col in DEFAULT_ITEM_SCHEMA.keys():
-                    if col not in df_items.columns:
-                        df_items[col] = None
-
-                # Recalculate totals needed for tax calculation before displaying anything
-                total_invoice_value_usd_for_calc = df_items["Valor total do item"].sum() if "Valor total do item" in df_items.columns else 0
-                total_invoice_weight_kg_for_calc = 0
-                if "Peso Unitário" in df_items.columns and "Quantidade" in df_items.columns:
-                    df_items['Peso Total do Item Calculado'] = pd.to_numeric(df_items['Peso Unitário'], errors='coerce').fillna(0) * \
-                                                            pd.to_numeric(df_items['Quantidade'], errors='coerce').fillna(0)
-                    total_invoice_weight_kg_for_calc = df_items['Peso Total do Item Calculado'].sum()
-
-                # Re-calculate taxes for all items in session state
+                # Re-calculate taxes for all items in session state (laço ou versão vetorizada, conforme a quantidade)
                 dolar_brl = st.session_state[form_state_key].get("Estimativa_Dolar_BRL", 0.0)
-                updated_process_items_data = []
-                for item in st.session_state.process_items_data:
-                    updated_item = calculate_item_taxes_and_values(
-                        item.copy(), # Pass a copy to ensure original is not modified during calculation
-                        dolar_brl,
-                        total_invoice_value_usd_for_calc,
-                        total_invoice_weight_kg_for_calc,
-                        st.session_state[form_state_key].get('Estimativa_Frete_USD', 0.0),
-                        st.session_state[form_state_key].get('Estimativa_Seguro_BRL', 0.0)
-                    )
-                    updated_process_items_data.append(updated_item)
-                st.session_state.process_items_data = updated_process_items_data
+                st.session_state.process_items_data, st.session_state.process_items_tax_totals = calculate_items_taxes(
+                    st.session_state.process_items_data,
+                    db_utils.get_ncm_rates_map(), # Alíquotas carregadas uma vez
+                    dolar_brl,
+                    st.session_state[form_state_key].get('Estimativa_Frete_USD', 0.0),
+                    st.session_state[form_state_key].get('Estimativa_Seguro_BRL', 0.0)
+                )
                 
                 # Re-create DataFrame from the updated session state for display
                 df_items = pd.DataFrame(st.session_state.process_items_data)
@@ -757,8 +929,7 @@ def show_process_form_page(process_identifier: Optional[Any] = None, reload_proc
                             with st.form("edit_item_form_fixed", clear_on_submit=False):
                                 edited_codigo_interno = st.text_input("Código Interno", value=item_data.get("Código Interno", ""), key="edit_item_codigo_interno_popup")
                                 
-                                all_ncm_items = db_utils.selecionar_todos_ncm_itens()
-                                ncm_options = [""] + sorted([ncm_list_page.format_ncm_code(item['ncm_code']) for item in all_ncm_items]) if ncm_list_page else [""]
+                                ncm_options = [""] + sorted([ncm_list_page.format_ncm_code(ncm_code) for ncm_code in db_utils.get_ncm_rates_map()]) if ncm_list_page else [""]
                                 current_ncm_display = ncm_list_page.format_ncm_code(str(item_data.get("NCM", ""))) if ncm_list_page else str(item_data.get("NCM", ""))
                                 edited_ncm_display = st.selectbox("NCM", options=ncm_options, index=ncm_options.index(current_ncm_display) if current_ncm_display in ncm_options else 0, key="edit_item_ncm_popup")
                                 
@@ -900,16 +1071,13 @@ def show_process_form_page(process_identifier: Optional[Any] = None, reload_proc
                 estimativa_frete_usd = st.session_state[form_state_key].get('Estimativa_Frete_USD', 0.0)
                 estimativa_seguro_brl = st.session_state[form_state_key].get('Estimativa_Seguro_BRL', 0.0)
 
-                total_ii = total_ipi = total_pis = total_cofins = total_icms_calculated_sum = 0.0
-                if st.session_state.process_items_data:
-                    # Nao precisa recalcular itens inteiros aqui, eles ja foram atualizados na aba Itens
-                    # Apenas somar os totais dos itens existentes
-                    for item in st.session_state.process_items_data:
-                        total_ii += item.get('Estimativa_II_BR', 0.0)
-                        total_ipi += item.get('Estimativa_IPI_BR', 0.0)
-                        total_pis += item.get('Estimativa_PIS_BR', 0.0)
-                        total_cofins += item.get('Estimativa_COFINS_BR', 0.0)
-                        total_icms_calculated_sum += item.get('Estimativa_ICMS_BR', 0.0)
+                # Nao precisa recalcular itens aqui: os totais ja foram calculados na aba Itens
+                item_tax_totals = st.session_state.get('process_items_tax_totals') or {}
+                total_ii = item_tax_totals.get('Estimativa_II_BR', 0.0)
+                total_ipi = item_tax_totals.get('Estimativa_IPI_BR', 0.0)
+                total_pis = item_tax_totals.get('Estimativa_PIS_BR', 0.0)
+                total_cofins = item_tax_totals.get('Estimativa_COFINS_BR', 0.0)
+                total_icms_calculated_sum = item_tax_totals.get('Estimativa_ICMS_BR', 0.0)
 
                 st.session_state[form_state_key]['Estimativa_II_BR'] = total_ii
                 st.session_state[form_state_key]['Estimativa_IPI_BR'] = total_ipi
@@ -917,7 +1085,7 @@ def show_process_form_page(process_identifier: Optional[Any] = None, reload_proc
                 st.session_state[form_state_key]['Estimativa_COFINS_BR'] = total_cofins
                 
                 # Calcular Estimativa Impostos (R$) - Soma de todos os impostos calculados
-                total_impostos_reais = total_ii + total_ipi + total_pis + total_cofins + total_icms_calculated_sum
+                total_impostos_reais = item_tax_totals.get('Estimativa_Impostos_Total', 0.0)
                 st.session_state[form_state_key]['Estimativa_Impostos_Total'] = total_impostos_reais
 
 
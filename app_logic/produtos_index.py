@@ -0,0 +1,182 @@
+import sqlite3
+import logging
+import threading
+import re
+from typing import Optional, Dict, Any, List, Iterable
+
+import pandas as pd
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import db_utils
+
+
+logger = logging.getLogger(__name__)
+
+_COLUNAS = ["id_key_erp", "nome_part", "descricao", "ncm"]
+# Colunas pesquisadas via índice de trigramas (FTS5); as demais usam busca direta em memória
+_COLUNAS_FTS = ["nome_part", "descricao"]
+# O tokenizer 'trigram' só indexa termos com 3 ou mais caracteres
+_TAMANHO_MINIMO_TRIGRAMA = 3
+
+_RE_NAO_DIGITO = re.compile(r'\D')
+
+
+def _normalizar_texto(valor: Any) -> str:
+    """Normaliza um valor para comparação case-insensitive."""
+    if valor is None:
+        return ""
+    return str(valor).strip().lower()
+
+
+def _normalizar_ncm(valor: Any) -> str:
+    """Remove a formatação do NCM, mantendo apenas os dígitos."""
+    if valor is None:
+        return ""
+    return _RE_NAO_DIGITO.sub('', str(valor))
+
+
+def _format_ncm(ncm_value):
+    """Formata o NCM para o padrão xxxx.xx.xx."""
+    if ncm_value and isinstance(ncm_value, str) and len(ncm_value) == 8:
+        return f"{ncm_value[0:4]}.{ncm_value[4:6]}.{ncm_value[6:8]}"
+    return ncm_value
+
+
+class ProdutosIndex:
+    """
+    Índice em memória do catálogo de produtos.
+
+    Mantém colunas normalizadas (minúsculas), um índice FTS5 de trigramas para
+    'nome_part' e 'descricao' e dicionários de busca exata por 'id_key_erp' e NCM.
+    A instância é imutável após a construção e pode ser compartilhada entre sessões;
+    qualquer escrita no banco deve descartar a instância e construir uma nova.
+    """
+
+    def __init__(self, produtos: Iterable[Any]):
+        self._rows: List[Dict[str, Any]] = []
+        for p in produtos:
+            self._rows.append({col: p[i] for i, col in enumerate(_COLUNAS)})
+
+        self._ids_norm = [_normalizar_texto(r['id_key_erp']) for r in self._rows]
+        self._ncms_norm = [_normalizar_ncm(r['ncm']) for r in self._rows]
+        self._textos_norm = {
+            col: [_normalizar_texto(r[col]) for r in self._rows] for col in _COLUNAS_FTS
+        }
+
+        # Busca exata (hash) por ID e por NCM
+        self._pos_por_id: Dict[str, int] = {}
+        for pos, row in enumerate(self._rows):
+            if row['id_key_erp'] is not None:
+                self._pos_por_id[str(row['id_key_erp'])] = pos
+        self._pos_por_ncm: Dict[str, List[int]] = {}
+        for pos, ncm in enumerate(self._ncms_norm):
+            if ncm:
+                self._pos_por_ncm.setdefault(ncm, []).append(pos)
+
+        # DataFrame de exibição construído uma única vez (NCM já formatado)
+        if self._rows:
+            self.frame = pd.DataFrame(self._rows, columns=_COLUNAS)
+            self.frame['ncm'] = self.frame['ncm'].apply(_format_ncm)
+        else:
+            self.frame = pd.DataFrame(columns=_COLUNAS)
+
+        self._lock = threading.Lock()
+        self._fts_conn = self._criar_indice_fts()
+
+    def _criar_indice_fts(self) -> Optional[sqlite3.Connection]:
+        """Cria o índice FTS5 (trigram) em memória. Retorna None se o SQLite não suportar."""
+        try:
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            conn.execute(
+                f"CREATE VIRTUAL TABLE produtos_fts USING fts5({', '.join(_COLUNAS_FTS)}, tokenize='trigram')"
+            )
+            conn.executemany(
+                f"INSERT INTO produtos_fts (rowid, {', '.join(_COLUNAS_FTS)}) VALUES (?, ?, ?)",
+                ((pos, *(self._textos_norm[col][pos] for col in _COLUNAS_FTS)) for pos in range(len(self._rows)))
+            )
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            logger.warning(f"FTS5 com tokenizer trigram indisponível, usando busca linear em memória: {e}")
+            return None
+
+    @classmethod
+    def from_db(cls, db_path: str) -> "ProdutosIndex":
+        """Constrói o índice a partir da tabela 'produtos'."""
+        produtos = db_utils.selecionar_todos_produtos(db_path)
+        index = cls(produtos)
+        logger.info(f"Índice do catálogo de produtos construído com {len(index)} produtos.")
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, id_key_erp: str) -> Optional[Dict[str, Any]]:
+        """Retorna o produto com o ID/Key ERP exato, ou None."""
+        pos = self._pos_por_id.get(str(id_key_erp))
+        return dict(self._rows[pos]) if pos is not None else None
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Retorna um dicionário {id: produto} apenas para os IDs encontrados."""
+        encontrados = {}
+        for id_key_erp in ids:
+            produto = self.get(id_key_erp)
+            if produto is not None:
+                encontrados[id_key_erp] = produto
+        return encontrados
+
+    def _buscar_texto(self, col_id: str, termo: str) -> List[int]:
+        termo_norm = _normalizar_texto(termo)
+        if self._fts_conn is not None and len(termo_norm) >= _TAMANHO_MINIMO_TRIGRAMA:
+            consulta = '"' + termo_norm.replace('"', '""') + '"'
+            with self._lock:
+                cursor = self._fts_conn.execute(
+                    f"SELECT rowid FROM produtos_fts WHERE {col_id} MATCH ? ORDER BY rowid", (consulta,)
+                )
+                return [r[0] for r in cursor.fetchall()]
+        coluna = self._textos_norm[col_id]
+        return [pos for pos, valor in enumerate(coluna) if termo_norm in valor]
+
+    def _buscar_id(self, termo: str) -> List[int]:
+        termo_norm = _normalizar_texto(termo)
+        return [pos for pos, valor in enumerate(self._ids_norm) if termo_norm in valor]
+
+    def _buscar_ncm(self, termo: str) -> List[int]:
+        termo_norm = _normalizar_ncm(termo)
+        if not termo_norm:
+            return []
+        if len(termo_norm) == 8:
+            return list(self._pos_por_ncm.get(termo_norm, []))
+        return [pos for pos, valor in enumerate(self._ncms_norm) if termo_norm in valor]
+
+    def search_positions(self, search_terms: Dict[str, str]) -> Optional[List[int]]:
+        """
+        Retorna as posições (ordem original) dos produtos que contêm todos os termos informados.
+        Retorna None quando nenhum termo foi informado (ou seja, todos os produtos).
+        """
+        resultado = None
+        for col_id, termo in search_terms.items():
+            if not termo:
+                continue
+            if col_id == 'id_key_erp':
+                posicoes = self._buscar_id(termo)
+            elif col_id == 'ncm':
+                posicoes = self._buscar_ncm(termo)
+            elif col_id in _COLUNAS_FTS:
+                posicoes = self._buscar_texto(col_id, termo)
+            else:
+                logger.warning(f"Coluna de pesquisa '{col_id}' não indexada. Ignorando este filtro.")
+                continue
+            resultado = set(posicoes) if resultado is None else resultado.intersection(posicoes)
+            if not resultado:
+                return []
+        return sorted(resultado) if resultado is not None else None
+
+    def search(self, search_terms: Dict[str, str]) -> pd.DataFrame:
+        """Filtra o catálogo. Sem termos, retorna o próprio DataFrame do índice (sem cópia)."""
+        posicoes = self.search_positions(search_terms)
+        if posicoes is None:
+            return self.frame
+        return self.frame.iloc[posicoes]
@@ -1,161 +1,42 @@
 import streamlit as st
 import pandas as pd
 import folium
-from streamlit_folium import st_folium
+import streamlit.components.v1 as components
 import os
 import time
-import sqlite3
+import hashlib
 import requests # Necessário para fazer requisições HTTP a APIs
 
 from app_logic.utils import set_background_image
+from app_logic import ship_tracking
+import db_utils
 
 # Configuração da API Maersk (Track & Trace Events)
 MAERSK_CONSUMER_KEY = "GJhpMY1GH45LNZLKHj20uacD1vYgR5jd" # SUA CONSUMER KEY REAL DA MAERSK
-MAERSK_BASE_URL = "https://api.maersk.com/track-and-trace-private" # URL de Produção
-
-# Mock do db_utils (ajustado para a nova estrutura de dados da Maersk API)
-class MockDbUtils:
-    def __init__(self, db_path="data/comex_db.db"):
-        self.db_path = db_path
-        self._create_table_if_not_exists()
-
-    def _create_table_if_not_exists(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        # Nova tabela para rastreamento de remessas/equipamentos
-        cursor.execute("DROP TABLE IF EXISTS tracked_shipments") # Drop para garantir esquema atualizado
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tracked_shipments (
-                tracking_ref TEXT PRIMARY KEY, -- Número do BL ou Contêiner (da Maersk)
-                tracking_type TEXT,            -- 'BL' ou 'Container'
-                imo_number TEXT,               -- Número IMO do navio (da Maersk API)
-                vessel_name TEXT,              -- Nome do navio (da Maersk API)
-                latitude REAL,
-                longitude REAL,
-                status TEXT,                   -- Status do evento (ACT, PLN, EST)
-                last_updated TEXT,
-                shipping_line TEXT             -- Companhia de navegação (entrada do usuário para contexto)
-            )
-        """)
-        conn.commit()
-        conn.close()
-
-    def add_tracked_shipment(self, tracking_ref, tracking_type, shipping_line, imo_number="N/A", vessel_name="Desconhecido", latitude=0.0, longitude=0.0, status="Indefinido"):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO tracked_shipments (tracking_ref, tracking_type, imo_number, vessel_name, latitude, longitude, status, last_updated, shipping_line)
-                VALUES (?, ?, ?, ?, ?, ?, ?, DATETIME('now'), ?)
-            """, (tracking_ref, tracking_type, imo_number, vessel_name, latitude, longitude, status, shipping_line))
-            conn.commit()
-            st.success(f"Rastreamento para '{tracking_ref}' adicionado/atualizado no banco de dados local.")
-            return True
-        except sqlite3.Error as e:
-            st.error(f"Erro ao adicionar/atualizar rastreamento no DB local: {e}")
-            return False
-        finally:
-            conn.close()
-
-    def get_all_tracked_shipments(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT tracking_ref, tracking_type, imo_number, vessel_name, latitude, longitude, status, last_updated, shipping_line FROM tracked_shipments")
-        shipments = cursor.fetchall()
-        conn.close()
-        return [{"Tracking Ref": s[0], "Tipo": s[1], "IMO": s[2], "Nome do Navio": s[3], "Latitude": s[4], "Longitude": s[5], "Status": s[6], "Última Atualização": s[7], "Companhia": s[8]} for s in shipments]
-
-    def update_shipment_position(self, tracking_ref, imo_number, vessel_name, latitude, longitude, status, last_updated):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                UPDATE tracked_shipments
-                SET imo_number = ?, vessel_name = ?, latitude = ?, longitude = ?, status = ?, last_updated = ?
-                WHERE tracking_ref = ?
-            """, (imo_number, vessel_name, latitude, longitude, status, last_updated, tracking_ref))
-            conn.commit()
-            return True
-        except sqlite3.Error as e:
-            st.error(f"Erro ao atualizar posição para {tracking_ref} no DB local: {e}")
-            return False
-        finally:
-            conn.close()
-
-# Inicializa o mock de DB
-mock_db = MockDbUtils()
-
-# Função para fazer a requisição GET para Maersk API e obter eventos
+MAERSK_BASE_URL = ship_tracking.MAERSK_BASE_URL
+
+# Cor do marcador por status do evento (ACT, PLN, EST); demais status em vermelho
+CORES_STATUS = {'ACT': 'green', 'PLN': 'blue', 'EST': 'orange'}
+COR_STATUS_PADRAO = 'red'
+# Colunas que definem o conteúdo do mapa: o HTML só é gerado de novo quando alguma delas muda
+COLUNAS_MAPA = ['Tracking Ref', 'Tipo', 'IMO', 'Nome do Navio', 'Latitude', 'Longitude', 'Status', 'Última Atualização']
+ALTURA_MAPA = 615
+
+# Função para fazer a requisição GET para Maersk API e obter eventos (uma referência, com mensagens na tela)
 def maersk_get_events_data(consumer_key, transport_document_reference=None, equipment_reference=None, carrier_booking_reference=None):
-    url = f"{MAERSK_BASE_URL}/events"
-    headers = {
-        'Consumer-Key': consumer_key,
-        'API-Version': '1' # Conforme documentação, versão MAIOR '1'
-    }
-    params = {}
-    
-    # Adiciona apenas o parâmetro que foi fornecido (apenas um é necessário por requisição)
+    # Usa apenas o parâmetro que foi fornecido (apenas um é necessário por requisição)
     if transport_document_reference:
-        params['transportDocumentReference'] = transport_document_reference
+        tracking_ref, tracking_type = transport_document_reference, "BL"
     elif equipment_reference:
-        params['equipmentReference'] = equipment_reference
+        tracking_ref, tracking_type = equipment_reference, "Container"
     elif carrier_booking_reference:
-        params['carrierBookingReference'] = carrier_booking_reference
-    
-    # Se nenhum parâmetro de rastreamento foi fornecido, retorna None
-    if not params:
+        tracking_ref, tracking_type = carrier_booking_reference, "Booking"
+    else:
         st.error("É necessário fornecer pelo menos uma referência (BL, Contêiner ou Booking) para a API Maersk.")
         return None
 
-    # Filtra por eventos de Transporte ou Equipamento, pois contêm dados de localização
-    params['eventType'] = 'TRANSPORT,EQUIPMENT' 
-    
-    # Ordena por eventDateTime em ordem decrescente para obter o evento mais recente primeiro
-    params['sort'] = 'eventDateTime:DESC'
-    params['limit'] = 1 # Obtém apenas o evento mais recente
-
-    st.info(f"DEBUG (Maersk API): URL: {url}")
-    st.info(f"DEBUG (Maersk API): Headers: {{'Consumer-Key': '...', 'API-Version': '1'}}") # Oculta a chave real no debug
-    st.info(f"DEBUG (Maersk API): Params: {params}")
-
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status() # Lança HTTPError para respostas de erro (4xx ou 5xx)
-        data = response.json()
-
-        if data and 'events' in data and len(data['events']) > 0:
-            # Itera sobre os eventos para encontrar o mais relevante com dados de localização/navio
-            for event in data['events']:
-                event_type = event.get('eventType')
-                
-                if event_type in ['TRANSPORT', 'EQUIPMENT']:
-                    transport_call = event.get('transportCall')
-                    if transport_call:
-                        location = transport_call.get('location')
-                        vessel = transport_call.get('vessel')
-
-                        if location and vessel:
-                            # Converte latitude e longitude para float, caso venham como string
-                            lat = float(location.get('latitude', 0.0))
-                            lon = float(location.get('longitude', 0.0))
-                            imo = str(vessel.get('vesselIMONumber', 'N/A'))
-                            vessel_name = vessel.get('vesselName', 'Desconhecido')
-                            status = event.get('eventClassifierCode', 'Indefinido') # ACT, PLN, EST
-
-                            st.success(f"Dados obtidos da API Maersk para a referência.")
-                            return {
-                                'latitude': lat,
-                                'longitude': lon,
-                                'imo_number': imo,
-                                'vessel_name': vessel_name,
-                                'status': status
-                            }
-            st.warning(f"Nenhum evento de transporte/equipamento com dados de localização/navio encontrado para a referência.")
-            return None
-        else:
-            st.warning(f"Nenhum evento encontrado na API Maersk para a referência: {transport_document_reference or equipment_reference or carrier_booking_reference}")
-            return None
-
+        data = ship_tracking.consultar_eventos(consumer_key, tracking_ref, tracking_type, MAERSK_BASE_URL)
     except requests.exceptions.RequestException as e:
         st.error(f"Erro de rede ao obter dados da API Maersk: {e}")
         return None
@@ -166,6 +47,67 @@ def maersk_get_events_data(consumer_key, transport_document_reference=None, equi
         st.error(f"Erro inesperado ao obter dados da API Maersk: {e}")
         return None
 
+    if not data or not data.get('events'):
+        st.warning(f"Nenhum evento encontrado na API Maersk para a referência: {tracking_ref}")
+        return None
+    posicao = ship_tracking.extrair_posicao(data)
+    if posicao is None:
+        st.warning(f"Nenhum evento de transporte/equipamento com dados de localização/navio encontrado para a referência.")
+        return None
+    st.success(f"Dados obtidos da API Maersk para a referência.")
+    return posicao
+
+
+def _assinatura_posicoes(df: pd.DataFrame) -> str:
+    """Hash das colunas exibidas no mapa (independe da ordem das linhas)."""
+    hashes = pd.util.hash_pandas_object(df[COLUNAS_MAPA].astype(str), index=False).sort_values()
+    return hashlib.sha1(hashes.values.tobytes()).hexdigest()
+
+
+def _feature_collection(df: pd.DataFrame) -> dict:
+    """Monta a GeoJSON FeatureCollection dos rastreamentos com coordenadas, em uma única passagem pelas colunas."""
+    df = df.dropna(subset=['Latitude', 'Longitude'])
+    cores = df['Status'].map(CORES_STATUS).fillna(COR_STATUS_PADRAO).tolist()
+    propriedades = df[COLUNAS_MAPA].astype(object).where(df[COLUNAS_MAPA].notna(), '').to_dict('records')
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                'properties': {**props, 'cor': cor},
+            }
+            for lat, lon, cor, props in zip(df['Latitude'].astype(float).tolist(), df['Longitude'].astype(float).tolist(), cores, propriedades)
+        ],
+    }
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _mapa_html(assinatura: str, _df: pd.DataFrame) -> str:
+    """
+    HTML do mapa com todos os marcadores em uma única camada GeoJSON (desenhada em canvas).
+    Fica em cache pela assinatura das posições; '_df' não entra na chave do cache.
+    """
+    m = folium.Map(location=[-23.5505, -46.6333], zoom_start=5, prefer_canvas=True)
+    campos = [c for c in COLUNAS_MAPA if c not in ('Latitude', 'Longitude')]
+    folium.GeoJson(
+        _feature_collection(_df),
+        name="Rastreamentos",
+        marker=folium.CircleMarker(radius=7, fill=True, fill_opacity=0.9, weight=1),
+        style_function=lambda feature: {'color': feature['properties']['cor'], 'fillColor': feature['properties']['cor']},
+        tooltip=folium.GeoJsonTooltip(fields=['Nome do Navio'], labels=False),
+        popup=folium.GeoJsonPopup(fields=campos, aliases=[f"{c}:" for c in campos]),
+    ).add_to(m)
+    return m.get_root().render()
+
+
+def _show_mapa(df_shipments_display: pd.DataFrame):
+    if df_shipments_display.empty:
+        st.info("Nenhum rastreamento disponível para exibição no mapa.")
+        return
+    html = _mapa_html(_assinatura_posicoes(df_shipments_display), df_shipments_display)
+    components.html(html, height=ALTURA_MAPA)
+
 
 def show_page():
     """
@@ -220,17 +162,14 @@ def show_page():
                 
                 if api_data:
                     # 2. Se a API retornou dados, adicionar/atualizar no DB local
-                    success = mock_db.add_tracked_shipment(
+                    success = db_utils.adicionar_rastreamento(
                         tracking_ref=tracking_ref,
                         tracking_type=tracking_type,
                         shipping_line=shipping_line_input,
-                        imo_number=api_data.get('imo_number', 'N/A'),
-                        vessel_name=api_data.get('vessel_name', 'Desconhecido'),
-                        latitude=api_data.get('latitude', 0.0),
-                        longitude=api_data.get('longitude', 0.0),
-                        status=api_data.get('status', 'Indefinido')
+                        posicao=api_data
                     )
                     if success:
+                        st.success(f"Rastreamento para '{tracking_ref}' adicionado/atualizado no banco de dados local.")
                         st.session_state['refresh_map'] = True # Sinaliza para recarregar o mapa
                     else:
                         st.error("Falha ao adicionar/atualizar rastreamento no banco de dados local.")
@@ -249,56 +188,41 @@ def show_page():
     table_placeholder = st.empty()
     status_placeholder = st.empty()
 
+    forcar_consulta = st.checkbox(
+        "Consultar todos os rastreamentos (ignorar intervalo de consulta e entregues)", value=False, key="ship_map_forcar_consulta"
+    )
+
     # Botão para atualizar posições (agora usando a API Maersk)
     if st.button("Atualizar Posições dos Rastreamentos (via Maersk API)") or st.session_state.get('refresh_map', False):
         st.session_state['refresh_map'] = False # Reseta o sinal
         
         status_placeholder.info("Buscando e atualizando dados dos rastreamentos via Maersk API...")
         
-        tracked_shipments = mock_db.get_all_tracked_shipments()
-        updated_shipments_for_display = []
+        tracked_shipments = db_utils.get_rastreamentos()
+        # Só consulta a API para referências não entregues cuja última consulta já passou do intervalo configurado
+        pendentes = [s for s in tracked_shipments if s.get('Tipo') in ship_tracking.PARAMETRO_POR_TIPO] if forcar_consulta \
+            else db_utils.get_rastreamentos_para_atualizar()
 
         if not tracked_shipments:
             status_placeholder.warning("Nenhum rastreamento no banco de dados para rastrear.")
         elif MAERSK_CONSUMER_KEY == "SUA_CONSUMER_KEY_AQUI":
             status_placeholder.error("Por favor, configure sua MAERSK_CONSUMER_KEY no código para atualizar os rastreamentos.")
         else:
-            for shipment in tracked_shipments:
-                tracking_ref = shipment.get('Tracking Ref')
-                tracking_type = shipment.get('Tipo')
-                
-                api_data = None
-                if tracking_type == "BL":
-                    api_data = maersk_get_events_data(MAERSK_CONSUMER_KEY, transport_document_reference=tracking_ref)
-                elif tracking_type == "Container":
-                    api_data = maersk_get_events_data(MAERSK_CONSUMER_KEY, equipment_reference=tracking_ref)
-                
-                if api_data:
-                    # Atualizar a posição no DB local
-                    mock_db.update_shipment_position(
-                        tracking_ref,
-                        api_data.get('imo_number', 'N/A'),
-                        api_data.get('vessel_name', 'Desconhecido'),
-                        api_data.get('latitude', 0.0),
-                        api_data.get('longitude', 0.0),
-                        api_data.get('status', 'Indefinido'),
-                        time.strftime("%Y-%m-%d %H:%M:%S")
-                    )
-                    # Adicionar os dados atualizados para exibição
-                    updated_shipments_for_display.append({
-                        **shipment, # Copia os dados existentes
-                        'IMO': api_data.get('imo_number', 'N/A'),
-                        'Nome do Navio': api_data.get('vessel_name', 'Desconhecido'),
-                        'Latitude': api_data.get('latitude', 0.0),
-                        'Longitude': api_data.get('longitude', 0.0),
-                        'Status': api_data.get('status', 'Indefinido'),
-                        'Última Atualização': time.strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                else:
-                    # Se a API falhou, manter os dados existentes do DB para exibição
-                    updated_shipments_for_display.append(shipment)
-                    st.warning(f"Não foi possível obter dados atualizados para {tracking_ref}. Usando dados locais.")
-
+            # Consulta os rastreamentos pendentes em paralelo e grava o resultado de uma vez
+            resultados = ship_tracking.atualizar_posicoes(pendentes, MAERSK_CONSUMER_KEY, MAERSK_BASE_URL)
+            db_utils.registrar_consultas_rastreamento(resultados, time.strftime("%Y-%m-%d %H:%M:%S"))
+            falhas = [f"{r['tracking_ref']}: {r['erro']}" for r in resultados if not r['dados']]
+            sem_resposta = [r['tracking_ref'] for r in resultados if not r.get('respondida')]
+            if len(pendentes) < len(tracked_shipments):
+                st.caption(f"{len(tracked_shipments) - len(pendentes)} rastreamento(s) consultado(s) recentemente ou entregue(s) não foram consultados.")
+            if falhas:
+                st.warning(f"Não foi possível obter dados atualizados para {len(falhas)} rastreamento(s). Usando dados locais.")
+                if sem_resposta:
+                    st.warning(f"Sem resposta da API para {', '.join(sem_resposta)}; serão consultados novamente na próxima atualização.")
+                with st.expander("Rastreamentos não atualizados"):
+                    st.write("\n".join(f"- {falha}" for falha in falhas))
+
+            updated_shipments_for_display = db_utils.get_rastreamentos()
             df_shipments_display = pd.DataFrame(updated_shipments_for_display)
 
             # Exibir a tabela de rastreamentos
@@ -307,67 +231,52 @@ def show_page():
 
             # Exibir o mapa interativo
             with map_placeholder:
-                if not df_shipments_display.empty:
-                    m = folium.Map(location=[-23.5505, -46.6333], zoom_start=5)
-
-                    for idx, row in df_shipments_display.iterrows():
-                        if row['Status'] == 'ACT': # Exemplo de status da Maersk API
-                            icon_color = 'green'
-                        elif row['Status'] == 'PLN':
-                            icon_color = 'blue'
-                        elif row['Status'] == 'EST':
-                            icon_color = 'orange'
-                        else:
-                            icon_color = 'red'
-
-                        folium.Marker(
-                            location=[row['Latitude'], row['Longitude']],
-                            popup=f"<b>{row['Nome do Navio']}</b><br>IMO: {row['IMO']}<br>Tipo: {row['Tipo']}<br>Ref: {row['Tracking Ref']}<br>Status: {row['Status']}<br>Última Atualização: {row['Última Atualização']}",
-                            tooltip=row['Nome do Navio'],
-                            icon=folium.Icon(color=icon_color, icon='ship', prefix='fa')
-                        ).add_to(m)
-                    
-                    st_folium(m, width=1400, height=615)
-                else:
-                    st.info("Nenhum rastreamento disponível para exibição no mapa.")
+                _show_mapa(df_shipments_display)
             
             status_placeholder.empty()
             st.success("Dados dos rastreamentos atualizados!")
 
     else:
         # Exibe os dados do banco na inicialização ou se não clicou em atualizar
-        tracked_shipments = mock_db.get_all_tracked_shipments()
+        tracked_shipments = db_utils.get_rastreamentos()
         df_shipments_display = pd.DataFrame(tracked_shipments)
         
         with table_placeholder:
             st.dataframe(df_shipments_display, use_container_width=True)
 
         with map_placeholder:
-            if not df_shipments_display.empty:
-                m = folium.Map(location=[-23.5505, -46.6333], zoom_start=5)
-
-                for idx, row in df_shipments_display.iterrows():
-                    if row['Status'] == 'ACT':
-                        icon_color = 'green'
-                    elif row['Status'] == 'PLN':
-                        icon_color = 'blue'
-                    elif row['Status'] == 'EST':
-                        icon_color = 'orange'
-                    else:
-                        icon_color = 'red'
-
-                    folium.Marker(
-                        location=[row['Latitude'], row['Longitude']],
-                        popup=f"<b>{row['Nome do Navio']}</b><br>IMO: {row['IMO']}<br>Tipo: {row['Tipo']}<br>Ref: {row['Tracking Ref']}<br>Status: {row['Status']}<br>Última Atualização: {row['Última Atualização']}",
-                        tooltip=row['Nome do Navio'],
-                        icon=folium.Icon(color=icon_color, icon='ship', prefix='fa')
-                    ).add_to(m)
-                st_folium(m, width=1400, height=615)
-            else:
-                st.info("Nenhum rastreamento disponível para exibição no mapa.")
+            _show_mapa(df_shipments_display)
 
 
+    _show_configuracao_rastreamento()
+
     st.markdown("---")
     st.write("Este mapa visualiza o rastreamento de cargas e navios via API Maersk (requer Consumer Key e acesso autorizado).")
     st.write("Use o botão 'Atualizar Posições dos Rastreamentos (via Maersk API)' para carregar os dados mais recentes.")
     st.write("Adicione novas referências de rastreamento (BL ou Contêiner) para persistir no banco de dados local.")
+
+
+def _show_configuracao_rastreamento():
+    """Intervalo de consulta, marcação de entregue e histórico de eventos de um rastreamento."""
+    rastreamentos = {r['Tracking Ref']: r for r in db_utils.get_rastreamentos()}
+    if not rastreamentos:
+        return
+    with st.expander("Configurar rastreamento e ver histórico"):
+        tracking_ref = st.selectbox("Rastreamento", list(rastreamentos), key="ship_map_config_ref")
+        rastreamento = rastreamentos[tracking_ref]
+        with st.form("ship_map_config_form"):
+            intervalo = st.number_input(
+                "Intervalo mínimo entre consultas (min)", min_value=1, max_value=7 * 24 * 60, step=15,
+                value=int(rastreamento['Intervalo (min)'] or db_utils.INTERVALO_RASTREAMENTO_PADRAO_MIN)
+            )
+            entregue = st.checkbox("Entregue (não consultar mais)", value=rastreamento['Entregue'])
+            if st.form_submit_button("Salvar"):
+                if db_utils.update_rastreamento_config(tracking_ref, intervalo, entregue):
+                    st.success(f"Configuração de '{tracking_ref}' salva.")
+                else:
+                    st.error(f"Falha ao salvar a configuração de '{tracking_ref}'.")
+        eventos = db_utils.get_eventos_rastreamento(tracking_ref)
+        if eventos:
+            st.dataframe(pd.DataFrame(eventos), use_container_width=True, hide_index=True)
+        else:
+            st.info("Nenhum evento registrado para este rastreamento.")
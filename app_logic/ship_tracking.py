@@ -0,0 +1,179 @@
+"""
+Consulta de posições na API Maersk (Track & Trace Events) para vários rastreamentos ao mesmo tempo.
+
+As consultas usam uma requests.Session compartilhada (conexões keep-alive), com concorrência limitada,
+intervalo mínimo entre requisições ao mesmo host e novas tentativas para falhas de rede, 429 e 5xx.
+Nada aqui usa Streamlit: as páginas recebem os resultados e gravam tudo no banco de uma vez.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+MAERSK_BASE_URL = "https://api.maersk.com/track-and-trace-private"  # URL de Produção
+TIMEOUT_S = (3.05, 15)  # (conexão, leitura)
+TENTATIVAS = 3
+ESPERA_ENTRE_TENTATIVAS_S = 0.5  # dobra a cada nova tentativa
+MAX_CONCORRENCIA = 8
+MAX_REQUISICOES_POR_SEGUNDO = 10.0  # por host
+STATUS_NOVA_TENTATIVA = {429, 500, 502, 503, 504}
+
+# Parâmetro da API para cada tipo de rastreamento
+PARAMETRO_POR_TIPO = {
+    "BL": "transportDocumentReference",
+    "Container": "equipmentReference",
+    "Booking": "carrierBookingReference",
+}
+
+
+class LimitadorPorHost:
+    """Garante um intervalo mínimo entre o início de requisições ao mesmo host (entre todas as threads)."""
+
+    def __init__(self, requisicoes_por_segundo: float):
+        self.intervalo_s = 1.0 / requisicoes_por_segundo if requisicoes_por_segundo else 0.0
+        self._lock = threading.Lock()
+        self._proxima: Dict[str, float] = {}
+
+    def aguardar(self, url: str):
+        if not self.intervalo_s:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            agora = time.monotonic()
+            horario = max(agora, self._proxima.get(host, agora))
+            self._proxima[host] = horario + self.intervalo_s
+        if horario > agora:
+            time.sleep(horario - agora)
+
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_limitador = LimitadorPorHost(MAX_REQUISICOES_POR_SEGUNDO)
+
+
+def get_session() -> requests.Session:
+    """Session compartilhada pelo processo, com pool de conexões do tamanho da concorrência máxima."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCORRENCIA)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def extrair_posicao(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Posição do evento de transporte/equipamento mais recente com local e navio, ou None."""
+    for event in (data or {}).get('events') or []:
+        if event.get('eventType') not in ('TRANSPORT', 'EQUIPMENT'):
+            continue
+        transport_call = event.get('transportCall') or {}
+        location = transport_call.get('location')
+        vessel = transport_call.get('vessel')
+        if location and vessel:
+            # Latitude e longitude podem vir como string
+            return {
+                'latitude': float(location.get('latitude', 0.0)),
+                'longitude': float(location.get('longitude', 0.0)),
+                'imo_number': str(vessel.get('vesselIMONumber', 'N/A')),
+                'vessel_name': vessel.get('vesselName', 'Desconhecido'),
+                'status': event.get('eventClassifierCode', 'Indefinido'),  # ACT, PLN, EST
+                'event_datetime': event.get('eventDateTime'),
+                'event_type': event.get('transportEventTypeCode') or event.get('equipmentEventTypeCode') or event.get('eventType'),
+            }
+    return None
+
+
+def consultar_eventos(consumer_key: str, tracking_ref: str, tracking_type: str, base_url: str = MAERSK_BASE_URL,
+                      session: Optional[requests.Session] = None) -> Optional[Dict[str, Any]]:
+    """
+    Busca o evento mais recente da referência. Retorna o JSON da resposta, ou None se a API não tiver
+    eventos para ela (404). Levanta a última exceção se todas as tentativas falharem.
+    """
+    parametro = PARAMETRO_POR_TIPO.get(tracking_type)
+    if not parametro:
+        raise ValueError(f"Tipo de rastreamento não suportado: {tracking_type}")
+    url = f"{base_url}/events"
+    headers = {'Consumer-Key': consumer_key, 'API-Version': '1'}
+    params = {
+        parametro: tracking_ref,
+        # Eventos de Transporte ou Equipamento contêm os dados de localização
+        'eventType': 'TRANSPORT,EQUIPMENT',
+        'sort': 'eventDateTime:DESC',
+        'limit': 1,
+    }
+    session = session or get_session()
+    espera = ESPERA_ENTRE_TENTATIVAS_S
+    for tentativa in range(1, TENTATIVAS + 1):
+        _limitador.aguardar(url)
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=TIMEOUT_S)
+            if response.status_code == 404:
+                return None
+            if response.status_code in STATUS_NOVA_TENTATIVA and tentativa < TENTATIVAS:
+                retry_after = response.headers.get('Retry-After')
+                espera_resposta = float(retry_after) if retry_after and retry_after.isdigit() else espera
+                logger.warning(f"API Maersk respondeu {response.status_code} para {tracking_ref} ({tentativa}/{TENTATIVAS}).")
+                time.sleep(espera_resposta)
+                espera *= 2
+                continue
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            logger.warning(f"Falha de rede ao consultar {tracking_ref} na API Maersk ({tentativa}/{TENTATIVAS}): {e}")
+            if tentativa == TENTATIVAS:
+                raise
+            time.sleep(espera)
+            espera *= 2
+    return None
+
+
+def consultar_posicao(consumer_key: str, tracking_ref: str, tracking_type: str, base_url: str = MAERSK_BASE_URL,
+                      session: Optional[requests.Session] = None) -> Dict[str, Any]:
+    """
+    Consulta uma referência e devolve {'tracking_ref', 'dados', 'erro', 'respondida'}: 'dados' é o retorno de
+    extrair_posicao() (ou None), 'erro' descreve a falha e 'respondida' indica se a API respondeu (com eventos
+    ou 404 sem eventos), em vez de falhar por rede, timeout ou erro do servidor. Não levanta exceções.
+    """
+    resultado = {'tracking_ref': tracking_ref, 'dados': None, 'erro': None, 'respondida': False}
+    try:
+        data = consultar_eventos(consumer_key, tracking_ref, tracking_type, base_url, session)
+        resultado['respondida'] = True
+        resultado['dados'] = extrair_posicao(data) if data else None
+        if resultado['dados'] is None:
+            resultado['erro'] = "Nenhum evento com localização/navio encontrado."
+    except requests.exceptions.RequestException as e:
+        resultado['erro'] = f"Erro de rede: {e}"
+    except ValueError as e:
+        resultado['erro'] = f"Resposta inválida: {e}"
+    return resultado
+
+
+def atualizar_posicoes(shipments: List[Dict[str, Any]], consumer_key: str, base_url: str = MAERSK_BASE_URL,
+                       max_concorrencia: int = MAX_CONCORRENCIA) -> List[Dict[str, Any]]:
+    """
+    Consulta em paralelo as posições de todos os rastreamentos (dicionários com 'Tracking Ref' e 'Tipo').
+    Retorna os resultados de consultar_posicao() na mesma ordem de shipments.
+    """
+    if not shipments:
+        return []
+    session = get_session()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concorrencia, len(shipments))), thread_name_prefix="rastreamento") as executor:
+        resultados = list(executor.map(
+            lambda s: consultar_posicao(consumer_key, s.get('Tracking Ref'), s.get('Tipo'), base_url, session),
+            shipments
+        ))
+    logger.info(
+        f"{sum(1 for r in resultados if r['dados'])} de {len(resultados)} rastreamento(s) atualizado(s) "
+        f"em {time.perf_counter() - inicio:.2f}s."
+    )
+    return resultados
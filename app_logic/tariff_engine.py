@@ -0,0 +1,409 @@
+"""
+Motor de tarifas dos terminais, transportadoras e fechamento (sem dependência do Streamlit).
+
+Cada terminal tem sua tabela declarativa em TABELAS_TARIFAS (faixas, mínimos, taxas fixas e
+divisores de gross-up dos impostos) e uma função de cálculo que aceita escalares ou arrays NumPy
+(broadcasting). As páginas de cálculo só leem os campos da tela, chamam essas funções e formatam
+o resultado; calcular_terminais() avalia um ou todos os terminais para várias DIs de uma vez.
+"""
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PORTONAVE = "portonave"
+PACLOG_ELO = "paclog_elo"
+FN_TRANSPORTES = "fn_transportes"
+FUTURA = "futura"
+FECHAMENTO = "fechamento"
+
+# --- Tabelas de tarifas ---
+TABELAS_TARIFAS: Dict[str, Dict[str, Any]] = {
+    PORTONAVE: {
+        "nome": "Portonave",
+        # (percentual sobre o VMLD do contêiner, primeiro dia, último dia, mínimo).
+        # O 1º período é cobrado uma única vez; os demais são cobrados por dia dentro da faixa.
+        "faixas_armazenagem": [
+            (0.0047, 1, 6, 909.00),              # 0,47% sobre CIF, min 909.00 (até 6 dias)
+            (0.0033, 7, 14, 263.00),             # 0,33% ao dia, min 263.00 (para dias 7-14)
+            (0.0040, 15, 29, 386.00),            # 0,40% ao dia, min 386.00 (para dias 15-29)
+            (0.0044, 30, float('inf'), 487.00),  # 0,44% ao dia, min 487.00 (para dias 30 em diante)
+        ],
+        "levante": 419.00,
+        "pesagem": 141.00,
+    },
+    PACLOG_ELO: {
+        "nome": "Pac Log Elo",
+        "armazenagem_percentual": 0.0040,  # 0,40% do VMLD
+        "capatazia_por_kg": 0.08,
+        "capatazia_minima": 17.95,
+        "carregamento": 350.00,
+        "divisor_impostos": 0.8775,  # PIS/COFINS/ISS por dentro
+    },
+    FN_TRANSPORTES: {
+        "nome": "FN Transportes",
+        "base_por_container": 1650.00,
+        "percentual_vmld": 0.00055,
+        "baixa_vazio_unitario": 380.00,
+        "divisor_impostos": 0.83,
+    },
+    FUTURA: {
+        "nome": "Futura",
+        "assessoria_logistica": 1000.00,
+        "taxa_mercante": 20.00,
+        "afrmm_percentual": 0.08,
+        "remessa_documentos": 0.00,
+    },
+    FECHAMENTO: {
+        "nome": "Fechamento",
+        "despachante": 1000.00,
+        "connecta": 0.00,
+        "descarregamento": 0.00,
+        "icms_4_percent": 0.00,
+        "envio_docs": 0.00,
+    },
+}
+
+
+def _dividir(numerador, denominador):
+    """Divisão elemento a elemento que mantém o numerador onde o denominador não é positivo."""
+    numerador = np.asarray(numerador, dtype=float)
+    denominador = np.asarray(denominador, dtype=float)
+    forma = np.broadcast(numerador, denominador).shape
+    return np.divide(numerador, denominador, out=np.broadcast_to(numerador, forma).copy(), where=denominador > 0)
+
+
+def _gross_up(base, divisor):
+    """Impostos calculados por dentro: base / divisor - base."""
+    base = np.asarray(base, dtype=float)
+    return base / divisor - base
+
+
+def icms_para_float(icms_sc) -> float:
+    """Converte o ICMS-SC gravado como texto na DI em número; valores não numéricos contam como 0."""
+    if icms_sc is None:
+        return 0.0
+    if isinstance(icms_sc, (int, float)):
+        return 0.0 if pd.isna(icms_sc) else float(icms_sc)
+    texto = str(icms_sc)
+    if not (texto and texto.replace(',', '.').replace('R$', '').strip().replace('.', '', 1).isdigit()):
+        return 0.0
+    try:
+        return float(texto.replace('R$', '').replace('.', '').replace(',', '.').strip())
+    except ValueError:
+        return 0.0
+
+
+# --- Portonave ---
+def dia_total_portonave(periodo, dias_no_periodo):
+    """Converte (período, dias no período) no dia total de armazenagem, limitado ao fim do período."""
+    faixas = TABELAS_TARIFAS[PORTONAVE]["faixas_armazenagem"]
+    periodo = int(periodo)
+    if not 1 <= periodo <= len(faixas):
+        return 0
+    _, inicio_periodo, dias_max, _ = faixas[periodo - 1]
+    dia_total = (inicio_periodo - 1) + int(dias_no_periodo) if periodo > 1 else int(dias_no_periodo)
+    if dias_max != float('inf'):
+        dia_total = min(dia_total, int(dias_max))
+    return dia_total
+
+
+def armazenagem_por_container(vmld_por_container, dia_total, qtde_processos):
+    """
+    Armazenagem de um contêiner em forma fechada: valor do 1º período + (valor diário x dias)
+    de cada faixa seguinte. O mínimo de cada faixa só se aplica quando há um único processo.
+    """
+    vmld_por_container = np.asarray(vmld_por_container, dtype=float)
+    dia_total = np.asarray(dia_total, dtype=float)
+    aplica_minimo = np.asarray(qtde_processos) <= 1
+
+    total = np.zeros(np.broadcast(vmld_por_container, dia_total, aplica_minimo).shape)
+    for i, (percentual, dia_inicio, dia_fim, minimo) in enumerate(TABELAS_TARIFAS[PORTONAVE]["faixas_armazenagem"]):
+        valor = vmld_por_container * percentual
+        valor = np.where(aplica_minimo, np.maximum(valor, minimo), valor)
+        if i == 0:
+            # 1º período: valor único a partir do primeiro dia
+            dias_cobrados = (dia_total >= dia_inicio).astype(float)
+        else:
+            dias_cobrados = np.clip(np.minimum(dia_total, dia_fim) - (dia_inicio - 1), 0, None)
+        total = total + valor * dias_cobrados
+    return total
+
+
+def calcular_portonave(vmld_di, qtde_container, qtde_processos, dia_total, diferenca=0.0, taxas_extras=0.0):
+    """
+    Calcula armazenagem, levante, pesagem e total a depositar.
+    A armazenagem é calculada para um contêiner e multiplicada pela quantidade.
+    """
+    tabela = TABELAS_TARIFAS[PORTONAVE]
+    qtde_container = np.asarray(qtde_container, dtype=float)
+    qtde_processos = np.asarray(qtde_processos, dtype=float)
+    vmld_por_container = np.divide(vmld_di, qtde_container, out=np.zeros(np.broadcast(vmld_di, qtde_container).shape), where=qtde_container > 0)
+
+    armazenagem = np.where(qtde_container > 0, armazenagem_por_container(vmld_por_container, dia_total, qtde_processos) * qtde_container, 0.0)
+
+    levante = tabela["levante"] * qtde_container
+    pesagem = tabela["pesagem"] * qtde_container
+    multiplos_processos = qtde_processos > 1
+    processos_divisor = np.where(multiplos_processos, qtde_processos, 1.0)
+    levante = np.where(multiplos_processos, levante / processos_divisor, np.maximum(levante, tabela["levante"]))
+    pesagem = np.where(multiplos_processos, pesagem / processos_divisor, np.maximum(pesagem, tabela["pesagem"]))
+
+    total_a_depositar = armazenagem + levante + pesagem + diferenca + taxas_extras
+    return {
+        'armazenagem': armazenagem,
+        'levante': levante,
+        'pesagem': pesagem,
+        'total_a_depositar': total_a_depositar
+    }
+
+
+def simular_portonave(vmld_di, dias, containers, processos, diferenca=0.0, taxas_extras=0.0) -> pd.DataFrame:
+    """
+    Simulação "what-if": calcula o total a depositar para todas as combinações de
+    dias totais x quantidade de contêineres x quantidade de processos em uma única passada NumPy.
+    Retorna um DataFrame longo com uma linha por combinação.
+    """
+    dias = np.asarray(dias, dtype=float).reshape(-1, 1, 1)
+    containers = np.asarray(containers, dtype=float).reshape(1, -1, 1)
+    processos = np.asarray(processos, dtype=float).reshape(1, 1, -1)
+
+    resultado = calcular_portonave(vmld_di, containers, processos, dias, diferenca, taxas_extras)
+    forma = np.broadcast(dias, containers, processos).shape
+    grade_dias, grade_containers, grade_processos = (np.broadcast_to(a, forma).ravel() for a in (dias, containers, processos))
+    total = np.broadcast_to(resultado['total_a_depositar'], forma).ravel()
+    return pd.DataFrame({
+        'Dias': grade_dias.astype(int),
+        'Contêineres': grade_containers.astype(int),
+        'Processos': grade_processos.astype(int),
+        'Armazenagem': np.broadcast_to(resultado['armazenagem'], forma).ravel(),
+        'Total a Depositar': total,
+        'Custo Médio por Dia': total / grade_dias,
+    })
+
+
+# --- Pac Log Elo ---
+def calcular_paclog_elo(vmld, peso_bruto, diferenca=0.0, taxas_extras=0.0):
+    """
+    Armazenagem (VMLD x 0,40%), capatazia por kg com mínimo, carregamento fixo e
+    PIS/COFINS/ISS por dentro sobre (armazenagem + capatazia + carregamento).
+    """
+    tabela = TABELAS_TARIFAS[PACLOG_ELO]
+    armazenagem = np.asarray(vmld, dtype=float) * tabela["armazenagem_percentual"]
+    capatazia = np.maximum(np.asarray(peso_bruto, dtype=float) * tabela["capatazia_por_kg"], tabela["capatazia_minima"])
+    carregamento = tabela["carregamento"]
+
+    base_impostos = armazenagem + capatazia + carregamento
+    impostos = np.where(base_impostos != 0, _gross_up(base_impostos, tabela["divisor_impostos"]), 0.0)
+
+    total_a_depositar = armazenagem + capatazia + impostos + carregamento + diferenca + taxas_extras
+    return {
+        'armazenagem': armazenagem,
+        'capatazia': capatazia,
+        'impostos': impostos,
+        'carregamento': np.full(np.shape(total_a_depositar), carregamento),
+        'total_a_depositar': total_a_depositar
+    }
+
+
+# --- FN Transportes ---
+def calcular_fn_transportes(vmld, qtde_container=1, qtde_processos=1, qtde_baixa_vazio=0, diferenca=0.0):
+    """
+    Frete nacional: (base por contêiner rateada entre os processos + percentual do VMLD) / 0,83,
+    mais a baixa de vazio rateada entre os processos.
+    """
+    tabela = TABELAS_TARIFAS[FN_TRANSPORTES]
+    qtde_container = np.asarray(qtde_container, dtype=float)
+    qtde_processos = np.asarray(qtde_processos, dtype=float)
+
+    base = np.where(qtde_container > 0, tabela["base_por_container"] * qtde_container, tabela["base_por_container"])
+    base = _dividir(base, qtde_processos)
+    percentual_vmld = tabela["percentual_vmld"] * np.asarray(vmld, dtype=float)
+    total_parcial = (base + percentual_vmld) / tabela["divisor_impostos"]
+
+    baixa_vazio = _dividir(tabela["baixa_vazio_unitario"] * np.asarray(qtde_baixa_vazio, dtype=float), qtde_processos)
+
+    total_a_depositar = total_parcial + diferenca + baixa_vazio
+    return {
+        'base_calculo': base,
+        'percentual_vmld': percentual_vmld,
+        'total_parcial': total_parcial,
+        'baixa_vazio': baixa_vazio,
+        'total_a_depositar': total_a_depositar
+    }
+
+
+# --- Futura (comissária de despachos) ---
+def calcular_futura(imposto_importacao, ipi, pis_pasep, cofins, taxa_siscomex, icms=0.0,
+                    frete=0.0, acrescimo=0.0, capatazias_afrmm=0.0, tarifa_afrmm=0.0,
+                    maritimo=True, diferenca=0.0):
+    """
+    Débitos do importador (tributos + Siscomex + ICMS) e da comissária
+    (assessoria logística + AFRMM, este só no transporte marítimo).
+    AFRMM = (frete + acréscimo + capatazias) x 8% + tarifa + taxa do Mercante.
+    """
+    tabela = TABELAS_TARIFAS[FUTURA]
+    total_importador = (np.asarray(imposto_importacao, dtype=float) + ipi + pis_pasep + cofins + taxa_siscomex + icms)
+
+    afrmm = (np.asarray(frete, dtype=float) + acrescimo + capatazias_afrmm) * tabela["afrmm_percentual"] + tarifa_afrmm + tabela["taxa_mercante"]
+    afrmm = np.where(maritimo, afrmm, 0.0)
+
+    total_comissaria = tabela["assessoria_logistica"] + afrmm + tabela["remessa_documentos"]
+    return {
+        'total_importador': total_importador,
+        'afrmm': afrmm,
+        'total_comissaria': total_comissaria,
+        'total_a_depositar': total_comissaria + diferenca
+    }
+
+
+# --- Fechamento ---
+def calcular_fechamento(vmle, frete_di, seguro_di, imposto_importacao, ipi, pis_pasep, cofins,
+                        taxa_siscomex, armazenagem=0.0, frete_nacional=0.0, afrmm=0.0,
+                        frete_internacional_pago=None, valor_nfs=0.0):
+    """
+    Fechamento do processo: impostos, despesas (incluindo taxas de destino = frete pago - frete da DI),
+    total das NFs calculado e a diferença para o valor das NFs emitidas.
+    """
+    tabela = TABELAS_TARIFAS[FECHAMENTO]
+    frete_di = np.asarray(frete_di, dtype=float)
+    if frete_internacional_pago is None:
+        frete_internacional_pago = frete_di
+
+    total_impostos = np.asarray(imposto_importacao, dtype=float) + ipi + pis_pasep + cofins
+    taxas_destino = np.asarray(frete_internacional_pago, dtype=float) - frete_di
+    total_despesas = (afrmm + np.asarray(armazenagem, dtype=float) + tabela["envio_docs"] + frete_nacional +
+                      tabela["despachante"] + taxa_siscomex + tabela["connecta"] +
+                      tabela["descarregamento"] + taxas_destino + tabela["icms_4_percent"])
+    total_adicionais = total_impostos + total_despesas + seguro_di + frete_di
+    total_nfs = vmle + total_adicionais
+    return {
+        'total_impostos': total_impostos,
+        'taxas_destino': taxas_destino,
+        'total_despesas': total_despesas,
+        'total_adicionais': total_adicionais,
+        'total_nfs': total_nfs,
+        'diferenca': valor_nfs - total_nfs
+    }
+
+
+# --- Cálculo em lote ---
+def _coluna(dis: pd.DataFrame, nome: str, padrao: Any = 0.0) -> np.ndarray:
+    """Coluna numérica de dis (nulos viram o padrão); se não existir, usa o padrão para todas as linhas."""
+    if nome in dis.columns:
+        return pd.to_numeric(dis[nome], errors='coerce').fillna(padrao).to_numpy(dtype=float)
+    return np.full(len(dis), padrao, dtype=float)
+
+
+def _avaliar_terminal(terminal: str, dis: pd.DataFrame, parametros: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Avalia um terminal para todas as linhas de dis. Parâmetros ausentes em dis vêm de `parametros`."""
+    p = lambda nome, padrao=0.0: _coluna(dis, nome, parametros.get(nome, padrao))
+    if terminal == PORTONAVE:
+        return calcular_portonave(p('vmld'), p('qtde_container', 1), p('qtde_processos', 1), p('dia_total', 1),
+                                  p('diferenca'), p('taxas_extras'))
+    if terminal == PACLOG_ELO:
+        return calcular_paclog_elo(p('vmld'), p('peso_bruto'), p('diferenca'), p('taxas_extras'))
+    if terminal == FN_TRANSPORTES:
+        return calcular_fn_transportes(p('vmld'), p('qtde_container', 1), p('qtde_processos', 1),
+                                       p('qtde_baixa_vazio'), p('diferenca'))
+    if terminal == FUTURA:
+        if 'icms_sc' in dis.columns:
+            icms = dis['icms_sc'].map(icms_para_float).to_numpy(dtype=float)
+        else:
+            icms = np.zeros(len(dis))
+        return calcular_futura(p('imposto_importacao'), p('ipi'), p('pis_pasep'), p('cofins'), p('taxa_siscomex'), icms,
+                               p('frete'), p('acrescimo'), p('capatazias_afrmm'), p('tarifa_afrmm'),
+                               _coluna(dis, 'maritimo', parametros.get('maritimo', True)) > 0, p('diferenca'))
+    if terminal == FECHAMENTO:
+        frete = p('frete')
+        frete_pago = _coluna(dis, 'frete_internacional_pago', np.nan)
+        frete_pago = np.where(np.isnan(frete_pago), parametros.get('frete_internacional_pago', frete), frete_pago)
+        return calcular_fechamento(p('vmle'), frete, p('seguro'), p('imposto_importacao'), p('ipi'), p('pis_pasep'),
+                                   p('cofins'), p('taxa_siscomex'), p('armazenagem'), p('frete_nacional'), p('afrmm'),
+                                   frete_pago, p('valor_nfs'))
+    raise ValueError(f"Terminal desconhecido: {terminal}")
+
+
+def calcular_terminais(dis: pd.DataFrame, terminais: Optional[Iterable[str]] = None, **parametros) -> Dict[str, pd.DataFrame]:
+    """
+    Avalia um ou todos os terminais (chaves de TABELAS_TARIFAS) para todas as DIs de `dis` de uma vez.
+
+    `dis` usa os nomes de coluna de xml_declaracoes (vmld, peso_bruto, frete, ...). Os parâmetros de tela
+    (qtde_container, qtde_processos, dia_total, diferenca, taxas_extras, qtde_baixa_vazio, maritimo, ...)
+    podem vir como colunas de `dis`, valendo por DI, ou como argumentos nomeados, valendo para todas.
+    Retorna {terminal: DataFrame com os componentes do cálculo}, com o mesmo índice de `dis`.
+    """
+    terminais = list(terminais) if terminais is not None else list(TABELAS_TARIFAS)
+    resultado = {}
+    for terminal in terminais:
+        componentes = _avaliar_terminal(terminal, dis, parametros)
+        resultado[terminal] = pd.DataFrame(
+            {nome: np.broadcast_to(valores, (len(dis),)) for nome, valores in componentes.items()},
+            index=dis.index
+        )
+    return resultado
+
+
+def totais_por_terminal(dis: pd.DataFrame, terminais: Optional[Iterable[str]] = None, **parametros) -> pd.DataFrame:
+    """Total a depositar de cada terminal por DI (uma coluna por terminal, com o nome de exibição)."""
+    terminais = [t for t in (terminais if terminais is not None else TABELAS_TARIFAS) if t != FECHAMENTO]
+    resultados = calcular_terminais(dis, terminais, **parametros)
+    return pd.DataFrame(
+        {TABELAS_TARIFAS[t]["nome"]: resultados[t]['total_a_depositar'] for t in terminais},
+        index=dis.index
+    )
+
+
+# --- Comparação entre terminais ---
+# Terminais de armazenagem comparados por padrão. Futura (comissária) e FN Transportes (frete nacional)
+# cobram outros serviços e só entram no comparativo quando selecionados.
+TERMINAIS_COMPARACAO = [PORTONAVE, PACLOG_ELO]
+
+
+def quantidade_containers(dis: pd.DataFrame, padrao: int = 1) -> np.ndarray:
+    """
+    Quantidade de contêineres por DI: a quantidade de volumes quando a embalagem declarada é contêiner,
+    senão o padrão (a DI não informa contêineres para outras embalagens).
+    """
+    if 'embalagem' not in dis.columns or 'quantidade_volumes' not in dis.columns:
+        return np.full(len(dis), padrao, dtype=float)
+    eh_container = dis['embalagem'].fillna('').astype(str).str.upper().str.contains('CONT', regex=False).to_numpy()
+    volumes = pd.to_numeric(dis['quantidade_volumes'], errors='coerce').to_numpy(dtype=float)
+    return np.where(eh_container & (volumes > 0), volumes, float(padrao))
+
+
+def comparar_terminais(dis: pd.DataFrame, terminais: Optional[Iterable[str]] = None, **parametros) -> pd.DataFrame:
+    """
+    Total a depositar de cada terminal para todas as DIs e o ranking do mais barato ao mais caro.
+
+    Acrescenta às colunas de identificação da DI uma coluna por terminal, 'Mais Barato',
+    'Economia' (diferença para o 2º mais barato) e 'Ranking'. O resultado é ordenado pela economia.
+    Quando `dis` não tem a coluna qtde_container, ela é obtida de quantidade_containers().
+    """
+    terminais = list(terminais) if terminais is not None else list(TERMINAIS_COMPARACAO)
+    if 'qtde_container' not in dis.columns:
+        dis = dis.assign(qtde_container=quantidade_containers(dis, parametros.pop('qtde_container', 1)))
+
+    totais = totais_por_terminal(dis, terminais, **parametros)
+    nomes = totais.columns.to_numpy()
+    valores = totais.to_numpy(dtype=float)
+    ordem = np.argsort(valores, axis=1, kind='stable')
+    ordenados = np.take_along_axis(valores, ordem, axis=1)
+
+    relatorio = pd.DataFrame({
+        'ID': dis['id'] if 'id' in dis.columns else dis.index,
+        'DI': dis['numero_di'] if 'numero_di' in dis.columns else '',
+        'Referência': dis['informacao_complementar'] if 'informacao_complementar' in dis.columns else '',
+        'VMLD': _coluna(dis, 'vmld'),
+        'Peso Bruto': _coluna(dis, 'peso_bruto'),
+        'Contêineres': _coluna(dis, 'qtde_container', 1).astype(int),
+    }, index=dis.index)
+    relatorio = pd.concat([relatorio, totais], axis=1)
+    if len(nomes):
+        relatorio['Mais Barato'] = nomes[ordem[:, 0]]
+        relatorio['Economia'] = ordenados[:, 1] - ordenados[:, 0] if len(nomes) > 1 else 0.0
+        relatorio['Ranking'] = [' < '.join(linha) for linha in nomes[ordem]]
+    return relatorio.sort_values('Economia', ascending=False, kind='stable').reset_index(drop=True) if len(nomes) else relatorio
@@ -0,0 +1,186 @@
+"""
+Cliente da API TTCE (tratamentos tributários do Portal Único Siscomex) com cache persistente.
+
+As respostas ficam gravadas em 'ttce_respostas' (db_utils) pela chave dos parâmetros da consulta
+(NCM, país, data do fato gerador, tipo de operação e fundamentos opcionais), com validade de TTL_S
+e a versão VERSAO_CACHE (incrementar invalida todas as respostas gravadas). As requisições usam uma
+requests.Session compartilhada, com o certificado digital configurado uma única vez. Nada aqui usa
+Streamlit.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import db_utils
+
+logger = logging.getLogger(__name__)
+
+# Use o ambiente de Produção ou Validação conforme sua necessidade
+TTCE_BASE_URL = "https://portalunico.siscomex.gov.br/ttce"  # Ambiente de Produção
+# TTCE_BASE_URL = "https://val.portalunico.siscomex.gov.br/ttce"  # Ambiente de Validação
+TIMEOUT_S = (5, 30)  # (conexão, leitura)
+TENTATIVAS = 3
+ESPERA_ENTRE_TENTATIVAS_S = 1.0  # dobra a cada nova tentativa
+STATUS_NOVA_TENTATIVA = {429, 500, 502, 503, 504}
+MAX_CONCORRENCIA = 6
+# Tratamentos tributários mudam raramente para os mesmos parâmetros
+TTL_S = 7 * 24 * 60 * 60
+VERSAO_CACHE = 1
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def get_cert_config() -> Optional[Tuple[str, str]]:
+    """
+    (certificado, chave) lidos de TTCE_CERT_PATH e TTCE_KEY_PATH, ou None se não configurados.
+    A requests não aceita chaves privadas protegidas por senha: TTCE_CERT_PASSWORD é ignorada.
+    """
+    cert_path = os.getenv("TTCE_CERT_PATH")
+    key_path = os.getenv("TTCE_KEY_PATH")
+    if cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path):
+        if os.getenv("TTCE_CERT_PASSWORD"):
+            logger.warning("TTCE_CERT_PASSWORD definida, mas a chave privada deve estar sem senha para uso com requests.")
+        return (cert_path, key_path)
+    return None
+
+
+def get_session() -> requests.Session:
+    """Session compartilhada pelo processo, com o certificado digital configurado na criação."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_CONCORRENCIA)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session.headers.update({"Content-Type": "application/json"})
+            _session.cert = get_cert_config()
+            if _session.cert:
+                logger.info(f"API TTCE usando o certificado digital de: {_session.cert[0]}")
+            else:
+                logger.warning("Certificado digital da API TTCE não configurado (TTCE_CERT_PATH/TTCE_KEY_PATH).")
+        return _session
+
+
+def reiniciar_session():
+    """Descarta a Session (ex.: após trocar o certificado nas variáveis de ambiente)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def montar_payload(ncm, codigo_pais, data_fato_gerador, tipo_operacao, fundamentos_opcionais=None) -> Dict[str, Any]:
+    payload = {
+        "ncm": str(ncm),
+        "codigoPais": int(codigo_pais),
+        "dataFato_gerador": str(data_fato_gerador),
+        "tipoOperacao": str(tipo_operacao),
+    }
+    if fundamentos_opcionais:
+        payload["fundamentosOpcionais"] = fundamentos_opcionais
+    return payload
+
+
+def chave_consulta(payload: Dict[str, Any]) -> str:
+    """Chave do cache: hash do payload serializado de forma canônica."""
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _registro_cache(chave: str, payload: Dict[str, Any], resposta: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'chave': chave, 'versao': VERSAO_CACHE, 'ncm': payload["ncm"], 'codigo_pais': payload["codigoPais"],
+        'data_fato_gerador': payload["dataFato_gerador"], 'tipo_operacao': payload["tipoOperacao"],
+        'fundamentos': payload.get("fundamentosOpcionais"), 'resposta': resposta,
+        'expira_em': (datetime.now() + timedelta(seconds=TTL_S)).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def requisitar(payload: Dict[str, Any], base_url: str = TTCE_BASE_URL, session: Optional[requests.Session] = None) -> Dict[str, Any]:
+    """POST na API TTCE com novas tentativas para falhas de rede, 429 e 5xx. Levanta a última exceção."""
+    url = f"{base_url}/api/ext/tratamentos-tributarios/importacao/"
+    session = session or get_session()
+    espera = ESPERA_ENTRE_TENTATIVAS_S
+    for tentativa in range(1, TENTATIVAS + 1):
+        try:
+            response = session.post(url, data=json.dumps(payload), timeout=TIMEOUT_S)
+            if response.status_code in STATUS_NOVA_TENTATIVA and tentativa < TENTATIVAS:
+                logger.warning(f"API TTCE respondeu {response.status_code} para NCM {payload['ncm']} ({tentativa}/{TENTATIVAS}).")
+                time.sleep(espera)
+                espera *= 2
+                continue
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            logger.warning(f"Falha de rede ao consultar a API TTCE para NCM {payload['ncm']} ({tentativa}/{TENTATIVAS}): {e}")
+            if tentativa == TENTATIVAS:
+                raise
+            time.sleep(espera)
+            espera *= 2
+    raise requests.exceptions.RetryError(f"API TTCE indisponível para NCM {payload['ncm']}.")
+
+
+def consultar_tratamentos(ncm, codigo_pais, data_fato_gerador, tipo_operacao, fundamentos_opcionais=None,
+                          usar_cache: bool = True, base_url: str = TTCE_BASE_URL) -> Tuple[Dict[str, Any], str]:
+    """
+    Tratamentos tributários para os parâmetros. Retorna (resposta, origem), com origem 'cache' ou 'api'.
+    Levanta requests.exceptions.RequestException ou ValueError se a API falhar.
+    """
+    payload = montar_payload(ncm, codigo_pais, data_fato_gerador, tipo_operacao, fundamentos_opcionais)
+    chave = chave_consulta(payload)
+    if usar_cache:
+        em_cache = db_utils.get_respostas_ttce([chave], VERSAO_CACHE)
+        if chave in em_cache:
+            return em_cache[chave], 'cache'
+    resposta = requisitar(payload, base_url)
+    db_utils.salvar_respostas_ttce([_registro_cache(chave, payload, resposta)])
+    return resposta, 'api'
+
+
+def consultar_em_lote(ncms: List[str], codigo_pais, data_fato_gerador, tipo_operacao, usar_cache: bool = True,
+                      base_url: str = TTCE_BASE_URL, max_concorrencia: int = MAX_CONCORRENCIA) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve os NCMs distintos para o mesmo país, data e tipo de operação: lê o cache de uma vez, consulta
+    em paralelo apenas os que faltam e grava as novas respostas em uma única transação.
+    Retorna {ncm: {'resposta', 'origem' ('cache'/'api'/None), 'erro'}}.
+    """
+    payloads = {ncm: montar_payload(ncm, codigo_pais, data_fato_gerador, tipo_operacao) for ncm in dict.fromkeys(ncms) if ncm}
+    chaves = {ncm: chave_consulta(payload) for ncm, payload in payloads.items()}
+    em_cache = db_utils.get_respostas_ttce(list(chaves.values()), VERSAO_CACHE) if usar_cache else {}
+    resultados = {
+        ncm: {'resposta': em_cache[chave], 'origem': 'cache', 'erro': None}
+        for ncm, chave in chaves.items() if chave in em_cache
+    }
+    faltantes = [ncm for ncm in payloads if ncm not in resultados]
+    if faltantes:
+        session = get_session()
+
+        def _consultar(ncm):
+            try:
+                return ncm, requisitar(payloads[ncm], base_url, session), None
+            except (requests.exceptions.RequestException, ValueError) as e:
+                return ncm, None, str(e)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concorrencia, len(faltantes))), thread_name_prefix="ttce") as executor:
+            consultas = list(executor.map(_consultar, faltantes))
+        novos = []
+        for ncm, resposta, erro in consultas:
+            resultados[ncm] = {'resposta': resposta, 'origem': 'api' if erro is None else None, 'erro': erro}
+            if erro is None:
+                novos.append(_registro_cache(chaves[ncm], payloads[ncm], resposta))
+        db_utils.salvar_respostas_ttce(novos)
+        logger.info(f"TTCE em lote: {len(em_cache)} do cache, {len(novos)} da API e "
+                    f"{len(faltantes) - len(novos)} com erro em {time.perf_counter() - inicio:.2f}s.")
+    return {ncm: resultados[ncm] for ncm in payloads}
@@ -10,221 +10,13 @@ import requests # Adicionado para fazer requisições HTTP
 
 # Importar funções de utilidade do novo módulo
 from app_logic.utils import set_background_image, set_sidebar_background_image, get_dolar_cotacao
+from app_logic import assets
 
 st.set_page_config(layout="wide", page_title="Gerenciamento COMEX")
 
 # Injetar CSS personalizado para ajustar layout e ocultar elementos indesejados
-st.markdown("""
-<style>
-/* Oculta o botão de fullscreen que aparece ao passar o mouse sobre as imagens */
-button[title="View fullscreen"] {
-    display: none !important;
-}
-/* Ajustes para reduzir o espaço ao redor da logo da sidebar */
-[data-testid="stSidebarUserContent"] {
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-[data-testid="stSidebarUserContent"] .stImage {
-    margin-top: 0px !important;
-    margin-bottom: 0px !important;
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-[data-testid="stSidebarUserContent"] img {
-    margin-top: 0px !important;
-    margin-bottom: 0px !important;
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-/* Ajustar margens do div de usuário/notificações na sidebar */
-.stSidebar [data-testid="stVerticalBlock"] > div:nth-child(2) > div:nth-child(1) > div:nth-child(1) {
-    margin-top: 0px !important;
-    margin-bottom: 0px !important;
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-/* Reduzir o padding dos botões na sidebar para um visual mais compacto */
-/* Ajustado para afetar diretamente os botões dentro da sidebar */
-[data-testid="stSidebarNav"] button {
-    padding-top: 0.1rem !important; /* Reduzir padding superior */
-    padding-bottom: 0.1rem !important; /* Reduzir padding inferior */
-    margin-top: 0.05rem !important; /* Reduzir margem superior */
-    margin-bottom: 0.05rem !important; /* Reduzir margem inferior */
-    height: auto !important; /* Permite que a altura se ajuste ao conteúdo */
-}
-/* Remover margens e padding de subheaders na sidebar para compactar */
-.stSidebar h3 {
-    margin-top: 0.2rem !important; /* Reduzir margem superior */
-    margin-bottom: 0.2rem !important; /* Reduzir margem inferior */
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-/* Ajustar margens e padding para a imagem principal (se necessário) */
-.main-logo-container {
-    margin-top: 0px !important;
-    margin-bottom: 0px !important;
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-.main-logo-container img {
-    margin-top: 0px !important;
-    margin-bottom: 0px !important;
-    padding-top: 0px !important;
-    padding-bottom: 0px !important;
-}
-
-/* Remover margens e padding de st-emotion-cache genéricos */
-.st-emotion-cache-z5fcl4, .st-emotion-cache-zq5wmm, .st-emotion-cache-1c7y2o2,
-.st-emotion-cache-1avcm0n, .st-emotion-cache-1dp5ifq, .st-emotion-cache-10qtn7d,
-.st-emotion-cache-1y4p8pa, .st-emotion-cache-ocqkz7, .st-emotion-cache-1gh0m0m,
-.st-emotion-cache-1vq4p4b, .st-emotion-cache-1v04791, .st-emotion-cache-1kyx2u8 {
-    padding-top: 0 !important;
-    padding-bottom: 0 !important;
-    margin-top: 0 !important;
-    margin-bottom: 0 !important;
-}
-
-/* Remover padding do cabeçalho do Streamlit */
-header {
-    padding: 0 !important;
-}
-
-/* Remover padding e margem de elementos de bloco no topo */
-.block-container {
-    padding-top: 0 !important;
-    padding-bottom: 0 !important;
-    margin-top: 0 !important;
-    margin-bottom: 0 !important;
-}
-
-/* Ajustar o padding do main content para que o conteúdo comece mais para cima */
-.stApp > header {
-    height: 0px !important;
-}
-
-/* Ajustar o padding do main content para que o conteúdo comece mais para cima */
-.main .block-container {
-    padding-top: 0rem !important;
-    padding-right: 1rem !important;
-    padding-left: 1rem !important;
-    padding-bottom: 1rem !important;
-}
-
-/* Remover espaço superior do título da página */
-h1, h2, h3, h4, h5, h6 {
-    margin-top: 0rem !important;
-    padding-top: 0rem !important;
-}
-
-/* Ajustar margem superior do primeiro elemento após o cabeçalho */
-.stApp > div:first-child > div:first-child {
-    margin-top: 0 !important;
-}
-
-/* Ocultar a barra de decoração superior do Streamlit */
-[data-testid="stDecoration"] {
-    display: none !important;
-}
-
-/* Ocultar o "Deploy" e os três pontos no canto superior direito */
-.st-emotion-cache-s1qj3df {
-    display: none !important;
-}
-
-/* Ajustar o padding do conteúdo dentro da sidebar para um visual mais compacto */
-[data-testid="stSidebarContent"] {
-    padding-top: 0.1rem !important; /* Reduzir padding superior */
-    padding-bottom: 0.1rem !important; /* Reduzir padding inferior */
-    padding-left: 0.1rem !important; /* Reduzir padding esquerdo */
-    padding-right: 0.1rem !important; /* Reduzir padding direito */
-}
-
-/* Ocultar o cabeçalho do Streamlit que pode conter o título da página ou outros elementos */
-.st-emotion-cache-10qtn7d, .st-emotion-cache-1a3f5x, .st-emotion-cache-1avcm0n {
-    display: none !important;
-}
-
-/* Ocultar o texto de status no canto superior esquerdo (seletores genéricos) */
-[data-testid="stStatusWidget"],
-.st-emotion-cache-1jm6g5k,
-.st-emotion-cache-1r6dm1k,
-.st-emotion-cache-1d3jo8e,
-body > div:nth-child(1) > div:nth-child(1) > div:nth-child(1) > div:nth-child(1) > div:first-child,
-body > div:nth-child(1) > div:nth-child(1) > div:first-child > div:first-child > div:first-child,
-body > div:nth-child(1) > div:first-child > div:first-child > div:first-child,
-.st-emotion-cache-1g8w69,
-.st-emotion-cache-1v04791 {
-    display: none !important;
-}
-
-/* Ajustes para centralizar horizontalmente os inputs de texto e labels na tela de login */
-/* E definir um tamanho máximo para os inputs de texto */
-.st-emotion-cache-h5rpjc, /* Seletor comum para o container de inputs de texto */
-.st-emotion-cache-kjg0a8 { /* Outro seletor possível para o wrapper de inputs */
-    max-width: 300px; /* Define a largura máxima do container/input */
-    margin-left: auto;
-    margin-right: auto;
-    float: none; /* Garante que não haja float que impeça o margin auto */
-}
-
-/* Alinhar o label do input à esquerda (conforme a imagem) */
-div[data-testid="stTextInput"] label { /* Alvo: o label dentro do stTextInput */
-    display: block;
-    text-align: left; /* Alinha o texto do label à esquerda */
-    width: 100%; /* Garante que o label ocupe a largura total para alinhar o texto */
-    /* Removido padding-left aqui, pois o input será centralizado e o label deve seguir */
-}
-
-/* Centralizar os inputs de texto */
-div[data-testid="stTextInput"] > div > div > input {
-    max-width: 250px; /* Ajusta a largura do campo de input */
-    min-width: 150px; /* Define uma largura mínima para o campo de input */
-    margin-left: 15px;
-    margin-right: auto;
-    display: block; /* Para que margin auto funcione */
-}
-
-/* Adicionar espaçamento entre os campos de entrada */
-div[data-testid="stTextInput"] {
-    margin-bottom: 15px; /* Espaçamento entre os campos de texto */
-}
-
-/* Centralizar o botão de Entrar e adicionar espaçamento */
-div[data-testid="stForm"] button {
-    display: block; /* Para que margin auto funcione */
-    margin-left: 15px;
-    margin-right: 15px;
-    float: none;
-    margin-top: 15px; /* Espaçamento acima do botão */
-}
-
-/* Centralizar verticalmente o conteúdo principal da página de login */
-/* Alvo: O container principal da página que contém as colunas do formulário */
-.stApp > div > div > div.main > div.block-container {
-    display: flex;
-    flex-direction: column;
-    justify-content: center; /* Centraliza verticalmente o conteúdo */
-    align-items: center; /* Centraliza horizontalmente o bloco inteiro */
-    min-height: 100vh; /* Garante que o container ocupe a altura total da viewport */
-    padding-top: 0 !important; /* Reduzir padding superior para melhor centralização */
-    padding-bottom: 0 !important; /* Reduzir padding inferior */
-}
-
-/* Adicionar opacidade à imagem de fundo do login SEM afetar o conteúdo */
-/* A imagem de fundo é definida pela função set_background_image (geralmente no body ou html) */
-/* Para dar a ela uma aparência opaca, aplicamos um overlay semi-transparente ao .stApp */
-.stApp {
-    background-color: rgba(0, 0, 0, 0.9); /* Camada semi-transparente sobre o fundo, ajustado para 0.9 */
-    background-blend-mode: multiply; /* Mistura a cor com a imagem de fundo */
-    background-size: cover; /* Garante que a imagem de fundo cubra o elemento */
-    background-position: center; /* Centraliza a imagem de fundo */
-    background-repeat: no-repeat; /* Evita a repetição da imagem de fundo */
-    transition: background-color 0.5s ease-in-out; /* Transição suave para a cor de fundo */
-}
-
-</style>
-""", unsafe_allow_html=True)
+# (assets/app.css, minificado uma vez por processo em app_logic/assets.py)
+st.markdown(f"<style>{assets.get_css(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'app.css'))}</style>", unsafe_allow_html=True)
 
 
 # Importar o módulo de utilitários de banco de dados (direto, pois está na mesma pasta)
@@ -236,40 +28,24 @@ except ImportError:
 
 # Importar followup_db_manager diretamente
 import followup_db_manager
+import query_trace
 
 # Importar as páginas da pasta 'app_logic'
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app_logic'))
 
-from app_logic import custo_item_page
-from app_logic import analise_xml_di_page
-from app_logic import detalhes_di_calculos_page
-from app_logic import descricoes_page
-from app_logic import calculo_portonave_page
-from app_logic import followup_importacao_page
-from app_logic import user_management_page
-from app_logic import dashboard_page
-from app_logic import notification_page
-# NOVO: Importar a nova página de Frete Internacional
-from app_logic import calculo_frete_internacional_page
-# IMPORTANTE: Importar a nova página de análise de PDF
-from app_logic import pdf_analyzer_page
-# NOVO: Importar a nova página de listagem NCM
-from app_logic import ncm_list_page
-# NOVO: Importar a nova página de formulário de processo
-from app_logic import process_form_page
-
-
-# Importar as novas páginas de cálculo
-from app_logic import calculo_futura_page
-from app_logic import calculo_paclog_elo_page
-from app_logic import calculo_fechamento_page
-from app_logic import calculo_fn_transportes_page
+# As páginas são importadas sob demanda, na primeira navegação (ver PAGES e app_logic/page_registry.py)
+from app_logic import page_registry, page_profiler
+from app_logic.page_registry import Pagina
+from app_logic import cotacoes
 
 
 # Configuração de logging (simplificada para Streamlit)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Associa as consultas ao banco feitas neste rerun à página exibida (ver query_trace.py)
+query_trace.definir_pagina(st.session_state.get('current_page', "Home") if st.session_state.get('authenticated') else "Login")
+
 # --- Autenticação e Usuário ---
 def authenticate_user(username, password):
     """
@@ -300,6 +76,8 @@ if 'db_initialized' not in st.session_state:
 
     # st.info("DEBUG: Chamando db_utils.create_tables()...") # Removido DEBUG
     tables_created_general = db_utils.create_tables()
+    # Completa o histórico de cotações e mantém as de hoje atualizadas em segundo plano (uma vez por processo)
+    cotacoes.iniciar_atualizador()
     # st.info(f"DEBUG: Resultado db_utils.create_tables(): {tables_created_general}") # Removido DEBUG
 
     # --- NOVO: Debugging detalhado para o banco de dados 'produtos' ---
@@ -351,26 +129,29 @@ if 'current_page' not in st.session_state:
 # Mapeamento de nomes de páginas para as funções de exibição
 PAGES = {
     "Home": None,
-    "Dashboard": dashboard_page.show_dashboard_page,
-    "Descrições": descricoes_page.show_page,
-    "Listagem NCM": ncm_list_page.show_ncm_list_page,
-    "Follow-up Importação": followup_importacao_page.show_page, # Aponta para a página principal de listagem
-    "Importar XML DI": analise_xml_di_page.show_page,
-    "Pagamentos": detalhes_di_calculos_page.show_page,
-    "Custo do Processo": custo_item_page.show_page,
-    "Cálculo Portonave": calculo_portonave_page.show_page,
-    "Cálculo Futura": calculo_futura_page.show_calculo_futura_page,
-    "Cálculo Pac Log - Elo": calculo_paclog_elo_page.show_calculo_paclog_elo_page,
-    "Cálculo Fechamento": calculo_fechamento_page.show_calculo_fechamento_page,
-    "Cálculo FN Transportes": calculo_fn_transportes_page.show_calculo_fn_transportes_page,
-    "Cálculo Frete Internacional": calculo_frete_internacional_page.show_calculo_frete_internacional_page, 
-    "Análise de Faturas/PL (PDF)": pdf_analyzer_page.show_pdf_analyzer_page,
+    "Dashboard": Pagina("app_logic.dashboard_page", "show_dashboard_page"),
+    "Descrições": Pagina("app_logic.descricoes_page", "show_page"),
+    "Listagem NCM": Pagina("app_logic.ncm_list_page", "show_ncm_list_page"),
+    "Follow-up Importação": Pagina("app_logic.followup_importacao_page", "show_page"), # Aponta para a página principal de listagem
+    "Importar XML DI": Pagina("app_logic.analise_xml_di_page", "show_page"),
+    "Pagamentos": Pagina("app_logic.detalhes_di_calculos_page", "show_page"),
+    "Custo do Processo": Pagina("app_logic.custo_item_page", "show_page"),
+    "Cálculo Portonave": Pagina("app_logic.calculo_portonave_page", "show_page"),
+    "Cálculo Futura": Pagina("app_logic.calculo_futura_page", "show_calculo_futura_page"),
+    "Cálculo Pac Log - Elo": Pagina("app_logic.calculo_paclog_elo_page", "show_calculo_paclog_elo_page"),
+    "Cálculo Fechamento": Pagina("app_logic.calculo_fechamento_page", "show_calculo_fechamento_page"),
+    "Cálculo FN Transportes": Pagina("app_logic.calculo_fn_transportes_page", "show_calculo_fn_transportes_page"),
+    "Comparativo de Terminais": Pagina("app_logic.comparativo_terminais_page", "show_page"),
+    "Cálculo Frete Internacional": Pagina("app_logic.calculo_frete_internacional_page", "show_calculo_frete_internacional_page"),
+    "Análise de Faturas/PL (PDF)": Pagina("app_logic.pdf_analyzer_page", "show_pdf_analyzer_page"),
     "Análise de Documentos": None,
     "Pagamentos Container": None,
-    "Cálculo de Tributos TTCE": None,
-    "Gerenciamento de Usuários": user_management_page.show_page,
-    "Gerenciar Notificações": notification_page.show_admin_notification_page,
-    "Formulário Processo": process_form_page.show_process_form_page, # Nova página dedicada para o formulário
+    "Cálculo de Tributos TTCE": Pagina("app_logic.calculo_tributos_ttce_page", "show_page"),
+    "Gerenciamento de Usuários": Pagina("app_logic.user_management_page", "show_page"),
+    "Gerenciar Notificações": Pagina("app_logic.notification_page", "show_admin_notification_page"),
+    "Consultas ao Banco": Pagina("app_logic.consultas_banco_page", "show_page"),
+    "Perfis das Páginas": Pagina("app_logic.perfis_paginas_page", "show_page"),
+    "Formulário Processo": Pagina("app_logic.process_form_page", "show_process_form_page"), # Nova página dedicada para o formulário
 }
 
 # --- Tela de Login ---
@@ -426,6 +207,8 @@ else:
     else:
         pass 
 
+    # Notificações aparecem em todas as telas após o login; o módulo só é carregado aqui
+    notification_page = page_registry.carregar_modulo("app_logic.notification_page")
     current_username = st.session_state.get('user_info', {}).get('username', 'Convidado')
     num_notifications = notification_page.get_notification_count_for_user(current_username)
 
@@ -445,6 +228,13 @@ else:
     sidebar_background_image_path = os.path.join(os.path.dirname(__file__), 'assets', 'logo_navio_atracado.png')
     set_sidebar_background_image(sidebar_background_image_path, opacity=0.6)
 
+    # Perfilador das páginas: opção do administrador no menu ou ?perfilar=1 na URL
+    is_admin = bool(st.session_state.user_info and st.session_state.user_info.get('is_admin'))
+    if is_admin and st.query_params.get("perfilar") in ("1", "0"):
+        st.session_state.perfilar_paginas = st.query_params.get("perfilar") == "1"
+        del st.query_params["perfilar"]  # Depois disso, vale a opção do menu
+    perfilar_pagina = is_admin and st.session_state.get('perfilar_paginas', False)
+
     def navigate_to(page_name, **kwargs):
         st.session_state.current_page = page_name
         # Passar argumentos extras para a próxima página através do session_state
@@ -475,6 +265,8 @@ else:
         navigate_to("Pagamentos")
     if st.sidebar.button("Custo do Processo", key="menu_custo_processo", use_container_width=True):
         navigate_to("Custo do Processo")
+    if st.sidebar.button("Comparativo de Terminais", key="menu_comparativo_terminais", use_container_width=True):
+        navigate_to("Comparativo de Terminais")
     
     
     # NOVO: Botão para Cálculo Frete Internacional
@@ -500,6 +292,12 @@ else:
             navigate_to("Gerenciamento de Usuários")
         if st.sidebar.button("Gerenciar Notificações", key="menu_manage_notifications", use_container_width=True):
             navigate_to("Gerenciar Notificações")
+        if st.sidebar.button("Consultas ao Banco", key="menu_consultas_banco", use_container_width=True):
+            navigate_to("Consultas ao Banco")
+        if st.sidebar.button("Perfis das Páginas", key="menu_perfis_paginas", use_container_width=True):
+            navigate_to("Perfis das Páginas")
+        st.sidebar.checkbox("Perfilar páginas", key="perfilar_paginas",
+                            help="Mede onde o tempo é gasto a cada exibição de página (ver 'Perfis das Páginas').")
         
         st.sidebar.markdown("---")
         st.sidebar.write("Seleção de Bancos (simulada)")
@@ -531,6 +329,8 @@ else:
             dolar_data = get_dolar_cotacao()
             
             if dolar_data:
+                if dolar_data.get('data_cotacao') != datetime.now().strftime('%Y-%m-%d'):
+                    st.caption(f"Cotações de {datetime.strptime(dolar_data['data_cotacao'], '%Y-%m-%d').strftime('%d/%m/%Y')} (último boletim disponível).")
                 col1, col2, col3, col4, col5, col6 = st.columns(6)
                 
                 with col1:
@@ -559,19 +359,23 @@ else:
             # st.info("DEBUG: Módulo 'db_utils' real importado com sucesso.") # Removido DEBUG
 
         elif st.session_state.current_page == "Dashboard":
-            dashboard_page.show_dashboard_page()
+            show_page_function = page_registry.obter_funcao(PAGES["Dashboard"])
+            with page_profiler.perfilar("Dashboard", show_page_function, ativo=perfilar_pagina):
+                show_page_function()
 
         elif st.session_state.current_page in PAGES and PAGES[st.session_state.current_page] is not None:
             if st.session_state.current_page in ["Análise de Documentos", "Pagamentos Container", "Cálculo de Tributos TTCE"]:
                 st.warning(f"Tela de {st.session_state.current_page} (em desenvolvimento)")
             
             # Se a página atual é "Formulário Processo", chame-a com os dados do session_state
-            if st.session_state.current_page == "Formulário Processo":
-                process_form_page.show_process_form_page(
-                    st.session_state.get('form_process_identifier'),
-                    st.session_state.get('form_reload_processes_callback')
-                )
-            else:
-                PAGES[st.session_state.current_page]()
+            show_page_function = page_registry.obter_funcao(PAGES[st.session_state.current_page])
+            with page_profiler.perfilar(st.session_state.current_page, show_page_function, ativo=perfilar_pagina):
+                if st.session_state.current_page == "Formulário Processo":
+                    show_page_function(
+                        st.session_state.get('form_process_identifier'),
+                        st.session_state.get('form_reload_processes_callback')
+                    )
+                else:
+                    show_page_function()
         else:
             st.info(f"Página '{st.session_state.current_page}' em desenvolvimento ou não encontrada.")
@@ -0,0 +1,357 @@
+"""
+Teste de carga do app com várias sessões simultâneas, sem navegador (streamlit.testing.v1.AppTest).
+
+Cada sessão simulada roda em um processo próprio. O AppTest troca o Runtime global do Streamlit a
+cada execução, então duas sessões na mesma thread/processo não podem rodar ao mesmo tempo. Os
+processos usam uma cópia da pasta data/ (os bancos originais não são alterados) e usuários de carga
+criados só nessa cópia. Depois de abrir o app, todas as sessões começam juntas e repetem o roteiro:
+
+    login -> abrir follow-up -> pesquisar processo -> abrir processo -> salvar processo
+          -> abrir custo do processo -> carregar DI -> exportar PDF -> sair
+
+O resultado (JSON) traz os percentis de latência de cada passo e os erros "database is locked"
+(registrados no log do app ou levantados na página), com o passo e a thread em que ocorreram.
+A latência de cada passo é a do rerun completo do script no AppTest, como o servidor o executaria
+para o clique do usuário.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_carga_sessoes.py --sessoes 8 --iteracoes 3
+    python benchmarks/bench_carga_sessoes.py --sessoes 16 --pausa 0.5 --saida carga.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Dict, Any, List, Optional
+
+_RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, _RAIZ)
+
+PASSOS = [
+    "login", "abrir_followup", "pesquisar_processo", "abrir_processo", "salvar_processo",
+    "abrir_custo", "carregar_di", "exportar_pdf", "sair",
+]
+SENHA_CARGA = "carga"
+TRECHOS_BLOQUEIO = ("database is locked", "database table is locked")
+PERCENTIS = (50, 90, 95, 99)
+
+
+class ElementoNaoEncontrado(Exception):
+    """O roteiro não encontrou na tela o botão/campo esperado (página mudou ou não há dados)."""
+
+
+# --- Preparação (processo principal) ---
+def copiar_dados(origem: str, destino: str):
+    """Copia os bancos de data/ (sem o cache de PDFs) para o diretório da carga."""
+    shutil.copytree(origem, destino, ignore=shutil.ignore_patterns("pdf_cache", "*.log"))
+
+
+def criar_usuarios_carga(caminho_users_db: str, quantidade: int) -> List[str]:
+    """Cria (na cópia) um usuário por sessão: carga01, carga02, ..., todos com a senha SENHA_CARGA."""
+    import db_utils
+    usuarios = [f"carga{i + 1:02d}" for i in range(quantidade)]
+    conn = sqlite3.connect(caminho_users_db)
+    try:
+        db_utils.criar_tabela_users(conn)
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (username, password_hash, is_admin, allowed_screens) VALUES (?, ?, 0, NULL)",
+            [(usuario, db_utils.hash_password(SENHA_CARGA, usuario)) for usuario in usuarios]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return usuarios
+
+
+def referencias_di(caminho_xml_db: str) -> List[str]:
+    """Referências (informacao_complementar) das DIs da cópia, usadas na pesquisa do Custo do Processo."""
+    conn = sqlite3.connect(caminho_xml_db)
+    try:
+        linhas = conn.execute(
+            "SELECT DISTINCT informacao_complementar FROM xml_declaracoes "
+            "WHERE informacao_complementar IS NOT NULL AND TRIM(informacao_complementar) <> ''"
+        ).fetchall()
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.close()
+    return sorted(linha[0].strip() for linha in linhas)
+
+
+# --- Sessão simulada (processo filho) ---
+class _CapturaBloqueios(logging.Handler):
+    """Guarda as mensagens de log com 'database is locked', com o passo em andamento na sessão."""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.passo = "abrir_app"
+        self.iteracao: Optional[int] = None
+        self.bloqueios: List[Dict[str, Any]] = []
+
+    def emit(self, record):
+        texto = record.getMessage()
+        if record.exc_info and record.exc_info[1] is not None:
+            texto = f"{texto} ({record.exc_info[1]})"
+        if any(trecho in texto for trecho in TRECHOS_BLOQUEIO):
+            self.bloqueios.append({
+                'passo': self.passo, 'iteracao': self.iteracao, 'origem': "log", 'logger': record.name,
+                'thread': threading.current_thread().name, 'mensagem': texto[:300],
+            })
+
+
+def _por_rotulo(elementos, rotulo: str):
+    for elemento in elementos:
+        if elemento.label == rotulo:
+            return elemento
+    raise ElementoNaoEncontrado(f"'{rotulo}' não encontrado na tela")
+
+
+def _por_chave(colecao, chave: str):
+    try:
+        return colecao(key=chave)
+    except KeyError:
+        raise ElementoNaoEncontrado(f"elemento '{chave}' não encontrado na tela") from None
+
+
+def _executar_roteiro(at, passo: str, usuario: str, rng: random.Random, referencias: List[str], iteracao: int, sessao: int):
+    """Faz a interação do passo e o rerun correspondente (o tempo medido é o desta chamada)."""
+    if passo == "login":
+        at.text_input(key="login_username_input").input(usuario)
+        at.text_input(key="login_password_input").input(SENHA_CARGA)
+        _por_rotulo(at.button, "Entrar").click().run()
+        if not at.session_state["authenticated"]:
+            raise ElementoNaoEncontrado("login recusado")
+    elif passo == "abrir_followup":
+        _por_chave(at.button, "menu_followup").click().run()
+    elif passo == "pesquisar_processo":
+        pesquisa = _por_chave(at.selectbox, "followup_edit_process_name_search_input")
+        processos = [opcao for opcao in pesquisa.options if opcao]
+        if not processos:
+            raise ElementoNaoEncontrado("nenhum processo no follow-up")
+        pesquisa.select(rng.choice(processos)).run()
+    elif passo == "abrir_processo":
+        _por_chave(at.button, "edit_process_from_search_button_outside_form").click().run()
+    elif passo == "salvar_processo":
+        _por_rotulo(at.text_area, "Observação").input(f"Teste de carga: sessão {sessao}, iteração {iteracao}")
+        _por_rotulo(at.button, "Salvar Processo").click().run()
+    elif passo == "abrir_custo":
+        _por_chave(at.button, "menu_custo_processo").click().run()
+    elif passo == "carregar_di":
+        if not referencias:
+            raise ElementoNaoEncontrado("nenhuma DI na cópia dos bancos")
+        _por_chave(at.text_input, "custo_search_ref_input_widget").input(rng.choice(referencias))
+        _por_chave(at.button, "custo_search_button").click().run()
+    elif passo == "exportar_pdf":
+        _por_chave(at.download_button, "download_report_pdf").click().run()
+    elif passo == "sair":
+        _por_chave(at.button, "logout_button").click().run()
+
+
+def _sessao(indice: int, usuario: str, config: Dict[str, Any], barreira, fila):
+    """Processo de uma sessão: abre o app, espera as demais e repete o roteiro; envia as medições pela fila."""
+    resultado: Dict[str, Any] = {'sessao': indice, 'usuario': usuario, 'medicoes': [], 'bloqueios': []}
+    captura = _CapturaBloqueios()
+    try:
+        os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+        # Com um handler no logger raiz, o logging.basicConfig do app_main não liga a saída no console
+        logging.getLogger().addHandler(captura)
+
+        import db_utils
+        import followup_db_manager
+        from streamlit.testing.v1 import AppTest
+
+        for tipo, caminho in list(db_utils._DB_PATHS.items()):
+            db_utils._DB_PATHS[tipo] = os.path.join(config['diretorio_dados'], os.path.basename(caminho))
+        followup_db_manager.set_followup_db_path(db_utils.get_db_path("followup"))
+
+        rng = random.Random(f"{config['seed']}:{indice}")
+        at = AppTest.from_file(os.path.join(_RAIZ, "app_main.py"), default_timeout=config['timeout'])
+        inicio = time.perf_counter()
+        at.run()
+        resultado['abrir_app_s'] = round(time.perf_counter() - inicio, 4)
+    except Exception:
+        resultado['falha'] = traceback.format_exc()
+        barreira.abort()
+        fila.put(resultado)
+        return
+
+    try:
+        barreira.wait(timeout=config['timeout'])
+    except Exception:
+        pass  # Outra sessão falhou ao abrir o app; esta segue sozinha
+
+    try:
+        for iteracao in range(config['iteracoes']):
+            for passo in PASSOS:
+                if config['pausa'] > 0:
+                    time.sleep(rng.uniform(0, 2 * config['pausa']))
+                captura.passo, captura.iteracao = passo, iteracao
+                medicao = {'passo': passo, 'iteracao': iteracao, 'duracao_s': None, 'erro': None}
+                inicio = time.perf_counter()
+                try:
+                    _executar_roteiro(at, passo, usuario, rng, config['referencias'], iteracao, indice)
+                    medicao['duracao_s'] = round(time.perf_counter() - inicio, 4)
+                    if at.exception:
+                        medicao['erro'] = at.exception[0].value[:300]
+                except ElementoNaoEncontrado as e:
+                    medicao['erro'] = f"não executado: {e}"
+                except Exception as e:
+                    medicao['duracao_s'] = round(time.perf_counter() - inicio, 4)
+                    medicao['erro'] = f"{type(e).__name__}: {e}"[:300]
+                if medicao['erro'] and any(trecho in medicao['erro'] for trecho in TRECHOS_BLOQUEIO):
+                    captura.bloqueios.append({
+                        'passo': passo, 'iteracao': iteracao, 'origem': "exceção na página", 'logger': None,
+                        'thread': None, 'mensagem': medicao['erro'],
+                    })
+                resultado['medicoes'].append(medicao)
+            if at.session_state["authenticated"]:
+                # O roteiro precisa começar na tela de login; se 'sair' falhou, encerra a sessão à força
+                at.session_state["authenticated"] = False
+                at.session_state["user_info"] = None
+                at.session_state["current_page"] = "Home"
+                at.run()
+    except Exception:
+        resultado['falha'] = traceback.format_exc()
+    resultado['bloqueios'] = captura.bloqueios
+    fila.put(resultado)
+
+
+# --- Relatório ---
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    """Percentil com interpolação linear (mesmo critério do numpy.percentile padrão)."""
+    if len(valores_ordenados) == 1:
+        return valores_ordenados[0]
+    posicao = (len(valores_ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(sessoes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    medicoes = [m for s in sessoes for m in s['medicoes']]
+    bloqueios = [dict(b, sessao=s['sessao']) for s in sessoes for b in s['bloqueios']]
+    passos = {}
+    for passo in PASSOS:
+        do_passo = [m for m in medicoes if m['passo'] == passo]
+        tempos = sorted(m['duracao_s'] for m in do_passo if m['duracao_s'] is not None and not m['erro'])
+        resumo = {
+            'execucoes': len(do_passo),
+            'erros': sum(1 for m in do_passo if m['erro']),
+            'bloqueios': sum(1 for b in bloqueios if b['passo'] == passo),
+        }
+        if tempos:
+            resumo.update({f"p{p}_s": round(percentil(tempos, p), 4) for p in PERCENTIS})
+            resumo.update({'max_s': tempos[-1], 'media_s': round(sum(tempos) / len(tempos), 4)})
+        passos[passo] = resumo
+    erros = [
+        {'sessao': s['sessao'], 'passo': m['passo'], 'iteracao': m['iteracao'], 'erro': m['erro']}
+        for s in sessoes for m in s['medicoes'] if m['erro']
+    ]
+    abrir_app = sorted(s['abrir_app_s'] for s in sessoes if 'abrir_app_s' in s)
+    return {
+        'abrir_app': {f"p{p}_s": round(percentil(abrir_app, p), 4) for p in PERCENTIS} if abrir_app else {},
+        'passos': passos,
+        'bloqueios': {
+            'total': len(bloqueios),
+            'por_passo': {passo: n for passo in PASSOS if (n := passos[passo]['bloqueios'])},
+            'fora_do_roteiro': sum(1 for b in bloqueios if b['passo'] not in PASSOS),
+            'exemplos': bloqueios[:20],
+        },
+        'erros': {'total': len(erros), 'exemplos': erros[:20]},
+        'falhas_de_sessao': {s['sessao']: s['falha'][-1500:] for s in sessoes if 'falha' in s},
+    }
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_RAIZ, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or "desconhecido"
+    except (OSError, subprocess.SubprocessError):
+        return "desconhecido"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=8, help="sessões simultâneas (um processo cada)")
+    parser.add_argument("--iteracoes", type=int, default=3, help="repetições do roteiro por sessão")
+    parser.add_argument("--pausa", type=float, default=0.0, help="tempo médio de 'leitura' entre os passos, em segundos")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dados", default=os.path.join(_RAIZ, "data"), help="pasta de bancos copiada para o teste")
+    parser.add_argument("--timeout", type=float, default=180, help="tempo máximo de um rerun, em segundos")
+    parser.add_argument("--saida", help="grava o JSON também neste arquivo")
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix="carga_prucomex_")
+    diretorio_dados = os.path.join(diretorio, "data")
+    try:
+        copiar_dados(args.dados, diretorio_dados)
+        import db_utils
+        usuarios = criar_usuarios_carga(
+            os.path.join(diretorio_dados, os.path.basename(db_utils.get_db_path("users"))), args.sessoes)
+        config = {
+            'diretorio_dados': diretorio_dados, 'seed': args.seed, 'iteracoes': args.iteracoes, 'pausa': args.pausa,
+            'timeout': args.timeout,
+            'referencias': referencias_di(os.path.join(diretorio_dados, os.path.basename(db_utils.get_db_path("xml_di")))),
+        }
+
+        # spawn: mesmo comportamento no Windows e no Linux, e nenhum estado do Streamlit herdado do processo principal
+        contexto = multiprocessing.get_context("spawn")
+        barreira = contexto.Barrier(args.sessoes)
+        fila = contexto.Queue()
+        processos = [
+            contexto.Process(target=_sessao, args=(i + 1, usuario, config, barreira, fila), name=f"sessao_{i + 1}")
+            for i, usuario in enumerate(usuarios)
+        ]
+        inicio = time.perf_counter()
+        for processo in processos:
+            processo.start()
+        # Lê a fila antes do join: um processo com resultado grande não termina enquanto ele não for consumido
+        sessoes = []
+        limite = args.timeout * (len(PASSOS) * args.iteracoes + 2) + args.pausa * 2 * len(PASSOS) * args.iteracoes
+        while len(sessoes) < len(processos) and time.perf_counter() - inicio < limite:
+            try:
+                sessoes.append(fila.get(timeout=1))
+            except Exception:
+                if not any(processo.is_alive() for processo in processos) and fila.empty():
+                    break
+        duracao_total_s = time.perf_counter() - inicio
+        for processo in processos:
+            processo.join(timeout=5)
+            if processo.is_alive():
+                processo.terminate()
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    sessoes.sort(key=lambda sessao: sessao['sessao'])
+    resultado = {
+        'benchmark': "carga_sessoes",
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': {k: v for k, v in vars(args).items() if k != 'saida'},
+        'sessoes_concluidas': len(sessoes),
+        'duracao_total_s': round(duracao_total_s, 2),
+        'passos_por_segundo': round(sum(len(s['medicoes']) for s in sessoes) / duracao_total_s, 2) if duracao_total_s else None,
+        **resumir(sessoes),
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+    sys.exit(0 if len(sessoes) == args.sessoes and not resultado['falhas_de_sessao'] else 1)
+
+
+if __name__ == "__main__":
+    main()
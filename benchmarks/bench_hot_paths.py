@@ -0,0 +1,349 @@
+"""
+Suíte de benchmarks dos caminhos mais usados do app, com dados sintéticos gerados pela semente.
+
+Cada cenário prepara seus dados com benchmarks/geradores.py em bancos SQLite temporários (os bancos
+de data/ não são tocados) e mede a função do app como as telas a chamam. O resultado é um JSON com
+o commit, a versão do Python, os parâmetros e, por cenário, o menor tempo, a mediana e a média das
+repetições. Com --comparar, os tempos são comparados com um JSON gerado antes (outro commit), e o
+processo termina com código 1 se algum cenário ficar mais lento que a tolerância. Cenários medidos com
+parâmetros de dados diferentes nos dois JSON (ver PARAMETROS_POR_CENARIO) não são comparados.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_hot_paths.py --saida resultados.json
+    python benchmarks/bench_hot_paths.py --cenarios parse_xml_di save_di --adicoes 50 --mercadorias 20
+    python benchmarks/bench_hot_paths.py --comparar resultados_anteriores.json --tolerancia 0.15
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Any
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# As páginas rodam sem o servidor do Streamlit (bare mode); os avisos de contexto ausente são esperados
+os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+import pandas as pd
+
+import db_utils
+import followup_db_manager
+import geradores
+
+_RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def medir(funcao: Callable[[], Any], repeat: int, preparar: Callable[[], None] = None) -> Dict[str, Any]:
+    """Executa a função `repeat` vezes (chamando `preparar` antes de cada uma, fora da medição)."""
+    tempos = []
+    for _ in range(repeat):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        'min_s': round(min(tempos), 6),
+        'mediana_s': round(statistics.median(tempos), 6),
+        'media_s': round(statistics.fmean(tempos), 6),
+        'repeat': repeat,
+    }
+
+
+def preparar_bancos(diretorio: str):
+    """Aponta todos os bancos do app para o diretório temporário e cria as tabelas."""
+    for tipo, caminho in list(db_utils._DB_PATHS.items()):
+        db_utils._DB_PATHS[tipo] = os.path.join(diretorio, os.path.basename(caminho))
+    followup_db_manager.set_followup_db_path(db_utils.get_db_path("followup"))
+    db_utils.create_tables()
+
+
+# --- Cenários ---
+def cenario_parse_xml_di(args, rng):
+    xml = geradores.gerar_di_xml(rng, args.adicoes, args.mercadorias)
+    di, itens = db_utils.parse_xml_data_to_dict(xml)
+    assert di and len(itens) == args.adicoes * args.mercadorias
+    resultado = medir(lambda: db_utils.parse_xml_data_to_dict(xml), args.repeat)
+    return {**resultado, 'itens': len(itens), 'bytes_xml': len(xml.encode('utf-8'))}
+
+
+def cenario_save_di(args, rng):
+    di, itens = db_utils.parse_xml_data_to_dict(geradores.gerar_di_xml(rng, args.adicoes, args.mercadorias))
+    contador = iter(range(10**6))
+
+    def preparar():
+        # numero_di é UNIQUE: cada repetição grava uma DI nova
+        di['numero_di'] = f"BENCH{next(contador):08d}"
+
+    def salvar():
+        assert db_utils.save_parsed_di_data(di, itens)
+
+    return {**medir(salvar, args.repeat, preparar), 'itens': len(itens)}
+
+
+def cenario_custo_perform_calculations(args, rng):
+    import streamlit as st
+    from app_logic import custo_item_page
+    referencia = f"PCH-BENCH-{rng.randint(1000, 9999)}"
+    di, itens = db_utils.parse_xml_data_to_dict(
+        geradores.gerar_di_xml(rng, args.adicoes, args.mercadorias, numero_di="BENCHCUSTO", referencia=referencia))
+    db_utils.save_parsed_di_data(di, itens)
+    declaracao = db_utils.get_declaracao_by_referencia(referencia)
+    itens_colunares = db_utils.get_itens_colunares_by_declaracao_id(declaracao.id)
+    despesas = {'afrmm': 850.0, 'siscoserv': 0.0, 'descarregamento': 1200.0, 'taxas_destino': 300.0, 'multa': 0.0}
+    contratos = pd.DataFrame({
+        'Nº Contrato': [f"Contrato {i + 1}" for i in range(10)],
+        'Dólar': [round(rng.uniform(4.8, 5.9), 4) if i < 3 else 0.0 for i in range(10)],
+        'Valor (US$)': [round(rng.uniform(5000, 50000), 2) if i < 3 else 0.0 for i in range(10)],
+    })
+    # Códigos ERP editados na tela (vazio: usa os do banco), como a página inicializa antes do cálculo
+    st.session_state.item_erp_codes = {}
+    resultado = medir(lambda: custo_item_page.perform_calculations(declaracao, itens_colunares, despesas, contratos), args.repeat)
+    return {**resultado, 'itens': len(itens)}
+
+
+def cenario_followup_planilha(args, rng):
+    # A gravação no banco não é medida: a importação chama db_manager.importar_csv_para_db_from_dataframe,
+    # que não existe em followup_db_manager.
+    from app_logic import followup_importacao_page
+    conteudo = geradores.planilha_xlsx(geradores.gerar_planilha_followup(rng, args.processos))
+
+    def importar():
+        df = pd.read_excel(pd.io.common.BytesIO(conteudo))
+        return followup_importacao_page._preprocess_dataframe_for_db(df)
+
+    return {**medir(importar, args.repeat), 'processos': args.processos, 'bytes_xlsx': len(conteudo)}
+
+
+def cenario_obter_processos_filtrados(args, rng):
+    processos = geradores.gerar_processos_followup(rng, args.processos)
+    conn = followup_db_manager.conectar_followup_db()
+    try:
+        colunas = list(processos[0])
+        conn.execute("DELETE FROM processos")
+        conn.executemany(
+            f"INSERT INTO processos ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+            [tuple(p[c] for c in colunas) for p in processos]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    consultas = {
+        'todos': ("Todos", None),
+        'status': ("Embarcado", None),
+        'arquivados': ("Arquivados", None),
+        'pesquisa': ("Todos", {'Processo_Novo': "PCH-001", 'Fornecedor': "LTD"}),
+    }
+    resultado = {'processos': args.processos}
+    for nome, (status, termos) in consultas.items():
+        resultado[nome] = {**medir(lambda: followup_db_manager.obter_processos_filtrados(status, termos), args.repeat),
+                           'linhas': len(followup_db_manager.obter_processos_filtrados(status, termos))}
+    return resultado
+
+
+def cenario_produtos_busca(args, rng):
+    from app_logic import produtos_index
+    catalogo = geradores.gerar_catalogo_produtos(rng, args.produtos)
+    db_path = db_utils.get_db_path("produtos")
+    db_utils.inserir_ou_atualizar_produtos_em_lote(db_path, catalogo)
+    termos = geradores.termos_busca_produtos(rng, catalogo, args.buscas)
+    indice = produtos_index.ProdutosIndex.from_db(db_path)
+
+    def buscar():
+        return [len(indice.search(t)) for t in termos]
+
+    return {
+        'produtos': len(indice), 'buscas': len(termos),
+        'construir_indice': medir(lambda: produtos_index.ProdutosIndex.from_db(db_path), args.repeat),
+        'buscar': {**medir(buscar, args.repeat), 'resultados': sum(buscar())},
+    }
+
+
+def cenario_importar_ncm(args, rng):
+    from app_logic import ncm_list_page
+    df = geradores.gerar_planilha_ncm(rng, args.ncms)
+    mapeamento = {coluna: coluna for coluna in ('NCM', 'DESCRIÇÃO', 'II (%)', 'IPI (%)', 'PIS (%)', 'COFINS (%)', 'ICMS (%)')}
+
+    def importar():
+        itens, erros = ncm_list_page._prepare_ncm_import_rows(df, mapeamento)
+        assert db_utils.adicionar_ou_atualizar_ncm_itens_em_lote(itens)
+        return itens, erros
+
+    itens, erros = importar()
+    return {**medir(importar, args.repeat), 'ncms': args.ncms, 'validos': len(itens), 'erros': len(erros)}
+
+
+def cenario_extrair_pdf(args, rng):
+    from app_logic import pdf_extraction
+    pdf = geradores.gerar_invoice_pdf(rng, args.paginas_pdf, args.itens_pdf, max(1, args.itens_pdf // 3))
+    analise = pdf_extraction.analyze_pdf(pdf, max_workers=args.pdf_workers, use_cache=False)
+    tabelas = sum(len(secao['tables']) for pagina in analise['pages'] for secao in pagina['sections'].values())
+    resultado = medir(lambda: pdf_extraction.analyze_pdf(pdf, max_workers=args.pdf_workers, use_cache=False),
+                      max(1, args.repeat // 2))
+    return {**resultado, 'paginas': args.paginas_pdf, 'bytes_pdf': len(pdf), 'tabelas_encontradas': tabelas,
+            'invoice': analise['invoice'].get('Invoice N#')}
+
+
+def cenario_terminais(args, rng):
+    from app_logic import tariff_engine
+    dis = geradores.gerar_dis_terminais(rng, args.dis)
+    parametros = {'dia_total': 12, 'qtde_processos': 1, 'diferenca': 0.0, 'taxas_extras': 0.0}
+    primeira = dis.iloc[[0]]
+    resultado = {'dis': args.dis}
+    for terminal in tariff_engine.TABELAS_TARIFAS:
+        resultado[terminal] = {
+            # Uma DI por vez, como nas telas de cálculo de cada terminal
+            'uma_di': medir(lambda: tariff_engine.calcular_terminais(primeira, [terminal], **parametros), args.repeat),
+            'lote': medir(lambda: tariff_engine.calcular_terminais(dis, [terminal], **parametros), args.repeat),
+        }
+    resultado['comparativo'] = medir(lambda: tariff_engine.comparar_terminais(dis, **parametros), args.repeat)
+    return resultado
+
+
+CENARIOS = {
+    'parse_xml_di': cenario_parse_xml_di,
+    'save_di': cenario_save_di,
+    'custo_perform_calculations': cenario_custo_perform_calculations,
+    'followup_planilha': cenario_followup_planilha,
+    'obter_processos_filtrados': cenario_obter_processos_filtrados,
+    'produtos_busca': cenario_produtos_busca,
+    'importar_ncm': cenario_importar_ncm,
+    'extrair_pdf': cenario_extrair_pdf,
+    'terminais': cenario_terminais,
+}
+
+# Parâmetros que definem os dados de cada cenário: só se comparam tempos medidos com os mesmos valores
+PARAMETROS_POR_CENARIO = {
+    'parse_xml_di': ('seed', 'adicoes', 'mercadorias'),
+    'save_di': ('seed', 'adicoes', 'mercadorias'),
+    'custo_perform_calculations': ('seed', 'adicoes', 'mercadorias'),
+    'followup_planilha': ('seed', 'processos'),
+    'obter_processos_filtrados': ('seed', 'processos'),
+    'produtos_busca': ('seed', 'produtos', 'buscas'),
+    'importar_ncm': ('seed', 'ncms'),
+    'extrair_pdf': ('seed', 'paginas_pdf', 'itens_pdf', 'pdf_workers'),
+    'terminais': ('seed', 'dis'),
+}
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_RAIZ, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or "desconhecido"
+    except (OSError, subprocess.SubprocessError):
+        return "desconhecido"
+
+
+def _tempos(resultado: Dict[str, Any], prefixo: str = "") -> Dict[str, float]:
+    """Achata os resultados em {'cenario.subcenario': min_s}."""
+    tempos = {}
+    for chave, valor in resultado.items():
+        if isinstance(valor, dict):
+            if 'min_s' in valor:
+                tempos[f"{prefixo}{chave}"] = valor['min_s']
+            tempos.update(_tempos({k: v for k, v in valor.items() if isinstance(v, dict)}, f"{prefixo}{chave}."))
+    return tempos
+
+
+def _parametros_diferentes(cenario: str, atual: Dict[str, Any], anterior: Dict[str, Any]) -> Dict[str, Any]:
+    """{parâmetro: [anterior, atual]} dos parâmetros do cenário que mudaram entre as execuções."""
+    return {
+        nome: [anterior.get(nome), atual.get(nome)]
+        for nome in PARAMETROS_POR_CENARIO.get(cenario, ())
+        if anterior.get(nome) != atual.get(nome)
+    }
+
+
+def comparar(atual: Dict[str, Any], anterior: Dict[str, Any], tolerancia: float) -> Dict[str, Any]:
+    """
+    Razão atual/anterior do menor tempo de cada cenário presente nos dois resultados. Cenários medidos
+    com parâmetros de dados diferentes (tamanho da DI, semente, ...) não são comparados: ficam em 'ignorados'.
+    """
+    tempos_atuais = _tempos(atual['cenarios'])
+    tempos_anteriores = _tempos(anterior.get('cenarios', {}))
+    ignorados = {}
+    for cenario in atual['cenarios']:
+        diferencas = _parametros_diferentes(cenario, atual['parametros'], anterior.get('parametros', {}))
+        if diferencas and cenario in anterior.get('cenarios', {}):
+            ignorados[cenario] = diferencas
+    razoes = {
+        nome: round(tempo / tempos_anteriores[nome], 3)
+        for nome, tempo in tempos_atuais.items()
+        if tempos_anteriores.get(nome) and nome.split('.', 1)[0] not in ignorados
+    }
+    return {
+        'commit_anterior': anterior.get('commit'),
+        'tolerancia': tolerancia,
+        'razoes': razoes,
+        'regressoes': sorted(nome for nome, razao in razoes.items() if razao > 1 + tolerancia),
+        'ignorados': ignorados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--adicoes", type=int, default=20)
+    parser.add_argument("--mercadorias", type=int, default=10, help="mercadorias por adição")
+    parser.add_argument("--processos", type=int, default=2000)
+    parser.add_argument("--produtos", type=int, default=20000)
+    parser.add_argument("--buscas", type=int, default=50)
+    parser.add_argument("--ncms", type=int, default=10000)
+    parser.add_argument("--paginas-pdf", type=int, default=4)
+    parser.add_argument("--itens-pdf", type=int, default=25, help="itens pagos por página do PDF")
+    parser.add_argument("--pdf-workers", type=int, default=1, help="processos da extração de PDF (1 = sequencial)")
+    parser.add_argument("--dis", type=int, default=5000, help="DIs no cálculo em lote dos terminais")
+    parser.add_argument("--saida", help="grava o JSON também neste arquivo")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar os tempos")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="aumento de tempo tolerado na comparação (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.disable(logging.WARNING)  # alguns módulos do app fixam o nível dos seus loggers em INFO
+    diretorio = tempfile.mkdtemp(prefix="bench_prucomex_")
+    try:
+        preparar_bancos(diretorio)
+        resultado = {
+            'benchmark': "hot_paths",
+            'commit': _commit_atual(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'parametros': {k: v for k, v in vars(args).items() if k not in ('saida', 'comparar', 'tolerancia')},
+            'cenarios': {},
+        }
+        for nome in args.cenarios:
+            # Cada cenário tem seu próprio gerador: o resultado não depende dos cenários escolhidos
+            rng = random.Random(f"{args.seed}:{nome}")
+            inicio = time.perf_counter()
+            resultado['cenarios'][nome] = CENARIOS[nome](args, rng)
+            print(f"{nome}: {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    codigo_saida = 0
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            resultado['comparacao'] = comparar(resultado, json.load(arquivo), args.tolerancia)
+        codigo_saida = 1 if resultado['comparacao']['regressoes'] else 0
+        for cenario, diferencas in resultado['comparacao']['ignorados'].items():
+            print(f"AVISO: '{cenario}' não comparado; parâmetros diferentes (anterior, atual): {diferencas}", file=sys.stderr)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+    sys.exit(codigo_saida)
+
+
+if __name__ == "__main__":
+    main()
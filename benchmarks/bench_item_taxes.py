@@ -0,0 +1,141 @@
+"""
+Benchmark da estimativa de impostos dos itens de um processo (process_form_page).
+
+Compara, para invoices sintéticas de vários tamanhos, o cálculo item a item
+(calculate_item_taxes_and_values), a versão vetorizada (calculate_items_taxes_batch,
+montando a tabela de alíquotas a cada chamada e com ela em cache) e
+calculate_items_taxes, usado pela tela, que escolhe entre as duas pela quantidade
+de itens. Confere também que os resultados são iguais.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_item_taxes.py --items 50,500,5000 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+from app_logic import process_form_page
+
+
+def gerar_aliquotas(qtd_ncm: int, rng: random.Random):
+    """Gera um dicionário {ncm: alíquotas} no formato de db_utils.get_ncm_rates_map."""
+    return {
+        f"{rng.randint(10000000, 99999999)}": {
+            'ii_aliquota': rng.choice([0.0, 2.0, 10.8, 14.4, 16.0, 18.0]),
+            'ipi_aliquota': rng.choice([0.0, 3.25, 5.0, 9.75, 15.0]),
+            'pis_aliquota': 2.1,
+            'cofins_aliquota': 9.65,
+            'icms_aliquota': rng.choice([4.0, 12.0, 17.0]),
+        }
+        for _ in range(qtd_ncm)
+    }
+
+
+def gerar_itens(qtd_itens: int, ncms, rng: random.Random):
+    """Gera itens no formato de st.session_state.process_items_data."""
+    itens = []
+    for i in range(qtd_itens):
+        quantidade = rng.randint(1, 500)
+        valor_unitario = round(rng.uniform(0.5, 900.0), 2)
+        itens.append({
+            "Código Interno": f"ERP{i:06d}",
+            # ~5% dos itens com NCM não cadastrado
+            "NCM": rng.choice(ncms) if rng.random() > 0.05 else "00000000",
+            "Quantidade": quantidade,
+            "Peso Unitário": round(rng.uniform(0.01, 25.0), 4),
+            "Valor Unitário": valor_unitario,
+            "Valor total do item": quantidade * valor_unitario,
+        })
+    return itens
+
+
+def bench(funcao, repeat: int):
+    tempos = []
+    resultado = None
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", default="50,500,5000", help="Quantidades de itens, separadas por vírgula")
+    parser.add_argument("--ncms", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ncm_rates = gerar_aliquotas(args.ncms, rng)
+    dolar, frete, seguro = 5.42, 3500.0, 1200.0
+    colunas = process_form_page.ITEM_TAX_COLUMNS
+
+    resultados = []
+    for qtd_itens in [int(q) for q in args.items.split(",") if q.strip()]:
+        itens = gerar_itens(qtd_itens, list(ncm_rates), rng)
+        df_itens = pd.DataFrame(itens)
+        total_valor = df_itens["Valor total do item"].sum()
+        total_peso = (df_itens["Peso Unitário"] * df_itens["Quantidade"]).sum()
+
+        def loop_item_a_item():
+            return [
+                process_form_page.calculate_item_taxes_and_values(item.copy(), dolar, total_valor, total_peso, frete, seguro, ncm_rates)
+                for item in itens
+            ]
+
+        def vetorizado():
+            return process_form_page.calculate_items_taxes_batch(
+                pd.DataFrame(itens), process_form_page.ncm_rates_to_frame(ncm_rates), dolar, frete, seguro
+            )
+
+        def vetorizado_tabela_em_cache():
+            return process_form_page.calculate_items_taxes_batch(
+                pd.DataFrame(itens), process_form_page.get_ncm_rates_frame(ncm_rates), dolar, frete, seguro
+            )
+
+        def tela():
+            return process_form_page.calculate_items_taxes(itens, ncm_rates, dolar, frete, seguro)
+
+        tempo_loop, itens_loop = bench(loop_item_a_item, args.repeat)
+        tempo_batch, (df_batch, _) = bench(vetorizado, args.repeat)
+        tempo_batch_cache, _ = bench(vetorizado_tabela_em_cache, args.repeat)
+        tempo_tela, (itens_tela, totais) = bench(tela, args.repeat)
+
+        df_loop = pd.DataFrame(itens_loop)[colunas]
+        diferenca_maxima = max(
+            float((df_loop - df_batch[colunas]).abs().max().max()),
+            float((df_loop - pd.DataFrame(itens_tela)[colunas]).abs().max().max()),
+        )
+        resultados.append({
+            "items": qtd_itens,
+            "loop_seconds": round(tempo_loop, 6),
+            "batch_seconds": round(tempo_batch, 6),
+            "batch_cached_rates_seconds": round(tempo_batch_cache, 6),
+            "calculate_items_taxes_seconds": round(tempo_tela, 6),
+            "batch_speedup": round(tempo_loop / tempo_batch, 2) if tempo_batch else None,
+            "batch_cached_rates_speedup": round(tempo_loop / tempo_batch_cache, 2) if tempo_batch_cache else None,
+            "caminho_tela": "batch" if qtd_itens >= process_form_page.ITENS_MINIMO_CALCULO_VETORIZADO else "loop",
+            "max_abs_diff": diferenca_maxima,
+            "estimativa_impostos_total": round(totais["Estimativa_Impostos_Total"], 2),
+        })
+
+    print(json.dumps({
+        "benchmark": "item_taxes",
+        "ncms": args.ncms,
+        "repeat": args.repeat,
+        "itens_minimo_calculo_vetorizado": process_form_page.ITENS_MINIMO_CALCULO_VETORIZADO,
+        "resultados": resultados,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
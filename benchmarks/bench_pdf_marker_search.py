@@ -0,0 +1,202 @@
+"""
+Benchmark da busca de marcadores de seção nas páginas de invoice (pdf_extraction).
+
+Compara a regra original de find_table_bbox_by_markers (reagrupa as palavras em linhas
+e compila os padrões a cada chamada, uma vez por seção) com o PageTextIndex construído
+uma vez por página e os padrões pré-compilados, e confere que as bboxes são iguais.
+
+As páginas podem ser sintéticas (padrão) ou vir de um PDF real:
+    python benchmarks/bench_pdf_marker_search.py --pages 40 --lines 70 --repeat 5
+    python benchmarks/bench_pdf_marker_search.py --pdf caminho/invoice.pdf
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app_logic import pdf_extraction
+
+_LARGURA_PAGINA = 595.0
+_ALTURA_PAGINA = 842.0
+_ALTURA_LINHA = 12.0
+
+
+def _palavras_linha(textos, top, rng: random.Random):
+    """Cria as palavras de uma linha no formato de pdfplumber.extract_words()."""
+    palavras = []
+    x = 30.0
+    for texto in textos:
+        # Pequena variação vertical, como ocorre entre fontes diferentes na mesma linha
+        top_palavra = top + rng.uniform(0, 0.8)
+        largura = 5.5 * len(texto)
+        palavras.append({'text': texto, 'x0': x, 'x1': x + largura, 'top': top_palavra, 'bottom': top_palavra + 9.0})
+        x += largura + 6.0
+    return palavras
+
+
+def gerar_pagina(qtd_linhas: int, rng: random.Random):
+    """Gera as palavras de uma página de invoice com seções de produtos pagos e gratuitos."""
+    linhas = [
+        ["ACME", "TRADING", "LTD"],
+        ["Invoice", "No.:", f"INV-{rng.randint(1000, 9999)}"],
+        ["NCM/HS", "Code", "Principal:", "85044010"],
+        ["PAID", "PRODUCTS"],
+        ["COD", "ERP", "DESCRIPTION", "MODEL", "QTY", "UNIT", "PRICE", "AMOUNT"],
+    ]
+    qtd_itens = max(1, (qtd_linhas - 10) // 2)
+    for i in range(qtd_itens):
+        linhas.append([f"P{i:05d}", "Inverter", f"M-{i}", str(rng.randint(1, 99)), "2.50", "25.00"])
+    linhas.append(["TOTAL", "AMOUNT", "1000.00"])
+    linhas.append(["FREE", "OF", "CHARGE", "PRODUCTS"])
+    linhas.append(["Código", "Interno", "SKU", "NCM", "Cobertura"])
+    for i in range(qtd_linhas - len(linhas) - 2):
+        linhas.append([f"F{i:05d}", f"SKU-{i}", "85044010", "NÃO"])
+    linhas.append(["SUBTOTAL", "0.00"])
+    linhas.append(["Say", "Total", "Amount:", "ONE", "THOUSAND"])
+
+    palavras = []
+    for n, textos in enumerate(linhas):
+        palavras.extend(_palavras_linha(textos, 20.0 + n * _ALTURA_LINHA, rng))
+    rng.shuffle(palavras)
+    return palavras
+
+
+def carregar_paginas_pdf(caminho: str):
+    import pdfplumber
+    with pdfplumber.open(caminho) as pdf:
+        return [(p.extract_words(), tuple(p.bbox), p.height) for p in pdf.pages]
+
+
+def bbox_referencia(all_words, page_bbox, page_height, area_start_marker_pattern, area_end_marker_pattern,
+                    table_header_pattern, table_footer_pattern):
+    """Cópia da regra original (sem Streamlit): reagrupa palavras e compila padrões a cada chamada."""
+    broad_search_start_y = 0
+    start_section_pattern = re.compile(area_start_marker_pattern, re.IGNORECASE)
+    lines_by_y_group = {}
+    for word_obj in all_words:
+        key = int(word_obj['top'] // 3) * 3
+        lines_by_y_group.setdefault(key, []).append(word_obj)
+    sorted_line_keys = sorted(lines_by_y_group.keys())
+
+    for line_key in sorted_line_keys:
+        words_in_current_line = sorted(lines_by_y_group[line_key], key=lambda w: w['x0'])
+        full_line_text = " ".join([w['text'] for w in words_in_current_line])
+        if start_section_pattern.search(full_line_text):
+            broad_search_start_y = max(broad_search_start_y, min(w['bottom'] for w in words_in_current_line))
+            break
+
+    broad_search_end_y = page_height
+    end_section_pattern = re.compile(area_end_marker_pattern, re.IGNORECASE)
+    for line_key in sorted_line_keys:
+        words_in_current_line = sorted(lines_by_y_group[line_key], key=lambda w: w['x0'])
+        full_line_text = " ".join([w['text'] for w in words_in_current_line])
+        current_line_top = min(w['top'] for w in words_in_current_line)
+        if current_line_top > broad_search_start_y and end_section_pattern.search(full_line_text):
+            broad_search_end_y = min(broad_search_end_y, max(w['top'] for w in words_in_current_line))
+            break
+
+    if broad_search_start_y == 0:
+        return None
+    if broad_search_end_y <= broad_search_start_y + 10:
+        return None
+
+    # Mesma filtragem por linha usada pelo pipeline (linhas inteiras dentro da área)
+    table_header_y = None
+    table_footer_y = None
+    header_pattern = re.compile(table_header_pattern, re.IGNORECASE)
+    footer_pattern = re.compile(table_footer_pattern, re.IGNORECASE)
+    for line_key in sorted_line_keys:
+        words_in_current_line = sorted(lines_by_y_group[line_key], key=lambda w: w['x0'])
+        current_line_top = min(w['top'] for w in words_in_current_line)
+        current_line_bottom = max(w['bottom'] for w in words_in_current_line)
+        if current_line_top < broad_search_start_y or current_line_bottom > broad_search_end_y:
+            continue
+        full_line_text = " ".join([w['text'] for w in words_in_current_line])
+        if header_pattern.search(full_line_text):
+            table_header_y = current_line_top
+        if table_header_y is not None and current_line_top > table_header_y:
+            if footer_pattern.search(full_line_text):
+                table_footer_y = current_line_bottom
+                break
+
+    if table_header_y is None:
+        return None
+    if table_footer_y is None:
+        table_footer_y = broad_search_end_y
+
+    y0_final = max(0, table_header_y - 15)
+    y1_final = min(page_height, table_footer_y + 15)
+    if y1_final <= y0_final + 5:
+        y0_final = broad_search_start_y + 10
+        y1_final = broad_search_end_y - 10
+        if y1_final <= y0_final + 5:
+            return None
+    return (page_bbox[0], y0_final, page_bbox[2], y1_final)
+
+
+def executar_referencia(paginas):
+    return [
+        [bbox_referencia(words, page_bbox, height, **padroes) for padroes in pdf_extraction.SECOES_PRODUTOS.values()]
+        for words, page_bbox, height in paginas
+    ]
+
+
+def executar_indice(paginas):
+    resultado = []
+    for words, page_bbox, height in paginas:
+        indice = pdf_extraction.PageTextIndex(words)
+        resultado.append([
+            pdf_extraction.find_table_bbox_in_lines(indice, page_bbox, height, **padroes)
+            for padroes in pdf_extraction.SECOES_PRODUTOS_COMPILADAS.values()
+        ])
+    return resultado
+
+
+def medir(funcao, paginas, repeticoes: int) -> float:
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(paginas)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40, help="Número de páginas sintéticas")
+    parser.add_argument("--lines", type=int, default=70, help="Linhas por página sintética")
+    parser.add_argument("--pdf", help="Usa as páginas de um PDF real em vez das sintéticas")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.pdf:
+        paginas = carregar_paginas_pdf(args.pdf)
+    else:
+        rng = random.Random(args.seed)
+        paginas = [(gerar_pagina(args.lines, rng), (0, 0, _LARGURA_PAGINA, _ALTURA_PAGINA), _ALTURA_PAGINA)
+                   for _ in range(args.pages)]
+
+    referencia = executar_referencia(paginas)
+    indice = executar_indice(paginas)
+    tempo_referencia = medir(executar_referencia, paginas, args.repeat)
+    tempo_indice = medir(executar_indice, paginas, args.repeat)
+
+    print(json.dumps({
+        "pages": len(paginas),
+        "words": sum(len(words) for words, _, _ in paginas),
+        "reference_s": round(tempo_referencia, 6),
+        "page_text_index_s": round(tempo_indice, 6),
+        "speedup": round(tempo_referencia / tempo_indice, 2) if tempo_indice else None,
+        "same_bboxes": referencia == indice,
+        "bboxes_found": sum(1 for pagina in indice for bbox in pagina if bbox),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Geradores de dados sintéticos (determinísticos pela semente) para os benchmarks.
+
+Cada gerador recebe um random.Random e produz dados no formato que o app recebe ou grava:
+XML de DI no layout do Siscomex (adições e mercadorias configuráveis), planilha de follow-up com o
+cabeçalho da importação de processos, processos já no formato da tabela 'processos', catálogo de
+produtos, planilha de NCMs/alíquotas, DIs para os cálculos de terminais e invoices em PDF com as
+seções de produtos pagos e gratuitos que pdf_extraction procura.
+"""
+import io
+import random
+from datetime import date, timedelta
+from typing import List, Dict, Any, Tuple
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+STATUS_PROCESSO = ["Processo Criado", "Verificando", "Em produção", "Pré Embarque", "Embarcado",
+                   "Chegada Recinto", "Registrado", "Liberado", "Agendado", "Encerrado"]
+MODAIS = ["Maritimo", "Aereo"]
+FORNECEDORES = ["ACME TRADING LTD", "SHENZHEN POWER CO LTD", "NINGBO COMPONENTS LTD", "GUANGZHOU TECH LTD",
+                "DONGGUAN CABLES LTD", "XIAMEN SOLAR LTD"]
+PRODUTOS_BASE = ["Inversor", "Fonte", "Placa de vídeo", "Memória", "Gabinete", "Cooler", "Cabo", "Monitor",
+                 "Teclado", "Mouse", "SSD", "Placa-mãe", "Processador", "Headset", "Roteador"]
+ADJETIVOS = ["gamer", "RGB", "modular", "compacto", "sem fio", "USB-C", "ATX", "DDR5", "NVMe", "65W", "850W"]
+NCMS_BASE = ["85044010", "84733041", "84715010", "85176259", "84718000", "84733049", "85285200", "84716053",
+             "85444200", "84713012"]
+RECINTOS = ["PORTONAVE S/A", "PAC LOG - ELO", "TECON ITAJAI"]
+
+
+def _data(rng: random.Random, inicio: date = date(2023, 1, 1), dias: int = 900) -> date:
+    return inicio + timedelta(days=rng.randrange(dias))
+
+
+def _ncm(rng: random.Random) -> str:
+    # ~70% dos itens nos NCMs mais comuns, como no catálogo real
+    return rng.choice(NCMS_BASE) if rng.random() < 0.7 else f"{rng.randint(10000000, 99999999)}"
+
+
+def _descricao_produto(rng: random.Random) -> str:
+    return f"{rng.choice(PRODUTOS_BASE)} {rng.choice(ADJETIVOS)} {rng.choice(ADJETIVOS)} modelo {rng.randint(100, 9999)}"
+
+
+# --- DI (XML do Siscomex) ---
+def gerar_di_xml(rng: random.Random, adicoes: int = 10, mercadorias_por_adicao: int = 5, numero_di: str = None,
+                 referencia: str = None) -> str:
+    """XML de uma DI com os campos lidos por db_utils.parse_xml_data_to_dict."""
+    numero_di = numero_di or f"{rng.randint(20, 25)}{rng.randint(10**8, 10**9 - 1)}"
+    referencia = referencia or f"PCH-{rng.randint(1000, 9999)}-{rng.randint(10, 99)}"
+    taxa = rng.uniform(4.8, 5.9)
+    centavos = lambda minimo, maximo: str(rng.randint(minimo * 100, maximo * 100))
+
+    partes_adicoes = []
+    for n_adicao in range(1, adicoes + 1):
+        mercadorias = []
+        for n_item in range(1, mercadorias_por_adicao + 1):
+            sku = f"SKU{rng.randint(10000, 99999)}"
+            mercadorias.append(
+                "<mercadoria>"
+                f"<descricaoMercadoria>{escape(sku + ' - ' + _descricao_produto(rng))}</descricaoMercadoria>"
+                f"<numeroSequencialItem>{n_item:02d}</numeroSequencialItem>"
+                f"<quantidade>{rng.randint(1, 2000) * 10**5:014d}</quantidade>"
+                "<unidadeMedida>UNIDADE</unidadeMedida>"
+                f"<valorUnitario>{int(rng.uniform(0.5, 900.0) * 10**7):020d}</valorUnitario>"
+                "</mercadoria>"
+            )
+        partes_adicoes.append(
+            "<adicao>"
+            f"<numeroAdicao>{n_adicao:03d}</numeroAdicao>"
+            f"<dadosMercadoriaCodigoNcm>{_ncm(rng)}</dadosMercadoriaCodigoNcm>"
+            f"<dadosMercadoriaPesoLiquido>{rng.randint(10, 5000) * 10**5:015d}</dadosMercadoriaPesoLiquido>"
+            f"<iiAliquotaAdValorem>{rng.choice([0, 1080, 1440, 1600, 1800]):05d}</iiAliquotaAdValorem>"
+            f"<ipiAliquotaAdValorem>{rng.choice([0, 325, 500, 975, 1500]):05d}</ipiAliquotaAdValorem>"
+            "<pisPasepAliquotaAdValorem>00210</pisPasepAliquotaAdValorem>"
+            "<cofinsAliquotaAdValorem>00965</cofinsAliquotaAdValorem>"
+            f"<acrescimo><valorReais>{centavos(0, 500)}</valorReais></acrescimo>"
+            + "".join(mercadorias) +
+            "</adicao>"
+        )
+
+    pagamentos = "".join(
+        f"<pagamento><codigoReceita>{codigo}</codigoReceita><valorReceita>{centavos(minimo, maximo)}</valorReceita></pagamento>"
+        for codigo, minimo, maximo in (("0086", 5000, 90000), ("1038", 1000, 30000), ("5602", 500, 5000),
+                                       ("5629", 2000, 25000), ("7811", 100, 500))
+    )
+    informacao = (f"REFERENCIA: {referencia}\nTAXA CAMBIAL(USD): {taxa:.4f}".replace('.', ',') +
+                  "\nICMS-SC IMPORTAÇÃO....: DIFERIDO\n")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><ListaDeclaracoes><declaracaoImportacao>'
+        f"<numeroDI>{numero_di}</numeroDI>"
+        f"<dataRegistro>{_data(rng).strftime('%Y%m%d')}</dataRegistro>"
+        f"<informacaoComplementar>{escape(informacao)}</informacaoComplementar>"
+        f"<localEmbarqueTotalReais>{centavos(50000, 900000)}</localEmbarqueTotalReais>"
+        f"<freteTotalReais>{centavos(5000, 40000)}</freteTotalReais>"
+        f"<seguroTotalReais>{centavos(100, 3000)}</seguroTotalReais>"
+        f"<localDescargaTotalReais>{centavos(60000, 950000)}</localDescargaTotalReais>"
+        f"<cargaPesoBruto>{rng.randint(1000, 25000) * 10**5:015d}</cargaPesoBruto>"
+        f"<cargaPesoLiquido>{rng.randint(800, 20000) * 10**5:015d}</cargaPesoLiquido>"
+        "<importadorNumero>09376495000122</importadorNumero><importadorNome>PICHAU INFORMATICA LTDA</importadorNome>"
+        f"<armazenamentoRecintoAduaneiroNome>{rng.choice(RECINTOS)}</armazenamentoRecintoAduaneiroNome>"
+        f"<embalagem><nomeEmbalagem>CONTAINER</nomeEmbalagem><quantidadeVolume>{rng.randint(1, 4)}</quantidadeVolume></embalagem>"
+        "<documentoInstrucaoDespacho><nomeDocumentoDespacho>FATURA COMERCIAL</nomeDocumentoDespacho>"
+        f"<numeroDocumentoDespacho>INV-{rng.randint(10000, 99999)}</numeroDocumentoDespacho></documentoInstrucaoDespacho>"
+        + "".join(partes_adicoes) + pagamentos +
+        "</declaracaoImportacao></ListaDeclaracoes>"
+    )
+
+
+# --- Follow-up ---
+def gerar_planilha_followup(rng: random.Random, processos: int) -> pd.DataFrame:
+    """Planilha de follow-up com o cabeçalho aceito pela importação de processos (followup_importacao_page)."""
+    linhas = []
+    for i in range(processos):
+        compra = _data(rng)
+        embarque = compra + timedelta(days=rng.randint(15, 60))
+        linhas.append({
+            "Process Reference": f"PCH-{i:05d}-{rng.randint(10, 99)}",
+            "Supplier": rng.choice(FORNECEDORES),
+            "Type of Item": rng.choice(PRODUTOS_BASE),
+            "INV/Invoice": f"INV-{rng.randint(10000, 99999)}",
+            "Qtd": str(rng.randint(10, 20000)),
+            "Value USD": f"{rng.uniform(1000, 500000):.2f}".replace('.', ','),
+            "Paid?": rng.choice(["Sim", "Não", "s", "n"]),
+            "P/O": f"PO{rng.randint(100000, 999999)}",
+            "Purchase Date (YYYY-MM-DD)": compra.strftime("%d/%m/%Y"),
+            "Est. Freight.": f"{rng.uniform(500, 9000):.2f}",
+            "Shipping Date (YYYY-MM-DD)": embarque.strftime("%d/%m/%Y"),
+            "Shipping Company": rng.choice(["MAERSK", "MSC", "CMA CGM", "COSCO"]),
+            "Status": rng.choice(STATUS_PROCESSO),
+            "ETA Pichau (YYYY-MM-DD)": (embarque + timedelta(days=rng.randint(30, 70))).strftime("%d/%m/%Y"),
+            "Modal": rng.choice(MODAIS),
+            "Navio": f"MAERSK {rng.choice(['SANTOS', 'ITAJAI', 'SHANGHAI', 'NINGBO'])}",
+            "Origin": rng.choice(["Shanghai", "Ningbo", "Shenzhen", "Xiamen"]),
+            "Destination": rng.choice(["Itajaí", "Navegantes", "Curitiba"]),
+            "INCOTERM": rng.choice(["FOB", "CIF", "EXW"]),
+            "Buyer": rng.choice(["Ana", "Bruno", "Carla", "Diego"]),
+            "Docs Reviewed (Sim/Não)": rng.choice(["Sim", "Não"]),
+            "BL/AWB (Sim/Não)": rng.choice(["Sim", "Não"]),
+            "Description Done (Sim/Não)": rng.choice(["Sim", "Não"]),
+            "Description Sent (Sim/Não)": rng.choice(["Sim", "Não"]),
+            "Obs": "" if rng.random() < 0.6 else f"Obs {rng.randint(1, 999)}",
+        })
+    return pd.DataFrame(linhas)
+
+
+def planilha_xlsx(df: pd.DataFrame) -> bytes:
+    """Conteúdo .xlsx do DataFrame (como um upload de planilha)."""
+    saida = io.BytesIO()
+    df.to_excel(saida, index=False)
+    return saida.getvalue()
+
+
+# --- Catálogo de produtos ---
+def gerar_catalogo_produtos(rng: random.Random, produtos: int) -> List[Tuple[str, str, str, str]]:
+    """Produtos (id_key_erp, nome_part, descricao, ncm), no formato de db_utils.inserir_ou_atualizar_produtos_em_lote."""
+    catalogo = []
+    for i in range(produtos):
+        nome = _descricao_produto(rng)
+        catalogo.append((
+            f"{100000 + i}",
+            nome,
+            f"{nome} - {rng.choice(FORNECEDORES)} - garantia {rng.randint(1, 3)} ano(s)",
+            _ncm(rng),
+        ))
+    return catalogo
+
+
+def termos_busca_produtos(rng: random.Random, catalogo: List[Tuple[str, str, str, str]], quantidade: int) -> List[Dict[str, str]]:
+    """Combinações de filtros da tela de descrições: ID parcial, NCM, trechos de nome e descrição."""
+    termos = []
+    for _ in range(quantidade):
+        produto = rng.choice(catalogo)
+        escolha = rng.randrange(4)
+        if escolha == 0:
+            termos.append({'id_key_erp': produto[0][:4]})
+        elif escolha == 1:
+            termos.append({'ncm': produto[3]})
+        elif escolha == 2:
+            termos.append({'nome_part': produto[1].split()[0].lower()})
+        else:
+            termos.append({'descricao': rng.choice(ADJETIVOS), 'ncm': produto[3][:4]})
+    return termos
+
+
+# --- NCMs ---
+def gerar_planilha_ncm(rng: random.Random, ncms: int, linhas_invalidas: float = 0.02) -> pd.DataFrame:
+    """Planilha de NCMs e alíquotas no layout da importação da tela Listagem NCM."""
+    linhas = []
+    for i in range(ncms):
+        invalida = rng.random() < linhas_invalidas
+        codigo = f"{10000000 + i * 37:08d}"
+        linhas.append({
+            'NCM': f"{codigo[:4]}.{codigo[4:6]}.{codigo[6:]}",
+            'DESCRIÇÃO': f"-- {_descricao_produto(rng)}",
+            'II (%)': "abc" if invalida else f"{rng.choice([0, 10.8, 14.4, 16, 18])}%",
+            'IPI (%)': str(rng.choice([0, 3.25, 5, 9.75, 15])).replace('.', ','),
+            'PIS (%)': "2,1",
+            'COFINS (%)': "9,65",
+            'ICMS (%)': rng.choice(["4", "12", "17", ""]),
+        })
+    return pd.DataFrame(linhas)
+
+
+# --- DIs para os cálculos de terminais ---
+def gerar_dis_terminais(rng: random.Random, quantidade: int) -> pd.DataFrame:
+    """DIs com as colunas de xml_declaracoes usadas por tariff_engine."""
+    linhas = []
+    for i in range(quantidade):
+        vmle = rng.uniform(50000, 900000)
+        frete = rng.uniform(5000, 40000)
+        linhas.append({
+            'id': i + 1, 'numero_di': f"24{i:08d}", 'informacao_complementar': f"PCH-{i:05d}",
+            'vmle': vmle, 'frete': frete, 'seguro': rng.uniform(100, 3000), 'vmld': vmle + frete + rng.uniform(100, 3000),
+            'peso_bruto': rng.uniform(1000, 25000), 'imposto_importacao': rng.uniform(5000, 90000),
+            'ipi': rng.uniform(1000, 30000), 'pis_pasep': rng.uniform(500, 5000), 'cofins': rng.uniform(2000, 25000),
+            'taxa_siscomex': rng.uniform(100, 500), 'acrescimo': rng.uniform(0, 500),
+            'icms_sc': rng.choice(["DIFERIDO", "4%", "12%"]), 'embalagem': "CONTAINER", 'quantidade_volumes': rng.randint(1, 4),
+        })
+    return pd.DataFrame(linhas)
+
+
+# --- Invoice em PDF ---
+def _tabela_pdf(cabecalho: List[str], linhas: List[List[str]]):
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+    tabela = Table([cabecalho] + linhas, repeatRows=0)
+    tabela.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ]))
+    return tabela
+
+
+def gerar_invoice_pdf(rng: random.Random, paginas: int = 3, itens_pagos: int = 25, itens_gratuitos: int = 8) -> bytes:
+    """
+    Invoice/packing list em PDF: cada página tem o cabeçalho do fornecedor, a seção PAID PRODUCTS e a
+    seção FREE OF CHARGE PRODUCTS em tabelas com grade (as tabelas são lidas pela estratégia 'lines').
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+
+    estilos = getSampleStyleSheet()
+    fornecedor = rng.choice(FORNECEDORES)
+    numero_invoice = f"INV-{rng.randint(10000, 99999)}"
+    elementos = []
+    for pagina in range(paginas):
+        elementos += [
+            Paragraph(fornecedor, estilos['Heading3']),
+            Paragraph(f"Invoice No.: {numero_invoice}", estilos['Normal']),
+            Paragraph(f"NCM/HS Code Principal: {rng.choice(NCMS_BASE)}", estilos['Normal']),
+            Spacer(1, 8),
+            Paragraph("PAID PRODUCTS", estilos['Heading4']),
+        ]
+        total = 0.0
+        linhas = []
+        for _ in range(itens_pagos):
+            quantidade, preco = rng.randint(1, 500), rng.uniform(0.5, 300.0)
+            total += quantidade * preco
+            linhas.append([f"{rng.randint(100000, 199999)}", rng.choice(PRODUTOS_BASE), f"M-{rng.randint(100, 999)}",
+                           str(quantidade), f"{preco:.2f}", f"{quantidade * preco:.2f}"])
+        linhas.append(["TOTAL AMOUNT", "", "", "", "", f"{total:.2f}"])
+        elementos.append(_tabela_pdf(["COD ERP", "DESCRIPTION", "MODEL", "QTY", "UNIT PRICE", "AMOUNT"], linhas))
+        elementos += [Spacer(1, 8), Paragraph("FREE OF CHARGE PRODUCTS", estilos['Heading4'])]
+        linhas = [[f"{rng.randint(100000, 199999)}", f"SKU-{rng.randint(1000, 9999)}", rng.choice(NCMS_BASE), rng.choice(["SIM", "NÃO"])]
+                  for _ in range(itens_gratuitos)]
+        linhas.append(["SUBTOTAL", "", "", "0.00"])
+        elementos.append(_tabela_pdf(["Código Interno", "SKU", "NCM", "Cobertura"], linhas))
+        elementos += [Spacer(1, 8), Paragraph(f"Say Total Amount: {total:.2f}", estilos['Normal'])]
+        if pagina < paginas - 1:
+            elementos.append(PageBreak())
+
+    saida = io.BytesIO()
+    SimpleDocTemplate(saida, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30).build(elementos)
+    return saida.getvalue()
+
+
+def gerar_processos_followup(rng: random.Random, processos: int) -> List[Dict[str, Any]]:
+    """Processos já no formato da tabela 'processos' (nomes de coluna do banco)."""
+    df = gerar_planilha_followup(rng, processos)
+    return [
+        {
+            'Processo_Novo': linha["Process Reference"], 'Fornecedor': linha["Supplier"],
+            'Tipos_de_item': linha["Type of Item"], 'N_Invoice': linha["INV/Invoice"],
+            'Quantidade': int(linha["Qtd"]), 'Valor_USD': float(linha["Value USD"].replace(',', '.')),
+            'Status_Geral': linha["Status"], 'Modal': linha["Modal"], 'Navio': linha["Navio"],
+            'Origem': linha["Origin"], 'Destino': linha["Destination"], 'INCOTERM': linha["INCOTERM"],
+            'Comprador': linha["Buyer"], 'Observacao': linha["Obs"] or None,
+            'Status_Arquivado': "Arquivado" if rng.random() < 0.2 else "Não Arquivado",
+        }
+        for linha in df.to_dict('records')
+    ]
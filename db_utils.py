@@ -1,14 +1,20 @@
 import sqlite3
 import logging
 import os
+import json
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import re
 import pandas as pd
 import hashlib
-from typing import Optional, Dict, Any, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple, Iterable, Iterator
+
+import numpy as np
 
 import followup_db_manager
+import query_trace
 
 
 logger = logging.getLogger(__name__)
@@ -22,6 +28,10 @@ _PAGAMENTOS_DB_FILENAME = "pagamentos_container.db"
 _FOLLOWUP_DB_FILENAME = "followup_importacao.db"
 # NOVO: Nome do arquivo do banco de dados para itens NCM e impostos
 _NCM_IMPOSTOS_DB_FILENAME = "ncm_impostos.db"
+# Boletins de cotação de moedas (PTAX) baixados do Banco Central
+_COTACOES_DB_FILENAME = "cotacoes.db"
+_COMEX_DB_FILENAME = "comex_db.db"
+_TTCE_DB_FILENAME = "ttce_cache.db"
 
 
 _base_path = os.path.dirname(os.path.abspath(__file__))
@@ -36,6 +46,9 @@ _DB_PATHS = {
     "followup": os.path.join(_app_root_path, _DEFAULT_DB_FOLDER, _FOLLOWUP_DB_FILENAME),
     # NOVO: Adiciona o caminho para o novo banco de dados de NCM e impostos
     "ncm_impostos": os.path.join(_app_root_path, _DEFAULT_DB_FOLDER, _NCM_IMPOSTOS_DB_FILENAME),
+    "cotacoes": os.path.join(_app_root_path, _DEFAULT_DB_FOLDER, _COTACOES_DB_FILENAME),
+    "comex": os.path.join(_app_root_path, _DEFAULT_DB_FOLDER, _COMEX_DB_FILENAME),
+    "ttce": os.path.join(_app_root_path, _DEFAULT_DB_FOLDER, _TTCE_DB_FILENAME),
 }
 
 
@@ -44,12 +57,12 @@ def get_db_path(db_type: str):
     return _DB_PATHS.get(db_type)
 
 def connect_db(db_path: str):
-    """Conecta ao banco de dados."""
+    """Conecta ao banco de dados. As consultas da conexão são medidas por query_trace."""
     if not db_path:
         logger.error("Caminho do DB não definido.")
         return None
     try:
-        conn = sqlite3.connect(db_path)
+        conn = query_trace.conectar(db_path)
         conn.row_factory = sqlite3.Row
         logger.debug(f"Conectado com sucesso ao DB: {db_path}")
         return conn
@@ -139,6 +152,117 @@ def criar_tabela_ncm_impostos(conn: sqlite3.Connection):
         conn.rollback()
         return False
 
+def criar_tabela_cotacoes(conn: sqlite3.Connection):
+    """Cria a tabela 'cotacoes' (um registro por boletim do Banco Central) se não existir."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cotacoes (
+                moeda TEXT NOT NULL,
+                data TEXT NOT NULL,
+                data_hora TEXT NOT NULL,
+                tipo_boletim TEXT NOT NULL,
+                cotacao_compra REAL,
+                cotacao_venda REAL,
+                atualizado_em TEXT,
+                PRIMARY KEY (moeda, data_hora, tipo_boletim)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cotacoes_moeda_data ON cotacoes (moeda, data)")
+        conn.commit()
+        logger.info("Tabela 'cotacoes' verificada/criada com sucesso.")
+        return True
+    except Exception as e:
+        logger.exception("Erro ao criar a tabela 'cotacoes'")
+        conn.rollback()
+        return False
+
+def criar_tabela_ttce_respostas(conn: sqlite3.Connection):
+    """Cria a tabela 'ttce_respostas' (cache das respostas da API TTCE por parâmetros de consulta) se não existir."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ttce_respostas (
+                chave TEXT PRIMARY KEY,
+                versao INTEGER NOT NULL,
+                ncm TEXT,
+                codigo_pais INTEGER,
+                data_fato_gerador TEXT,
+                tipo_operacao TEXT,
+                fundamentos TEXT,
+                resposta TEXT NOT NULL,
+                consultado_em TEXT,
+                expira_em TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ttce_respostas_ncm ON ttce_respostas (ncm, codigo_pais)")
+        conn.commit()
+        logger.info("Tabela 'ttce_respostas' verificada/criada com sucesso.")
+        return True
+    except Exception as e:
+        logger.exception("Erro ao criar a tabela 'ttce_respostas'")
+        conn.rollback()
+        return False
+
+# Intervalo mínimo entre consultas à API de um rastreamento, quando não configurado por referência
+INTERVALO_RASTREAMENTO_PADRAO_MIN = 60
+
+def criar_tabelas_rastreamento(conn: sqlite3.Connection):
+    """
+    Cria (sem apagar dados existentes) a tabela 'tracked_shipments', com a última posição de cada
+    rastreamento, e a tabela 'shipment_events', histórico somente de inclusão dos eventos recebidos.
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS tracked_shipments (
+                tracking_ref TEXT PRIMARY KEY,
+                tracking_type TEXT,
+                imo_number TEXT,
+                vessel_name TEXT,
+                latitude REAL,
+                longitude REAL,
+                status TEXT,
+                last_updated TEXT,
+                shipping_line TEXT,
+                last_fetched TEXT,
+                refresh_interval_min INTEGER DEFAULT {INTERVALO_RASTREAMENTO_PADRAO_MIN},
+                delivered INTEGER DEFAULT 0
+            )
+        ''')
+        # Bancos criados pela versão anterior da tela do mapa não têm as colunas de controle de consulta
+        colunas = {row[1] for row in cursor.execute("PRAGMA table_info(tracked_shipments)")}
+        for coluna, definicao in (
+            ("last_fetched", "TEXT"),
+            ("refresh_interval_min", f"INTEGER DEFAULT {INTERVALO_RASTREAMENTO_PADRAO_MIN}"),
+            ("delivered", "INTEGER DEFAULT 0"),
+        ):
+            if coluna not in colunas:
+                cursor.execute(f"ALTER TABLE tracked_shipments ADD COLUMN {coluna} {definicao}")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS shipment_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tracking_ref TEXT NOT NULL,
+                event_datetime TEXT NOT NULL,
+                event_type TEXT,
+                status TEXT,
+                imo_number TEXT,
+                vessel_name TEXT,
+                latitude REAL,
+                longitude REAL,
+                fetched_at TEXT,
+                UNIQUE (tracking_ref, event_datetime, event_type, status)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_shipment_events_ref_data ON shipment_events (tracking_ref, event_datetime)")
+        conn.commit()
+        logger.info("Tabelas de rastreamento verificadas/criadas com sucesso.")
+        return True
+    except Exception as e:
+        logger.exception("Erro ao criar as tabelas de rastreamento")
+        conn.rollback()
+        return False
+
 def create_tables():
     """Cria todas as tabelas necessárias para o aplicativo."""
     success = True
@@ -181,6 +305,36 @@ def create_tables():
     else:
         success = False
 
+    conn_cotacoes = connect_db(get_db_path("cotacoes"))
+    if conn_cotacoes:
+        try:
+            if not criar_tabela_cotacoes(conn_cotacoes):
+                success = False
+        finally:
+            conn_cotacoes.close()
+    else:
+        success = False
+
+    conn_comex = connect_db(get_db_path("comex"))
+    if conn_comex:
+        try:
+            if not criar_tabelas_rastreamento(conn_comex):
+                success = False
+        finally:
+            conn_comex.close()
+    else:
+        success = False
+
+    conn_ttce = connect_db(get_db_path("ttce"))
+    if conn_ttce:
+        try:
+            if not criar_tabela_ttce_respostas(conn_ttce):
+                success = False
+        finally:
+            conn_ttce.close()
+    else:
+        success = False
+
 
     conn_xml_di = connect_db(get_db_path("xml_di"))
     if conn_xml_di:
@@ -290,6 +444,20 @@ def create_tables():
                     FOREIGN KEY (declaracao_id) REFERENCES xml_declaracoes(id) ON DELETE CASCADE
                 )
             ''')
+            # Histórico das alterações de campos das DIs (sem cascade: o histórico sobrevive à exclusão da DI)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS xml_declaracoes_auditoria (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    declaracao_id INTEGER,
+                    campo TEXT,
+                    valor_anterior TEXT,
+                    valor_novo TEXT,
+                    origem TEXT,
+                    usuario TEXT,
+                    data_alteracao TEXT
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_auditoria_declaracao ON xml_declaracoes_auditoria (declaracao_id)")
             conn_xml_di.commit()
             logger.info("Tabelas XML DI e Custo verificadas/criadas.")
         except Exception as e:
@@ -446,6 +614,142 @@ def get_all_users() -> List[Dict[str, Any]]:
     finally:
         if conn: conn.close()
 
+# --- Registros tipados de DI ---
+# Métodos de acesso por nome compartilhados pelos registros abaixo, para que dict(registro),
+# registro['campo'] e registro.get('campo') continuem funcionando como com sqlite3.Row.
+def _registro_keys(self) -> List[str]:
+    return list(self._fields)
+
+def _registro_getitem(self, chave):
+    if isinstance(chave, str):
+        if chave not in self._fields:
+            raise KeyError(chave)
+        return getattr(self, chave)
+    return tuple.__getitem__(self, chave)
+
+def _registro_get(self, chave: str, default: Any = None) -> Any:
+    return getattr(self, chave) if chave in self._fields else default
+
+
+class Declaracao(NamedTuple):
+    """Linha de xml_declaracoes, na ordem de colunas usada pelas páginas (29 campos)."""
+    id: int
+    numero_di: Optional[str]
+    data_registro: Optional[str]
+    valor_total_reais_xml: Optional[float]
+    arquivo_origem: Optional[str]
+    data_importacao: Optional[str]
+    informacao_complementar: Optional[str]
+    vmle: Optional[float]
+    frete: Optional[float]
+    seguro: Optional[float]
+    vmld: Optional[float]
+    ipi: Optional[float]
+    pis_pasep: Optional[float]
+    cofins: Optional[float]
+    icms_sc: Optional[str]
+    taxa_cambial_usd: Optional[float]
+    taxa_siscomex: Optional[float]
+    numero_invoice: Optional[str]
+    peso_bruto: Optional[float]
+    peso_liquido: Optional[float]
+    cnpj_importador: Optional[str]
+    importador_nome: Optional[str]
+    recinto: Optional[str]
+    embalagem: Optional[str]
+    quantidade_volumes: Optional[int]
+    acrescimo: Optional[float]
+    imposto_importacao: Optional[float]
+    armazenagem: Optional[float]
+    frete_nacional: Optional[float]
+
+    keys = _registro_keys
+    __getitem__ = _registro_getitem
+    get = _registro_get
+
+
+class DeclaracaoItem(NamedTuple):
+    """Linha de xml_itens (19 campos)."""
+    id: int
+    declaracao_id: int
+    numero_adicao: Optional[str]
+    numero_item_sequencial: Optional[str]
+    descricao_mercadoria: Optional[str]
+    quantidade: Optional[float]
+    unidade_medida: Optional[str]
+    valor_unitario: Optional[float]
+    valor_item_calculado: Optional[float]
+    peso_liquido_item: Optional[float]
+    ncm_item: Optional[str]
+    sku_item: Optional[str]
+    custo_unit_di_usd: Optional[float]
+    ii_percent_item: Optional[float]
+    ipi_percent_item: Optional[float]
+    pis_percent_item: Optional[float]
+    cofins_percent_item: Optional[float]
+    icms_percent_item: Optional[float]
+    codigo_erp_item: Optional[str]
+
+    keys = _registro_keys
+    __getitem__ = _registro_getitem
+    get = _registro_get
+
+
+# As consultas selecionam exatamente os campos dos registros, na mesma ordem
+_COLUNAS_DECLARACAO = ", ".join(Declaracao._fields)
+_COLUNAS_DECLARACAO_ITEM = ", ".join(DeclaracaoItem._fields)
+
+def _declaracao_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Declaracao:
+    return Declaracao._make(row)
+
+def _declaracao_item_row_factory(cursor: sqlite3.Cursor, row: tuple) -> DeclaracaoItem:
+    return DeclaracaoItem._make(row)
+
+
+class ItensDeclaracao:
+    """
+    Itens de uma DI em formato colunar: uma tupla por campo de DeclaracaoItem, sem um objeto por linha.
+    numerico(campo) devolve a coluna como array float (nulos e valores inválidos viram 0.0), em cache.
+    Iterar ou indexar devolve DeclaracaoItem, para o código que ainda trabalha linha a linha.
+    """
+    __slots__ = ('_colunas', '_tamanho', '_numericos')
+
+    def __init__(self, colunas: Dict[str, tuple]):
+        self._colunas = colunas
+        self._tamanho = len(next(iter(colunas.values()), ()))
+        self._numericos: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Iterable[Any]]) -> "ItensDeclaracao":
+        """Constrói a partir de linhas (DeclaracaoItem, tuplas ou sqlite3.Row) na ordem de DeclaracaoItem._fields."""
+        if isinstance(rows, cls):
+            return rows
+        colunas = list(zip(*rows))
+        if not colunas:
+            colunas = [()] * len(DeclaracaoItem._fields)
+        return cls(dict(zip(DeclaracaoItem._fields, colunas)))
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def __iter__(self) -> Iterator[DeclaracaoItem]:
+        return map(DeclaracaoItem._make, zip(*self._colunas.values()))
+
+    def __getitem__(self, posicao: int) -> DeclaracaoItem:
+        return DeclaracaoItem._make(coluna[posicao] for coluna in self._colunas.values())
+
+    def coluna(self, campo: str) -> tuple:
+        """Valores originais do campo."""
+        return self._colunas[campo]
+
+    def numerico(self, campo: str) -> np.ndarray:
+        """Valores do campo como array float; nulos e valores não numéricos viram 0.0."""
+        if campo not in self._numericos:
+            valores = pd.to_numeric(pd.Series(self._colunas[campo], dtype=object), errors='coerce')
+            self._numericos[campo] = valores.fillna(0.0).to_numpy(dtype=float)
+        return self._numericos[campo]
+
+
 def get_all_declaracoes():
     """Carrega e retorna todos os dados das declarações XML do banco de dados."""
     conn = connect_db(get_db_path("xml_di"))
@@ -463,19 +767,13 @@ def get_all_declaracoes():
         if conn: conn.close()
     return []
 
-def get_declaracao_by_id(declaracao_id: int):
+def get_declaracao_by_id(declaracao_id: int) -> Optional[Declaracao]:
     conn = connect_db(get_db_path("xml_di"))
     if not conn: return None
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, numero_di, data_registro, valor_total_reais_xml, arquivo_origem, data_importacao,
-                   informacao_complementar, vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-                   taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-                   cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-                   imposto_importacao, armazenagem, frete_nacional
-            FROM xml_declaracoes WHERE id = ?
-        """, (declaracao_id,))
+        cursor.row_factory = _declaracao_row_factory
+        cursor.execute(f"SELECT {_COLUNAS_DECLARACAO} FROM xml_declaracoes WHERE id = ?", (declaracao_id,))
         return cursor.fetchone()
     except Exception as e:
         logger.error(f"Erro DB ao buscar declaração ID {declaracao_id}: {e}")
@@ -484,10 +782,10 @@ def get_declaracao_by_id(declaracao_id: int):
     return None
 
 # Renomeado de get_declaracao_by_process_number para get_declaracao_by_referencia
-def get_declaracao_by_referencia(referencia: str) -> Optional[sqlite3.Row]:
+def get_declaracao_by_referencia(referencia: str) -> Optional[Declaracao]:
     """
     Busca uma declaração de importação pela referência (informacao_complementar).
-    Retorna uma sqlite3.Row se encontrada, ou None.
+    Retorna uma Declaracao se encontrada, ou None.
     """
     conn = connect_db(get_db_path("xml_di"))
     if not conn: return None
@@ -495,12 +793,9 @@ def get_declaracao_by_referencia(referencia: str) -> Optional[sqlite3.Row]:
         cursor = conn.cursor()
         # Padroniza a referência de entrada para comparação (maiúsculas e sem espaços extras)
         query_val = referencia.strip().upper() 
-        cursor.execute("""
-            SELECT id, numero_di, data_registro, valor_total_reais_xml, arquivo_origem, data_importacao,
-                   informacao_complementar, vmle, frete, seguro, vmld, ipi, pis_pasep, cofins, icms_sc,
-                   taxa_cambial_usd, taxa_siscomex, numero_invoice, peso_bruto, peso_liquido,
-                   cnpj_importador, importador_nome, recinto, embalagem, quantidade_volumes, acrescimo,
-                   imposto_importacao, armazenagem, frete_nacional
+        cursor.row_factory = _declaracao_row_factory
+        cursor.execute(f"""
+            SELECT {_COLUNAS_DECLARACAO}
             FROM xml_declaracoes WHERE UPPER(TRIM(informacao_complementar)) = ?
         """, (query_val,))
         return cursor.fetchone()
@@ -510,17 +805,106 @@ def get_declaracao_by_referencia(referencia: str) -> Optional[sqlite3.Row]:
         if conn: conn.close()
     return None
 
+# Cache de declarações compartilhado pelo processo (todas as sessões e telas de cálculo).
+# Cada DI tem um carimbo de versão; toda escrita na DI (update_declaracao, update_declaracao_field,
+# save_process_cost_data, delete_declaracao) incrementa o carimbo, o que invalida a entrada.
+_declaracao_cache_lock = threading.Lock()
+_declaracao_versions: Dict[int, int] = {}
+_declaracao_cache: "OrderedDict[int, Tuple[int, Declaracao]]" = OrderedDict()
+_DECLARACAO_CACHE_MAX = 512
+
+def _invalidate_declaracao_cache(declaracao_id: int):
+    """Incrementa o carimbo de versão da DI e descarta a entrada em cache (chamada após qualquer escrita)."""
+    declaracao_id = int(declaracao_id)
+    with _declaracao_cache_lock:
+        _declaracao_versions[declaracao_id] = _declaracao_versions.get(declaracao_id, 0) + 1
+        _declaracao_cache.pop(declaracao_id, None)
+
+def get_declaracao_version(declaracao_id: int) -> int:
+    """Carimbo de versão atual da DI; muda a cada escrita feita pelas funções deste módulo."""
+    declaracao_id = int(declaracao_id)
+    with _declaracao_cache_lock:
+        return _declaracao_versions.get(declaracao_id, 0)
+
+def get_declaracao_cached(declaracao_id: int) -> Optional[Declaracao]:
+    """
+    Mesmo resultado de get_declaracao_by_id, lido do cache do processo enquanto a DI não for alterada.
+    As telas de cálculo leem por aqui, então a navegação entre elas não consulta o banco novamente.
+    """
+    if declaracao_id is None:
+        return None
+    declaracao_id = int(declaracao_id)
+    with _declaracao_cache_lock:
+        entrada = _declaracao_cache.get(declaracao_id)
+        version = _declaracao_versions.get(declaracao_id, 0)
+        if entrada is not None and entrada[0] == version:
+            _declaracao_cache.move_to_end(declaracao_id)
+            return entrada[1]
+
+    declaracao = get_declaracao_by_id(declaracao_id)
+    if declaracao is None:
+        return None
+
+    with _declaracao_cache_lock:
+        # Só publica se nenhuma escrita ocorreu durante a leitura
+        if version == _declaracao_versions.get(declaracao_id, 0):
+            _declaracao_cache[declaracao_id] = (version, declaracao)
+            _declaracao_cache.move_to_end(declaracao_id)
+            while len(_declaracao_cache) > _DECLARACAO_CACHE_MAX:
+                _declaracao_cache.popitem(last=False)
+    return declaracao
+
+
+def get_data_registro_mais_antiga() -> Optional[str]:
+    """Data de registro (AAAA-MM-DD) da DI mais antiga; usada para saber até onde guardar cotações históricas."""
+    conn = connect_db(get_db_path("xml_di"))
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(data_registro) FROM xml_declaracoes WHERE data_registro IS NOT NULL AND data_registro != ''")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Erro DB ao buscar a data de registro mais antiga: {e}")
+    finally:
+        if conn: conn.close()
+    return None
+
+
+# Colunas de xml_declaracoes usadas pelo motor de tarifas (app_logic/tariff_engine.py)
+COLUNAS_CALCULO_TARIFAS = [
+    "id", "numero_di", "informacao_complementar", "vmle", "frete", "seguro", "vmld", "ipi", "pis_pasep", "cofins",
+    "icms_sc", "taxa_siscomex", "peso_bruto", "embalagem", "quantidade_volumes", "acrescimo", "imposto_importacao",
+    "armazenagem", "frete_nacional"
+]
+
+def get_declaracoes_para_calculo() -> pd.DataFrame:
+    """
+    Carrega, em uma única consulta, os valores de cálculo de todas as DIs de xml_declaracoes
+    (VMLD, peso bruto, embalagem/volumes, tributos...). Retorna um DataFrame vazio em caso de erro.
+    """
+    conn = connect_db(get_db_path("xml_di"))
+    if not conn: return pd.DataFrame(columns=COLUNAS_CALCULO_TARIFAS)
+    try:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(COLUNAS_CALCULO_TARIFAS)} FROM xml_declaracoes ORDER BY data_importacao DESC, numero_di DESC",
+            conn
+        )
+    except Exception as e:
+        logger.error(f"Erro DB ao carregar os valores de cálculo das declarações: {e}")
+        return pd.DataFrame(columns=COLUNAS_CALCULO_TARIFAS)
+    finally:
+        if conn: conn.close()
+
 
-def get_itens_by_declaracao_id(declaracao_id: int):
+def get_itens_by_declaracao_id(declaracao_id: int) -> List[DeclaracaoItem]:
     conn = connect_db(get_db_path("xml_di"))
     if not conn: return []
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, declaracao_id, numero_adicao, numero_item_sequencial, descricao_mercadoria, quantidade, unidade_medida,
-                   valor_unitario, valor_item_calculado, peso_liquido_item, ncm_item, sku_item,
-                   custo_unit_di_usd, ii_percent_item, ipi_percent_item, pis_percent_item, cofins_percent_item, icms_percent_item,
-                   codigo_erp_item
+        cursor.row_factory = _declaracao_item_row_factory
+        cursor.execute(f"""
+            SELECT {_COLUNAS_DECLARACAO_ITEM}
             FROM xml_itens WHERE declaracao_id = ?
             ORDER BY numero_adicao ASC, numero_item_sequencial ASC
         """, (declaracao_id,))
@@ -531,6 +915,25 @@ def get_itens_by_declaracao_id(declaracao_id: int):
         if conn: conn.close()
     return []
 
+def get_itens_colunares_by_declaracao_id(declaracao_id: int) -> ItensDeclaracao:
+    """Itens da DI no formato colunar (ItensDeclaracao), lidos como tuplas simples, sem um objeto por linha."""
+    conn = connect_db(get_db_path("xml_di"))
+    if not conn: return ItensDeclaracao.from_rows([])
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"""
+            SELECT {_COLUNAS_DECLARACAO_ITEM}
+            FROM xml_itens WHERE declaracao_id = ?
+            ORDER BY numero_adicao ASC, numero_item_sequencial ASC
+        """, (declaracao_id,))
+        return ItensDeclaracao.from_rows(cursor.fetchall())
+    except Exception as e:
+        logger.error(f"Erro DB ao buscar itens para declaração ID {declaracao_id}: {e}")
+    finally:
+        if conn: conn.close()
+    return ItensDeclaracao.from_rows([])
+
 def update_xml_item_erp_code(item_id: int, new_erp_code: str):
     conn = connect_db(get_db_path("xml_di"))
     if not conn: return False
@@ -572,6 +975,7 @@ def save_process_cost_data(declaracao_id: int, afrmm: float, siscoserv: float, d
             ''', (declaracao_id, afrmm, siscoserv, descarregamento, taxas_destino, multa))
             logger.info(f"Despesas inseridas para DI ID {declaracao_id}.")
         conn.commit()
+        _invalidate_declaracao_cache(declaracao_id)
 
         cursor.execute("DELETE FROM processo_contratos_cambio WHERE declaracao_id = ?", (declaracao_id,))
         logger.debug(f"Contratos antigos deletados para DI ID {declaracao_id}.")
@@ -587,6 +991,7 @@ def save_process_cost_data(declaracao_id: int, afrmm: float, siscoserv: float, d
                     VALUES (?, ?, ?, ?)
                 ''', (declaracao_id, num_contrato, dolar_cambio, valor_contrato_usd))
         conn.commit()
+        _invalidate_declaracao_cache(declaracao_id)
         logger.info(f"Contratos de câmbio salvos para DI ID {declaracao_id}.")
         return True
     except Exception as e:
@@ -829,6 +1234,7 @@ def delete_declaracao(declaracao_id: int):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM xml_declaracoes WHERE id = ?", (declaracao_id,))
         conn.commit()
+        _invalidate_declaracao_cache(declaracao_id)
         logger.info(f"Declaração ID {declaracao_id} e dados relacionados excluídos com sucesso.")
         return True
     except Exception as e:
@@ -887,6 +1293,7 @@ def update_declaracao(declaracao_id: int, di_data: Dict[str, Any]):
             declaracao_id
         ))
         conn.commit()
+        _invalidate_declaracao_cache(declaracao_id)
         logger.info(f"Declaração ID {declaracao_id} atualizada com sucesso.")
         return True
     except Exception as e:
@@ -896,39 +1303,83 @@ def update_declaracao(declaracao_id: int, di_data: Dict[str, Any]):
     finally:
         if conn: conn.close()
 
-def update_declaracao_field(declaracao_id: int, field_name: str, new_value: Any):
+# Campos de xml_declaracoes que podem ser alterados individualmente (todos exceto o id)
+CAMPOS_DECLARACAO_EDITAVEIS = frozenset(Declaracao._fields[1:])
+
+# Limite de parâmetros por consulta do SQLite (versões antigas aceitam 999)
+_LOTE_PARAMETROS_SQLITE = 900
+
+def _valor_auditoria(valor: Any) -> Optional[str]:
+    return None if valor is None else str(valor)
+
+def update_declaracao_fields(alteracoes: Iterable[Tuple[int, str, Any]], origem: Optional[str] = None, usuario: Optional[str] = None) -> bool:
     """
-    Updates a single field for a given declaracao_id in the xml_declaracoes table.
+    Atualiza campos de várias DIs em uma única transação a partir de [(declaracao_id, campo, valor), ...].
+    Os campos são validados uma vez contra CAMPOS_DECLARACAO_EDITAVEIS antes de qualquer escrita e cada
+    alteração grava uma linha em xml_declaracoes_auditoria com o valor anterior e o novo.
+    Retorna False (sem gravar nada) se algum campo não for permitido ou se ocorrer erro.
     """
+    alteracoes = [(int(declaracao_id), campo, valor) for declaracao_id, campo, valor in alteracoes]
+    if not alteracoes:
+        return True
+    campos = sorted({campo for _, campo, _ in alteracoes})
+    campos_invalidos = [campo for campo in campos if campo not in CAMPOS_DECLARACAO_EDITAVEIS]
+    if campos_invalidos:
+        logger.error(f"Tentativa de atualizar campo(s) não permitido(s): {', '.join(map(str, campos_invalidos))}")
+        return False
+
     conn = connect_db(get_db_path("xml_di"))
     if not conn: return False
     try:
         cursor = conn.cursor()
-        allowed_fields = [
-            'numero_di', 'data_registro', 'valor_total_reais_xml', 'arquivo_origem',
-            'data_importacao', 'informacao_complementar', 'vmle', 'frete', 'seguro',
-            'vmld', 'ipi', 'pis_pasep', 'cofins', 'icms_sc', 'taxa_cambial_usd',
-            'taxa_siscomex', 'numero_invoice', 'peso_bruto', 'peso_liquido',
-            'cnpj_importador', 'importador_nome', 'recinto', 'embalagem',
-            'quantidade_volumes', 'acrescimo', 'imposto_importacao', 'armazenagem',
-            'frete_nacional'
-        ]
-        if field_name not in allowed_fields:
-            logger.error(f"Tentativa de atualizar campo não permitido: {field_name}")
-            return False
-
-        query = f"UPDATE xml_declaracoes SET {field_name} = ? WHERE id = ?"
-        cursor.execute(query, (new_value, declaracao_id))
+        ids = sorted({declaracao_id for declaracao_id, _, _ in alteracoes})
+        valores_atuais: Dict[int, Dict[str, Any]] = {}
+        for inicio in range(0, len(ids), _LOTE_PARAMETROS_SQLITE):
+            lote = ids[inicio:inicio + _LOTE_PARAMETROS_SQLITE]
+            cursor.execute(
+                f"SELECT id, {', '.join(campos)} FROM xml_declaracoes WHERE id IN ({', '.join('?' * len(lote))})", lote
+            )
+            for row in cursor.fetchall():
+                valores_atuais[row[0]] = dict(zip(campos, tuple(row)[1:]))
+        ausentes = [declaracao_id for declaracao_id in ids if declaracao_id not in valores_atuais]
+        if ausentes:
+            logger.warning(f"Declarações não encontradas, alterações ignoradas: {ausentes}")
+
+        data_alteracao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        updates_por_campo: Dict[str, List[Tuple[Any, int]]] = {}
+        auditoria = []
+        for declaracao_id, campo, valor in alteracoes:
+            atuais = valores_atuais.get(declaracao_id)
+            if atuais is None:
+                continue
+            updates_por_campo.setdefault(campo, []).append((valor, declaracao_id))
+            auditoria.append((declaracao_id, campo, _valor_auditoria(atuais[campo]), _valor_auditoria(valor), origem, usuario, data_alteracao))
+            atuais[campo] = valor # Alterações repetidas do mesmo campo registram a sequência
+
+        for campo, parametros in updates_por_campo.items():
+            cursor.executemany(f"UPDATE xml_declaracoes SET {campo} = ? WHERE id = ?", parametros)
+        cursor.executemany('''
+            INSERT INTO xml_declaracoes_auditoria (declaracao_id, campo, valor_anterior, valor_novo, origem, usuario, data_alteracao)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', auditoria)
         conn.commit()
-        logger.info(f"Campo '{field_name}' da declaração ID {declaracao_id} atualizado para '{new_value}'.")
+        for declaracao_id in valores_atuais:
+            _invalidate_declaracao_cache(declaracao_id)
+        logger.info(f"{len(auditoria)} alteração(ões) gravada(s) em {len(valores_atuais)} declaração(ões) (origem: {origem}).")
         return True
     except Exception as e:
-        logger.error(f"Erro ao atualizar campo '{field_name}' para declaração ID {declaracao_id}: {e}")
+        logger.error(f"Erro ao atualizar campos em lote das declarações: {e}")
         conn.rollback()
         return False
     finally:
         if conn: conn.close()
 
+def update_declaracao_field(declaracao_id: int, field_name: str, new_value: Any, origem: Optional[str] = None, usuario: Optional[str] = None):
+    """
+    Updates a single field for a given declaracao_id in the xml_declaracoes table.
+    """
+    return update_declaracao_fields([(declaracao_id, field_name, new_value)], origem=origem, usuario=usuario)
+
 def inserir_ou_atualizar_produto(db_path: str, produto: Tuple[str, str, str, str]):
     conn = connect_db(db_path)
     if not conn: return False
@@ -957,6 +1408,35 @@ def inserir_ou_atualizar_produto(db_path: str, produto: Tuple[str, str, str, str
     finally:
         if conn: conn.close()
 
+def inserir_ou_atualizar_produtos_em_lote(db_path: str, produtos: List[Tuple[str, str, str, str]]) -> bool:
+    """
+    Insere ou atualiza vários produtos de uma vez, com um único executemany
+    (INSERT ... ON CONFLICT DO UPDATE) dentro de uma única transação.
+    Em caso de erro, nenhuma linha é gravada.
+    """
+    if not produtos: return True
+    conn = connect_db(db_path)
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO produtos (id_key_erp, nome_part, descricao, ncm)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(id_key_erp) DO UPDATE SET
+                nome_part = excluded.nome_part,
+                descricao = excluded.descricao,
+                ncm = excluded.ncm
+        ''', produtos)
+        conn.commit()
+        logger.info(f"{len(produtos)} produtos inseridos/atualizados em lote com sucesso.")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao inserir/atualizar produtos em lote: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
 def selecionar_todos_produtos(db_path: str):
     conn = connect_db(db_path)
     if not conn: return []
@@ -1022,6 +1502,55 @@ def deletar_produto(db_path: str, id_key_erp: str):
         if conn: conn.close()
 
 # Funções para o novo banco de NCM e impostos
+
+# Cache de alíquotas por NCM compartilhado pelo processo.
+# Toda escrita em 'ncm_impostos_items' incrementa _ncm_rates_version, o que invalida o cache.
+_ncm_rates_lock = threading.Lock()
+_ncm_rates_version = 0
+_ncm_rates_cache: Dict[str, Any] = {"version": -1, "rates": {}}
+
+_NCM_RATE_FIELDS = ('ii_aliquota', 'ipi_aliquota', 'pis_aliquota', 'cofins_aliquota', 'icms_aliquota')
+
+def _invalidate_ncm_rates_cache():
+    """Invalida o cache de alíquotas por NCM (chamada após qualquer escrita)."""
+    global _ncm_rates_version
+    with _ncm_rates_lock:
+        _ncm_rates_version += 1
+
+def get_ncm_rates_map() -> Dict[str, Dict[str, float]]:
+    """
+    Retorna um dicionário {ncm_code: {'ii_aliquota': ..., 'ipi_aliquota': ..., ...}} com todas as
+    alíquotas cadastradas. O dicionário é carregado com uma única consulta e reaproveitado até a
+    próxima escrita na tabela. Não deve ser modificado pelo chamador.
+    """
+    with _ncm_rates_lock:
+        if _ncm_rates_cache["version"] == _ncm_rates_version:
+            return _ncm_rates_cache["rates"]
+        version = _ncm_rates_version
+
+    conn = connect_db(get_db_path("ncm_impostos"))
+    if not conn: return {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT ncm_code, {', '.join(_NCM_RATE_FIELDS)} FROM ncm_impostos_items")
+        rates = {
+            row['ncm_code']: {field: (row[field] if row[field] is not None else 0.0) for field in _NCM_RATE_FIELDS}
+            for row in cursor.fetchall()
+        }
+    except Exception as e:
+        logger.error(f"Erro ao carregar alíquotas NCM para o cache: {e}")
+        return {}
+    finally:
+        if conn: conn.close()
+
+    with _ncm_rates_lock:
+        # Só publica se nenhuma escrita ocorreu durante a leitura
+        if version == _ncm_rates_version:
+            _ncm_rates_cache["version"] = version
+            _ncm_rates_cache["rates"] = rates
+    logger.debug(f"Cache de alíquotas NCM carregado com {len(rates)} itens (versão {version}).")
+    return rates
+
 def adicionar_ou_atualizar_ncm_item(ncm_code: str, descricao_item: str, ii_aliquota: float, ipi_aliquota: float, pis_aliquota: float, cofins_aliquota: float, icms_aliquota: float):
     """
     Adiciona um novo item NCM com seus impostos ou atualiza um existente.
@@ -1045,6 +1574,7 @@ def adicionar_ou_atualizar_ncm_item(ncm_code: str, descricao_item: str, ii_aliqu
             ''', (ncm_code, descricao_item, ii_aliquota, ipi_aliquota, pis_aliquota, cofins_aliquota, icms_aliquota))
             logger.info(f"Novo item NCM '{ncm_code}' inserido com sucesso.")
         conn.commit()
+        _invalidate_ncm_rates_cache()
         return True
     except Exception as e:
         logger.error(f"Erro ao inserir/atualizar item NCM '{ncm_code}': {e}")
@@ -1053,6 +1583,39 @@ def adicionar_ou_atualizar_ncm_item(ncm_code: str, descricao_item: str, ii_aliqu
     finally:
         if conn: conn.close()
 
+def adicionar_ou_atualizar_ncm_itens_em_lote(itens: List[Tuple[str, str, float, float, float, float, float]]) -> bool:
+    """
+    Insere ou atualiza vários itens NCM de uma vez, com um único executemany
+    (INSERT ... ON CONFLICT DO UPDATE) dentro de uma única transação.
+    Cada item é (ncm_code, descricao_item, ii, ipi, pis, cofins, icms).
+    """
+    if not itens: return True
+    conn = connect_db(get_db_path("ncm_impostos"))
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO ncm_impostos_items (ncm_code, descricao_item, ii_aliquota, ipi_aliquota, pis_aliquota, cofins_aliquota, icms_aliquota)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ncm_code) DO UPDATE SET
+                descricao_item = excluded.descricao_item,
+                ii_aliquota = excluded.ii_aliquota,
+                ipi_aliquota = excluded.ipi_aliquota,
+                pis_aliquota = excluded.pis_aliquota,
+                cofins_aliquota = excluded.cofins_aliquota,
+                icms_aliquota = excluded.icms_aliquota
+        ''', itens)
+        conn.commit()
+        _invalidate_ncm_rates_cache()
+        logger.info(f"{len(itens)} itens NCM inseridos/atualizados em lote com sucesso.")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao inserir/atualizar itens NCM em lote: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
 def selecionar_todos_ncm_itens():
     """
     Seleciona todos os itens NCM do banco de dados.
@@ -1079,6 +1642,7 @@ def deletar_ncm_item(ncm_id: int):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM ncm_impostos_items WHERE id = ?", (ncm_id,))
         conn.commit()
+        _invalidate_ncm_rates_cache()
         if cursor.rowcount > 0:
             logger.info(f"Item NCM com ID '{ncm_id}' excluído com sucesso.")
             return True
@@ -1107,3 +1671,349 @@ def get_ncm_item_by_ncm_code(ncm_code: str):
         return None
     finally:
         if conn: conn.close()
+
+# Funções do armazenamento local de cotações (boletins PTAX do Banco Central)
+
+def salvar_boletins_cotacao(boletins: List[Dict[str, Any]], moeda: str = "USD") -> bool:
+    """
+    Grava os boletins [{'data_hora', 'tipo_boletim', 'cotacao_compra', 'cotacao_venda'}, ...] da moeda.
+    Um boletim já gravado (mesma data/hora e tipo) tem as cotações atualizadas.
+    """
+    if not boletins:
+        return True
+    conn = connect_db(get_db_path("cotacoes"))
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        atualizado_em = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.executemany('''
+            INSERT INTO cotacoes (moeda, data, data_hora, tipo_boletim, cotacao_compra, cotacao_venda, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(moeda, data_hora, tipo_boletim) DO UPDATE SET
+                cotacao_compra = excluded.cotacao_compra,
+                cotacao_venda = excluded.cotacao_venda,
+                atualizado_em = excluded.atualizado_em
+        ''', [
+            (moeda, b['data_hora'][:10], b['data_hora'], b['tipo_boletim'], b.get('cotacao_compra'), b.get('cotacao_venda'), atualizado_em)
+            for b in boletins
+        ])
+        conn.commit()
+        logger.debug(f"{len(boletins)} boletim(ns) de cotação {moeda} gravado(s).")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao gravar boletins de cotação {moeda}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
+def get_boletins_cotacao(data: str, moeda: str = "USD") -> List[Dict[str, Any]]:
+    """Boletins gravados da moeda na data (AAAA-MM-DD), em ordem de horário."""
+    conn = connect_db(get_db_path("cotacoes"))
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT data, data_hora, tipo_boletim, cotacao_compra, cotacao_venda
+            FROM cotacoes WHERE moeda = ? AND data = ? ORDER BY data_hora
+        ''', (moeda, data))
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Erro ao buscar boletins de cotação {moeda} de {data}: {e}")
+        return []
+    finally:
+        if conn: conn.close()
+
+def get_data_cotacao_anterior(data: str, moeda: str = "USD") -> Optional[str]:
+    """Data mais recente, até a data informada (inclusive), que tem boletins gravados."""
+    conn = connect_db(get_db_path("cotacoes"))
+    if not conn: return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX(data) FROM cotacoes WHERE moeda = ? AND data <= ?", (moeda, data))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Erro ao buscar a data de cotação {moeda} anterior a {data}: {e}")
+        return None
+    finally:
+        if conn: conn.close()
+
+def get_intervalo_cotacoes(moeda: str = "USD") -> Tuple[Optional[str], Optional[str]]:
+    """Primeira e última data com boletins gravados da moeda."""
+    conn = connect_db(get_db_path("cotacoes"))
+    if not conn: return None, None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(data), MAX(data) FROM cotacoes WHERE moeda = ?", (moeda,))
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else (None, None)
+    except Exception as e:
+        logger.error(f"Erro ao buscar o intervalo de cotações {moeda}: {e}")
+        return None, None
+    finally:
+        if conn: conn.close()
+
+# Funções do armazenamento de rastreamentos de cargas (tela do mapa de navios)
+
+_COLUNAS_RASTREAMENTO = {
+    "tracking_ref": "Tracking Ref", "tracking_type": "Tipo", "imo_number": "IMO", "vessel_name": "Nome do Navio",
+    "latitude": "Latitude", "longitude": "Longitude", "status": "Status", "last_updated": "Última Atualização",
+    "shipping_line": "Companhia", "last_fetched": "Última Consulta", "refresh_interval_min": "Intervalo (min)",
+    "delivered": "Entregue",
+}
+
+def _rastreamento_row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    registro = {titulo: row[coluna] for coluna, titulo in _COLUNAS_RASTREAMENTO.items()}
+    registro["Entregue"] = bool(registro["Entregue"])
+    return registro
+
+def adicionar_rastreamento(tracking_ref: str, tracking_type: str, shipping_line: str, posicao: Optional[Dict[str, Any]] = None,
+                           refresh_interval_min: Optional[int] = None) -> bool:
+    """
+    Inclui ou atualiza um rastreamento, mantendo o histórico de eventos. 'posicao' é o retorno de
+    ship_tracking.extrair_posicao() e, se informada, também é registrada em shipment_events.
+    """
+    conn = connect_db(get_db_path("comex"))
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        posicao = posicao or {}
+        cursor.execute('''
+            INSERT INTO tracked_shipments (tracking_ref, tracking_type, imo_number, vessel_name, latitude, longitude, status,
+                                           last_updated, shipping_line, last_fetched, refresh_interval_min, delivered)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            ON CONFLICT(tracking_ref) DO UPDATE SET
+                tracking_type = excluded.tracking_type,
+                imo_number = excluded.imo_number,
+                vessel_name = excluded.vessel_name,
+                latitude = excluded.latitude,
+                longitude = excluded.longitude,
+                status = excluded.status,
+                last_updated = excluded.last_updated,
+                shipping_line = excluded.shipping_line,
+                last_fetched = excluded.last_fetched,
+                refresh_interval_min = COALESCE(?, tracked_shipments.refresh_interval_min),
+                delivered = 0
+        ''', (
+            tracking_ref, tracking_type, posicao.get('imo_number', 'N/A'), posicao.get('vessel_name', 'Desconhecido'),
+            posicao.get('latitude', 0.0), posicao.get('longitude', 0.0), posicao.get('status', 'Indefinido'), agora,
+            shipping_line, agora if posicao else None, refresh_interval_min or INTERVALO_RASTREAMENTO_PADRAO_MIN,
+            refresh_interval_min
+        ))
+        if posicao:
+            _inserir_evento_rastreamento(cursor, tracking_ref, posicao, agora)
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao adicionar o rastreamento {tracking_ref}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
+def _inserir_evento_rastreamento(cursor: sqlite3.Cursor, tracking_ref: str, posicao: Dict[str, Any], fetched_at: str):
+    # Um mesmo evento devolvido em consultas seguidas é gravado uma única vez
+    cursor.execute('''
+        INSERT OR IGNORE INTO shipment_events (tracking_ref, event_datetime, event_type, status, imo_number, vessel_name,
+                                               latitude, longitude, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        tracking_ref, posicao.get('event_datetime') or fetched_at, posicao.get('event_type'), posicao.get('status'),
+        posicao.get('imo_number'), posicao.get('vessel_name'), posicao.get('latitude'), posicao.get('longitude'), fetched_at
+    ))
+
+def get_rastreamentos() -> List[Dict[str, Any]]:
+    """Todos os rastreamentos com a última posição conhecida (chaves no formato exibido na tela do mapa)."""
+    conn = connect_db(get_db_path("comex"))
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(_COLUNAS_RASTREAMENTO)} FROM tracked_shipments ORDER BY tracking_ref")
+        return [_rastreamento_row_to_dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Erro ao buscar os rastreamentos: {e}")
+        return []
+    finally:
+        if conn: conn.close()
+
+def get_rastreamentos_para_atualizar(agora: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Rastreamentos que precisam de nova consulta à API: não entregues e nunca consultados ou consultados
+    há mais tempo que o próprio intervalo (refresh_interval_min).
+    """
+    agora = agora or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect_db(get_db_path("comex"))
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {', '.join(_COLUNAS_RASTREAMENTO)} FROM tracked_shipments
+            WHERE COALESCE(delivered, 0) = 0
+              AND (last_fetched IS NULL
+                   OR datetime(last_fetched, '+' || COALESCE(refresh_interval_min, ?) || ' minutes') <= datetime(?))
+            ORDER BY tracking_ref
+        ''', (INTERVALO_RASTREAMENTO_PADRAO_MIN, agora))
+        return [_rastreamento_row_to_dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Erro ao buscar os rastreamentos a atualizar: {e}")
+        return []
+    finally:
+        if conn: conn.close()
+
+def registrar_consultas_rastreamento(resultados: List[Dict[str, Any]], consultado_em: Optional[str] = None) -> bool:
+    """
+    Grava em uma única transação o resultado de uma rodada de consultas ([{'tracking_ref', 'dados', 'erro', 'respondida'}],
+    como em ship_tracking.atualizar_posicoes). As referências a que a API respondeu têm 'last_fetched' atualizado,
+    mesmo sem dados novos; as que falharam por rede ou erro do servidor ficam como estavam, para serem consultadas
+    de novo na próxima atualização. As que retornaram posição também têm a última posição e o histórico atualizados.
+    """
+    if not resultados:
+        return True
+    consultado_em = consultado_em or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect_db(get_db_path("comex"))
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "UPDATE tracked_shipments SET last_fetched = ? WHERE tracking_ref = ?",
+            [(consultado_em, r['tracking_ref']) for r in resultados if r.get('respondida')]
+        )
+        com_dados = [r for r in resultados if r.get('dados')]
+        cursor.executemany('''
+            UPDATE tracked_shipments
+            SET imo_number = ?, vessel_name = ?, latitude = ?, longitude = ?, status = ?, last_updated = ?
+            WHERE tracking_ref = ?
+        ''', [
+            (r['dados'].get('imo_number', 'N/A'), r['dados'].get('vessel_name', 'Desconhecido'), r['dados'].get('latitude', 0.0),
+             r['dados'].get('longitude', 0.0), r['dados'].get('status', 'Indefinido'), consultado_em, r['tracking_ref'])
+            for r in com_dados
+        ])
+        for r in com_dados:
+            _inserir_evento_rastreamento(cursor, r['tracking_ref'], r['dados'], consultado_em)
+        conn.commit()
+        logger.info(f"{len(resultados)} consulta(s) de rastreamento registrada(s), {len(com_dados)} com posição.")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao registrar as consultas de rastreamento: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
+def update_rastreamento_config(tracking_ref: str, refresh_interval_min: int, delivered: bool) -> bool:
+    """Altera o intervalo de consulta e a marcação de entregue de um rastreamento."""
+    conn = connect_db(get_db_path("comex"))
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE tracked_shipments SET refresh_interval_min = ?, delivered = ? WHERE tracking_ref = ?",
+            (int(refresh_interval_min), 1 if delivered else 0, tracking_ref)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"Erro ao atualizar a configuração do rastreamento {tracking_ref}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
+def get_eventos_rastreamento(tracking_ref: str) -> List[Dict[str, Any]]:
+    """Histórico de eventos recebidos para a referência, do mais recente para o mais antigo."""
+    conn = connect_db(get_db_path("comex"))
+    if not conn: return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT event_datetime, event_type, status, imo_number, vessel_name, latitude, longitude, fetched_at
+            FROM shipment_events WHERE tracking_ref = ? ORDER BY event_datetime DESC, id DESC
+        ''', (tracking_ref,))
+        return [dict(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Erro ao buscar os eventos do rastreamento {tracking_ref}: {e}")
+        return []
+    finally:
+        if conn: conn.close()
+
+# Funções do cache de respostas da API TTCE (app_logic/ttce_client.py)
+
+def get_respostas_ttce(chaves: List[str], versao: int, agora: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Respostas em cache, válidas (não expiradas) e da versão informada, para as chaves. Retorna {chave: resposta}."""
+    if not chaves:
+        return {}
+    agora = agora or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = connect_db(get_db_path("ttce"))
+    if not conn: return {}
+    try:
+        cursor = conn.cursor()
+        respostas = {}
+        for inicio in range(0, len(chaves), _LOTE_PARAMETROS_SQLITE):
+            lote = chaves[inicio:inicio + _LOTE_PARAMETROS_SQLITE]
+            cursor.execute(f'''
+                SELECT chave, resposta FROM ttce_respostas
+                WHERE chave IN ({', '.join('?' for _ in lote)}) AND versao = ? AND (expira_em IS NULL OR expira_em > ?)
+            ''', (*lote, versao, agora))
+            respostas.update({row['chave']: json.loads(row['resposta']) for row in cursor.fetchall()})
+        return respostas
+    except Exception as e:
+        logger.error(f"Erro ao ler o cache de respostas TTCE: {e}")
+        return {}
+    finally:
+        if conn: conn.close()
+
+def salvar_respostas_ttce(registros: List[Dict[str, Any]]) -> bool:
+    """
+    Grava (ou substitui) respostas no cache em uma única transação. Cada registro tem 'chave', 'versao',
+    'ncm', 'codigo_pais', 'data_fato_gerador', 'tipo_operacao', 'fundamentos', 'resposta' e 'expira_em'.
+    """
+    if not registros:
+        return True
+    conn = connect_db(get_db_path("ttce"))
+    if not conn: return False
+    try:
+        cursor = conn.cursor()
+        consultado_em = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.executemany('''
+            INSERT OR REPLACE INTO ttce_respostas (chave, versao, ncm, codigo_pais, data_fato_gerador, tipo_operacao,
+                                                   fundamentos, resposta, consultado_em, expira_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (r['chave'], r['versao'], r['ncm'], r['codigo_pais'], r['data_fato_gerador'], r['tipo_operacao'],
+             json.dumps(r['fundamentos']) if r.get('fundamentos') else None, json.dumps(r['resposta']),
+             consultado_em, r.get('expira_em'))
+            for r in registros
+        ])
+        conn.commit()
+        logger.debug(f"{len(registros)} resposta(s) TTCE gravada(s) no cache.")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao gravar respostas TTCE no cache: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
+def limpar_cache_ttce(versao_atual: Optional[int] = None) -> int:
+    """Remove do cache as respostas expiradas e de outras versões (ou todas, se versao_atual for None)."""
+    conn = connect_db(get_db_path("ttce"))
+    if not conn: return 0
+    try:
+        cursor = conn.cursor()
+        if versao_atual is None:
+            cursor.execute("DELETE FROM ttce_respostas")
+        else:
+            cursor.execute(
+                "DELETE FROM ttce_respostas WHERE versao != ? OR (expira_em IS NOT NULL AND expira_em <= ?)",
+                (versao_atual, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Erro ao limpar o cache de respostas TTCE: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        if conn: conn.close()
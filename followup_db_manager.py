@@ -3,6 +3,7 @@ import sqlite3
 import streamlit as st
 import pandas as pd
 import os
+import re
 import logging
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple
@@ -11,6 +12,7 @@ import json # Importar json para lidar com target_users
 # Importar db_utils para obter a lista de usuários
 # Assumindo que db_utils está no mesmo nível que followup_db_manager
 import db_utils
+import query_trace
 
 
 # Configuração de logging para o módulo de banco de dados
@@ -71,7 +73,7 @@ def conectar_followup_db():
         logger.error("Caminho do DB de Follow-up não definido. Não é possível conectar.")
         return None
     try:
-        conn = sqlite3.connect(followup_db_path)
+        conn = query_trace.conectar(followup_db_path) # Consultas medidas por query_trace
         conn.row_factory = sqlite3.Row # Retorna linhas como dicionários-like para fácil acesso
         conn.execute("PRAGMA foreign_keys = ON;") # Garante a integridade referencial
         logger.debug(f"[conectar_followup_db] Conectado com sucesso a: {followup_db_path}")
@@ -347,6 +349,39 @@ def inserir_item_processo(
         if conn:
             conn.close()
 
+def inserir_itens_processo_em_lote(processo_id: int, itens: List[tuple], substituir: bool = False) -> bool:
+    """
+    Insere vários itens de um processo em uma única transação.
+    Cada tupla segue a ordem dos parâmetros de inserir_item_processo (sem o processo_id).
+    Com substituir=True, os itens existentes do processo são removidos na mesma transação.
+    """
+    conn = conectar_followup_db()
+    if conn is None:
+        return False
+    try:
+        cursor = conn.cursor()
+        if substituir:
+            cursor.execute("DELETE FROM process_items WHERE processo_id = ?", (processo_id,))
+        cursor.executemany('''INSERT INTO process_items (
+                            processo_id, codigo_interno, ncm, cobertura, sku,
+                            quantidade, peso_unitario, valor_unitario, valor_total_item,
+                            estimativa_ii_br, estimativa_ipi_br, estimativa_pis_br,
+                            estimativa_cofins_br, estimativa_icms_br,
+                            frete_rateado_usd, seguro_rateado_brl, vlmd_item,
+                            denominacao_produto, detalhamento_complementar_produto
+                          ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                           [(processo_id, *item) for item in itens])
+        conn.commit()
+        logger.info(f"{len(itens)} itens inseridos em lote para o processo ID {processo_id} (substituir={substituir}).")
+        return True
+    except Exception as e:
+        logger.exception(f"Erro ao inserir itens em lote para o processo ID {processo_id}.")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
 def obter_itens_processo(processo_id: int) -> List[Dict[str, Any]]:
     """Obtém todos os itens associados a um processo específico."""
     conn = conectar_followup_db()
@@ -429,6 +464,42 @@ def obter_todos_processos():
         if conn:
             conn.close()
 
+def normalizar_invoice(invoice: Optional[str]) -> str:
+    """Normaliza um número de invoice para comparação (sem espaços nas pontas, maiúsculas)."""
+    if invoice is None:
+        return ""
+    return str(invoice).strip().upper()
+
+
+def obter_processos_por_invoice() -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Retorna um dicionário {N_Invoice normalizado: [processos]} com uma única consulta.
+    Quando o campo N_Invoice contém várias invoices separadas por '/', ',' ou ';', o processo
+    é indexado por cada uma delas.
+    """
+    conn = conectar_followup_db()
+    if conn is None:
+        return {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''SELECT * FROM processos
+                          WHERE "N_Invoice" IS NOT NULL AND LENGTH(TRIM("N_Invoice")) > 0''')
+        mapa: Dict[str, List[Dict[str, Any]]] = {}
+        for row in cursor.fetchall():
+            processo = dict(row)
+            for parte in re.split(r"[/,;]", processo["N_Invoice"]):
+                chave = normalizar_invoice(parte)
+                if chave:
+                    mapa.setdefault(chave, []).append(processo)
+        logger.debug(f"Mapa de processos por invoice com {len(mapa)} chaves.")
+        return mapa
+    except Exception as e:
+        logger.exception("Erro ao obter o mapa de processos por invoice")
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
 def obter_processo_por_id(processo_id: int):
     """Busca um processo específico pelo ID."""
     conn = conectar_followup_db()
@@ -0,0 +1,315 @@
+"""
+Rastreamento das consultas SQL feitas pelas conexões do app (db_utils e followup_db_manager).
+
+As fábricas de conexão usam conectar(), que devolve uma sqlite3.Connection cujos cursores medem cada
+execução: texto do SQL, impressão digital dos parâmetros (os valores não são guardados), duração
+(execução + leitura das linhas), linhas retornadas/afetadas, página do app que estava sendo exibida e a
+função que fez a consulta. Os registros ficam em um buffer circular em memória (TAMANHO_BUFFER) e em
+um resumo por consulta; consultas mais lentas que o limite configurado vão para o log e, se
+configurado, para um arquivo próprio (uma linha JSON por consulta). Nada aqui usa Streamlit.
+
+Variáveis de ambiente: QUERY_TRACE=0 desliga o rastreamento, QUERY_TRACE_SLOW_MS define o limite de
+consulta lenta e QUERY_TRACE_SLOW_LOG o caminho do arquivo de consultas lentas.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_BUFFER = 2000
+LIMITE_LENTA_MS_PADRAO = 200.0
+# Limita o resumo quando o SQL é montado com valores embutidos (cada texto vira uma consulta distinta)
+MAX_CONSULTAS_DISTINTAS = 1000
+TAMANHO_MAXIMO_SQL = 1000
+TAMANHO_MAXIMO_ARQUIVO_LENTAS = 5 * 1024 * 1024
+# Módulos ignorados ao procurar a função que fez a consulta
+_MODULOS_INTERNOS = ('query_trace', 'pandas', 'sqlite3', 'sqlalchemy')
+
+_lock = threading.Lock()
+_registros: deque = deque(maxlen=TAMANHO_BUFFER)
+_resumo: Dict[tuple, Dict[str, Any]] = {}
+_contexto = threading.local()
+_config = {
+    'ativo': os.getenv("QUERY_TRACE", "1") != "0",
+    'limite_lenta_ms': float(os.getenv("QUERY_TRACE_SLOW_MS") or LIMITE_LENTA_MS_PADRAO),
+    'arquivo_lentas': os.getenv("QUERY_TRACE_SLOW_LOG") or None,
+}
+_logger_lentas = logging.getLogger(__name__ + ".lentas")
+_logger_lentas.propagate = False
+_logger_lentas.setLevel(logging.INFO)
+
+
+class RegistroConsulta:
+    """Uma execução de SQL. Duração e linhas crescem enquanto o resultado é lido."""
+    __slots__ = ('momento', 'sql', 'parametros', 'n_parametros', 'duracao_s', 'linhas', 'pagina', 'origem',
+                 'thread', 'erro', 'lenta')
+
+    def __init__(self, sql, parametros, n_parametros, duracao_s, linhas, pagina, origem, erro):
+        self.momento = time.time()
+        self.sql = sql
+        self.parametros = parametros
+        self.n_parametros = n_parametros
+        self.duracao_s = duracao_s
+        self.linhas = linhas
+        self.pagina = pagina
+        self.origem = origem
+        self.thread = threading.current_thread().name
+        self.erro = erro
+        self.lenta = False
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            'momento': datetime.fromtimestamp(self.momento).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            'pagina': self.pagina, 'sql': self.sql, 'parametros': self.parametros,
+            'n_parametros': self.n_parametros, 'duracao_ms': round(self.duracao_s * 1000, 3),
+            'linhas': self.linhas, 'origem': self.origem, 'thread': self.thread, 'erro': self.erro,
+        }
+
+
+@lru_cache(maxsize=4096)
+def _normalizar_sql(sql: str) -> str:
+    sql = re.sub(r"\s+", " ", sql).strip()
+    return sql if len(sql) <= TAMANHO_MAXIMO_SQL else sql[:TAMANHO_MAXIMO_SQL] + "..."
+
+
+def _impressao_parametros(parametros) -> str:
+    """Hash curto dos valores (válido dentro do processo): identifica repetições sem guardar os dados."""
+    if not parametros:
+        return ""
+    try:
+        valores = tuple(sorted(parametros.items())) if isinstance(parametros, dict) else tuple(parametros)
+        return f"{hash(valores) & 0xFFFFFFFF:08x}"
+    except TypeError:
+        return f"{hash(repr(parametros)) & 0xFFFFFFFF:08x}"
+
+
+def _origem() -> str:
+    """'modulo.funcao:linha' do primeiro quadro da pilha fora deste módulo, do pandas e do sqlite3."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get('__name__', '').startswith(_MODULOS_INTERNOS):
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}:{frame.f_lineno}"
+
+
+def definir_pagina(nome: Optional[str]):
+    """Página do app associada às consultas feitas a partir de agora na thread atual."""
+    _contexto.pagina = nome
+
+
+def pagina_atual() -> str:
+    pagina = getattr(_contexto, 'pagina', None)
+    return pagina if pagina else f"[{threading.current_thread().name}]"
+
+
+def _gravar_lenta(registro: RegistroConsulta):
+    logger.warning(f"Consulta lenta ({registro.duracao_s * 1000:.0f} ms, {registro.linhas} linha(s)) "
+                   f"em '{registro.pagina}' ({registro.origem}): {registro.sql[:200]}")
+    if _logger_lentas.handlers:
+        _logger_lentas.info(json.dumps(registro.como_dict(), ensure_ascii=False))
+
+
+def _acumular(registro: RegistroConsulta, duracao_s: float, linhas: int, nova_execucao: bool = False):
+    with _lock:
+        registro.duracao_s += duracao_s
+        registro.linhas += linhas
+        chave = (registro.sql, registro.pagina)
+        resumo = _resumo.get(chave)
+        if resumo is None:
+            if len(_resumo) >= MAX_CONSULTAS_DISTINTAS:
+                chave = ("(outras consultas)", registro.pagina)
+                resumo = _resumo.get(chave)
+            if resumo is None:
+                resumo = _resumo[chave] = {'execucoes': 0, 'tempo_total_s': 0.0, 'tempo_max_s': 0.0,
+                                           'linhas': 0, 'erros': 0, 'parametros_distintos': set(), 'origem': registro.origem}
+        if nova_execucao:
+            resumo['execucoes'] += 1
+            resumo['erros'] += 1 if registro.erro else 0
+            if len(resumo['parametros_distintos']) < TAMANHO_BUFFER:
+                resumo['parametros_distintos'].add(registro.parametros)
+        resumo['tempo_total_s'] += duracao_s
+        resumo['tempo_max_s'] = max(resumo['tempo_max_s'], registro.duracao_s)
+        resumo['linhas'] += linhas
+        gravar_lenta = not registro.lenta and registro.duracao_s * 1000 >= _config['limite_lenta_ms']
+        if gravar_lenta:
+            registro.lenta = True
+    if gravar_lenta:
+        _gravar_lenta(registro)
+
+
+def _registrar(sql: str, parametros, n_parametros: int, duracao_s: float, linhas: int, erro: Optional[str]) -> RegistroConsulta:
+    registro = RegistroConsulta(_normalizar_sql(sql), parametros, n_parametros, 0.0, 0, pagina_atual(), _origem(), erro)
+    with _lock:
+        _registros.append(registro)
+    _acumular(registro, duracao_s, linhas, nova_execucao=True)
+    return registro
+
+
+class CursorRastreado(sqlite3.Cursor):
+    """Cursor que registra cada execução e soma às linhas e à duração o tempo de leitura do resultado."""
+    _registro: Optional[RegistroConsulta] = None
+    # Linhas lidas por iteração são somadas localmente e repassadas ao registro no fim da leitura
+    _pendente_s = 0.0
+    _pendente_linhas = 0
+
+    def _descarregar(self):
+        if self._registro is not None and self._pendente_linhas:
+            _acumular(self._registro, self._pendente_s, self._pendente_linhas)
+        self._pendente_s, self._pendente_linhas = 0.0, 0
+
+    def _executar(self, metodo, sql, parametros, impressao, n_parametros):
+        self._descarregar()
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            return metodo(sql, parametros)
+        except Exception as e:
+            erro = type(e).__name__
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            # Para INSERT/UPDATE/DELETE conta as linhas afetadas; para SELECT, as linhas lidas depois
+            linhas = max(self.rowcount, 0) if erro is None and self.description is None else 0
+            self._registro = _registrar(sql, impressao, n_parametros, duracao, linhas, erro)
+
+    def execute(self, sql, parameters=()):
+        return self._executar(super().execute, sql, parameters, _impressao_parametros(parameters), len(parameters or ()))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._executar(super().executemany, sql, seq_of_parameters, "executemany", 0)
+
+    def executescript(self, sql_script):
+        return self._executar(lambda sql, _: super(CursorRastreado, self).executescript(sql), sql_script, None, "", 0)
+
+    def _ler(self, metodo, *args):
+        inicio = time.perf_counter()
+        resultado = metodo(*args)
+        if self._registro is not None:
+            linhas = len(resultado) if isinstance(resultado, list) else (0 if resultado is None else 1)
+            _acumular(self._registro, time.perf_counter() - inicio, linhas)
+        return resultado
+
+    def fetchone(self):
+        return self._ler(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._ler(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._ler(super().fetchall)
+
+    def __next__(self):
+        inicio = time.perf_counter()
+        try:
+            linha = super().__next__()
+        except StopIteration:
+            self._descarregar()
+            raise
+        self._pendente_s += time.perf_counter() - inicio
+        self._pendente_linhas += 1
+        return linha
+
+    def close(self):
+        self._descarregar()
+        super().close()
+
+
+class ConexaoRastreada(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de conn.execute) são CursorRastreado."""
+
+    def cursor(self, factory=CursorRastreado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def conectar(caminho: str, **kwargs) -> sqlite3.Connection:
+    """sqlite3.connect() com rastreamento das consultas quando ativo."""
+    kwargs.setdefault('factory', ConexaoRastreada if _config['ativo'] else sqlite3.Connection)
+    return sqlite3.connect(caminho, **kwargs)
+
+
+def _configurar_arquivo_lentas(caminho: Optional[str]):
+    for handler in list(_logger_lentas.handlers):
+        _logger_lentas.removeHandler(handler)
+        handler.close()
+    if caminho:
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        handler = RotatingFileHandler(caminho, maxBytes=TAMANHO_MAXIMO_ARQUIVO_LENTAS, backupCount=3, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger_lentas.addHandler(handler)
+
+
+def configurar(ativo: Optional[bool] = None, limite_lenta_ms: Optional[float] = None, arquivo_lentas: Optional[str] = ...):
+    """
+    Altera a configuração do rastreamento. 'ativo' vale para as conexões abertas a partir de agora;
+    arquivo_lentas=None desliga o arquivo de consultas lentas.
+    """
+    with _lock:
+        if ativo is not None:
+            _config['ativo'] = bool(ativo)
+        if limite_lenta_ms is not None:
+            _config['limite_lenta_ms'] = float(limite_lenta_ms)
+        if arquivo_lentas is not ...:
+            _config['arquivo_lentas'] = arquivo_lentas or None
+            _configurar_arquivo_lentas(_config['arquivo_lentas'])
+    logger.info(f"Rastreamento de consultas: {get_configuracao()}")
+
+
+def get_configuracao() -> Dict[str, Any]:
+    return dict(_config)
+
+
+def get_consultas_recentes(limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Registros do buffer circular, do mais recente para o mais antigo."""
+    with _lock:
+        registros = list(_registros)
+    registros.reverse()
+    return [registro.como_dict() for registro in registros[:limite]]
+
+
+def get_resumo_consultas() -> List[Dict[str, Any]]:
+    """Totais por (SQL, página) desde o início do processo (ou da última limpeza), do maior tempo total para o menor."""
+    with _lock:
+        itens = [(chave, dict(resumo)) for chave, resumo in _resumo.items()]
+    linhas = []
+    for (sql, pagina), resumo in itens:
+        linhas.append({
+            'pagina': pagina, 'sql': sql, 'execucoes': resumo['execucoes'],
+            'tempo_total_ms': round(resumo['tempo_total_s'] * 1000, 3),
+            'tempo_medio_ms': round(resumo['tempo_total_s'] * 1000 / max(resumo['execucoes'], 1), 3),
+            'tempo_max_ms': round(resumo['tempo_max_s'] * 1000, 3),
+            'linhas': resumo['linhas'], 'erros': resumo['erros'],
+            'parametros_distintos': len(resumo['parametros_distintos']), 'origem': resumo['origem'],
+        })
+    linhas.sort(key=lambda linha: linha['tempo_total_ms'], reverse=True)
+    return linhas
+
+
+def limpar():
+    """Descarta o buffer e o resumo."""
+    with _lock:
+        _registros.clear()
+        _resumo.clear()
+
+
+_configurar_arquivo_lentas(_config['arquivo_lentas'])